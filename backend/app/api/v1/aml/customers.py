@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from datetime import date
+from typing import Any, Dict, List, Optional
+from datetime import date, datetime
 
 from app.api.deps import get_db, get_current_active_user
 from app.models.user import User
@@ -47,6 +47,19 @@ def create_customer(
     return db_customer
 
 
+@router.post("/rescore")
+def rescore_customers(
+    since: Optional[datetime] = Query(None, description="completed_at of the previous run; omit to re-score everyone"),
+    chunk_size: int = Query(5000, ge=1, le=50000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+) -> Dict[str, Any]:
+    """Re-score customers in bulk; pass the returned completed_at as since for the next run"""
+    
+    risk_service = RiskScoringService(db)
+    return risk_service.rescore_customers_bulk(since=since, chunk_size=chunk_size)
+
+
 @router.get("/{customer_id}", response_model=CustomerProfileSchema)
 def get_customer(
     customer_id: int,
@@ -7,10 +7,14 @@ from sqlalchemy.orm import Session
 from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta
 from pydantic import BaseModel
+import numpy as np
+import pandas as pd
 
 from app.api.deps import get_db, get_current_active_user
 from app.models.user import User
-from app.services.aml.ml_prediction_engine import get_ml_engine, PredictionResult, AnomalyResult, RiskForecast
+from app.services.aml.ml_prediction_engine import (
+    get_ml_engine, PredictionResult, AnomalyResult, RiskForecast, SCORING_CHUNK_ROWS
+)
 
 router = APIRouter()
 
@@ -22,6 +26,9 @@ class TransactionPredictionRequest(BaseModel):
     transaction_date: Optional[datetime] = None
     transaction_type: Optional[str] = None
 
+class BatchPredictionRequest(BaseModel):
+    transactions: List[TransactionPredictionRequest]
+
 class AnomalyDetectionRequest(BaseModel):
     transactions: List[Dict[str, Any]]
     sensitivity: float = 0.1
@@ -65,6 +72,7 @@ def predict_fraud(
     """
     try:
         ml_engine = get_ml_engine()
+        ml_engine.ensure_ready(db)
         
         # Prepare transaction data
         transaction_data = {
@@ -106,6 +114,78 @@ def predict_fraud(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
+def _risk_levels(probabilities: np.ndarray) -> np.ndarray:
+    return np.select(
+        [probabilities > 0.8, probabilities > 0.6, probabilities > 0.4],
+        ["CRITICAL", "HIGH", "MEDIUM"],
+        default="LOW"
+    )
+
+@router.post("/predict/fraud/batch")
+def predict_fraud_batch(
+    request: BatchPredictionRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Score a batch of transactions for fraud probability and anomalies in one pass
+    """
+    try:
+        ml_engine = get_ml_engine()
+        ml_engine.ensure_ready(db)
+        now = datetime.now()
+        transactions = request.transactions
+        frame = pd.DataFrame({
+            "amount": [tx.amount for tx in transactions],
+            "country": [tx.country or "US" for tx in transactions],
+            # Rows without a customer get a key of their own (real ids are positive),
+            # so each is scored without history instead of sharing one
+            "customer_id": [tx.customer_id if tx.customer_id is not None else -(i + 2) for i, tx in enumerate(transactions)],
+            "transaction_date": [tx.transaction_date or now for tx in transactions]
+        })
+        
+        # Chunks go in time order, each scored on top of the request's earlier
+        # chunks, in a copy of the store so the live history is left alone
+        order = np.argsort(frame["transaction_date"].to_numpy(), kind="stable")
+        frame = frame.iloc[order].reset_index(drop=True)
+        store = ml_engine.feature_store.subset(frame["customer_id"].unique())
+        chunks = (frame.iloc[start:start + SCORING_CHUNK_ROWS] for start in range(0, len(frame), SCORING_CHUNK_ROWS))
+        
+        results = [None] * len(frame)
+        model_trained = True
+        start = 0
+        for scores in ml_engine.score_transactions_chunked(chunks, feature_store=store, ingest=True):
+            model_trained = model_trained and scores.fraud_probability is not None
+            probabilities = scores.fraud_probability if scores.fraud_probability is not None else np.full(len(scores), 0.5)
+            confidence = scores.confidence if scores.confidence is not None else np.zeros(len(scores))
+            for i, (probability, row_confidence, risk_level, is_anomaly, anomaly_score, severity, factors) in enumerate(zip(
+                probabilities.tolist(), confidence.tolist(), _risk_levels(probabilities).tolist(),
+                scores.is_anomaly.tolist(), scores.anomaly_score.tolist(), scores.severity.tolist(), scores.risk_factors
+            )):
+                index = int(order[start + i])
+                results[index] = {
+                    "transaction_index": index,
+                    "prediction": probability,
+                    "confidence": row_confidence,
+                    "risk_level": risk_level,
+                    "is_anomaly": is_anomaly,
+                    "anomaly_score": anomaly_score,
+                    "severity": severity,
+                    "risk_factors": factors
+                }
+            start += len(scores)
+        
+        return {
+            "total_transactions": len(results),
+            "anomalies_detected": sum(1 for r in results if r["is_anomaly"]),
+            "model_trained": model_trained,
+            "results": results,
+            "timestamp": now.isoformat()
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch prediction failed: {str(e)}")
+
 @router.post("/detect/anomalies", response_model=AnomalyResponse)
 def detect_anomalies(
     request: AnomalyDetectionRequest,
@@ -117,6 +197,7 @@ def detect_anomalies(
     """
     try:
         ml_engine = get_ml_engine()
+        ml_engine.ensure_ready(db)
         
         # Detect anomalies
         results = ml_engine.detect_anomalies(request.transactions)
@@ -220,6 +301,8 @@ def train_model(
     def train_model_background():
         if request.model_type == "fraud_classifier":
             return ml_engine.train_fraud_classifier(db, request.retrain)
+        elif request.model_type == "anomaly_detector":
+            return ml_engine.train_anomaly_detector(db, request.retrain)
         else:
             return {"status": "error", "message": f"Unknown model type: {request.model_type}"}
     
@@ -296,6 +379,7 @@ def get_risk_trends(
     """
     try:
         ml_engine = get_ml_engine()
+        ml_engine.ensure_ready(db)
         
         # Get recent transactions for trend analysis
         from app.models.aml.transaction import Transaction
@@ -311,26 +395,22 @@ def get_risk_trends(
         if not transactions:
             return {"message": "No transactions found for the specified period"}
         
-        # Convert to transaction data format
-        transaction_data = []
-        for tx in transactions:
-            transaction_data.append({
-                "amount": tx.amount,
-                "country": tx.country,
-                "customer_id": tx.customer_id,
-                "transaction_date": tx.transaction_date,
-                "transaction_type": getattr(tx, 'transaction_type', 'transfer')
-            })
-        
-        # Get fraud predictions for all transactions
-        risk_scores = []
-        for tx_data in transaction_data[:100]:  # Limit for performance
-            prediction = ml_engine.predict_fraud_probability(tx_data)
-            risk_scores.append({
-                "date": tx_data["transaction_date"].date().isoformat(),
-                "risk_score": prediction.prediction * 100,
-                "amount": tx_data["amount"]
-            })
+        # Score every transaction in one batch
+        frame = pd.DataFrame({
+            "id": [tx.id for tx in transactions],
+            "amount": [tx.amount for tx in transactions],
+            "country": [tx.country for tx in transactions],
+            "customer_id": [tx.customer_id for tx in transactions],
+            "transaction_date": [tx.transaction_date for tx in transactions]
+        })
+        scores = ml_engine.score_transactions(frame)
+        probabilities = scores.fraud_probability if scores.fraud_probability is not None else np.full(len(scores), 0.5)
+        risk_scores = [
+            {"date": date.date().isoformat(), "risk_score": probability * 100, "amount": amount}
+            for date, probability, amount in zip(
+                frame["transaction_date"].tolist(), probabilities.tolist(), frame["amount"].tolist()
+            )
+        ]
         
         # Group by date and calculate daily averages
         daily_risks = {}
@@ -374,6 +454,56 @@ def get_risk_trends(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Risk trend analysis failed: {str(e)}")
 
+@router.get("/analytics/daily-scores")
+def get_daily_scores(
+    day: Optional[datetime] = None,
+    top: int = 20,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Score every transaction of a day (default: yesterday) in streamed chunks
+    """
+    try:
+        ml_engine = get_ml_engine()
+        day = day or datetime.now() - timedelta(days=1)
+        started = datetime.now()
+        
+        total = 0
+        anomalies = 0
+        severity_counts: Dict[str, int] = {}
+        highest: List[Dict[str, Any]] = []
+        for scores in ml_engine.score_transaction_day(db, day):
+            total += len(scores)
+            anomalies += int(scores.is_anomaly.sum())
+            levels, counts = np.unique(scores.severity, return_counts=True)
+            for level, count in zip(levels.tolist(), counts.tolist()):
+                severity_counts[level] = severity_counts.get(level, 0) + count
+            
+            ranking = scores.fraud_probability if scores.fraud_probability is not None else scores.anomaly_score
+            for i in np.argsort(-ranking, kind="stable")[:top].tolist():
+                highest.append({
+                    "transaction_id": int(scores.transaction_ids[i]),
+                    "fraud_probability": float(scores.fraud_probability[i]) if scores.fraud_probability is not None else None,
+                    "anomaly_score": float(scores.anomaly_score[i]),
+                    "severity": str(scores.severity[i]),
+                    "risk_factors": scores.risk_factors[i],
+                    "rank_score": float(ranking[i])
+                })
+            highest = sorted(highest, key=lambda item: item["rank_score"], reverse=True)[:top]
+        
+        return {
+            "day": day.date().isoformat(),
+            "transactions_scored": total,
+            "anomalies_detected": anomalies,
+            "severity_counts": severity_counts,
+            "highest_risk": highest,
+            "elapsed_seconds": (datetime.now() - started).total_seconds()
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Daily scoring failed: {str(e)}")
+
 @router.get("/analytics/predictive-insights")
 def get_predictive_insights(
     db: Session = Depends(get_db),
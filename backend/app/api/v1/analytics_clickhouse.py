@@ -512,7 +512,21 @@ def trigger_data_sync(
             return {"message": "Full data sync completed"}
         else:
             pipeline.sync_all_data()
-            return {"message": "Incremental data sync completed"}
+            return {"message": "Incremental data sync completed", "streams": pipeline.get_lag_metrics()}
     
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Data sync failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Data sync failed: {str(e)}")
+
+
+@router.get("/pipeline/status")
+def get_pipeline_status(
+    current_user: User = Depends(get_current_active_user)
+):
+    """Per-stream lag of the change-data-capture pipeline"""
+    
+    pipeline = get_data_pipeline()
+    
+    return {
+        "running": pipeline.running,
+        "streams": pipeline.get_lag_metrics()
+    }
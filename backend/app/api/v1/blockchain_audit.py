@@ -33,11 +33,22 @@ class BlockchainVerificationResponse(BaseModel):
     total_blocks: int
     errors: List[str]
     verification_time: datetime
+    verified_from: Optional[int] = None
+    blocks_verified: Optional[int] = None
+    verified_height: Optional[int] = None
 
 class AuditTrailResponse(BaseModel):
     total_records: int
     records: List[Dict[str, Any]]
     filters_applied: Dict[str, Any]
+    next_cursor: Optional[str] = None
+
+class InclusionProofRequest(BaseModel):
+    transaction_hash: str
+    leaf_index: int
+    leaf_count: int
+    path: List[Dict[str, str]]
+    block: Dict[str, Any]
 
 class BlockchainStatsResponse(BaseModel):
     total_blocks: int
@@ -47,6 +58,7 @@ class BlockchainStatsResponse(BaseModel):
     event_type_distribution: List[Dict[str, Any]]
     blockchain_length: int
     last_block_time: Optional[str]
+    verification_checkpoint: Optional[Dict[str, Any]] = None
 
 @router.post("/record-event")
 def record_blockchain_audit_event(
@@ -84,11 +96,18 @@ def record_blockchain_audit_event(
             "timestamp": datetime.now().isoformat()
         }
         
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid audit event: {str(e)}")
+    except TimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to record audit event: {str(e)}")
 
 @router.get("/verify", response_model=BlockchainVerificationResponse)
 def verify_blockchain_integrity(
+    full: bool = Query(False, description="Re-verify the whole chain instead of blocks sealed since the last check"),
     current_user: User = Depends(get_current_active_user)
 ):
     """
@@ -98,13 +117,16 @@ def verify_blockchain_integrity(
         blockchain_service = get_blockchain_service()
         verification_start = datetime.now()
         
-        results = blockchain_service.verify_blockchain_integrity()
+        results = blockchain_service.verify_blockchain_integrity(full=full)
         
         return BlockchainVerificationResponse(
             is_valid=results["is_valid"],
             total_blocks=results["total_blocks"],
             errors=results["errors"],
-            verification_time=verification_start
+            verification_time=verification_start,
+            verified_from=results.get("verified_from"),
+            blocks_verified=results.get("blocks_verified"),
+            verified_height=results.get("verified_height")
         )
         
     except Exception as e:
@@ -118,6 +140,7 @@ def get_audit_trail(
     start_date: Optional[datetime] = Query(None, description="Start date filter"),
     end_date: Optional[datetime] = Query(None, description="End date filter"),
     limit: int = Query(100, ge=1, le=1000, description="Maximum number of records"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
     current_user: User = Depends(get_current_active_user)
 ):
     """
@@ -126,14 +149,19 @@ def get_audit_trail(
     try:
         blockchain_service = get_blockchain_service()
         
-        records = blockchain_service.get_audit_trail(
-            entity_type=entity_type,
-            entity_id=entity_id,
-            event_type=event_type,
-            start_date=start_date,
-            end_date=end_date,
-            limit=limit
-        )
+        try:
+            page = blockchain_service.get_audit_trail_page(
+                entity_type=entity_type,
+                entity_id=entity_id,
+                event_type=event_type,
+                start_date=start_date,
+                end_date=end_date,
+                limit=limit,
+                cursor=cursor
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        records = page["records"]
         
         filters_applied = {}
         if entity_type:
@@ -151,12 +179,44 @@ def get_audit_trail(
         return AuditTrailResponse(
             total_records=len(records),
             records=records,
-            filters_applied=filters_applied
+            filters_applied=filters_applied,
+            next_cursor=page["next_cursor"]
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get audit trail: {str(e)}")
 
+@router.get("/proof/{transaction_hash}")
+def get_inclusion_proof(
+    transaction_hash: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Get the Merkle inclusion proof of an audit record
+    """
+    blockchain_service = get_blockchain_service()
+    proof = blockchain_service.get_inclusion_proof(transaction_hash)
+    if proof is None:
+        raise HTTPException(status_code=404, detail=f"Audit transaction {transaction_hash} not found in a sealed block")
+    return proof
+
+@router.post("/proof/verify")
+def verify_inclusion_proof(
+    proof: InclusionProofRequest,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Verify a Merkle inclusion proof against the stored record and chain
+    """
+    try:
+        blockchain_service = get_blockchain_service()
+        return blockchain_service.verify_inclusion_proof(proof.model_dump())
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Proof verification failed: {str(e)}")
+
 @router.get("/stats", response_model=BlockchainStatsResponse)
 def get_blockchain_statistics(
     current_user: User = Depends(get_current_active_user)
@@ -202,6 +262,29 @@ def force_new_block_creation(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create block: {str(e)}")
 
+@router.get("/blocks/{height}")
+def get_block(
+    height: int,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Get a sealed block and the hashes of its transactions
+    """
+    blockchain_service = get_blockchain_service()
+    block = blockchain_service.get_block(height)
+    if block is None:
+        raise HTTPException(status_code=404, detail=f"Block {height} not found")
+    
+    return {
+        "height": block.index,
+        "block_hash": block.hash,
+        "previous_hash": block.previous_hash,
+        "merkle_root": block.merkle_root,
+        "timestamp": block.timestamp.isoformat(),
+        "signed": block.signature is not None,
+        "transaction_hashes": [tx.transaction_hash for tx in block.transactions]
+    }
+
 @router.get("/event-types")
 def get_available_event_types(
     current_user: User = Depends(get_current_active_user)
@@ -365,12 +448,11 @@ def reindex_blockchain(
         raise HTTPException(status_code=403, detail="Insufficient permissions")
     
     try:
-        # This would typically reload the blockchain from database
-        # and verify all blocks
+        # Reload the chain tip from the database and verify every block
         blockchain_service = get_blockchain_service()
         blockchain_service._load_blockchain()
         
-        verification_results = blockchain_service.verify_blockchain_integrity()
+        verification_results = blockchain_service.verify_blockchain_integrity(full=True)
         
         return {
             "status": "success" if verification_results["is_valid"] else "warning",
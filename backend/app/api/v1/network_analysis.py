@@ -3,7 +3,7 @@ Network Analysis API
 Provides endpoints for graph-based network analysis and relationship mapping
 """
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Response
 from sqlalchemy.orm import Session
 from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta
@@ -31,6 +31,10 @@ class NodeDetailsRequest(BaseModel):
 class SubgraphRequest(BaseModel):
     center_node: str
     radius: int = 2
+    page: int = 1
+    page_size: int = 200
+    max_nodes: Optional[int] = None
+    include_properties: bool = False
 
 class PatternDetectionRequest(BaseModel):
     patterns: Optional[List[str]] = None  # Specific patterns to detect
@@ -58,7 +62,8 @@ async def build_network_graph(
                 analyzer.build_graph_from_database(
                     db=db,
                     time_window_days=request.time_window_days,
-                    min_transaction_amount=request.min_transaction_amount
+                    min_transaction_amount=request.min_transaction_amount,
+                    incremental=not request.rebuild
                 )
             
             background_tasks.add_task(build_graph_background)
@@ -73,7 +78,8 @@ async def build_network_graph(
             analyzer.build_graph_from_database(
                 db=db,
                 time_window_days=request.time_window_days,
-                min_transaction_amount=request.min_transaction_amount
+                min_transaction_amount=request.min_transaction_amount,
+                incremental=True
             )
             
             stats = analyzer.get_graph_statistics()
@@ -155,7 +161,8 @@ async def calculate_centrality_measures(
                     "by_betweenness_centrality": [{"node_id": node, **scores} for node, scores in top_by_betweenness],
                     "by_pagerank": [{"node_id": node, **scores} for node, scores in top_by_pagerank]
                 },
-                "total_nodes_analyzed": len(centrality_results)
+                "total_nodes_analyzed": len(centrality_results),
+                "approximation": analyzer.centrality.get_statistics()["current"]
             }
         
     except Exception as e:
@@ -320,12 +327,20 @@ async def get_subgraph(
     """
     try:
         analyzer = get_network_analyzer()
-        subgraph_data = analyzer.get_subgraph(request.center_node, request.radius)
-        
-        if subgraph_data["node_count"] == 0:
+        # Pre-serialized payload; skips re-encoding node and edge dicts per request
+        subgraph_json = analyzer.get_subgraph_json(
+            request.center_node,
+            request.radius,
+            page=request.page,
+            page_size=min(request.page_size, 1000),
+            max_nodes=request.max_nodes,
+            include_properties=request.include_properties
+        )
+        
+        if subgraph_json is None or request.center_node not in analyzer.node_cache:
             raise HTTPException(status_code=404, detail="Node not found or no connections")
         
-        return subgraph_data
+        return Response(content=subgraph_json, media_type="application/json")
         
     except HTTPException:
         raise
@@ -4,7 +4,7 @@ Provides endpoints for real-time event streaming, alerts management, and complex
 """
 
 from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from sqlalchemy.orm import Session
 from typing import Dict, List, Any, Optional
 from datetime import datetime
@@ -26,6 +26,13 @@ from app.services.streaming import (
 
 router = APIRouter()
 
+# Returned when the event's partition queue stays full for the publish timeout
+STREAM_FULL_DETAIL = "Event stream is at capacity; retry later"
+
+
+def _stream_full() -> HTTPException:
+    return HTTPException(status_code=503, detail=STREAM_FULL_DETAIL, headers={"Retry-After": "1"})
+
 # Pydantic models for API
 class EventPublishRequest(BaseModel):
     event_type: str
@@ -78,18 +85,17 @@ async def websocket_endpoint(websocket: WebSocket):
     WebSocket endpoint for real-time alerts and events
     """
     await manager.connect(websocket)
+    streaming_service = get_streaming_service()
+    
+    # Subscribe to alert events
+    async def alert_callback(data):
+        await websocket.send_text(json.dumps({
+            "type": "alert",
+            "data": data
+        }, default=str))
+    
+    streaming_service.subscribe("alert_generated", alert_callback)
     try:
-        streaming_service = get_streaming_service()
-        
-        # Subscribe to alert events
-        async def alert_callback(data):
-            await websocket.send_text(json.dumps({
-                "type": "alert",
-                "data": data
-            }, default=str))
-        
-        streaming_service.subscribe("alert_generated", alert_callback)
-        
         # Keep connection alive and handle client messages
         while True:
             data = await websocket.receive_text()
@@ -100,7 +106,11 @@ async def websocket_endpoint(websocket: WebSocket):
                 await websocket.send_text(json.dumps({"type": "pong"}))
                 
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Any exit, not only a clean disconnect, must release the subscription
         manager.disconnect(websocket)
+        streaming_service.unsubscribe("alert_generated", alert_callback)
 
 @router.post("/events/publish")
 async def publish_event(
@@ -134,7 +144,8 @@ async def publish_event(
             user_id=str(current_user.id)
         )
         
-        await streaming_service.publish_event(event)
+        if not await streaming_service.publish_event(event):
+            raise _stream_full()
         
         return {
             "status": "success",
@@ -142,6 +153,8 @@ async def publish_event(
             "message": "Event published successfully"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to publish event: {str(e)}")
 
@@ -283,6 +296,27 @@ async def get_streaming_statistics(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get statistics: {str(e)}")
 
+@router.get("/metrics")
+async def get_streaming_metrics(
+    format: str = "json",
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Latency histograms (p50/p95/p99/max) per processor, per subscriber and
+    end-to-end, with alert rate and queue depth history.
+    ``format=prometheus`` returns the text exposition format.
+    """
+    try:
+        streaming_service = get_streaming_service()
+        
+        if format == "prometheus":
+            return PlainTextResponse(streaming_service.metrics.to_prometheus(), media_type="text/plain; version=0.0.4")
+        
+        return streaming_service.metrics.snapshot()
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get metrics: {str(e)}")
+
 @router.get("/events/history")
 async def get_event_history(
     limit: int = 100,
@@ -343,8 +377,9 @@ async def get_alerts_feed(
     async def event_stream():
         streaming_service = get_streaming_service()
         
-        # Subscribe to new alerts
-        alert_queue = asyncio.Queue()
+        # Subscribe to new alerts; a stalled client blocks the callback until
+        # the subscriber times out and is dropped instead of queueing forever
+        alert_queue = asyncio.Queue(maxsize=100)
         
         async def alert_callback(data):
             await alert_queue.put(data)
@@ -366,6 +401,8 @@ async def get_alerts_feed(
                     
         except Exception as e:
             yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+        finally:
+            streaming_service.unsubscribe("alert_generated", alert_callback)
     
     return StreamingResponse(event_stream(), media_type="text/event-stream")
 
@@ -378,7 +415,8 @@ async def test_transaction_event(
     Test endpoint to simulate transaction events for testing
     """
     try:
-        await publish_transaction_event(transaction_data, "created")
+        if not await publish_transaction_event(transaction_data, "created"):
+            raise _stream_full()
         
         return {
             "status": "success",
@@ -386,6 +424,8 @@ async def test_transaction_event(
             "data": transaction_data
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to publish test event: {str(e)}")
 
@@ -400,7 +440,8 @@ async def test_ml_prediction_event(
     Test endpoint to simulate ML prediction events
     """
     try:
-        await publish_ml_prediction_event(entity_type, entity_id, prediction_data)
+        if not await publish_ml_prediction_event(entity_type, entity_id, prediction_data):
+            raise _stream_full()
         
         return {
             "status": "success",
@@ -410,6 +451,8 @@ async def test_ml_prediction_event(
             "data": prediction_data
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to publish test event: {str(e)}")
 
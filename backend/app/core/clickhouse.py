@@ -1,15 +1,25 @@
 """
 ClickHouse connection and configuration for analytics
 """
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from clickhouse_driver import Client
 from contextlib import contextmanager
 import logging
 from datetime import datetime
 import os
 
+import pandas as pd
+
 logger = logging.getLogger(__name__)
 
+# Summary views over the analytics tables; earlier schema versions created them as materialized views
+SUMMARY_VIEWS = (
+    'daily_transaction_summary',
+    'customer_transaction_patterns',
+    'alert_resolution_metrics',
+    'risk_score_distribution'
+)
+
 
 class ClickHouseClient:
     """ClickHouse client for analytics operations"""
@@ -29,6 +39,7 @@ class ClickHouseClient:
         self.password = password or os.getenv("CLICKHOUSE_PASSWORD", "")
         
         self.client = None
+        self._retired_tables: List[str] = []
         self._connect()
     
     def _connect(self):
@@ -86,6 +97,19 @@ class ClickHouseClient:
             logger.error(f"Insert failed: {e}")
             raise
     
+    def insert_dataframe(self, table: str, frame: pd.DataFrame) -> int:
+        """Insert a DataFrame as one columnar insert (the client runs with ``use_numpy``)"""
+        if frame.empty:
+            return 0
+        
+        query = f"INSERT INTO {table} ({','.join(frame.columns)}) VALUES"
+        
+        try:
+            return self.client.insert_dataframe(query, frame)
+        except Exception as e:
+            logger.error(f"Insert into {table} failed: {e}")
+            raise
+    
     def create_database(self):
         """Create the analytics database if it doesn't exist"""
         try:
@@ -101,6 +125,10 @@ class ClickHouseClient:
         # Create database
         self.create_database()
         
+        # Upserts are versioned inserts; move tables created as plain MergeTree aside first
+        for table in ("transactions_analytics", "alert_analytics"):
+            self._retire_non_replacing_table(table)
+        
         # Transaction analytics table
         self.execute("""
             CREATE TABLE IF NOT EXISTS transactions_analytics (
@@ -118,8 +146,10 @@ class ClickHouseClient:
                 country String,
                 counterparty_country String,
                 channel String,
-                created_at DateTime DEFAULT now()
-            ) ENGINE = MergeTree()
+                created_at DateTime DEFAULT now(),
+                version UInt64,
+                is_deleted UInt8 DEFAULT 0
+            ) ENGINE = ReplacingMergeTree(version, is_deleted)
             PARTITION BY toYYYYMM(transaction_date)
             ORDER BY (transaction_date, customer_id, transaction_id)
             SETTINGS index_granularity = 8192
@@ -160,8 +190,10 @@ class ClickHouseClient:
                 resolved_date Nullable(DateTime),
                 resolution_time_hours Nullable(Float32),
                 status String,
-                false_positive UInt8
-            ) ENGINE = MergeTree()
+                false_positive UInt8,
+                version UInt64,
+                is_deleted UInt8 DEFAULT 0
+            ) ENGINE = ReplacingMergeTree(version, is_deleted)
             PARTITION BY toYYYYMM(created_date)
             ORDER BY (created_date, customer_id, alert_id)
             SETTINGS index_granularity = 8192
@@ -185,21 +217,51 @@ class ClickHouseClient:
             SETTINGS index_granularity = 8192
         """)
         
-        # Create materialized views for common queries
-        self._create_materialized_views()
+        self._restore_retired_tables()
+        
+        # Summaries for common queries, aggregated at query time over the latest row versions
+        self._create_summary_views()
         
         logger.info("ClickHouse schema initialized successfully")
     
-    def _create_materialized_views(self):
-        """Create materialized views for performance optimization"""
+    def _retire_non_replacing_table(self, table: str):
+        """Rename a table created before upserts were versioned; init_schema then copies it back"""
+        result = self.execute(
+            "SELECT engine FROM system.tables WHERE database = currentDatabase() AND name = %(table)s",
+            {'table': table}
+        )
+        if result and result[0][0] != 'ReplacingMergeTree':
+            self.execute(f"RENAME TABLE {table} TO {table}_merge_tree")
+            self._retired_tables.append(table)
+            logger.warning(f"Renamed {table} to {table}_merge_tree to recreate it as ReplacingMergeTree")
+    
+    def _restore_retired_tables(self):
+        for table in self._retired_tables:
+            columns = [
+                row[0] for row in self.execute(
+                    "SELECT name FROM system.columns WHERE database = currentDatabase() AND table = %(table)s",
+                    {'table': f"{table}_merge_tree"}
+                )
+            ]
+            column_list = ', '.join(columns)
+            # Rows copied from the old table all carry version 0, so any synced change replaces
+            # them, and the summary views read FINAL, so a repeated copy is not counted twice
+            self.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {table}_merge_tree")
+            logger.info(f"Copied {table}_merge_tree into {table}; drop it once the copy is checked")
+        self._retired_tables = []
+    
+    def _create_summary_views(self):
+        """
+        Create the summary views. They aggregate at query time over ``FINAL``
+        without tombstones: an insert-time materialized view would count every
+        version and tombstone written for a row
+        """
+        self._drop_materialized_views(SUMMARY_VIEWS)
         
         # Daily transaction summary
         self.execute("""
-            CREATE MATERIALIZED VIEW IF NOT EXISTS daily_transaction_summary
-            ENGINE = SummingMergeTree()
-            PARTITION BY toYYYYMM(date)
-            ORDER BY (date, transaction_type, currency)
-            AS SELECT
+            CREATE VIEW IF NOT EXISTS daily_transaction_summary AS
+            SELECT
                 toDate(transaction_date) as date,
                 transaction_type,
                 currency,
@@ -209,17 +271,15 @@ class ClickHouseClient:
                 max(amount) as max_amount,
                 countIf(is_high_risk = 1) as high_risk_count,
                 avgIf(risk_score, risk_score > 0) as avg_risk_score
-            FROM transactions_analytics
+            FROM transactions_analytics FINAL
+            WHERE is_deleted = 0
             GROUP BY date, transaction_type, currency
         """)
         
         # Customer transaction patterns
         self.execute("""
-            CREATE MATERIALIZED VIEW IF NOT EXISTS customer_transaction_patterns
-            ENGINE = AggregatingMergeTree()
-            PARTITION BY toYYYYMM(month)
-            ORDER BY (month, customer_id)
-            AS SELECT
+            CREATE VIEW IF NOT EXISTS customer_transaction_patterns AS
+            SELECT
                 toStartOfMonth(transaction_date) as month,
                 customer_id,
                 count() as transaction_count,
@@ -231,17 +291,15 @@ class ClickHouseClient:
                 uniqExact(toDate(transaction_date)) as active_days,
                 uniqExact(counterparty_country) as unique_countries,
                 avgIf(risk_score, risk_score > 0) as avg_risk_score
-            FROM transactions_analytics
+            FROM transactions_analytics FINAL
+            WHERE is_deleted = 0
             GROUP BY month, customer_id
         """)
         
         # Alert resolution metrics
         self.execute("""
-            CREATE MATERIALIZED VIEW IF NOT EXISTS alert_resolution_metrics
-            ENGINE = SummingMergeTree()
-            PARTITION BY toYYYYMM(date)
-            ORDER BY (date, alert_type, severity)
-            AS SELECT
+            CREATE VIEW IF NOT EXISTS alert_resolution_metrics AS
+            SELECT
                 toDate(created_date) as date,
                 alert_type,
                 severity,
@@ -250,16 +308,15 @@ class ClickHouseClient:
                 countIf(false_positive = 1) as false_positive_count,
                 avg(resolution_time_hours) as avg_resolution_hours,
                 median(resolution_time_hours) as median_resolution_hours
-            FROM alert_analytics
+            FROM alert_analytics FINAL
+            WHERE is_deleted = 0
             GROUP BY date, alert_type, severity
         """)
         
-        # Risk score distribution
+        # Risk score distribution, from the latest snapshot of each customer and day
         self.execute("""
-            CREATE MATERIALIZED VIEW IF NOT EXISTS risk_score_distribution
-            ENGINE = SummingMergeTree()
-            ORDER BY (date, risk_band)
-            AS SELECT
+            CREATE VIEW IF NOT EXISTS risk_score_distribution AS
+            SELECT
                 toDate(snapshot_date) as date,
                 multiIf(
                     risk_score < 25, 'Low',
@@ -271,10 +328,21 @@ class ClickHouseClient:
                 avg(risk_score) as avg_score,
                 sum(transaction_count) as total_transactions,
                 sum(total_volume) as total_volume
-            FROM customer_risk_analytics
+            FROM customer_risk_analytics FINAL
             GROUP BY date, risk_band
         """)
     
+    def _drop_materialized_views(self, names: Tuple[str, ...]):
+        """Drop insert-time materialized views left by earlier schema versions"""
+        result = self.execute(
+            "SELECT name FROM system.tables WHERE database = currentDatabase() "
+            "AND engine = 'MaterializedView' AND name IN %(names)s",
+            {'names': tuple(names)}
+        )
+        for (name,) in result or []:
+            self.execute(f"DROP TABLE IF EXISTS {name}")
+            logger.warning(f"Dropped materialized view {name}; it is recreated as a view over FINAL")
+    
     def get_transaction_analytics(
         self,
         start_date: datetime,
@@ -293,7 +361,7 @@ class ClickHouseClient:
                 countIf(is_high_risk = 1) as high_risk_count,
                 avg(risk_score) as avg_risk_score,
                 uniqExact(customer_id) as unique_customers
-            FROM transactions_analytics
+            FROM transactions_analytics FINAL
             WHERE transaction_date >= %(start_date)s
                 AND transaction_date <= %(end_date)s
                 {customer_filter}
@@ -338,7 +406,7 @@ class ClickHouseClient:
                 toDate(transaction_date) as date,
                 count() as daily_count,
                 sum(amount) as daily_volume
-            FROM transactions_analytics
+            FROM transactions_analytics FINAL
             WHERE customer_id = %(customer_id)s
                 AND transaction_date >= now() - INTERVAL 30 DAY
             GROUP BY date
@@ -356,7 +424,7 @@ class ClickHouseClient:
                 stddevPop(amount) as stddev_amount,
                 max(amount) as max_amount,
                 min(amount) as min_amount
-            FROM transactions_analytics
+            FROM transactions_analytics FINAL
             WHERE customer_id = %(customer_id)s
                 AND transaction_date >= now() - INTERVAL 90 DAY
             GROUP BY transaction_type
@@ -370,7 +438,7 @@ class ClickHouseClient:
                 counterparty_country,
                 count() as transaction_count,
                 sum(amount) as total_amount
-            FROM transactions_analytics
+            FROM transactions_analytics FINAL
             WHERE customer_id = %(customer_id)s
                 AND transaction_date >= now() - INTERVAL 90 DAY
                 AND counterparty_country != ''
@@ -387,7 +455,7 @@ class ClickHouseClient:
                 toHour(transaction_date) as hour,
                 count() as transaction_count,
                 avg(amount) as avg_amount
-            FROM transactions_analytics
+            FROM transactions_analytics FINAL
             WHERE customer_id = %(customer_id)s
                 AND transaction_date >= now() - INTERVAL 30 DAY
             GROUP BY hour
@@ -49,6 +49,21 @@ class Settings(BaseSettings):
     SMS_SENDER_ID: Optional[str] = "ONTECH"
     SMS_API_KEY: Optional[str] = "use_preshared"
     
+    # Streaming: directory for the durable event log (disabled when unset)
+    STREAMING_EVENT_LOG_DIR: Optional[str] = os.getenv("STREAMING_EVENT_LOG_DIR")
+    
+    # Network analysis: directory for persisted centrality results (memory only when unset)
+    GRAPH_CENTRALITY_CACHE_DIR: Optional[str] = os.getenv("GRAPH_CENTRALITY_CACHE_DIR")
+
+    # Audit chain: HMAC key for block header signatures (headers are only hashed when unset)
+    AUDIT_CHAIN_SIGNING_KEY: Optional[str] = os.getenv("AUDIT_CHAIN_SIGNING_KEY")
+
+    # ML: model registry root (independent of the working directory)
+    ML_MODEL_DIR: str = os.getenv(
+        "ML_MODEL_DIR",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "ml_models")
+    )
+    
     # Environment
     ENVIRONMENT: str = "development"
     
@@ -3,6 +3,7 @@ from .transaction import Transaction, TransactionAlert
 from .sanctions import SanctionsList, WatchlistEntry, ScreeningResult
 from .reports import SuspiciousActivityReport, CurrencyTransactionReport
 from .case import ComplianceCase, CaseComment
+from .change_log import AnalyticsChange, AnalyticsChangeFailure, AnalyticsSyncState
 
 __all__ = [
     "CustomerProfile",
@@ -15,5 +16,8 @@ __all__ = [
     "SuspiciousActivityReport",
     "CurrencyTransactionReport",
     "ComplianceCase",
-    "CaseComment"
+    "CaseComment",
+    "AnalyticsChange",
+    "AnalyticsChangeFailure",
+    "AnalyticsSyncState"
 ]
\ No newline at end of file
@@ -0,0 +1,43 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Index
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class AnalyticsChange(Base):
+    """Outbox row written by a database trigger whenever a row synced to ClickHouse changes"""
+    __tablename__ = "analytics_change_log"
+    
+    id = Column(BigInteger, primary_key=True)
+    stream = Column(String(50), nullable=False)  # transactions, alerts or customer_risk
+    row_id = Column(Integer, nullable=False)
+    operation = Column(String(1), nullable=False)  # I, U or D
+    old_row = Column(Text)  # JSON of the deleted row, for deletes only
+    changed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    __table_args__ = (
+        Index("ix_analytics_change_log_stream_id", "stream", "id"),
+    )
+
+
+class AnalyticsSyncState(Base):
+    """Highest ClickHouse row version written for a stream; the next write goes above it"""
+    __tablename__ = "analytics_sync_state"
+    
+    stream = Column(String(50), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class AnalyticsChangeFailure(Base):
+    """Outbox row moved aside after it kept failing to apply to ClickHouse"""
+    __tablename__ = "analytics_change_failures"
+    
+    id = Column(BigInteger, primary_key=True)  # id of the outbox row
+    stream = Column(String(50), nullable=False)
+    row_id = Column(Integer, nullable=False)
+    operation = Column(String(1), nullable=False)
+    old_row = Column(Text)
+    changed_at = Column(DateTime(timezone=True), nullable=False)
+    error = Column(Text)
+    failed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
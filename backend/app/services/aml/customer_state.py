@@ -0,0 +1,492 @@
+"""
+Per-customer rolling-window state store
+Maintains time-bucketed transaction counts and sums, near-threshold counts and
+last activity per customer so the window rules do not query the transactions table
+"""
+
+from typing import Dict, Any, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from datetime import datetime, timedelta, timezone
+import logging
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from app.models.aml import Transaction
+from app.services.aml.rule_engine import TransactionHistory, Facts, get_rule_engine
+
+logger = logging.getLogger(__name__)
+
+# Bucket ids of unused ring slots
+EMPTY_BUCKET = -1
+
+# Refreshes re-read this many ids below the last one seen, so rows committed
+# out of id order by concurrent writers are still picked up (ingest is idempotent)
+REFRESH_ID_OVERLAP = 1000
+
+
+def _epoch(value: datetime) -> float:
+    """Seconds since the epoch; naive datetimes are UTC as stored in the database
+
+    Callers holding local wall-clock times must convert them with ``to_utc`` first.
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _from_epoch(value: float) -> datetime:
+    return datetime.fromtimestamp(value, tz=timezone.utc).replace(tzinfo=None)
+
+
+def to_utc(value: datetime) -> datetime:
+    """Naive UTC datetime for a naive local or an aware datetime"""
+    if value.tzinfo is None:
+        value = value.astimezone()
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _customer_key(facts: Facts) -> int:
+    # Transactions without a customer share one history, as with the SQL queries
+    customer_id = facts.get("customer_id")
+    return int(customer_id) if customer_id is not None else -1
+
+
+class CustomerStateStore(TransactionHistory):
+    """
+    Ring buffers of time buckets per active customer, held in 2-D NumPy arrays.
+
+    Ingesting a transaction touches one bucket (O(1)); window queries sum at most
+    ``window_seconds / bucket_seconds + 1`` slots. Windows start on a bucket
+    boundary, so a query may include up to one bucket of older activity. Bucket
+    rows are allocated only for customers active within the window and are
+    reclaimed once they age out; last activity is kept for every customer.
+
+    The store is local to the process, so ``ensure_current`` re-reads rows other
+    workers and bulk loads wrote to the transactions table, at most
+    ``refresh_interval_seconds`` apart.
+    """
+
+    def __init__(
+        self,
+        bucket_seconds: int = 1800,
+        window_seconds: int = 86400,
+        near_threshold_band: Optional[Tuple[float, float]] = None,
+        initial_capacity: int = 1024,
+        refresh_interval_seconds: int = 30
+    ):
+        self.bucket_seconds = bucket_seconds
+        self.window_seconds = window_seconds
+        self.near_threshold_band = near_threshold_band
+        self.num_buckets = math.ceil(window_seconds / bucket_seconds) + 1
+        self.refresh_interval_seconds = refresh_interval_seconds
+
+        # Window rows for recently active customers
+        self._rows: Dict[int, int] = {}
+        self._free_rows = []
+        self._bucket_ids = np.full((initial_capacity, self.num_buckets), EMPTY_BUCKET, dtype=np.int64)
+        self._counts = np.zeros((initial_capacity, self.num_buckets), dtype=np.int32)
+        self._sums = np.zeros((initial_capacity, self.num_buckets), dtype=np.float64)
+        self._near_counts = np.zeros((initial_capacity, self.num_buckets), dtype=np.int32)
+
+        # Last two distinct activity times for every customer
+        self._customers: Dict[int, int] = {}
+        self._last_activity = np.full(initial_capacity, np.nan, dtype=np.float64)
+        self._previous_activity = np.full(initial_capacity, np.nan, dtype=np.float64)
+
+        # Bitmap of ingested transaction ids; makes ingest idempotent and lets
+        # queries exclude the transaction being evaluated
+        self._seen = bytearray()
+        self._latest_bucket = EMPTY_BUCKET
+        self.transactions_ingested = 0
+        self.is_warm = False
+        # Highest transaction id read from the database, and when
+        self._refreshed_id = 0
+        self._last_refresh = 0.0
+        self._lock = threading.RLock()
+
+    def ingest(self, facts: Facts) -> bool:
+        """Add a transaction to its customer's state; returns False if already ingested"""
+        transaction_id = facts.get("id")
+
+        with self._lock:
+            if transaction_id is not None:
+                if self._is_seen(transaction_id):
+                    return False
+                self._mark_seen(transaction_id)
+
+            key = _customer_key(facts)
+            timestamp = _epoch(facts["transaction_date"])
+            amount = float(facts["amount"])
+            bucket = int(timestamp // self.bucket_seconds)
+            self._latest_bucket = max(self._latest_bucket, bucket)
+
+            if bucket > self._latest_bucket - self.num_buckets:
+                row = self._window_row(key)
+                slot = bucket % self.num_buckets
+                if self._bucket_ids[row, slot] < bucket:
+                    self._bucket_ids[row, slot] = bucket
+                    self._counts[row, slot] = 0
+                    self._sums[row, slot] = 0.0
+                    self._near_counts[row, slot] = 0
+                if self._bucket_ids[row, slot] == bucket:
+                    self._counts[row, slot] += 1
+                    self._sums[row, slot] += amount
+                    if self._in_band(amount):
+                        self._near_counts[row, slot] += 1
+
+            index = self._customer_index(key)
+            last = self._last_activity[index]
+            if np.isnan(last) or timestamp > last:
+                self._previous_activity[index] = last
+                self._last_activity[index] = timestamp
+            elif timestamp < last:
+                previous = self._previous_activity[index]
+                if np.isnan(previous) or timestamp > previous:
+                    self._previous_activity[index] = timestamp
+
+            self.transactions_ingested += 1
+            return True
+
+    def recent_activity(
+        self,
+        facts: Facts,
+        since: datetime,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None
+    ) -> Tuple[int, float]:
+        banded = min_amount is not None or max_amount is not None
+        if banded and (min_amount, max_amount) != self.near_threshold_band:
+            raise ValueError(f"Amount band {min_amount}-{max_amount} is not tracked by the state store")
+
+        since_bucket = int(_epoch(since) // self.bucket_seconds)
+        with self._lock:
+            if self._latest_bucket - since_bucket >= self.num_buckets:
+                raise ValueError("Requested window is longer than the state store window")
+
+            row = self._rows.get(_customer_key(facts))
+            if row is None:
+                return 0, 0.0
+
+            mask = self._bucket_ids[row] >= since_bucket
+            if banded:
+                count = int(self._near_counts[row][mask].sum())
+                total = 0.0
+            else:
+                count = int(self._counts[row][mask].sum())
+                total = float(self._sums[row][mask].sum())
+
+            # The transaction under evaluation may already be ingested
+            transaction_id = facts.get("id")
+            if transaction_id is not None and self._is_seen(transaction_id):
+                bucket = int(_epoch(facts["transaction_date"]) // self.bucket_seconds)
+                amount = float(facts["amount"])
+                if bucket >= since_bucket and (not banded or self._in_band(amount)):
+                    count -= 1
+                    total -= 0.0 if banded else amount
+
+        return max(count, 0), total
+
+    def last_activity_before(self, facts: Facts) -> Optional[datetime]:
+        timestamp = _epoch(facts["transaction_date"])
+        with self._lock:
+            index = self._customers.get(_customer_key(facts))
+            if index is None:
+                return None
+            last = self._last_activity[index]
+            previous = self._previous_activity[index]
+        
+        if np.isnan(last):
+            return None
+        if last < timestamp:
+            return _from_epoch(last)
+        if np.isnan(previous):
+            return None
+        if previous < timestamp:
+            return _from_epoch(previous)
+        # Only the last two activities are kept; older transactions need the full history
+        raise ValueError("Transaction predates the activity tracked by the state store")
+
+    def warm(self, db: Session, batch_size: int = 10000) -> int:
+        """Load window state and last activity for all customers from the database"""
+        since = datetime.utcnow() - timedelta(seconds=self.window_seconds + self.bucket_seconds)
+        # Rows written while warming are re-read by the next refresh
+        max_id = db.query(func.max(Transaction.id)).scalar() or 0
+
+        ingested = 0
+        rows = db.query(
+            Transaction.id,
+            Transaction.customer_id,
+            Transaction.transaction_date,
+            Transaction.amount
+        ).filter(
+            Transaction.transaction_date >= since
+        ).order_by(Transaction.transaction_date).yield_per(batch_size)
+
+        for transaction_id, customer_id, transaction_date, amount in rows:
+            if self.ingest({
+                "id": transaction_id,
+                "customer_id": customer_id,
+                "transaction_date": transaction_date,
+                "amount": amount
+            }):
+                ingested += 1
+
+        last_activity = db.query(
+            Transaction.customer_id,
+            func.max(Transaction.transaction_date)
+        ).filter(
+            Transaction.transaction_date < since
+        ).group_by(Transaction.customer_id).yield_per(batch_size)
+
+        with self._lock:
+            for customer_id, transaction_date in last_activity:
+                index = self._customer_index(int(customer_id) if customer_id is not None else -1)
+                timestamp = _epoch(transaction_date)
+                if np.isnan(self._last_activity[index]):
+                    self._last_activity[index] = timestamp
+                elif np.isnan(self._previous_activity[index]) or timestamp > self._previous_activity[index]:
+                    self._previous_activity[index] = timestamp
+            self._refreshed_id = max(self._refreshed_id, max_id)
+            self._last_refresh = time.time()
+            self.is_warm = True
+
+        logger.info(f"Warmed customer state store with {ingested} transactions for {len(self._customers)} customers")
+        return ingested
+
+    def refresh(self, db: Session, batch_size: int = 10000) -> int:
+        """Ingest transactions written since the last warm or refresh, by any process"""
+        last_id = max(0, self._refreshed_id - REFRESH_ID_OVERLAP)
+        self._last_refresh = time.time()
+
+        ingested = 0
+        while True:
+            rows = db.query(
+                Transaction.id,
+                Transaction.customer_id,
+                Transaction.transaction_date,
+                Transaction.amount
+            ).filter(
+                Transaction.id > last_id
+            ).order_by(Transaction.id).limit(batch_size).all()
+            if not rows:
+                break
+
+            for transaction_id, customer_id, transaction_date, amount in rows:
+                if self.ingest({
+                    "id": transaction_id,
+                    "customer_id": customer_id,
+                    "transaction_date": transaction_date,
+                    "amount": amount
+                }):
+                    ingested += 1
+            last_id = rows[-1][0]
+
+        with self._lock:
+            self._refreshed_id = max(self._refreshed_id, last_id)
+
+        if ingested:
+            logger.info(f"Refreshed customer state store with {ingested} transactions")
+        return ingested
+
+    def ensure_current(self, db: Session) -> int:
+        """Refresh from the database once the refresh interval has elapsed"""
+        if not self.is_warm or time.time() - self._last_refresh < self.refresh_interval_seconds:
+            return 0
+        return self.refresh(db)
+
+    def reclaim(self) -> int:
+        """Free window rows of customers with no activity left in the window"""
+        with self._lock:
+            oldest_bucket = self._latest_bucket - self.num_buckets + 1
+            stale = [
+                key for key, row in self._rows.items()
+                if self._bucket_ids[row].max() < oldest_bucket
+            ]
+            for key in stale:
+                row = self._rows.pop(key)
+                self._bucket_ids[row] = EMPTY_BUCKET
+                self._free_rows.append(row)
+            return len(stale)
+
+    def save(self, path: str) -> None:
+        """Persist the store to a compressed NumPy archive"""
+        with self._lock:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            row_keys = np.fromiter(self._rows.keys(), dtype=np.int64, count=len(self._rows))
+            row_index = np.fromiter(self._rows.values(), dtype=np.int64, count=len(self._rows))
+            customer_keys = np.fromiter(self._customers.keys(), dtype=np.int64, count=len(self._customers))
+            customer_index = np.fromiter(self._customers.values(), dtype=np.int64, count=len(self._customers))
+
+            tmp_path = f"{path}.tmp.npz"
+            np.savez_compressed(
+                tmp_path,
+                config=np.array(
+                    [self.bucket_seconds, self.window_seconds, self._latest_bucket, self.transactions_ingested],
+                    dtype=np.int64
+                ),
+                band=np.array(self.near_threshold_band if self.near_threshold_band else [np.nan, np.nan]),
+                row_keys=row_keys,
+                bucket_ids=self._bucket_ids[row_index],
+                counts=self._counts[row_index],
+                sums=self._sums[row_index],
+                near_counts=self._near_counts[row_index],
+                customer_keys=customer_keys,
+                last_activity=self._last_activity[customer_index],
+                previous_activity=self._previous_activity[customer_index],
+                seen=np.frombuffer(bytes(self._seen), dtype=np.uint8)
+            )
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "CustomerStateStore":
+        """Restore a store saved with ``save``"""
+        with np.load(path) as data:
+            bucket_seconds, window_seconds, latest_bucket, ingested = (int(v) for v in data["config"])
+            band = data["band"]
+            store = cls(
+                bucket_seconds=bucket_seconds,
+                window_seconds=window_seconds,
+                near_threshold_band=None if np.isnan(band).any() else (float(band[0]), float(band[1])),
+                initial_capacity=max(1024, len(data["row_keys"]), len(data["customer_keys"]))
+            )
+
+            rows = len(data["row_keys"])
+            store._bucket_ids[:rows] = data["bucket_ids"]
+            store._counts[:rows] = data["counts"]
+            store._sums[:rows] = data["sums"]
+            store._near_counts[:rows] = data["near_counts"]
+            store._rows = {int(key): i for i, key in enumerate(data["row_keys"])}
+
+            customers = len(data["customer_keys"])
+            store._last_activity[:customers] = data["last_activity"]
+            store._previous_activity[:customers] = data["previous_activity"]
+            store._customers = {int(key): i for i, key in enumerate(data["customer_keys"])}
+
+            store._seen = bytearray(data["seen"].tobytes())
+            store._latest_bucket = latest_bucket
+            store.transactions_ingested = ingested
+            store.is_warm = True
+
+        return store
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Size and memory footprint of the store"""
+        arrays = (
+            self._bucket_ids, self._counts, self._sums, self._near_counts,
+            self._last_activity, self._previous_activity
+        )
+        return {
+            "customers": len(self._customers),
+            "active_customers": len(self._rows),
+            "transactions_ingested": self.transactions_ingested,
+            "bucket_seconds": self.bucket_seconds,
+            "window_seconds": self.window_seconds,
+            "near_threshold_band": self.near_threshold_band,
+            "memory_bytes": sum(array.nbytes for array in arrays) + len(self._seen),
+            "is_warm": self.is_warm
+        }
+
+    def _in_band(self, amount: float) -> bool:
+        band = self.near_threshold_band
+        return band is not None and band[0] <= amount < band[1]
+
+    def _is_seen(self, transaction_id: int) -> bool:
+        byte = transaction_id >> 3
+        return byte < len(self._seen) and bool(self._seen[byte] & (1 << (transaction_id & 7)))
+
+    def _mark_seen(self, transaction_id: int) -> None:
+        byte = transaction_id >> 3
+        if byte >= len(self._seen):
+            self._seen.extend(bytes(max(byte + 1 - len(self._seen), len(self._seen))))
+        self._seen[byte] |= 1 << (transaction_id & 7)
+
+    def _window_row(self, key: int) -> int:
+        row = self._rows.get(key)
+        if row is not None:
+            return row
+
+        if not self._free_rows and len(self._rows) >= self._bucket_ids.shape[0]:
+            self.reclaim()
+        if self._free_rows:
+            row = self._free_rows.pop()
+        else:
+            row = len(self._rows)
+            if row >= self._bucket_ids.shape[0]:
+                self._grow_window_rows()
+        self._rows[key] = row
+        return row
+
+    def _grow_window_rows(self) -> None:
+        capacity = self._bucket_ids.shape[0]
+        self._bucket_ids = np.vstack([self._bucket_ids, np.full_like(self._bucket_ids, EMPTY_BUCKET)])
+        self._counts = np.vstack([self._counts, np.zeros_like(self._counts)])
+        self._sums = np.vstack([self._sums, np.zeros_like(self._sums)])
+        self._near_counts = np.vstack([self._near_counts, np.zeros_like(self._near_counts)])
+        logger.debug(f"Grew customer window rows from {capacity} to {capacity * 2}")
+
+    def _customer_index(self, key: int) -> int:
+        index = self._customers.get(key)
+        if index is None:
+            index = len(self._customers)
+            if index >= len(self._last_activity):
+                self._last_activity = np.concatenate([self._last_activity, np.full_like(self._last_activity, np.nan)])
+                self._previous_activity = np.concatenate([self._previous_activity, np.full_like(self._previous_activity, np.nan)])
+            self._customers[key] = index
+        return index
+
+
+class StateStoreHistory(TransactionHistory):
+    """Answer window rules from the state store, falling back when it cannot"""
+
+    def __init__(self, store: CustomerStateStore, fallback: Optional[TransactionHistory] = None):
+        self.store = store
+        self.fallback = fallback
+
+    def recent_activity(
+        self,
+        facts: Facts,
+        since: datetime,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None
+    ) -> Tuple[int, float]:
+        try:
+            return self.store.recent_activity(facts, since, min_amount, max_amount)
+        except ValueError:
+            if self.fallback is None:
+                raise
+            return self.fallback.recent_activity(facts, since, min_amount, max_amount)
+
+    def last_activity_before(self, facts: Facts) -> Optional[datetime]:
+        try:
+            return self.store.last_activity_before(facts)
+        except ValueError:
+            if self.fallback is None:
+                raise
+            return self.fallback.last_activity_before(facts)
+
+
+customer_state_store: Optional[CustomerStateStore] = None
+
+
+def get_customer_state_store() -> CustomerStateStore:
+    """Get the global customer state store, sized from the current window rules"""
+    global customer_state_store
+    if customer_state_store is None:
+        window_seconds = 86400
+        band = None
+        for rule in get_rule_engine().rule_set.rules:
+            if rule.rule_type == "velocity":
+                window_seconds = max(window_seconds, rule.params["hours"] * 3600)
+            elif rule.rule_type == "structuring":
+                window_seconds = max(window_seconds, rule.params["period_hours"] * 3600)
+                band = (rule.params["threshold"] - rule.params["margin"], rule.params["threshold"])
+        customer_state_store = CustomerStateStore(window_seconds=window_seconds, near_threshold_band=band)
+    return customer_state_store
@@ -0,0 +1,374 @@
+"""
+Online transaction feature store for ML scoring
+Keeps running per-customer amount aggregates and builds fixed-order feature
+vectors with the same definitions used to build training matrices
+"""
+
+from typing import Any, Dict, Iterable, Optional, Tuple
+from datetime import datetime, timedelta
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.aml.transaction import Transaction
+
+logger = logging.getLogger(__name__)
+
+# Column order of every feature vector and training matrix
+TRANSACTION_FEATURES: Tuple[str, ...] = (
+    "amount",
+    "log_amount",
+    "amount_z_score",
+    "hour",
+    "day_of_week",
+    "is_weekend",
+    "is_night",
+    "tx_count",
+    "tx_sum",
+    "tx_mean",
+    "tx_std",
+    "tx_min",
+    "tx_max",
+    "country_risk",
+    "is_round_100",
+    "is_round_1000"
+)
+FEATURE_INDEX = {name: i for i, name in enumerate(TRANSACTION_FEATURES)}
+
+COUNTRY_RISK = {
+    'US': 0.1, 'CA': 0.1, 'GB': 0.2, 'DE': 0.2, 'FR': 0.2,
+    'CN': 0.6, 'RU': 0.7, 'IR': 0.9, 'KP': 0.9
+}
+DEFAULT_COUNTRY_RISK = 0.5
+
+
+def _customer_key(customer_id: Any) -> int:
+    # Transactions without a customer share one history
+    return int(customer_id) if customer_id is not None and not pd.isna(customer_id) else -1
+
+
+def _as_datetime(value: Any) -> datetime:
+    if value is None:
+        return datetime.now()
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value
+
+
+def fill_transaction_features(
+    out: np.ndarray,
+    amount: np.ndarray,
+    hour: np.ndarray,
+    day_of_week: np.ndarray,
+    country_risk: np.ndarray,
+    count: np.ndarray,
+    total: np.ndarray,
+    mean: np.ndarray,
+    std: np.ndarray,
+    minimum: np.ndarray,
+    maximum: np.ndarray
+) -> np.ndarray:
+    """
+    Write features into ``out`` (rows x len(TRANSACTION_FEATURES)).
+
+    The single definition shared by training and scoring. Customer
+    aggregates describe the customer's history *before* each transaction;
+    aggregates without enough history are 0, as is the z-score.
+    """
+    out[:, FEATURE_INDEX["amount"]] = amount
+    out[:, FEATURE_INDEX["log_amount"]] = np.log1p(np.maximum(amount, 0.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[:, FEATURE_INDEX["amount_z_score"]] = np.where(std > 0, (amount - mean) / np.where(std > 0, std, 1.0), 0.0)
+    out[:, FEATURE_INDEX["hour"]] = hour
+    out[:, FEATURE_INDEX["day_of_week"]] = day_of_week
+    out[:, FEATURE_INDEX["is_weekend"]] = day_of_week >= 5
+    out[:, FEATURE_INDEX["is_night"]] = (hour >= 22) | (hour <= 6)
+    out[:, FEATURE_INDEX["tx_count"]] = count
+    out[:, FEATURE_INDEX["tx_sum"]] = total
+    out[:, FEATURE_INDEX["tx_mean"]] = mean
+    out[:, FEATURE_INDEX["tx_std"]] = std
+    out[:, FEATURE_INDEX["tx_min"]] = minimum
+    out[:, FEATURE_INDEX["tx_max"]] = maximum
+    out[:, FEATURE_INDEX["country_risk"]] = country_risk
+    out[:, FEATURE_INDEX["is_round_100"]] = amount % 100 == 0
+    out[:, FEATURE_INDEX["is_round_1000"]] = amount % 1000 == 0
+    return out
+
+
+def _frame_customers(data: pd.DataFrame) -> pd.Series:
+    return data["customer_id"].map(_customer_key) if "customer_id" in data else pd.Series(-1, index=data.index)
+
+
+def transaction_feature_matrix(data: pd.DataFrame, prior: Optional[Tuple[np.ndarray, ...]] = None) -> np.ndarray:
+    """
+    Point-in-time feature matrix for a frame of transactions, rows in frame order.
+
+    Customer aggregates for each row cover the customer's earlier rows in
+    (transaction_date, id) order, which is what the online store holds when
+    that transaction is scored. ``prior`` holds per-row (count, sum, mean,
+    m2, min, max) aggregates of history before the frame, merged in.
+    """
+    n = len(data)
+    amount = pd.to_numeric(data["amount"], errors="coerce").fillna(0.0).to_numpy(dtype=np.float64)
+    dates = pd.to_datetime(data["transaction_date"]) if "transaction_date" in data else pd.Series(pd.Timestamp.now(), index=data.index)
+    countries = data["country"] if "country" in data else pd.Series(None, index=data.index, dtype=object)
+
+    ordered = pd.DataFrame({
+        "row": np.arange(n),
+        "date": dates.to_numpy(),
+        "id": data["id"].to_numpy() if "id" in data else np.arange(n),
+        "customer": _frame_customers(data).to_numpy(),
+        "amount": amount
+    }).sort_values(["date", "id"], kind="stable")
+    groups = ordered.groupby("customer", sort=False)["amount"]
+
+    # Cumulative aggregates, shifted to exclude the row itself
+    count = groups.cumcount().to_numpy(dtype=np.float64)
+    total = groups.cumsum().to_numpy() - ordered["amount"].to_numpy()
+    squares = ordered["amount"] ** 2
+    sum_squares = squares.groupby(ordered["customer"], sort=False).cumsum().to_numpy() - squares.to_numpy()
+    minimum = ordered.assign(value=groups.cummin()).groupby("customer", sort=False)["value"].shift(1).to_numpy()
+    maximum = ordered.assign(value=groups.cummax()).groupby("customer", sort=False)["value"].shift(1).to_numpy()
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(count > 0, total / np.maximum(count, 1), 0.0)
+        m2 = np.where(count > 0, sum_squares - total * mean, 0.0)
+
+        if prior is not None:
+            # Chan et al. merge of the pre-frame history with the in-frame prefix
+            rows = ordered["row"].to_numpy()
+            prior_count, prior_sum, prior_mean, prior_m2, prior_min, prior_max = (column[rows] for column in prior)
+            merged = count + prior_count
+            delta = mean - prior_mean
+            m2 = m2 + prior_m2 + np.where(merged > 0, delta ** 2 * count * prior_count / np.maximum(merged, 1), 0.0)
+            total = total + prior_sum
+            mean = np.where(merged > 0, total / np.maximum(merged, 1), 0.0)
+            minimum = np.fmin(minimum, np.where(prior_count > 0, prior_min, np.nan))
+            maximum = np.fmax(maximum, np.where(prior_count > 0, prior_max, np.nan))
+            count = merged
+
+        std = np.sqrt(np.maximum(np.where(count > 1, m2 / np.maximum(count - 1, 1), 0.0), 0.0))
+
+    # Back to frame order
+    rows = ordered["row"].to_numpy()
+    inverse = np.empty(n, dtype=np.int64)
+    inverse[rows] = np.arange(n)
+
+    out = np.empty((n, len(TRANSACTION_FEATURES)))
+    return fill_transaction_features(
+        out,
+        amount,
+        dates.dt.hour.to_numpy(),
+        dates.dt.dayofweek.to_numpy(),
+        countries.map(COUNTRY_RISK).fillna(DEFAULT_COUNTRY_RISK).to_numpy(dtype=np.float64),
+        count[inverse],
+        total[inverse],
+        mean[inverse],
+        std[inverse],
+        np.nan_to_num(minimum)[inverse],
+        np.nan_to_num(maximum)[inverse]
+    )
+
+
+class TransactionFeatureStore:
+    """
+    Running amount aggregates per customer in NumPy columns.
+
+    Count, sum, min and max are kept directly and mean/variance with
+    Welford's update, so ingesting a transaction and building a feature
+    vector are both O(1) with no pandas involved.
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        self._customers: Dict[int, int] = {}
+        self._count = np.zeros(initial_capacity, dtype=np.int64)
+        self._sum = np.zeros(initial_capacity)
+        self._mean = np.zeros(initial_capacity)
+        self._m2 = np.zeros(initial_capacity)
+        self._min = np.zeros(initial_capacity)
+        self._max = np.zeros(initial_capacity)
+        self._lock = threading.RLock()
+        self.transactions_ingested = 0
+        self.is_warm = False
+
+    def vector(self, transaction: Dict[str, Any]) -> np.ndarray:
+        """Feature vector in TRANSACTION_FEATURES order from the customer's history so far"""
+        amount = float(transaction.get("amount") or 0.0)
+        date = _as_datetime(transaction.get("transaction_date"))
+
+        with self._lock:
+            index = self._customers.get(_customer_key(transaction.get("customer_id")))
+            if index is None:
+                count, total, mean, std, minimum, maximum = 0, 0.0, 0.0, 0.0, 0.0, 0.0
+            else:
+                count = int(self._count[index])
+                total = float(self._sum[index])
+                mean = float(self._mean[index])
+                std = float(np.sqrt(self._m2[index] / (count - 1))) if count > 1 else 0.0
+                minimum = float(self._min[index])
+                maximum = float(self._max[index])
+
+        out = np.empty((1, len(TRANSACTION_FEATURES)))
+        fill_transaction_features(
+            out,
+            np.array([amount]),
+            np.array([date.hour]),
+            np.array([date.weekday()]),
+            np.array([COUNTRY_RISK.get(transaction.get("country"), DEFAULT_COUNTRY_RISK)]),
+            np.array([count]),
+            np.array([total]),
+            np.array([mean]),
+            np.array([std]),
+            np.array([minimum]),
+            np.array([maximum])
+        )
+        return out[0]
+
+    def ingest(self, transaction: Dict[str, Any]) -> None:
+        """Add a transaction to its customer's running aggregates"""
+        amount = float(transaction.get("amount") or 0.0)
+        with self._lock:
+            index = self._customer_index(_customer_key(transaction.get("customer_id")))
+            count = self._count[index] + 1
+            delta = amount - self._mean[index]
+            self._mean[index] += delta / count
+            self._m2[index] += delta * (amount - self._mean[index])
+            self._min[index] = amount if count == 1 else min(self._min[index], amount)
+            self._max[index] = amount if count == 1 else max(self._max[index], amount)
+            self._sum[index] += amount
+            self._count[index] = count
+            self.transactions_ingested += 1
+
+    def matrix(self, data: pd.DataFrame) -> np.ndarray:
+        """Point-in-time feature matrix for a batch, on top of the history already in the store"""
+        keys = _frame_customers(data).to_numpy()
+        with self._lock:
+            rows = np.fromiter((self._customers.get(int(key), -1) for key in keys), dtype=np.int64, count=len(keys))
+            known = rows >= 0
+            prior = []
+            for column in (self._count, self._sum, self._mean, self._m2, self._min, self._max):
+                values = np.zeros(len(keys))
+                values[known] = column[rows[known]]
+                prior.append(values)
+        return transaction_feature_matrix(data, prior=tuple(prior))
+
+    def ingest_frame(self, data: pd.DataFrame) -> None:
+        """Merge a batch of transactions into the running aggregates (set-based)"""
+        if data.empty:
+            return
+        amount = pd.to_numeric(data["amount"], errors="coerce").fillna(0.0)
+        stats = amount.groupby(_frame_customers(data)).agg(["count", "sum", "mean", "var", "min", "max"])
+        with self._lock:
+            rows = np.array([self._customer_index(int(key)) for key in stats.index], dtype=np.int64)
+            count = stats["count"].to_numpy(dtype=np.float64)
+            previous = self._count[rows].astype(np.float64)
+            merged = previous + count
+            delta = stats["mean"].to_numpy() - self._mean[rows]
+            self._m2[rows] += stats["var"].fillna(0.0).to_numpy() * (count - 1) + delta ** 2 * previous * count / merged
+            self._mean[rows] += delta * count / merged
+            self._min[rows] = np.where(previous > 0, np.minimum(self._min[rows], stats["min"].to_numpy()), stats["min"].to_numpy())
+            self._max[rows] = np.where(previous > 0, np.maximum(self._max[rows], stats["max"].to_numpy()), stats["max"].to_numpy())
+            self._sum[rows] += stats["sum"].to_numpy()
+            self._count[rows] = merged.astype(np.int64)
+            self.transactions_ingested += len(data)
+
+    def load_frame(self, data: pd.DataFrame) -> int:
+        """Replace the aggregates with those of a frame of transactions (set-based)"""
+        customers = _frame_customers(data)
+        amount = pd.to_numeric(data["amount"], errors="coerce").fillna(0.0)
+        stats = amount.groupby(customers).agg(["count", "sum", "mean", "var", "min", "max"])
+        self._load_aggregates(
+            stats.index.to_numpy(),
+            stats["count"].to_numpy(),
+            stats["sum"].to_numpy(),
+            stats["mean"].to_numpy(),
+            stats["var"].fillna(0.0).to_numpy(),
+            stats["min"].to_numpy(),
+            stats["max"].to_numpy()
+        )
+        return len(stats)
+
+    def warm(self, db: Session, since: Optional[datetime] = None, until: Optional[datetime] = None) -> int:
+        """Load per-customer aggregates of transactions in (since, until) with one grouped query"""
+        since = since or datetime.now() - timedelta(days=180)
+        query = db.query(
+            Transaction.customer_id,
+            func.count(Transaction.id),
+            func.sum(Transaction.amount),
+            func.avg(Transaction.amount),
+            func.var_samp(Transaction.amount),
+            func.min(Transaction.amount),
+            func.max(Transaction.amount)
+        ).filter(
+            Transaction.transaction_date > since
+        )
+        if until is not None:
+            query = query.filter(Transaction.transaction_date < until)
+        rows = query.group_by(Transaction.customer_id).all()
+
+        columns = list(zip(*rows)) if rows else [()] * 7
+        self._load_aggregates(
+            np.array([_customer_key(value) for value in columns[0]], dtype=np.int64),
+            *(np.array([float(value or 0.0) for value in column]) for column in columns[1:])
+        )
+        logger.info(f"Warmed transaction feature store for {len(rows)} customers")
+        return len(rows)
+
+    def subset(self, customer_ids: Iterable[Any]) -> "TransactionFeatureStore":
+        """A separate store holding a copy of these customers' aggregates"""
+        with self._lock:
+            keys = [key for key in dict.fromkeys(_customer_key(value) for value in customer_ids) if key in self._customers]
+            rows = np.array([self._customers[key] for key in keys], dtype=np.int64)
+            store = TransactionFeatureStore(initial_capacity=max(len(keys), 1))
+            store._customers = {key: i for i, key in enumerate(keys)}
+            for name in ("_count", "_sum", "_mean", "_m2", "_min", "_max"):
+                getattr(store, name)[:len(keys)] = getattr(self, name)[rows]
+            store.transactions_ingested = int(store._count.sum())
+            store.is_warm = self.is_warm
+        return store
+
+    def _load_aggregates(self, keys, count, total, mean, variance, minimum, maximum) -> None:
+        with self._lock:
+            size = max(len(keys), 1024)
+            self._customers = {int(key): i for i, key in enumerate(keys)}
+            self._count = np.zeros(size, dtype=np.int64)
+            self._sum, self._mean, self._m2 = np.zeros(size), np.zeros(size), np.zeros(size)
+            self._min, self._max = np.zeros(size), np.zeros(size)
+
+            rows = len(keys)
+            self._count[:rows] = count
+            self._sum[:rows] = total
+            self._mean[:rows] = mean
+            self._m2[:rows] = np.nan_to_num(variance) * np.maximum(np.asarray(count) - 1, 0)
+            self._min[:rows] = minimum
+            self._max[:rows] = maximum
+            self.transactions_ingested = int(np.sum(count))
+            self.is_warm = True
+
+    def _customer_index(self, key: int) -> int:
+        index = self._customers.get(key)
+        if index is None:
+            index = len(self._customers)
+            if index >= len(self._count):
+                for name in ("_count", "_sum", "_mean", "_m2", "_min", "_max"):
+                    column = getattr(self, name)
+                    setattr(self, name, np.concatenate([column, np.zeros_like(column)]))
+            self._customers[key] = index
+        return index
+
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            "customers": len(self._customers),
+            "transactions_ingested": self.transactions_ingested,
+            "features": list(TRANSACTION_FEATURES),
+            "memory_bytes": sum(
+                getattr(self, name).nbytes for name in ("_count", "_sum", "_mean", "_m2", "_min", "_max")
+            ),
+            "is_warm": self.is_warm
+        }
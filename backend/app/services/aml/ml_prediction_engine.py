@@ -6,16 +6,17 @@ Provides predictive analytics, anomaly detection, and risk forecasting capabilit
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Any, Union
 import logging
 from sklearn.ensemble import IsolationForest, RandomForestClassifier, GradientBoostingRegressor
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, mean_squared_error
 from sklearn.cluster import DBSCAN, KMeans
-import joblib
 import os
+import threading
 from dataclasses import dataclass
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
@@ -23,9 +24,46 @@ from app.models.aml.transaction import Transaction
 from app.models.aml.customer import CustomerProfile
 from app.models.aml.case import ComplianceCase
 from app.core.clickhouse import get_clickhouse_client
+from app.services.aml.model_registry import ModelArtifact, ModelRegistry, get_model_registry
+from app.services.aml.feature_store import (
+    TransactionFeatureStore,
+    TRANSACTION_FEATURES,
+    transaction_feature_matrix
+)
 
 logger = logging.getLogger(__name__)
 
+# Fresh, untrained estimators; trained versions live in the model registry
+MODEL_FACTORIES = {
+    'fraud_classifier': lambda: RandomForestClassifier(
+        n_estimators=100, 
+        max_depth=10, 
+        random_state=42,
+        class_weight='balanced'
+    ),
+    'risk_regressor': lambda: GradientBoostingRegressor(
+        n_estimators=100, 
+        max_depth=8, 
+        random_state=42
+    ),
+    'anomaly_detector': lambda: IsolationForest(
+        contamination=0.1, 
+        random_state=42,
+        n_estimators=100
+    ),
+    'clustering_model': lambda: DBSCAN(eps=0.5, min_samples=5)
+}
+
+# Rows scored per chunk by the streaming batch jobs
+SCORING_CHUNK_ROWS = 10000
+
+RISK_FACTORS = ("Unusually high amount", "Night transaction", "High-risk country", "Round amount pattern")
+# Risk factor lists for every combination of the RISK_FACTORS bits
+_RISK_FACTOR_LISTS = [
+    [factor for bit, factor in enumerate(RISK_FACTORS) if code >> bit & 1]
+    for code in range(1 << len(RISK_FACTORS))
+]
+
 @dataclass
 class PredictionResult:
     """Result of ML prediction"""
@@ -53,56 +91,70 @@ class RiskForecast:
     trend_direction: str  # increasing, decreasing, stable
     key_drivers: List[str]
 
+@dataclass
+class BatchScoringResult:
+    """Scores for a batch of transactions, arrays aligned with the input rows"""
+    fraud_probability: Optional[np.ndarray]  # None while the fraud classifier is untrained
+    confidence: Optional[np.ndarray]
+    anomaly_score: np.ndarray
+    is_anomaly: np.ndarray
+    severity: np.ndarray
+    risk_factors: List[List[str]]
+    transaction_ids: Optional[np.ndarray] = None
+    timestamp: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self.anomaly_score)
+
+    def anomaly_results(self) -> List[AnomalyResult]:
+        return [
+            AnomalyResult(
+                is_anomaly=bool(is_anomaly),
+                anomaly_score=float(score),
+                risk_factors=factors,
+                severity=str(severity),
+                timestamp=self.timestamp
+            )
+            for is_anomaly, score, factors, severity in zip(
+                self.is_anomaly.tolist(), self.anomaly_score.tolist(), self.risk_factors, self.severity.tolist()
+            )
+        ]
+
 class MLPredictionEngine:
     """Advanced ML engine for AML and risk predictions"""
     
-    def __init__(self):
-        self.models = {}
-        self.scalers = {}
-        self.encoders = {}
-        self.model_directory = "ml_models"
-        self.clickhouse_client = None
-        self._initialize_models()
-        
-    def _initialize_models(self):
-        """Initialize ML models and create model directory"""
-        os.makedirs(self.model_directory, exist_ok=True)
-        
-        # Initialize models
-        self.models = {
-            'fraud_classifier': RandomForestClassifier(
-                n_estimators=100, 
-                max_depth=10, 
-                random_state=42,
-                class_weight='balanced'
-            ),
-            'risk_regressor': GradientBoostingRegressor(
-                n_estimators=100, 
-                max_depth=8, 
-                random_state=42
-            ),
-            'anomaly_detector': IsolationForest(
-                contamination=0.1, 
-                random_state=42,
-                n_estimators=100
-            ),
-            'clustering_model': DBSCAN(eps=0.5, min_samples=5)
-        }
-        
-        # Initialize scalers and encoders
-        self.scalers = {
-            'transaction_scaler': StandardScaler(),
-            'customer_scaler': StandardScaler()
-        }
-        
-        self.encoders = {
-            'categorical_encoder': LabelEncoder()
-        }
-        
-        try:
-            self.clickhouse_client = get_clickhouse_client()
-        except Exception as e:
-            logger.warning(f"ClickHouse not available: {e}")
+    def __init__(self, registry: Optional[ModelRegistry] = None):
+        # Nothing is built or connected here: models load from the registry on first use
+        self.registry = registry or get_model_registry()
+        self.feature_store = TransactionFeatureStore()
+        self._clickhouse_client = None
+        self._warm_lock = threading.Lock()
+
+    @property
+    def clickhouse_client(self):
+        """ClickHouse client, connected on first use"""
+        if self._clickhouse_client is None:
+            try:
+                self._clickhouse_client = get_clickhouse_client()
+            except Exception as e:
+                logger.warning(f"ClickHouse not available: {e}")
+        return self._clickhouse_client
+
+    def ensure_ready(self, db: Session) -> None:
+        """Warm the online feature store once per process, e.g. after a restart"""
+        if self.feature_store.is_warm:
+            return
+        with self._warm_lock:
+            if not self.feature_store.is_warm:
+                self.feature_store.warm(db)
+
+    def _artifact(self, name: str) -> Optional[ModelArtifact]:
+        """Current trained version of a transaction model, if it matches the feature schema"""
+        artifact = self.registry.get(name)
+        if artifact is not None and artifact.feature_schema != TRANSACTION_FEATURES:
+            logger.warning(f"Ignoring {name} version {artifact.version}: trained on a different feature schema")
+            return None
+        return artifact
 
     def prepare_features(self, data: pd.DataFrame, feature_type: str = 'transaction') -> pd.DataFrame:
         """Prepare features for ML models"""
@@ -118,42 +170,14 @@ class MLPredictionEngine:
             return pd.DataFrame()
 
     def _prepare_transaction_features(self, data: pd.DataFrame) -> pd.DataFrame:
-        """Prepare transaction-specific features"""
-        features = data.copy()
-        
-        # Basic transaction features
-        if 'amount' in features.columns:
-            features['log_amount'] = np.log1p(features['amount'])
-            features['amount_z_score'] = (features['amount'] - features['amount'].mean()) / features['amount'].std()
-        
-        # Time-based features
-        if 'transaction_date' in features.columns:
-            features['hour'] = pd.to_datetime(features['transaction_date']).dt.hour
-            features['day_of_week'] = pd.to_datetime(features['transaction_date']).dt.dayofweek
-            features['is_weekend'] = features['day_of_week'].isin([5, 6]).astype(int)
-            features['is_night'] = ((features['hour'] >= 22) | (features['hour'] <= 6)).astype(int)
-        
-        # Customer behavior features (if customer data available)
-        if 'customer_id' in features.columns:
-            customer_stats = features.groupby('customer_id')['amount'].agg([
-                'count', 'sum', 'mean', 'std', 'min', 'max'
-            ]).reset_index()
-            customer_stats.columns = ['customer_id', 'tx_count', 'tx_sum', 'tx_mean', 'tx_std', 'tx_min', 'tx_max']
-            features = features.merge(customer_stats, on='customer_id', how='left')
-        
-        # Geographic features
-        if 'country' in features.columns:
-            country_risk = {
-                'US': 0.1, 'CA': 0.1, 'GB': 0.2, 'DE': 0.2, 'FR': 0.2,
-                'CN': 0.6, 'RU': 0.7, 'IR': 0.9, 'KP': 0.9
-            }
-            features['country_risk'] = features['country'].map(country_risk).fillna(0.5)
-        
-        # Round amount patterns
-        if 'amount' in features.columns:
-            features['is_round_100'] = (features['amount'] % 100 == 0).astype(int)
-            features['is_round_1000'] = (features['amount'] % 1000 == 0).astype(int)
-        
+        """Prepare transaction-specific features (point-in-time, same definitions as scoring)"""
+        features = data.reset_index(drop=True).copy()
+        if features.empty or 'amount' not in features.columns:
+            return features
+
+        matrix = transaction_feature_matrix(features)
+        for i, name in enumerate(TRANSACTION_FEATURES):
+            features[name] = matrix[:, i]
         return features
 
     def _prepare_customer_features(self, data: pd.DataFrame) -> pd.DataFrame:
@@ -177,28 +201,20 @@ class MLPredictionEngine:
     def train_fraud_classifier(self, db: Session, retrain: bool = False) -> Dict[str, Any]:
         """Train fraud classification model"""
         try:
-            model_path = os.path.join(self.model_directory, 'fraud_classifier.joblib')
-            
-            # Check if model exists and retrain is False
-            if os.path.exists(model_path) and not retrain:
-                self.models['fraud_classifier'] = joblib.load(model_path)
-                return {"status": "loaded", "message": "Existing model loaded"}
+            # Check if a trained version exists and retrain is False
+            artifact = self._artifact('fraud_classifier')
+            if artifact is not None and not retrain:
+                self.ensure_ready(db)
+                return {"status": "loaded", "message": "Existing model loaded", "version": artifact.version}
             
             # Get training data
             training_data = self._get_fraud_training_data(db)
             if training_data.empty:
                 return {"status": "error", "message": "No training data available"}
             
-            # Prepare features
-            features = self.prepare_features(training_data, 'transaction')
-            
-            # Select numeric features for training
-            numeric_features = features.select_dtypes(include=[np.number]).columns.tolist()
-            if 'is_fraud' in numeric_features:
-                numeric_features.remove('is_fraud')
-            
-            X = features[numeric_features].fillna(0)
-            y = features['is_fraud'] if 'is_fraud' in features.columns else np.zeros(len(features))
+            # Point-in-time features, built exactly as the feature store builds them at scoring time
+            X = transaction_feature_matrix(training_data)
+            y = training_data['is_fraud'].fillna(0).astype(int).to_numpy() if 'is_fraud' in training_data.columns else np.zeros(len(training_data))
             
             # Split data
             X_train, X_test, y_train, y_test = train_test_split(
@@ -206,26 +222,33 @@ class MLPredictionEngine:
             )
             
             # Scale features
-            X_train_scaled = self.scalers['transaction_scaler'].fit_transform(X_train)
-            X_test_scaled = self.scalers['transaction_scaler'].transform(X_test)
+            scaler = StandardScaler()
+            X_train_scaled = scaler.fit_transform(X_train)
+            X_test_scaled = scaler.transform(X_test)
             
             # Train model
-            self.models['fraud_classifier'].fit(X_train_scaled, y_train)
+            model = MODEL_FACTORIES['fraud_classifier']()
+            model.fit(X_train_scaled, y_train)
             
             # Evaluate model
-            train_score = self.models['fraud_classifier'].score(X_train_scaled, y_train)
-            test_score = self.models['fraud_classifier'].score(X_test_scaled, y_test)
+            train_score = model.score(X_train_scaled, y_train)
+            test_score = model.score(X_test_scaled, y_test)
+            
+            # Publish model, scaler and feature schema as one version
+            version = self.registry.publish(
+                'fraud_classifier', model, TRANSACTION_FEATURES, scaler=scaler,
+                metrics={"train_score": train_score, "test_score": test_score, "training_samples": len(X_train)}
+            )
             
-            # Save model and scaler
-            joblib.dump(self.models['fraud_classifier'], model_path)
-            joblib.dump(self.scalers['transaction_scaler'], 
-                       os.path.join(self.model_directory, 'transaction_scaler.joblib'))
+            # Training features come from the training frame; the live store keeps its own history
+            self.ensure_ready(db)
             
             return {
                 "status": "success",
+                "version": version,
                 "train_score": train_score,
                 "test_score": test_score,
-                "features_used": numeric_features,
+                "features_used": list(TRANSACTION_FEATURES),
                 "training_samples": len(X_train)
             }
             
@@ -233,29 +256,66 @@ class MLPredictionEngine:
             logger.error(f"Error training fraud classifier: {e}")
             return {"status": "error", "message": str(e)}
 
+    def train_anomaly_detector(self, db: Session, retrain: bool = False) -> Dict[str, Any]:
+        """Fit the anomaly detector on the transaction training window"""
+        try:
+            artifact = self._artifact('anomaly_detector')
+            if artifact is not None and not retrain:
+                self.ensure_ready(db)
+                return {"status": "loaded", "message": "Existing model loaded", "version": artifact.version}
+            
+            training_data = self._get_fraud_training_data(db)
+            if training_data.empty:
+                return {"status": "error", "message": "No training data available"}
+            
+            X = transaction_feature_matrix(training_data)
+            model = MODEL_FACTORIES['anomaly_detector']()
+            model.fit(X)
+            anomaly_rate = float(np.mean(model.predict(X) == -1))
+            
+            version = self.registry.publish(
+                'anomaly_detector', model, TRANSACTION_FEATURES,
+                metrics={"training_samples": len(X), "training_anomaly_rate": anomaly_rate}
+            )
+            self.ensure_ready(db)
+            
+            return {
+                "status": "success",
+                "version": version,
+                "training_anomaly_rate": anomaly_rate,
+                "features_used": list(TRANSACTION_FEATURES),
+                "training_samples": len(X)
+            }
+            
+        except Exception as e:
+            logger.error(f"Error training anomaly detector: {e}")
+            return {"status": "error", "message": str(e)}
+
     def predict_fraud_probability(self, transaction_data: Dict[str, Any]) -> PredictionResult:
         """Predict fraud probability for a transaction"""
         try:
-            # Convert to DataFrame
-            df = pd.DataFrame([transaction_data])
-            
-            # Prepare features
-            features = self.prepare_features(df, 'transaction')
-            numeric_features = features.select_dtypes(include=[np.number]).columns.tolist()
-            X = features[numeric_features].fillna(0)
+            artifact = self._artifact('fraud_classifier')
+            if artifact is None:
+                return PredictionResult(
+                    prediction=0.5,
+                    confidence=0.0,
+                    feature_importance={},
+                    model_type="Untrained",
+                    timestamp=datetime.now()
+                )
+            model, scaler = artifact.model, artifact.scaler
             
-            # Scale features
-            X_scaled = self.scalers['transaction_scaler'].transform(X)
+            # Fixed-order feature vector from the online store, scaled without sklearn's per-call validation
+            X_scaled = ((self.feature_store.vector(transaction_data) - scaler.mean_) / scaler.scale_).reshape(1, -1)
             
             # Predict
-            fraud_prob = self.models['fraud_classifier'].predict_proba(X_scaled)[0][1]
-            confidence = max(self.models['fraud_classifier'].predict_proba(X_scaled)[0]) - 0.5
+            probabilities = model.predict_proba(X_scaled)[0]
+            classes = list(model.classes_)
+            fraud_prob = float(probabilities[classes.index(1)]) if 1 in classes else 0.0
+            confidence = float(max(probabilities)) - 0.5
             
             # Get feature importance
-            feature_importance = dict(zip(
-                numeric_features,
-                self.models['fraud_classifier'].feature_importances_
-            ))
+            feature_importance = dict(zip(TRANSACTION_FEATURES, model.feature_importances_))
             
             return PredictionResult(
                 prediction=fraud_prob,
@@ -275,60 +335,132 @@ class MLPredictionEngine:
                 timestamp=datetime.now()
             )
 
+    def record_transaction(self, transaction_data: Dict[str, Any]) -> None:
+        """Fold a booked transaction into the online customer aggregates, after it has been scored"""
+        if self.feature_store.is_warm:
+            self.feature_store.ingest(transaction_data)
+
     def detect_anomalies(self, transaction_data: List[Dict[str, Any]]) -> List[AnomalyResult]:
         """Detect anomalies in transaction data"""
         try:
-            # Convert to DataFrame
-            df = pd.DataFrame(transaction_data)
-            
-            # Prepare features
-            features = self.prepare_features(df, 'transaction')
-            numeric_features = features.select_dtypes(include=[np.number]).columns.tolist()
-            X = features[numeric_features].fillna(0)
-            
-            # Detect anomalies
-            anomaly_scores = self.models['anomaly_detector'].decision_function(X)
-            anomalies = self.models['anomaly_detector'].predict(X)
-            
-            results = []
-            for i, (score, is_anomaly) in enumerate(zip(anomaly_scores, anomalies)):
-                # Determine severity based on score
-                if score < -0.5:
-                    severity = "critical"
-                elif score < -0.2:
-                    severity = "high"
-                elif score < 0:
-                    severity = "medium"
-                else:
-                    severity = "low"
-                
-                # Identify risk factors
-                risk_factors = []
-                row = features.iloc[i]
-                
-                if 'amount' in row and row['amount'] > row.get('tx_mean', 0) * 3:
-                    risk_factors.append("Unusually high amount")
-                if row.get('is_night', 0) == 1:
-                    risk_factors.append("Night transaction")
-                if row.get('country_risk', 0) > 0.5:
-                    risk_factors.append("High-risk country")
-                if row.get('is_round_1000', 0) == 1:
-                    risk_factors.append("Round amount pattern")
-                
-                results.append(AnomalyResult(
-                    is_anomaly=(is_anomaly == -1),
-                    anomaly_score=abs(score),
-                    risk_factors=risk_factors,
-                    severity=severity,
-                    timestamp=datetime.now()
-                ))
-            
-            return results
+            return self.score_transactions(transaction_data).anomaly_results()
             
         except Exception as e:
             logger.error(f"Error detecting anomalies: {e}")
             return []
 
+    def score_transactions(self, transactions: Union[pd.DataFrame, List[Dict[str, Any]]],
+                           feature_store: Optional[TransactionFeatureStore] = None,
+                           detector: Optional[IsolationForest] = None) -> BatchScoringResult:
+        """
+        Fraud and anomaly scores for a batch: one feature matrix, one
+        predict_proba and one decision_function call, risk factors and
+        severities from vectorized masks
+        """
+        frame = transactions if isinstance(transactions, pd.DataFrame) else pd.DataFrame(transactions)
+        frame = frame.reset_index(drop=True)
+        store = feature_store or self.feature_store
+        X = store.matrix(frame)
+        
+        # Fraud probability
+        fraud_probability, confidence = None, None
+        artifact = self._artifact('fraud_classifier')
+        if artifact is not None and len(frame):
+            classifier, scaler = artifact.model, artifact.scaler
+            probabilities = classifier.predict_proba((X - scaler.mean_) / scaler.scale_)
+            classes = list(classifier.classes_)
+            fraud_probability = probabilities[:, classes.index(1)] if 1 in classes else np.zeros(len(frame))
+            confidence = probabilities.max(axis=1) - 0.5
+        
+        # Anomaly score; without a trained version (or a given detector) the batch is scored against itself
+        if detector is None:
+            artifact = self._artifact('anomaly_detector')
+            if artifact is not None:
+                detector = artifact.model
+            else:
+                logger.warning(f"No trained anomaly detector; fitting one on this batch of {len(frame)} transactions")
+                detector = MODEL_FACTORIES['anomaly_detector']().fit(X)
+        scores = detector.decision_function(X)
+        is_anomaly = scores < 0  # predict() == -1 exactly when decision_function < 0
+        
+        severity = np.select(
+            [scores < -0.5, scores < -0.2, scores < 0],
+            ["critical", "high", "medium"],
+            default="low"
+        )
+        
+        column = {name: X[:, i] for i, name in enumerate(TRANSACTION_FEATURES)}
+        masks = (
+            column['amount'] > column['tx_mean'] * 3,
+            column['is_night'] == 1,
+            column['country_risk'] > 0.5,
+            column['is_round_1000'] == 1
+        )
+        codes = np.zeros(len(frame), dtype=np.int64)
+        for bit, mask in enumerate(masks):
+            codes |= mask.astype(np.int64) << bit
+        
+        return BatchScoringResult(
+            fraud_probability=fraud_probability,
+            confidence=confidence,
+            anomaly_score=np.abs(scores),
+            is_anomaly=is_anomaly,
+            severity=severity,
+            risk_factors=[list(_RISK_FACTOR_LISTS[code]) for code in codes.tolist()],
+            transaction_ids=frame['id'].to_numpy() if 'id' in frame.columns else None,
+            timestamp=datetime.now()
+        )
+
+    def score_transactions_chunked(self, chunks: Iterable[pd.DataFrame],
+                                   feature_store: Optional[TransactionFeatureStore] = None,
+                                   ingest: bool = False) -> Iterator[BatchScoringResult]:
+        """
+        Score a stream of transaction chunks (in time order); with ``ingest``
+        each chunk is folded into the store before the next one is scored.
+        Without a trained anomaly detector, one is fitted on the first chunk
+        and used for the whole stream
+        """
+        store = feature_store or self.feature_store
+        detector = None
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            if detector is None and self._artifact('anomaly_detector') is None:
+                logger.warning(f"No trained anomaly detector; fitting one on the first {len(chunk)} transactions")
+                detector = MODEL_FACTORIES['anomaly_detector']().fit(store.matrix(chunk))
+            yield self.score_transactions(chunk, store, detector=detector)
+            if ingest:
+                store.ingest_frame(chunk)
+
+    def score_transaction_day(self, db: Session, day: datetime,
+                              chunk_size: int = SCORING_CHUNK_ROWS) -> Iterator[BatchScoringResult]:
+        """
+        Score every transaction booked on ``day``, streamed from the database in
+        chunks, against a feature store holding only the history before that day
+        """
+        start = datetime(day.year, day.month, day.day)
+        end = start + timedelta(days=1)
+        store = TransactionFeatureStore()
+        store.warm(db, since=start - timedelta(days=180), until=start)
+        
+        query = """
+        SELECT id, customer_id, transaction_date, amount, country
+        FROM transactions
+        WHERE transaction_date >= :start AND transaction_date < :end
+        ORDER BY transaction_date, id
+        """
+        result = db.execute(text(query).execution_options(stream_results=True), {"start": start, "end": end})
+        columns = list(result.keys())
+        
+        def chunks() -> Iterator[pd.DataFrame]:
+            while True:
+                rows = result.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield pd.DataFrame(rows, columns=columns)
+        
+        return self.score_transactions_chunked(chunks(), store, ingest=True)
+
     def forecast_customer_risk(self, customer_id: int, db: Session, 
                              forecast_days: int = 30) -> RiskForecast:
         """Forecast customer risk for the next period"""
@@ -408,10 +540,10 @@ class MLPredictionEngine:
             X = features[numeric_features].fillna(0)
             
             # Scale features
-            X_scaled = self.scalers['customer_scaler'].fit_transform(X)
+            X_scaled = StandardScaler().fit_transform(X)
             
             # Perform clustering
-            clusters = self.models['clustering_model'].fit_predict(X_scaled)
+            clusters = MODEL_FACTORIES['clustering_model']().fit_predict(X_scaled)
             
             # Analyze clusters
             cluster_analysis = {}
@@ -570,21 +702,23 @@ class MLPredictionEngine:
         """Get performance metrics for all models"""
         metrics = {}
         
-        for model_name, model in self.models.items():
+        for model_name, factory in MODEL_FACTORIES.items():
             try:
-                model_path = os.path.join(self.model_directory, f"{model_name}.joblib")
-                if os.path.exists(model_path):
+                version = self.registry.current_version(model_name)
+                if version is not None:
+                    manifest = self.registry.manifest(model_name, version)
                     metrics[model_name] = {
                         "status": "loaded",
-                        "last_updated": datetime.fromtimestamp(
-                            os.path.getmtime(model_path)
-                        ).isoformat(),
-                        "model_type": type(model).__name__
+                        "version": version,
+                        "versions": self.registry.versions(model_name),
+                        "last_updated": manifest.get("created_at"),
+                        "metrics": manifest.get("metrics", {}),
+                        "model_type": type(factory()).__name__
                     }
                 else:
                     metrics[model_name] = {
                         "status": "not_trained",
-                        "model_type": type(model).__name__
+                        "model_type": type(factory()).__name__
                     }
             except Exception as e:
                 metrics[model_name] = {
@@ -0,0 +1,215 @@
+"""
+Versioned registry for trained ML models
+Stores each model with its scaler and feature schema, loads lazily and
+swaps in new versions atomically
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
+from datetime import datetime
+import errno
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+import joblib
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+# Version numbers tried before a publish gives up on concurrent publishers
+MAX_PUBLISH_ATTEMPTS = 100
+
+
+@dataclass
+class ModelArtifact:
+    """One immutable model version: estimator, optional scaler and the feature order it expects"""
+    name: str
+    version: int
+    model: Any
+    scaler: Optional[Any]
+    feature_schema: Tuple[str, ...]
+    metrics: Dict[str, Any] = field(default_factory=dict)
+    created_at: Optional[datetime] = None
+    loaded_at: datetime = field(default_factory=datetime.now)
+
+
+class ModelRegistry:
+    """
+    Model versions on disk under ``root/<name>/<version>/``.
+
+    A version directory is written under a temporary name and renamed into
+    place, and ``root/<name>/CURRENT`` is replaced with ``os.replace``, so
+    readers never see a partial version. Artifacts are dumped uncompressed
+    and loaded with ``mmap_mode="r"``, which maps top-level NumPy arrays
+    (scaler statistics, linear coefficients) read-only from the page cache.
+    Tree ensembles such as RandomForest and IsolationForest keep their trees
+    in Cython objects that are unpickled into memory, so each worker process
+    still holds its own copy of those. Each process loads a model on first
+    use and notices a newly published version within ``check_interval``
+    seconds; requests already holding the previous artifact finish with it.
+    """
+
+    def __init__(self, root: str, check_interval: float = 5.0):
+        self.root = os.path.abspath(root)
+        self.check_interval = check_interval
+        self._loaded: Dict[str, ModelArtifact] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        self.loads = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    def get(self, name: str) -> Optional[ModelArtifact]:
+        """The current version of ``name``, loading or swapping it if needed"""
+        artifact = self._loaded.get(name)
+        now = time.monotonic()
+        if artifact is not None and now - self._checked_at.get(name, 0.0) < self.check_interval:
+            return artifact
+
+        with self._lock:
+            artifact = self._loaded.get(name)
+            version = self.current_version(name)
+            self._checked_at[name] = now
+            if version is None or (artifact is not None and artifact.version == version):
+                return artifact
+            try:
+                artifact = self._load(name, version)
+            except Exception as e:
+                logger.error(f"Could not load {name} version {version}: {e}")
+                return self._loaded.get(name)
+            # Single reference assignment; readers see the old or the new artifact, never a mix
+            self._loaded[name] = artifact
+            logger.info(f"Model {name} version {version} loaded")
+            return artifact
+
+    def publish(
+        self,
+        name: str,
+        model: Any,
+        feature_schema: Tuple[str, ...],
+        scaler: Optional[Any] = None,
+        metrics: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """Write a new version and make it current"""
+        model_root = os.path.join(self.root, name)
+        os.makedirs(model_root, exist_ok=True)
+        staging = os.path.join(model_root, f".staging-{os.getpid()}-{threading.get_ident()}")
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+
+        created_at = datetime.now()
+        joblib.dump(model, os.path.join(staging, "model.joblib"))
+        if scaler is not None:
+            joblib.dump(scaler, os.path.join(staging, "scaler.joblib"))
+        with open(os.path.join(staging, MANIFEST_FILE), "w") as f:
+            json.dump({
+                "name": name,
+                "feature_schema": list(feature_schema),
+                "has_scaler": scaler is not None,
+                "metrics": metrics or {},
+                "created_at": created_at.isoformat()
+            }, f, default=str)
+
+        with self._lock:
+            try:
+                version = self._claim_version(name, staging)
+            except Exception:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+            self._write_current(name, version)
+            self._checked_at.pop(name, None)
+
+        logger.info(f"Published {name} version {version}")
+        return version
+
+    def _claim_version(self, name: str, staging: str) -> int:
+        """Rename the staged directory to the next free version number"""
+        model_root = os.path.join(self.root, name)
+        version = max(self.versions(name), default=0) + 1
+        for _ in range(MAX_PUBLISH_ATTEMPTS):
+            try:
+                os.rename(staging, os.path.join(model_root, str(version)))
+                return version
+            except OSError as e:
+                if not isinstance(e, FileExistsError) and e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                    raise
+                # Another process published this version number first
+                version = max(max(self.versions(name), default=0), version) + 1
+        raise RuntimeError(f"Could not claim a version of {name} after {MAX_PUBLISH_ATTEMPTS} attempts")
+
+    def activate(self, name: str, version: int) -> None:
+        """Make an existing version current, e.g. to roll back"""
+        if version not in self.versions(name):
+            raise ValueError(f"Unknown version {version} of model {name}")
+        with self._lock:
+            self._write_current(name, version)
+            self._checked_at.pop(name, None)
+
+    def current_version(self, name: str) -> Optional[int]:
+        try:
+            with open(os.path.join(self.root, name, CURRENT_FILE)) as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def versions(self, name: str) -> List[int]:
+        model_root = os.path.join(self.root, name)
+        if not os.path.isdir(model_root):
+            return []
+        return sorted(int(entry) for entry in os.listdir(model_root) if entry.isdigit())
+
+    def manifest(self, name: str, version: int) -> Dict[str, Any]:
+        with open(os.path.join(self.root, name, str(version), MANIFEST_FILE)) as f:
+            return json.load(f)
+
+    def _load(self, name: str, version: int) -> ModelArtifact:
+        path = os.path.join(self.root, name, str(version))
+        manifest = self.manifest(name, version)
+        self.loads += 1
+        return ModelArtifact(
+            name=name,
+            version=version,
+            model=joblib.load(os.path.join(path, "model.joblib"), mmap_mode="r"),
+            scaler=joblib.load(os.path.join(path, "scaler.joblib"), mmap_mode="r") if manifest.get("has_scaler") else None,
+            feature_schema=tuple(manifest["feature_schema"]),
+            metrics=manifest.get("metrics", {}),
+            created_at=datetime.fromisoformat(manifest["created_at"]) if manifest.get("created_at") else None
+        )
+
+    def _write_current(self, name: str, version: int) -> None:
+        path = os.path.join(self.root, name, CURRENT_FILE)
+        temporary = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(temporary, "w") as f:
+            f.write(str(version))
+        os.replace(temporary, path)
+
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            "root": self.root,
+            "loads": self.loads,
+            "loaded": {
+                name: {
+                    "version": artifact.version,
+                    "loaded_at": artifact.loaded_at.isoformat()
+                }
+                for name, artifact in self._loaded.items()
+            }
+        }
+
+
+# Global instance
+_model_registry: Optional[ModelRegistry] = None
+
+
+def get_model_registry() -> ModelRegistry:
+    """Get the global model registry instance"""
+    global _model_registry
+    if _model_registry is None:
+        _model_registry = ModelRegistry(settings.ML_MODEL_DIR)
+    return _model_registry
@@ -1,11 +1,25 @@
 from typing import Dict, Any, Optional, List
+from sqlalchemy import bindparam, case, func, or_, update
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
+import logging
+import time
 import numpy as np
 
 from app.models.aml import CustomerProfile, CustomerRiskProfile, Transaction
 from app.models.aml.customer import RiskLevel
 
+logger = logging.getLogger(__name__)
+
+# Days of transaction history behind the transaction risk factor
+TRANSACTION_RISK_WINDOW_DAYS = 90
+REVIEW_INTERVAL_DAYS = {
+    RiskLevel.CRITICAL: 30,
+    RiskLevel.HIGH: 90,
+    RiskLevel.MEDIUM: 180,
+    RiskLevel.LOW: 365
+}
+
 
 class RiskScoringService:
     """Service for calculating and managing risk scores for customers and transactions"""
@@ -105,6 +119,276 @@ class RiskScoringService:
             "high_risk_indicators": self._get_high_risk_indicators(customer, risk_profile)
         }
     
+    def rescore_customers_bulk(
+        self,
+        since: Optional[datetime] = None,
+        chunk_size: int = 5000,
+        start_after_id: int = 0
+    ) -> Dict[str, Any]:
+        """Re-score customers in keyset-paginated chunks with set-based factors
+        
+        Each chunk is one customer extract plus one grouped transaction
+        aggregate; the five factors, composite score and level are computed
+        as column operations with the same rules as
+        ``calculate_customer_risk_score``. Risk profiles are written with one
+        bulk update and one bulk insert per chunk, customers only where their
+        score, level or flags changed, and each chunk is committed. Customer
+        ``updated_at`` is left alone, so a re-score does not make the next
+        incremental run (or other ``updated_at`` watchers) see every customer
+        as changed.
+        
+        With ``since`` only customers whose inputs may have changed are
+        re-scored: customers updated since then, customers with transactions
+        updated since then, and customers with transactions that have left
+        the transaction risk window since then. Pass the returned
+        ``completed_at`` as ``since`` for the next incremental run.
+        """
+        
+        started_at = datetime.utcnow()
+        started = time.time()
+        candidates = self._changed_customer_ids(since, started_at) if since else None
+        last_id = start_after_id
+        
+        summary = {
+            "customers_scored": 0,
+            "profiles_created": 0,
+            "profiles_updated": 0,
+            "customers_changed": 0,
+            "chunks": 0,
+            "risk_levels": {level.value: 0 for level in RiskLevel}
+        }
+        
+        while True:
+            query = self.db.query(
+                CustomerProfile.id,
+                CustomerProfile.country,
+                CustomerProfile.pep_status,
+                CustomerProfile.customer_type,
+                CustomerProfile.occupation,
+                CustomerProfile.kyc_status,
+                CustomerProfile.risk_score,
+                CustomerProfile.risk_level,
+                CustomerProfile.high_risk_country,
+                CustomerProfile.high_risk_business
+            )
+            if candidates is None:
+                query = query.filter(CustomerProfile.id > last_id)
+            else:
+                chunk_ids = candidates[candidates > last_id][:chunk_size]
+                if not len(chunk_ids):
+                    break
+                query = query.filter(CustomerProfile.id.in_(chunk_ids.tolist()))
+            customers = query.order_by(CustomerProfile.id).limit(chunk_size).all()
+            
+            if candidates is not None:
+                last_id = int(chunk_ids[-1])
+            elif customers:
+                last_id = customers[-1].id
+            else:
+                break
+            if not customers:
+                continue
+            
+            scored = self._score_customer_chunk(customers, started_at)
+            counts = self._write_customer_chunk(customers, scored, started_at)
+            self.db.commit()
+            
+            summary["customers_scored"] += len(customers)
+            summary["chunks"] += 1
+            for key, value in counts.items():
+                summary[key] += value
+            levels, level_counts = np.unique(scored["risk_level"], return_counts=True)
+            for level, count in zip(levels.tolist(), level_counts.tolist()):
+                summary["risk_levels"][level] += count
+            
+            elapsed = time.time() - started
+            logger.info(
+                f"Risk re-scoring chunk {summary['chunks']}: {summary['customers_scored']} customers, "
+                f"{summary['customers_scored'] / max(elapsed, 1e-9):.1f} customers/s"
+            )
+        
+        summary["incremental"] = since is not None
+        summary["completed_at"] = started_at
+        summary["elapsed_seconds"] = time.time() - started
+        return summary
+    
+    def _changed_customer_ids(self, since: datetime, now: datetime) -> np.ndarray:
+        """Customers whose risk inputs may have changed after ``since``"""
+        window = timedelta(days=TRANSACTION_RISK_WINDOW_DAYS)
+        updated = self.db.query(CustomerProfile.id).filter(CustomerProfile.updated_at > since)
+        transacted = self.db.query(Transaction.customer_id).filter(
+            Transaction.customer_id.isnot(None),
+            or_(
+                Transaction.updated_at > since,
+                # Aged out of the transaction risk window since the last run
+                Transaction.transaction_date.between(since - window, now - window)
+            )
+        ).distinct()
+        ids = [row[0] for row in updated.union(transacted).all() if row[0] is not None]
+        return np.unique(np.array(ids, dtype=np.int64))
+    
+    def _score_customer_chunk(self, customers: List[Any], now: datetime) -> Dict[str, np.ndarray]:
+        """Vectorized factor scores for a chunk of customer rows"""
+        n = len(customers)
+        ids = np.fromiter((c.id for c in customers), dtype=np.int64, count=n)
+        country = np.array([c.country for c in customers], dtype=object)
+        pep = np.fromiter((bool(c.pep_status) for c in customers), dtype=bool, count=n)
+        corporate = np.fromiter((c.customer_type == "corporate" for c in customers), dtype=bool, count=n)
+        high_risk_occupation = np.fromiter(
+            (c.occupation in self.high_risk_businesses for c in customers), dtype=bool, count=n
+        )
+        kyc_incomplete = np.fromiter((c.kyc_status != "completed" for c in customers), dtype=bool, count=n)
+        
+        # Geographic
+        high_risk_country = np.isin(country, self.high_risk_countries)
+        has_country = np.fromiter((bool(value) for value in country), dtype=bool, count=n)
+        geographic = np.where(high_risk_country, 80.0, np.where(has_country, 30.0, 0.0))
+        geographic = np.where(pep, np.minimum(100.0, geographic + 30), geographic)
+        
+        # Product and channel (defaults, as for a single customer)
+        product = np.full(n, 40.0)
+        channel = np.full(n, 35.0)
+        
+        # Customer type
+        high_risk_business = corporate & high_risk_occupation
+        customer_type = np.where(corporate, np.where(high_risk_occupation, 80.0, 50.0), 30.0)
+        customer_type = np.where(kyc_incomplete, np.minimum(100.0, customer_type + 20), customer_type)
+        
+        # Transaction behaviour over the risk window, one grouped query for the chunk
+        stats = self.db.query(
+            Transaction.customer_id,
+            func.count(Transaction.id),
+            func.avg(Transaction.amount),
+            func.stddev_pop(Transaction.amount),
+            func.sum(case((Transaction.is_cash == True, 1), else_=0))
+        ).filter(
+            Transaction.customer_id.in_(ids.tolist()),
+            Transaction.transaction_date >= now - timedelta(days=TRANSACTION_RISK_WINDOW_DAYS)
+        ).group_by(Transaction.customer_id).all()
+        
+        tx_count = np.zeros(n)
+        avg_amount = np.zeros(n)
+        std_amount = np.zeros(n)
+        cash_count = np.zeros(n)
+        if stats:
+            rows = np.searchsorted(ids, np.array([row[0] for row in stats], dtype=np.int64))
+            tx_count[rows] = [row[1] for row in stats]
+            avg_amount[rows] = [float(row[2] or 0) for row in stats]
+            std_amount[rows] = [float(row[3] or 0) for row in stats]
+            cash_count[rows] = [float(row[4] or 0) for row in stats]
+        
+        transaction = (
+            30.0
+            + np.where(avg_amount > 10000, 20, 0)
+            + np.where(std_amount > avg_amount * 0.5, 15, 0)
+            + np.where(cash_count / np.maximum(tx_count, 1) > 0.5, 20, 0)
+        )
+        transaction = np.where(tx_count > 0, np.minimum(100.0, transaction), 20.0)
+        
+        composite = (
+            geographic * self.weights["geographic"] +
+            product * self.weights["product"] +
+            channel * self.weights["channel"] +
+            customer_type * self.weights["customer_type"] +
+            transaction * self.weights["transaction"]
+        )
+        risk_level = np.select(
+            [composite >= 75, composite >= 50, composite >= 25],
+            [RiskLevel.CRITICAL.value, RiskLevel.HIGH.value, RiskLevel.MEDIUM.value],
+            default=RiskLevel.LOW.value
+        )
+        
+        return {
+            "geographic": geographic,
+            "product": product,
+            "channel": channel,
+            "customer_type": customer_type,
+            "transaction": transaction,
+            "composite": composite,
+            "risk_level": risk_level,
+            "high_risk_country": high_risk_country,
+            "high_risk_business": high_risk_business
+        }
+    
+    def _write_customer_chunk(
+        self,
+        customers: List[Any],
+        scored: Dict[str, np.ndarray],
+        now: datetime
+    ) -> Dict[str, int]:
+        """Upsert risk profiles with bulk mappings and update changed customers in one executemany"""
+        ids = [c.id for c in customers]
+        existing = dict(self.db.query(
+            CustomerRiskProfile.customer_id, CustomerRiskProfile.id
+        ).filter(CustomerRiskProfile.customer_id.in_(ids)).all())
+        
+        columns = {
+            name: scored[name].tolist()
+            for name in ("geographic", "product", "channel", "customer_type", "transaction", "composite", "risk_level")
+        }
+        profile_updates, profile_inserts, customer_updates = [], [], []
+        for i, customer in enumerate(customers):
+            level = RiskLevel(columns["risk_level"][i])
+            profile = {
+                "customer_id": customer.id,
+                "geographic_risk": columns["geographic"][i],
+                "product_risk": columns["product"][i],
+                "channel_risk": columns["channel"][i],
+                "customer_type_risk": columns["customer_type"][i],
+                "transaction_risk": columns["transaction"][i],
+                "composite_risk_score": columns["composite"][i],
+                "last_review_date": now,
+                "next_review_date": now + timedelta(days=REVIEW_INTERVAL_DAYS[level])
+            }
+            if customer.id in existing:
+                profile["id"] = existing[customer.id]
+                profile_updates.append(profile)
+            else:
+                profile_inserts.append(profile)
+            
+            # Flags are only ever raised, as in the single-customer path
+            high_risk_country = bool(customer.high_risk_country) or bool(scored["high_risk_country"][i])
+            high_risk_business = bool(customer.high_risk_business) or bool(scored["high_risk_business"][i])
+            if (
+                customer.risk_score != columns["composite"][i]
+                or customer.risk_level != level
+                or bool(customer.high_risk_country) != high_risk_country
+                or bool(customer.high_risk_business) != high_risk_business
+            ):
+                customer_updates.append({
+                    "customer_pk": customer.id,
+                    "new_risk_score": columns["composite"][i],
+                    "new_risk_level": level,
+                    "new_high_risk_country": high_risk_country,
+                    "new_high_risk_business": high_risk_business
+                })
+        
+        if profile_updates:
+            self.db.bulk_update_mappings(CustomerRiskProfile, profile_updates)
+        if profile_inserts:
+            self.db.bulk_insert_mappings(CustomerRiskProfile, profile_inserts)
+        if customer_updates:
+            customers_table = CustomerProfile.__table__
+            self.db.execute(
+                update(customers_table)
+                .where(customers_table.c.id == bindparam("customer_pk"))
+                .values(
+                    risk_score=bindparam("new_risk_score"),
+                    risk_level=bindparam("new_risk_level"),
+                    high_risk_country=bindparam("new_high_risk_country"),
+                    high_risk_business=bindparam("new_high_risk_business"),
+                    # Set to itself so the column's onupdate does not fire
+                    updated_at=customers_table.c.updated_at
+                ),
+                customer_updates
+            )
+        
+        return {
+            "profiles_created": len(profile_inserts),
+            "profiles_updated": len(profile_updates),
+            "customers_changed": len(customer_updates)
+        }
+    
     def calculate_transaction_risk_score(
         self,
         transaction_id: int,
@@ -242,7 +526,7 @@ class RiskScoringService:
         # Query recent transactions
         recent_transactions = self.db.query(Transaction).filter(
             Transaction.customer_id == customer.id,
-            Transaction.transaction_date >= datetime.utcnow() - timedelta(days=90)
+            Transaction.transaction_date >= datetime.utcnow() - timedelta(days=TRANSACTION_RISK_WINDOW_DAYS)
         ).all()
         
         if not recent_transactions:
@@ -371,13 +655,7 @@ class RiskScoringService:
     
     def _calculate_next_review_date(self, risk_level: RiskLevel) -> datetime:
         """Calculate next review date based on risk level"""
-        days_map = {
-            RiskLevel.CRITICAL: 30,
-            RiskLevel.HIGH: 90,
-            RiskLevel.MEDIUM: 180,
-            RiskLevel.LOW: 365
-        }
-        return datetime.utcnow() + timedelta(days=days_map[risk_level])
+        return datetime.utcnow() + timedelta(days=REVIEW_INTERVAL_DAYS[risk_level])
     
     def _get_high_risk_indicators(
         self,
@@ -0,0 +1,776 @@
+"""
+Declarative AML rule engine
+Rule definitions are stored as JSON in system configuration, compiled once into
+predicate closures and hot-reloaded when the stored definition changes
+"""
+
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from datetime import datetime, timedelta
+from dataclasses import dataclass, field
+from abc import ABC, abstractmethod
+import hashlib
+import json
+import logging
+import operator
+import threading
+import time
+
+from app.models.aml import Transaction
+from app.models.aml.transaction import AlertSeverity
+from app.models.system_config import SystemConfiguration
+
+logger = logging.getLogger(__name__)
+
+RULES_CONFIG_KEY = "aml.monitoring_rules"
+
+SCOPE_BATCH = "batch"
+SCOPE_STREAM = "stream"
+# Evaluated by stream processors that keep their own sliding windows and pass
+# the window contents in as facts
+SCOPE_STREAM_WINDOW = "stream_window"
+
+DEFAULT_RULES: List[Dict[str, Any]] = [
+    {
+        "id": "R001",
+        "name": "Large Cash Transaction",
+        "type": "amount_threshold",
+        "version": 1,
+        "params": {"amount": 10000, "types": ["cash", "deposit", "withdrawal"]}
+    },
+    {
+        "id": "R002",
+        "name": "Rapid Movement of Funds",
+        "type": "velocity",
+        "version": 1,
+        "params": {"hours": 24, "count": 5, "amount": 5000}
+    },
+    {
+        "id": "R003",
+        "name": "Structuring Pattern",
+        "type": "structuring",
+        "version": 1,
+        "params": {"threshold": 10000, "margin": 500, "period_hours": 24}
+    },
+    {
+        "id": "R004",
+        "name": "High Risk Country",
+        "type": "geographic",
+        "version": 1,
+        "params": {"countries": ["IR", "KP", "SY", "YE", "AF", "MM"]}
+    },
+    {
+        "id": "R005",
+        "name": "Unusual Time Pattern",
+        "type": "timing",
+        "version": 1,
+        "params": {"hours": [2, 3, 4, 5]}
+    },
+    {
+        "id": "R006",
+        "name": "Round Amount Pattern",
+        "type": "round_amount",
+        "version": 1,
+        "params": {"divisor": 1000, "min_amount": 5000}
+    },
+    {
+        "id": "R007",
+        "name": "Dormant Account Sudden Activity",
+        "type": "dormancy",
+        "version": 1,
+        "params": {"dormant_days": 180, "amount": 5000}
+    },
+    {
+        "id": "S001",
+        "name": "Large Amount Transaction",
+        "type": "large_amount",
+        "version": 1,
+        "scopes": [SCOPE_STREAM],
+        "event_types": ["transaction_created"],
+        "params": {"amount_threshold": 50000.0}
+    },
+    {
+        "id": "S002",
+        "name": "High Risk Score Detected",
+        "type": "risk_score",
+        "version": 1,
+        "scopes": [SCOPE_STREAM],
+        "event_types": ["ml_model_prediction"],
+        "params": {"high_risk_threshold": 0.7}
+    },
+    {
+        "id": "S003",
+        "name": "High Transaction Velocity Detected",
+        "type": "window_velocity",
+        "version": 1,
+        "scopes": [SCOPE_STREAM_WINDOW],
+        "event_types": ["transaction_created"],
+        "params": {"window_seconds": 300, "count": 15}
+    },
+    {
+        "id": "S004",
+        "name": "Potential Structuring Pattern",
+        "type": "window_structuring",
+        "version": 1,
+        "scopes": [SCOPE_STREAM_WINDOW],
+        "event_types": ["transaction_created"],
+        "params": {
+            "threshold": 10000.0,
+            "window_seconds": 86400,
+            "min_count": 3,
+            "near_ratio": 0.8,
+            "near_share": 0.6,
+            "total_multiple": 1.5
+        }
+    }
+]
+
+# Facts are plain dicts: transaction columns for monitoring, event data for streaming
+Facts = Dict[str, Any]
+Predicate = Callable[[Facts, Optional["TransactionHistory"], datetime], Optional[Dict[str, Any]]]
+
+
+class TransactionHistory(ABC):
+    """Customer transaction history consulted by stateful rules"""
+
+    @abstractmethod
+    def recent_activity(
+        self,
+        facts: Facts,
+        since: datetime,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None
+    ) -> Tuple[int, float]:
+        """Count and total of the customer's other transactions since ``since``"""
+
+    @abstractmethod
+    def last_activity_before(self, facts: Facts) -> Optional[datetime]:
+        """Date of the customer's last transaction strictly before this one"""
+
+
+class SqlTransactionHistory(TransactionHistory):
+    """History answered by aggregate queries on the transactions table"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def recent_activity(
+        self,
+        facts: Facts,
+        since: datetime,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None
+    ) -> Tuple[int, float]:
+        query = self.db.query(
+            func.count(Transaction.id),
+            func.sum(Transaction.amount)
+        ).filter(
+            Transaction.customer_id == facts.get("customer_id"),
+            Transaction.transaction_date >= since,
+            Transaction.id != facts.get("id")
+        )
+        if min_amount is not None:
+            query = query.filter(Transaction.amount >= min_amount)
+        if max_amount is not None:
+            query = query.filter(Transaction.amount < max_amount)
+
+        count, total = query.one()
+        return count or 0, total or 0.0
+
+    def last_activity_before(self, facts: Facts) -> Optional[datetime]:
+        return self.db.query(func.max(Transaction.transaction_date)).filter(
+            Transaction.customer_id == facts.get("customer_id"),
+            Transaction.id != facts.get("id"),
+            Transaction.transaction_date < facts["transaction_date"]
+        ).scalar()
+
+
+def transaction_facts(transaction: Transaction) -> Facts:
+    """Facts for a transaction row"""
+    return {
+        "id": transaction.id,
+        "customer_id": transaction.customer_id,
+        "transaction_type": transaction.transaction_type.value if transaction.transaction_type else None,
+        "transaction_date": transaction.transaction_date,
+        "amount": transaction.amount,
+        "currency": transaction.currency,
+        "originating_country": transaction.originating_country,
+        "destination_country": transaction.destination_country,
+        "counterparty_country": transaction.counterparty_country
+    }
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    """A rule definition compiled into a predicate closure"""
+    rule_id: str
+    name: str
+    rule_type: str
+    version: int
+    params: Dict[str, Any]
+    scopes: Tuple[str, ...]
+    event_types: Tuple[str, ...]
+    stateful: bool
+    predicate: Predicate
+    definition: Dict[str, Any]
+
+
+@dataclass(frozen=True)
+class RuleSet:
+    """An immutable, versioned set of compiled rules"""
+    version: str
+    rules: Tuple[CompiledRule, ...]
+    by_scope: Dict[str, Tuple[CompiledRule, ...]] = field(default_factory=dict)
+    by_event_type: Dict[str, Tuple[CompiledRule, ...]] = field(default_factory=dict)
+    by_id: Dict[str, CompiledRule] = field(default_factory=dict)
+    loaded_at: datetime = field(default_factory=datetime.utcnow)
+
+
+# Rule compilers: each takes rule params and returns a predicate closure
+
+def _compile_amount_threshold(params: Dict[str, Any]) -> Predicate:
+    threshold = params["amount"]
+    types = frozenset(params.get("types", []))
+
+    def predicate(facts: Facts, history: Optional[TransactionHistory], now: datetime):
+        transaction_type = facts.get("transaction_type")
+        amount = facts["amount"]
+        if transaction_type in types and amount >= threshold:
+            return {
+                "description": f"Large {transaction_type} transaction of {amount} {facts.get('currency')}",
+                "severity": AlertSeverity.HIGH if amount >= threshold * 2 else AlertSeverity.MEDIUM,
+                "score": min(100, (amount / threshold) * 50),
+                "details": {
+                    "amount": amount,
+                    "threshold": threshold,
+                    "type": transaction_type
+                }
+            }
+        return None
+
+    return predicate
+
+
+def _compile_velocity(params: Dict[str, Any]) -> Predicate:
+    window = timedelta(hours=params["hours"])
+    min_count = params["count"]
+    min_amount = params["amount"]
+
+    def predicate(facts: Facts, history: Optional[TransactionHistory], now: datetime):
+        if not facts.get("customer_id"):
+            return None
+
+        count, total = history.recent_activity(facts, now - window)
+        if count >= min_count:
+            total_amount = total + facts["amount"]
+            if total_amount >= min_amount:
+                return {
+                    "description": f"Rapid movement of funds: {count+1} transactions totaling {total_amount} in {params['hours']} hours",
+                    "severity": AlertSeverity.HIGH,
+                    "score": min(100, (count / min_count) * 60),
+                    "details": {
+                        "transaction_count": count + 1,
+                        "total_amount": total_amount,
+                        "period_hours": params["hours"]
+                    }
+                }
+        return None
+
+    return predicate
+
+
+def _compile_structuring(params: Dict[str, Any]) -> Predicate:
+    threshold = params["threshold"]
+    lower = threshold - params["margin"]
+    window = timedelta(hours=params["period_hours"])
+
+    def predicate(facts: Facts, history: Optional[TransactionHistory], now: datetime):
+        amount = facts["amount"]
+        if not lower <= amount < threshold:
+            return None
+
+        similar_count, _ = history.recent_activity(facts, now - window, min_amount=lower, max_amount=threshold)
+        if similar_count > 0:
+            return {
+                "description": f"Potential structuring: Multiple transactions just below {threshold} threshold",
+                "severity": AlertSeverity.HIGH,
+                "score": 80,
+                "details": {
+                    "amount": amount,
+                    "threshold": threshold,
+                    "similar_count": similar_count
+                }
+            }
+        return None
+
+    return predicate
+
+
+def _compile_geographic(params: Dict[str, Any]) -> Predicate:
+    countries = frozenset(params["countries"])
+    fields = (
+        ("originating", "originating_country"),
+        ("destination", "destination_country"),
+        ("counterparty", "counterparty_country")
+    )
+
+    def predicate(facts: Facts, history: Optional[TransactionHistory], now: datetime):
+        for _, key in fields:
+            country = facts.get(key)
+            if country in countries:
+                # Report the first field holding this country
+                field_name = next(name for name, k in fields if facts.get(k) == country)
+                return {
+                    "description": f"Transaction involves high-risk country: {country}",
+                    "severity": AlertSeverity.HIGH,
+                    "score": 90,
+                    "details": {
+                        "country": country,
+                        "field": field_name
+                    }
+                }
+        return None
+
+    return predicate
+
+
+def _compile_timing(params: Dict[str, Any]) -> Predicate:
+    hours = frozenset(params["hours"])
+
+    def predicate(facts: Facts, history: Optional[TransactionHistory], now: datetime):
+        transaction_date = facts["transaction_date"]
+        hour = transaction_date.hour
+        if hour in hours:
+            return {
+                "description": f"Transaction at unusual hour: {hour:02d}:00",
+                "severity": AlertSeverity.MEDIUM,
+                "score": 60,
+                "details": {
+                    "hour": hour,
+                    "timestamp": transaction_date.isoformat()
+                }
+            }
+        return None
+
+    return predicate
+
+
+def _compile_round_amount(params: Dict[str, Any]) -> Predicate:
+    divisor = params["divisor"]
+    min_amount = params["min_amount"]
+
+    def predicate(facts: Facts, history: Optional[TransactionHistory], now: datetime):
+        amount = facts["amount"]
+        if amount >= min_amount and amount % divisor == 0:
+            return {
+                "description": f"Round amount transaction: {amount}",
+                "severity": AlertSeverity.LOW,
+                "score": 40,
+                "details": {
+                    "amount": amount,
+                    "divisor": divisor
+                }
+            }
+        return None
+
+    return predicate
+
+
+def _compile_dormancy(params: Dict[str, Any]) -> Predicate:
+    dormant_days = params["dormant_days"]
+    min_amount = params["amount"]
+
+    def predicate(facts: Facts, history: Optional[TransactionHistory], now: datetime):
+        if not facts.get("customer_id"):
+            return None
+
+        last_activity = history.last_activity_before(facts)
+        if last_activity:
+            days_dormant = (facts["transaction_date"] - last_activity).days
+            if days_dormant >= dormant_days and facts["amount"] >= min_amount:
+                return {
+                    "description": f"Sudden activity in dormant account: {days_dormant} days inactive",
+                    "severity": AlertSeverity.HIGH,
+                    "score": 75,
+                    "details": {
+                        "days_dormant": days_dormant,
+                        "amount": facts["amount"],
+                        "last_activity": last_activity.isoformat()
+                    }
+                }
+        return None
+
+    return predicate
+
+
+def _compile_large_amount(params: Dict[str, Any]) -> Predicate:
+    threshold = params["amount_threshold"]
+
+    def predicate(facts: Facts, history: Optional[TransactionHistory], now: datetime):
+        amount = facts.get("amount", 0)
+        if amount > threshold:
+            return {
+                "title": "Large Amount Transaction",
+                "alert_key": "large_amount",
+                "description": f"Transaction amount ${amount:,.2f} exceeds threshold ${threshold:,.2f}",
+                "severity": AlertSeverity.MEDIUM,
+                "details": {
+                    "transaction_id": facts.get("entity_id"),
+                    "amount": amount,
+                    "threshold": threshold,
+                    "customer_id": facts.get("customer_id")
+                }
+            }
+        return None
+
+    return predicate
+
+
+def _compile_risk_score(params: Dict[str, Any]) -> Predicate:
+    threshold = params["high_risk_threshold"]
+
+    def predicate(facts: Facts, history: Optional[TransactionHistory], now: datetime):
+        risk_score = facts.get("risk_score", 0)
+        if risk_score > threshold:
+            return {
+                "title": "High Risk Score Detected",
+                "alert_key": "high_risk",
+                "description": f"ML model predicted high risk score ({risk_score:.2%}) for {facts.get('entity_type')} {facts.get('entity_id')}",
+                "severity": AlertSeverity.HIGH if risk_score > 0.9 else AlertSeverity.MEDIUM,
+                "details": {
+                    "entity_type": facts.get("entity_type"),
+                    "entity_id": facts.get("entity_id"),
+                    "risk_score": risk_score,
+                    "threshold": threshold,
+                    "model_confidence": facts.get("confidence", 0)
+                }
+            }
+        return None
+
+    return predicate
+
+
+def _compile_window_velocity(params: Dict[str, Any]) -> Predicate:
+    """Expects ``window_count``: transactions in the window, including this one"""
+    window_seconds = float(params["window_seconds"])
+    max_count = int(params["count"])
+    if window_seconds <= 0:
+        raise ValueError("window_seconds must be positive")
+
+    def predicate(facts: Facts, history: Optional[TransactionHistory], now: datetime):
+        count = facts["window_count"]
+        if count > max_count:
+            return {
+                "alert_key": "velocity",
+                "description": f"Customer {facts.get('customer_id')} has {count} transactions in {window_seconds:g} seconds",
+                "severity": AlertSeverity.HIGH,
+                "details": {
+                    "customer_id": facts.get("customer_id"),
+                    "transaction_count": count,
+                    "time_window": window_seconds,
+                    "threshold": max_count
+                }
+            }
+        return None
+
+    return predicate
+
+
+def _compile_window_structuring(params: Dict[str, Any]) -> Predicate:
+    """Expects ``window_amounts``: sub-threshold amounts in the window, including this one"""
+    threshold = float(params["threshold"])
+    window_seconds = float(params["window_seconds"])
+    min_count = int(params.get("min_count", 3))
+    near_amount = threshold * float(params.get("near_ratio", 0.8))
+    near_share = float(params.get("near_share", 0.6))
+    min_total = threshold * float(params.get("total_multiple", 1.5))
+    if window_seconds <= 0:
+        raise ValueError("window_seconds must be positive")
+
+    def predicate(facts: Facts, history: Optional[TransactionHistory], now: datetime):
+        amounts = facts["window_amounts"]
+        if len(amounts) < min_count:
+            return None
+
+        total_amount = sum(amounts)
+        near_threshold_count = sum(1 for amount in amounts if amount > near_amount)
+        if total_amount > min_total and near_threshold_count >= len(amounts) * near_share:
+            return {
+                "alert_key": "structuring",
+                "description": f"Customer {facts.get('customer_id')} has {len(amounts)} transactions totaling ${total_amount:,.2f} in pattern suggesting structuring",
+                "severity": AlertSeverity.HIGH,
+                "details": {
+                    "customer_id": facts.get("customer_id"),
+                    "transaction_count": len(amounts),
+                    "total_amount": total_amount,
+                    "threshold": threshold,
+                    "pattern_window_hours": window_seconds / 3600
+                }
+            }
+        return None
+
+    return predicate
+
+
+CONDITION_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "in": lambda value, options: value in options,
+    "not_in": lambda value, options: value not in options
+}
+
+
+def _compile_condition_clause(clause: Dict[str, Any]) -> Callable[[Facts], bool]:
+    if "all" in clause or "any" in clause:
+        combinator = all if "all" in clause else any
+        children = tuple(_compile_condition_clause(child) for child in clause.get("all", clause.get("any")))
+        return lambda facts: combinator(child(facts) for child in children)
+
+    key = clause["field"]
+    op = CONDITION_OPERATORS.get(clause["op"])
+    if op is None:
+        raise ValueError(f"Unknown condition operator: {clause['op']}")
+    value = clause["value"]
+    if clause["op"] in ("in", "not_in"):
+        value = frozenset(value)
+
+    def evaluate(facts: Facts) -> bool:
+        fact = facts.get(key)
+        if fact is None:
+            return False
+        try:
+            return op(fact, value)
+        except TypeError:
+            return False
+
+    return evaluate
+
+
+def _compile_condition(params: Dict[str, Any]) -> Predicate:
+    """Generic rule: ``{"all": [{"field": ..., "op": ..., "value": ...}, ...]}``"""
+    matches = _compile_condition_clause(params["when"])
+    severity = AlertSeverity(params.get("severity", "medium"))
+    score = params.get("score", 50)
+    description = params.get("description", "Rule condition matched")
+    detail_fields = tuple(params.get("detail_fields", []))
+
+    def predicate(facts: Facts, history: Optional[TransactionHistory], now: datetime):
+        if matches(facts):
+            try:
+                text = description.format(**facts)
+            except (KeyError, IndexError, ValueError):
+                text = description
+            return {
+                "description": text,
+                "severity": severity,
+                "score": score,
+                "details": {key: facts.get(key) for key in detail_fields}
+            }
+        return None
+
+    return predicate
+
+
+RULE_COMPILERS: Dict[str, Callable[[Dict[str, Any]], Predicate]] = {
+    "amount_threshold": _compile_amount_threshold,
+    "velocity": _compile_velocity,
+    "structuring": _compile_structuring,
+    "geographic": _compile_geographic,
+    "timing": _compile_timing,
+    "round_amount": _compile_round_amount,
+    "dormancy": _compile_dormancy,
+    "large_amount": _compile_large_amount,
+    "risk_score": _compile_risk_score,
+    "window_velocity": _compile_window_velocity,
+    "window_structuring": _compile_window_structuring,
+    "condition": _compile_condition
+}
+
+STATEFUL_RULE_TYPES = frozenset(["velocity", "structuring", "dormancy"])
+
+
+def _compile_rule(definition: Dict[str, Any], seen: set) -> Optional[CompiledRule]:
+    """Compile one definition; returns None for disabled rules, raises ValueError if malformed"""
+    if not isinstance(definition, dict):
+        raise ValueError(f"Rule definition is not an object: {definition!r}")
+
+    rule_id = definition.get("id")
+    rule_type = definition.get("type")
+    if not rule_id or rule_id in seen:
+        raise ValueError(f"Rule id missing or duplicated: {rule_id}")
+    if rule_type not in RULE_COMPILERS:
+        raise ValueError(f"Rule {rule_id} has unknown type: {rule_type}")
+    seen.add(rule_id)
+
+    if not definition.get("enabled", True):
+        return None
+
+    params = definition.get("params", {})
+    try:
+        if not isinstance(params, dict):
+            raise TypeError("params must be an object")
+        predicate = RULE_COMPILERS[rule_type](params)
+        version = int(definition.get("version", 1))
+        scopes = tuple(definition.get("scopes", [SCOPE_BATCH]))
+        event_types = tuple(definition.get("event_types", ["transaction_created"]))
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        raise ValueError(f"Rule {rule_id} has invalid params: {e}")
+
+    return CompiledRule(
+        rule_id=rule_id,
+        name=definition.get("name", rule_id),
+        rule_type=rule_type,
+        version=version,
+        params=params,
+        scopes=scopes,
+        event_types=event_types,
+        stateful=rule_type in STATEFUL_RULE_TYPES,
+        predicate=predicate,
+        definition={
+            "id": rule_id,
+            "name": definition.get("name", rule_id),
+            "type": rule_type,
+            "params": params
+        }
+    )
+
+
+def compile_rules(
+    definitions: List[Dict[str, Any]],
+    version: Optional[str] = None,
+    skip_invalid: bool = False
+) -> RuleSet:
+    """Compile rule definitions into a rule set
+
+    Raises ValueError on the first invalid rule, or logs and leaves it out
+    when ``skip_invalid`` is set.
+    """
+
+    if not isinstance(definitions, list):
+        raise ValueError("Rule definitions must be a list")
+    if version is None:
+        version = hashlib.sha256(json.dumps(definitions, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+    compiled = []
+    seen = set()
+    for definition in definitions:
+        try:
+            rule = _compile_rule(definition, seen)
+        except ValueError as e:
+            if not skip_invalid:
+                raise
+            logger.error(f"Skipping malformed AML rule in rule set {version}: {e}")
+            continue
+        if rule is not None:
+            compiled.append(rule)
+
+    by_scope: Dict[str, List[CompiledRule]] = {}
+    by_event_type: Dict[str, List[CompiledRule]] = {}
+    for rule in compiled:
+        for scope in rule.scopes:
+            by_scope.setdefault(scope, []).append(rule)
+        if SCOPE_STREAM in rule.scopes:
+            for event_type in rule.event_types:
+                by_event_type.setdefault(event_type, []).append(rule)
+
+    return RuleSet(
+        version=version,
+        rules=tuple(compiled),
+        by_scope={scope: tuple(rules) for scope, rules in by_scope.items()},
+        by_event_type={event_type: tuple(rules) for event_type, rules in by_event_type.items()},
+        by_id={rule.rule_id: rule for rule in compiled}
+    )
+
+
+class RuleEngine:
+    """Holds the current compiled rule set and hot-reloads it from the rule store"""
+
+    def __init__(self, definitions: Optional[List[Dict[str, Any]]] = None, reload_interval_seconds: int = 30):
+        self.reload_interval_seconds = reload_interval_seconds
+        self._rule_set = compile_rules(definitions or DEFAULT_RULES)
+        self._stored_digest: Optional[str] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def rule_set(self) -> RuleSet:
+        return self._rule_set
+
+    def rules_for(self, scope: str) -> Tuple[CompiledRule, ...]:
+        """Compiled rules that run in a scope"""
+        return self._rule_set.by_scope.get(scope, ())
+
+    def rules_for_event(self, event_type: str) -> Tuple[CompiledRule, ...]:
+        """Compiled streaming rules subscribed to an event type"""
+        return self._rule_set.by_event_type.get(event_type, ())
+
+    def rule(self, rule_id: str) -> Optional[CompiledRule]:
+        """A compiled rule by id, or None when it is missing or disabled"""
+        return self._rule_set.by_id.get(rule_id)
+
+    def ensure_current(self, db: Session) -> bool:
+        """Reload from the rule store once the reload interval has elapsed"""
+        if time.time() - self._last_check < self.reload_interval_seconds:
+            return False
+        return self.reload(db)
+
+    def reload(self, db: Session) -> bool:
+        """Recompile and swap in the stored rules if they changed; returns True on swap"""
+        self._last_check = time.time()
+
+        config = db.query(SystemConfiguration).filter(
+            SystemConfiguration.config_key == RULES_CONFIG_KEY,
+            SystemConfiguration.is_active == True
+        ).first()
+        if not config or not config.config_value:
+            return False
+
+        digest = hashlib.sha256(config.config_value.encode()).hexdigest()
+        if digest == self._stored_digest:
+            return False
+
+        with self._lock:
+            try:
+                rule_set = compile_rules(
+                    json.loads(config.config_value), version=digest[:12], skip_invalid=True
+                )
+            except (ValueError, TypeError) as e:
+                # Keep serving the previous rules until the stored definition is fixed
+                logger.error(f"Rejected AML rule definition {digest[:12]}: {e}")
+                self._stored_digest = digest
+                return False
+
+            # A single reference assignment; evaluators pick up the new set on their next call
+            self._rule_set = rule_set
+            self._stored_digest = digest
+
+        logger.info(f"Loaded AML rule set {rule_set.version} with {len(rule_set.rules)} rules")
+        return True
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Current rule set version and contents"""
+        rule_set = self._rule_set
+        return {
+            "version": rule_set.version,
+            "loaded_at": rule_set.loaded_at.isoformat(),
+            "rules": [
+                {"id": rule.rule_id, "type": rule.rule_type, "version": rule.version, "scopes": list(rule.scopes)}
+                for rule in rule_set.rules
+            ]
+        }
+
+
+rule_engine: Optional[RuleEngine] = None
+
+
+def get_rule_engine() -> RuleEngine:
+    """Get the global AML rule engine"""
+    global rule_engine
+    if rule_engine is None:
+        rule_engine = RuleEngine()
+    return rule_engine
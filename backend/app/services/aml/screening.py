@@ -1,19 +1,45 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from sqlalchemy.orm import Session
 from datetime import datetime
 from difflib import SequenceMatcher
-import re
+from concurrent.futures import ProcessPoolExecutor
+import json
+import logging
+import os
+import time
+import uuid
 
-from app.models.aml import WatchlistEntry, ScreeningResult, CustomerProfile, Transaction
+from app.models.aml import ScreeningResult, CustomerProfile, Transaction
 from app.models.aml.sanctions import MatchStatus
+from app.services.aml.screening_index import WatchlistScreeningIndex, get_watchlist_index, normalize_name
 
+logger = logging.getLogger(__name__)
+
+# Read-only copy of the index held by each bulk screening worker process
+_worker_index: Optional[WatchlistScreeningIndex] = None
+
+
+def _init_screening_worker(index: WatchlistScreeningIndex) -> None:
+    global _worker_index
+    _worker_index = index
+
+
+def _match_search_terms(
+    terms: List[Tuple[int, str]],
+    threshold: float
+) -> List[Tuple[int, str, List[Dict[str, Any]]]]:
+    return [
+        (customer_id, term, _worker_index.search(term, threshold))
+        for customer_id, term in terms
+    ]
 
 class ScreeningService:
     """Service for screening customers and transactions against watchlists and sanctions"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, index: Optional[WatchlistScreeningIndex] = None):
         self.db = db
         self.match_threshold = 0.85  # 85% similarity threshold
+        self.index = index or get_watchlist_index()
     
     def screen_customer(
         self,
@@ -54,6 +80,147 @@ class ScreeningService:
         self.db.commit()
         return results
     
+    def screen_customers_bulk(
+        self,
+        screening_type: str = "periodic",
+        chunk_size: int = 1000,
+        workers: Optional[int] = None,
+        checkpoint_path: Optional[str] = None,
+        start_after_id: int = 0
+    ) -> Dict[str, Any]:
+        """Re-screen all active customers in keyset-paginated chunks
+        
+        Matching fans out over a process pool holding a read-only copy of the
+        watchlist index. Each chunk is written with one bulk insert and one
+        commit, and the last committed customer id is recorded in
+        ``checkpoint_path`` so an interrupted run resumes where it stopped.
+        A resumed run first drops the results the interrupted run committed
+        after its last checkpoint.
+        """
+        
+        self.index.ensure_current(self.db)
+        
+        checkpoint = self._load_bulk_checkpoint(checkpoint_path)
+        last_id = max(start_after_id, checkpoint.get("last_customer_id", 0))
+        run_id = checkpoint.get("run_id") or (
+            f"{datetime.utcnow().strftime('%Y%m%d%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+        )
+        if checkpoint.get("run_id"):
+            # The interrupted run may have committed a chunk it never got to
+            # checkpoint; those ids would collide with the re-screened ones
+            self.db.query(ScreeningResult).filter(
+                ScreeningResult.customer_id > last_id,
+                ScreeningResult.screening_id.like(f"SCR-%-{run_id}-%")
+            ).delete(synchronize_session=False)
+            self.db.commit()
+        
+        workers = workers if workers is not None else (os.cpu_count() or 1)
+        executor = None
+        if workers > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_screening_worker,
+                initargs=(self.index,)
+            )
+        
+        started = time.time()
+        customers_screened = 0
+        matches_found = 0
+        chunks = 0
+        
+        try:
+            while True:
+                customers = self.db.query(
+                    CustomerProfile.id,
+                    CustomerProfile.first_name,
+                    CustomerProfile.last_name,
+                    CustomerProfile.company_name,
+                    CustomerProfile.account_name
+                ).filter(
+                    CustomerProfile.is_active == True,
+                    CustomerProfile.id > last_id
+                ).order_by(CustomerProfile.id).limit(chunk_size).all()
+                
+                if not customers:
+                    break
+                
+                terms = [
+                    (customer.id, term)
+                    for customer in customers
+                    for term in self._prepare_customer_search_terms(customer)
+                ]
+                
+                if executor:
+                    slice_size = max(1, -(-len(terms) // workers))
+                    slices = [terms[i:i + slice_size] for i in range(0, len(terms), slice_size)]
+                    futures = [
+                        executor.submit(_match_search_terms, terms_slice, self.match_threshold)
+                        for terms_slice in slices
+                    ]
+                    matched = [row for future in futures for row in future.result()]
+                else:
+                    matched = [
+                        (customer_id, term, self.index.search(term, self.match_threshold))
+                        for customer_id, term in terms
+                    ]
+                
+                screening_date = datetime.utcnow()
+                rows = []
+                for customer_id, term, matches in matched:
+                    for match in matches:
+                        rows.append({
+                            "screening_id": f"SCR-{customer_id}-{run_id}-{len(rows)}",
+                            "customer_id": customer_id,
+                            "screening_type": screening_type,
+                            "screening_date": screening_date,
+                            "searched_name": term,
+                            "watchlist_entry_id": match["entry_id"],
+                            "match_score": match["score"],
+                            "match_status": self._determine_match_status(match["score"]),
+                            "matched_fields": match["matched_fields"],
+                            "algorithm_used": match["algorithm"]
+                        })
+                
+                if rows:
+                    self.db.bulk_insert_mappings(ScreeningResult, rows)
+                self.db.commit()
+                
+                last_id = customers[-1].id
+                customers_screened += len(customers)
+                matches_found += len(rows)
+                chunks += 1
+                self._save_bulk_checkpoint(checkpoint_path, {
+                    "run_id": run_id,
+                    "last_customer_id": last_id,
+                    "updated_at": datetime.utcnow().isoformat()
+                })
+                
+                elapsed = time.time() - started
+                logger.info(
+                    f"Bulk screening chunk {chunks}: {customers_screened} customers, "
+                    f"{matches_found} matches, {customers_screened / max(elapsed, 1e-9):.1f} customers/s"
+                )
+        finally:
+            if executor:
+                executor.shutdown()
+        
+        # A completed run starts from the beginning next time
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        
+        elapsed = time.time() - started
+        return {
+            "run_id": run_id,
+            "screening_type": screening_type,
+            "customers_screened": customers_screened,
+            "matches_found": matches_found,
+            "chunks": chunks,
+            "last_customer_id": last_id,
+            "workers": workers,
+            "elapsed_seconds": elapsed,
+            "customers_per_second": customers_screened / elapsed if elapsed > 0 else 0.0
+        }
+    
     def screen_transaction(
         self,
         transaction_id: int
@@ -114,60 +281,39 @@ class ScreeningService:
         
         return terms
     
+    def _load_bulk_checkpoint(self, checkpoint_path: Optional[str]) -> Dict[str, Any]:
+        """Load a bulk screening checkpoint if one exists"""
+        if not checkpoint_path or not os.path.exists(checkpoint_path):
+            return {}
+        
+        with open(checkpoint_path) as f:
+            return json.load(f)
+    
+    def _save_bulk_checkpoint(self, checkpoint_path: Optional[str], checkpoint: Dict[str, Any]) -> None:
+        """Atomically persist a bulk screening checkpoint"""
+        if not checkpoint_path:
+            return
+        
+        directory = os.path.dirname(checkpoint_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        tmp_path = f"{checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, checkpoint_path)
+    
     def _search_watchlists(self, search_term: str) -> List[Dict[str, Any]]:
         """Search all active watchlists for matches"""
         
-        # Normalize search term
-        normalized_term = self._normalize_name(search_term)
-        
-        # Query all active watchlist entries
-        entries = self.db.query(WatchlistEntry).filter(
-            WatchlistEntry.is_active == True
-        ).all()
-        
-        matches = []
-        for entry in entries:
-            # Check main name
-            score = self._calculate_similarity(normalized_term, self._normalize_name(entry.full_name))
-            if score > self.match_threshold:
-                matches.append({
-                    "entry_id": entry.id,
-                    "score": score * 100,
-                    "matched_fields": {"full_name": entry.full_name},
-                    "algorithm": "fuzzy"
-                })
-                continue
-            
-            # Check aliases
-            if entry.aliases:
-                for alias in entry.aliases:
-                    alias_score = self._calculate_similarity(normalized_term, self._normalize_name(alias))
-                    if alias_score > self.match_threshold:
-                        matches.append({
-                            "entry_id": entry.id,
-                            "score": alias_score * 100,
-                            "matched_fields": {"alias": alias},
-                            "algorithm": "fuzzy"
-                        })
-                        break
+        # Build on first use, then pick up watchlist changes incrementally
+        self.index.ensure_current(self.db)
         
-        return matches
+        return self.index.search(search_term, self.match_threshold)
     
     def _normalize_name(self, name: str) -> str:
         """Normalize a name for comparison"""
-        if not name:
-            return ""
-        
-        # Convert to lowercase
-        name = name.lower()
-        
-        # Remove special characters
-        name = re.sub(r'[^\w\s]', ' ', name)
-        
-        # Remove extra spaces
-        name = ' '.join(name.split())
-        
-        return name
+        return normalize_name(name)
     
     def _calculate_similarity(self, str1: str, str2: str) -> float:
         """Calculate similarity between two strings"""
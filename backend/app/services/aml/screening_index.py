@@ -0,0 +1,335 @@
+"""
+In-process watchlist screening index
+Blocks candidates by character bigrams and ranks them with a C-backed upper bound
+before the exact SequenceMatcher score used by ScreeningService
+"""
+
+from typing import Dict, Any, List, Optional, Set, Tuple
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from datetime import datetime
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+import logging
+import math
+import re
+import threading
+import time
+
+from app.models.aml import WatchlistEntry
+
+try:
+    import Levenshtein
+    LEVENSHTEIN_AVAILABLE = True
+except ImportError:
+    LEVENSHTEIN_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+NGRAM_SIZE = 2
+FULL_NAME_POSITION = -1
+
+
+def normalize_name(name: str) -> str:
+    """Normalize a name for comparison"""
+    if not name:
+        return ""
+
+    # Convert to lowercase
+    name = name.lower()
+
+    # Remove special characters
+    name = re.sub(r'[^\w\s]', ' ', name)
+
+    # Remove extra spaces
+    name = ' '.join(name.split())
+
+    return name
+
+
+def name_ngrams(normalized: str) -> frozenset:
+    """Distinct character n-grams of a normalized name"""
+    return frozenset(
+        normalized[i:i + NGRAM_SIZE] for i in range(len(normalized) - NGRAM_SIZE + 1)
+    )
+
+
+@dataclass(frozen=True)
+class IndexedName:
+    """A single screenable name (full name or alias) of a watchlist entry"""
+    entry_id: int
+    position: int  # FULL_NAME_POSITION for the full name, alias index otherwise
+    value: str
+    normalized: str
+    ngrams: frozenset
+
+
+class WatchlistScreeningIndex:
+    """
+    Screening index over active watchlist names.
+
+    Candidate blocking is lossless for SequenceMatcher thresholds: a name scoring
+    above ``threshold`` is within ``floor((l1 + l2) * (1 - threshold))`` insert/delete
+    edits of the search term, and each edit can remove at most two of the term's
+    distinct bigrams, so such a name always shares enough bigrams to be found.
+    """
+
+    def __init__(self, refresh_interval_seconds: int = 60):
+        self.refresh_interval_seconds = refresh_interval_seconds
+
+        self._names: Dict[int, IndexedName] = {}
+        self._entry_slots: Dict[int, List[int]] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self._length_buckets: Dict[int, Set[int]] = {}
+        self._next_slot = 0
+
+        # Keyset position (updated_at, id) of the newest entry applied so far
+        self._high_water_mark: Optional[datetime] = None
+        self._high_water_id: int = 0
+        self._last_refresh: float = 0.0
+        self._built = False
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    @property
+    def is_built(self) -> bool:
+        return self._built
+
+    def build(self, db: Session) -> int:
+        """Build the index from every active watchlist entry"""
+        started = time.time()
+
+        entries = db.query(WatchlistEntry).filter(
+            WatchlistEntry.is_active == True
+        ).all()
+
+        with self._lock:
+            self._names.clear()
+            self._entry_slots.clear()
+            self._postings.clear()
+            self._length_buckets.clear()
+            self._next_slot = 0
+            self._high_water_mark = None
+            self._high_water_id = 0
+
+            for entry in entries:
+                self._add_entry(entry)
+                self._advance_high_water_mark(entry)
+
+            self._built = True
+            self._last_refresh = time.time()
+
+        logger.info(
+            f"Built watchlist screening index: {len(entries)} entries, "
+            f"{len(self._names)} names in {time.time() - started:.2f}s"
+        )
+        return len(entries)
+
+    def refresh(self, db: Session) -> int:
+        """Apply watchlist entries changed since the last build or refresh"""
+        if not self._built:
+            return self.build(db)
+
+        # Entries sharing the boundary timestamp are told apart by id, so none
+        # is skipped or re-applied across refreshes
+        query = db.query(WatchlistEntry)
+        if self._high_water_mark is not None:
+            query = query.filter(or_(
+                WatchlistEntry.updated_at > self._high_water_mark,
+                and_(
+                    WatchlistEntry.updated_at == self._high_water_mark,
+                    WatchlistEntry.id > self._high_water_id
+                )
+            ))
+        changed = query.order_by(WatchlistEntry.updated_at, WatchlistEntry.id).all()
+
+        with self._lock:
+            for entry in changed:
+                self.upsert_entry(entry)
+                self._advance_high_water_mark(entry)
+            self._last_refresh = time.time()
+
+        if changed:
+            logger.info(f"Refreshed watchlist screening index with {len(changed)} changed entries")
+        return len(changed)
+
+    def ensure_current(self, db: Session) -> None:
+        """Build on first use and refresh once the refresh interval has elapsed"""
+        if not self._built:
+            self.build(db)
+        elif time.time() - self._last_refresh >= self.refresh_interval_seconds:
+            self.refresh(db)
+
+    def upsert_entry(self, entry: WatchlistEntry) -> None:
+        """Index an entry, replacing any previous version; inactive entries are removed"""
+        with self._lock:
+            self.remove_entry(entry.id)
+            if entry.is_active:
+                self._add_entry(entry)
+
+    def remove_entry(self, entry_id: int) -> None:
+        """Drop all names of an entry from the index"""
+        with self._lock:
+            for slot in self._entry_slots.pop(entry_id, []):
+                name = self._names.pop(slot)
+                for gram in name.ngrams:
+                    posting = self._postings.get(gram)
+                    if posting is not None:
+                        posting.discard(slot)
+                        if not posting:
+                            del self._postings[gram]
+                bucket = self._length_buckets.get(len(name.normalized))
+                if bucket is not None:
+                    bucket.discard(slot)
+                    if not bucket:
+                        del self._length_buckets[len(name.normalized)]
+
+    def search(self, search_term: str, threshold: float) -> List[Dict[str, Any]]:
+        """Return watchlist matches for a search term, one per entry"""
+        normalized_term = normalize_name(search_term)
+
+        with self._lock:
+            scored = self._score_candidates(normalized_term, threshold)
+
+            # Full name takes precedence, then the first matching alias
+            best: Dict[int, Tuple[IndexedName, float]] = {}
+            for name, score in scored:
+                current = best.get(name.entry_id)
+                if current is None or name.position < current[0].position:
+                    best[name.entry_id] = (name, score)
+
+        matches = []
+        for entry_id in sorted(best):
+            name, score = best[entry_id]
+            field = "full_name" if name.position == FULL_NAME_POSITION else "alias"
+            matches.append({
+                "entry_id": entry_id,
+                "score": score * 100,
+                "matched_fields": {field: name.value},
+                "algorithm": "fuzzy"
+            })
+
+        return matches
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Index size and freshness"""
+        return {
+            "entries": len(self._entry_slots),
+            "names": len(self._names),
+            "ngrams": len(self._postings),
+            "built": self._built,
+            "high_water_mark": self._high_water_mark.isoformat() if self._high_water_mark else None,
+            "c_scorer": LEVENSHTEIN_AVAILABLE
+        }
+
+    def _add_entry(self, entry: WatchlistEntry) -> None:
+        slots = []
+        names = [(FULL_NAME_POSITION, entry.full_name)]
+        if entry.aliases:
+            names.extend(enumerate(entry.aliases))
+
+        for position, value in names:
+            if not isinstance(value, str):
+                continue
+            normalized = normalize_name(value)
+            slot = self._next_slot
+            self._next_slot += 1
+
+            name = IndexedName(
+                entry_id=entry.id,
+                position=position,
+                value=value,
+                normalized=normalized,
+                ngrams=name_ngrams(normalized)
+            )
+            self._names[slot] = name
+            for gram in name.ngrams:
+                self._postings.setdefault(gram, set()).add(slot)
+            self._length_buckets.setdefault(len(normalized), set()).add(slot)
+            slots.append(slot)
+
+        self._entry_slots[entry.id] = slots
+
+    def _advance_high_water_mark(self, entry: WatchlistEntry) -> None:
+        if not entry.updated_at:
+            return
+        if (
+            self._high_water_mark is None
+            or (entry.updated_at, entry.id) > (self._high_water_mark, self._high_water_id)
+        ):
+            self._high_water_mark = entry.updated_at
+            self._high_water_id = entry.id
+
+    def _score_candidates(self, normalized_term: str, threshold: float) -> List[Tuple[IndexedName, float]]:
+        term_length = len(normalized_term)
+        term_grams = name_ngrams(normalized_term)
+        slack = 1 - threshold
+
+        # ratio <= 2 * min(l1, l2) / (l1 + l2) bounds the candidate length
+        min_length = math.floor(term_length * threshold / (2 - threshold))
+        max_length = math.ceil(term_length * (2 - threshold) / threshold)
+        max_edits = math.floor((term_length + max_length) * slack + 1e-9)
+        required = len(term_grams) - 2 * max_edits
+
+        if required >= 1:
+            # Any name sharing `required` grams shares one of the rarest n - required + 1
+            rarest = sorted(term_grams, key=lambda gram: len(self._postings.get(gram, ())))
+            candidates = set()
+            for gram in rarest[:len(term_grams) - required + 1]:
+                candidates.update(self._postings.get(gram, ()))
+        else:
+            candidates = set()
+            for length in range(min_length, max_length + 1):
+                candidates.update(self._length_buckets.get(length, ()))
+
+        scores: Dict[str, float] = {}
+        results = []
+        for slot in candidates:
+            name = self._names[slot]
+            candidate = name.normalized
+            length = len(candidate)
+            if length < min_length or length > max_length:
+                continue
+
+            edits = math.floor((term_length + length) * slack + 1e-9)
+            if len(term_grams & name.ngrams) < len(term_grams) - 2 * edits:
+                continue
+
+            score = scores.get(candidate)
+            if score is None:
+                score = self._similarity(normalized_term, candidate, threshold)
+                scores[candidate] = score
+            if score > threshold:
+                results.append((name, score))
+
+        return results
+
+    def _similarity(self, term: str, candidate: str, threshold: float) -> float:
+        # Indel ratio is 2 * LCS / (l1 + l2), an upper bound of SequenceMatcher.ratio
+        if LEVENSHTEIN_AVAILABLE:
+            if Levenshtein.ratio(term, candidate) <= threshold:
+                return 0.0
+
+        matcher = SequenceMatcher(None, term, candidate)
+        if matcher.quick_ratio() <= threshold:
+            return 0.0
+        return matcher.ratio()
+
+
+watchlist_index: Optional[WatchlistScreeningIndex] = None
+
+
+def get_watchlist_index() -> WatchlistScreeningIndex:
+    """Get the global watchlist screening index"""
+    global watchlist_index
+    if watchlist_index is None:
+        watchlist_index = WatchlistScreeningIndex()
+    return watchlist_index
@@ -1,64 +1,72 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from sqlalchemy import func, or_
+import numpy as np
+import pandas as pd
 import re
+import logging
 
 from app.models.aml import Transaction, TransactionAlert, CustomerProfile
 from app.models.aml.transaction import AlertSeverity, TransactionType
+from app.services.aml.rule_engine import (
+    RuleEngine,
+    CompiledRule,
+    SqlTransactionHistory,
+    TransactionHistory,
+    SCOPE_BATCH,
+    get_rule_engine,
+    transaction_facts
+)
+from app.services.aml.customer_state import CustomerStateStore, StateStoreHistory, get_customer_state_store
+from app.services.aml.ml_prediction_engine import MLPredictionEngine, get_ml_engine
+
+logger = logging.getLogger(__name__)
+
+# Columns loaded for batch monitoring
+BATCH_COLUMNS = [
+    Transaction.id,
+    Transaction.customer_id,
+    Transaction.transaction_type,
+    Transaction.transaction_date,
+    Transaction.amount,
+    Transaction.currency,
+    Transaction.originating_country,
+    Transaction.destination_country,
+    Transaction.counterparty_country
+]
 
 
 class TransactionMonitoringService:
     """Service for monitoring transactions and detecting suspicious patterns"""
     
-    def __init__(self, db: Session):
+    def __init__(
+        self,
+        db: Session,
+        rule_engine: Optional[RuleEngine] = None,
+        state_store: Optional[CustomerStateStore] = None,
+        ml_engine: Optional[MLPredictionEngine] = None
+    ):
         self.db = db
+        self.ml_engine = ml_engine or get_ml_engine()
+        
+        # Window rules read the in-memory customer state once it is warm
+        self.state_store = state_store or get_customer_state_store()
+        sql_history = SqlTransactionHistory(db)
+        if self.state_store.is_warm:
+            self.state_store.ensure_current(db)
+            self.history = StateStoreHistory(self.state_store, fallback=sql_history)
+        else:
+            self.history = sql_history
         
-        # Define monitoring rules
-        self.rules = [
-            {
-                "id": "R001",
-                "name": "Large Cash Transaction",
-                "type": "amount_threshold",
-                "params": {"amount": 10000, "types": ["cash", "deposit", "withdrawal"]}
-            },
-            {
-                "id": "R002",
-                "name": "Rapid Movement of Funds",
-                "type": "velocity",
-                "params": {"hours": 24, "count": 5, "amount": 5000}
-            },
-            {
-                "id": "R003",
-                "name": "Structuring Pattern",
-                "type": "structuring",
-                "params": {"threshold": 10000, "margin": 500, "period_hours": 24}
-            },
-            {
-                "id": "R004",
-                "name": "High Risk Country",
-                "type": "geographic",
-                "params": {"countries": ["IR", "KP", "SY", "YE", "AF", "MM"]}
-            },
-            {
-                "id": "R005",
-                "name": "Unusual Time Pattern",
-                "type": "timing",
-                "params": {"hours": [2, 3, 4, 5]}
-            },
-            {
-                "id": "R006",
-                "name": "Round Amount Pattern",
-                "type": "round_amount",
-                "params": {"divisor": 1000, "min_amount": 5000}
-            },
-            {
-                "id": "R007",
-                "name": "Dormant Account Sudden Activity",
-                "type": "dormancy",
-                "params": {"dormant_days": 180, "amount": 5000}
-            }
-        ]
+        # Monitoring rules are compiled from the rule store and hot-reloaded
+        self.rule_engine = rule_engine or get_rule_engine()
+        self.rule_engine.ensure_current(db)
+    
+    @property
+    def rules(self) -> List[Dict[str, Any]]:
+        """Definitions of the batch monitoring rules currently in force"""
+        return [rule.definition for rule in self.rule_engine.rules_for(SCOPE_BATCH)]
     
     def monitor_transaction(self, transaction_id: int) -> Dict[str, Any]:
         """Monitor a single transaction for suspicious patterns"""
@@ -72,27 +80,33 @@ class TransactionMonitoringService:
         
         alerts = []
         risk_indicators = []
+        facts = transaction_facts(transaction)
+        now = datetime.utcnow()
         
-        # Apply each rule
-        for rule in self.rules:
-            result = self._apply_rule(transaction, rule)
-            if result["triggered"]:
+        # Apply each compiled rule
+        for rule in self.rule_engine.rules_for(SCOPE_BATCH):
+            result = rule.predicate(facts, self.history, now)
+            if result:
                 alerts.append({
-                    "alert_type": rule["type"],
-                    "title": rule["name"],
+                    "alert_type": rule.rule_type,
+                    "title": rule.name,
                     "description": result["description"],
                     "severity": result["severity"],
-                    "rule_id": rule["id"],
-                    "rule_name": rule["name"],
+                    "rule_id": rule.rule_id,
+                    "rule_name": rule.name,
                     "score": result.get("score", 50),
                     "details": result.get("details", {})
                 })
-                risk_indicators.append(rule["name"])
+                risk_indicators.append(rule.name)
         
         # Check for pattern combinations
         pattern_alerts = self._check_pattern_combinations(transaction, risk_indicators)
         alerts.extend(pattern_alerts)
         
+        if self.state_store.is_warm:
+            self.state_store.ingest(facts)
+        self.ml_engine.record_transaction(facts)
+        
         return {
             "transaction_id": transaction_id,
             "alerts": alerts,
@@ -101,208 +115,473 @@ class TransactionMonitoringService:
             "max_severity": max([a["severity"] for a in alerts]) if alerts else None
         }
     
-    def _apply_rule(self, transaction: Transaction, rule: Dict[str, Any]) -> Dict[str, Any]:
-        """Apply a specific monitoring rule to a transaction"""
+    def monitor_batch(
+        self,
+        transaction_ids: Optional[List[int]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        chunk_size: int = 50000
+    ) -> List[Dict[str, Any]]:
+        """Monitor a batch of transactions with set-based rule evaluation
+        
+        The batch is selected by ``transaction_ids`` or a ``start_date``/``end_date``
+        range. Each chunk loads the customer histories it needs in one windowed
+        query and evaluates every rule as column operations. Results have the
+        same shape as ``monitor_transaction`` and are ordered by transaction id.
+        """
+        
+        if transaction_ids is None and start_date is None and end_date is None:
+            raise ValueError("Either transaction_ids or a time range is required")
+        
+        now = datetime.utcnow()
+        results = []
+        
+        if transaction_ids is not None:
+            ids = sorted(set(transaction_ids))
+            for i in range(0, len(ids), chunk_size):
+                rows = self.db.query(*BATCH_COLUMNS).filter(
+                    Transaction.id.in_(ids[i:i + chunk_size])
+                ).order_by(Transaction.id).all()
+                if rows:
+                    results.extend(self._monitor_frame(self._to_batch_frame(rows), now))
+            return results
+        
+        last_id = 0
+        while True:
+            query = self.db.query(*BATCH_COLUMNS).filter(Transaction.id > last_id)
+            if start_date:
+                query = query.filter(Transaction.transaction_date >= start_date)
+            if end_date:
+                query = query.filter(Transaction.transaction_date <= end_date)
+            
+            rows = query.order_by(Transaction.id).limit(chunk_size).all()
+            if not rows:
+                break
+            
+            batch = self._to_batch_frame(rows)
+            results.extend(self._monitor_frame(batch, now))
+            last_id = int(batch["id"].iloc[-1])
+        
+        return results
+    
+    def _to_batch_frame(self, rows: List[Any]) -> pd.DataFrame:
+        """Build the batch DataFrame from transaction rows"""
+        
+        batch = pd.DataFrame(rows, columns=[column.key for column in BATCH_COLUMNS])
+        batch["transaction_type"] = batch["transaction_type"].map(
+            lambda t: t.value if t is not None else None
+        )
+        batch["transaction_date"] = pd.to_datetime(batch["transaction_date"])
+        batch["amount"] = batch["amount"].astype(float)
+        batch["has_customer"] = batch["customer_id"].notna()
+        # Transactions without a customer share one history, as in the per-transaction queries
+        batch["customer_key"] = batch["customer_id"].fillna(-1).astype(np.int64)
+        return batch
+    
+    def _monitor_frame(self, batch: pd.DataFrame, now: datetime) -> List[Dict[str, Any]]:
+        """Evaluate all rules over a batch and assemble per-transaction results"""
+        
+        # One rule set snapshot for the whole frame, even if a reload lands meanwhile
+        rules = self.rule_engine.rules_for(SCOPE_BATCH)
+        history, last_before_window = self._load_batch_history(batch, rules, now)
+        
+        rule_results = [
+            (rule, self._apply_rule_batch(batch, history, last_before_window, rule, now))
+            for rule in rules
+        ]
+        
+        results = []
+        for position, transaction_id in enumerate(batch["id"]):
+            alerts = []
+            risk_indicators = []
+            
+            for rule, triggered in rule_results:
+                result = triggered.get(position)
+                if result:
+                    alerts.append({
+                        "alert_type": rule.rule_type,
+                        "title": rule.name,
+                        "description": result["description"],
+                        "severity": result["severity"],
+                        "rule_id": rule.rule_id,
+                        "rule_name": rule.name,
+                        "score": result.get("score", 50),
+                        "details": result.get("details", {})
+                    })
+                    risk_indicators.append(rule.name)
+            
+            alerts.extend(self._check_pattern_combinations(None, risk_indicators))
+            
+            results.append({
+                "transaction_id": int(transaction_id),
+                "alerts": alerts,
+                "risk_indicators": risk_indicators,
+                "total_alerts": len(alerts),
+                "max_severity": max([a["severity"] for a in alerts]) if alerts else None
+            })
+        
+        return results
+    
+    def _longest_window(self, rules: Tuple[CompiledRule, ...], rule_type: str, key: str) -> Optional[float]:
+        """Largest window parameter over all rules of a type, if any is configured"""
+        windows = [rule.params[key] for rule in rules if rule.rule_type == rule_type]
+        return max(windows) if windows else None
+    
+    def _load_batch_history(
+        self,
+        batch: pd.DataFrame,
+        rules: Tuple[CompiledRule, ...],
+        now: datetime
+    ) -> Tuple[pd.DataFrame, pd.Series]:
+        """Load the customer histories needed by the window rules
+        
+        Returns the transactions of the batch customers since the earliest window
+        start, and each customer's last transaction date before that window.
+        """
+        
+        # Every rule of a type shares the history, so it must cover the longest window
+        window_starts = []
+        for rule_type, key in (("velocity", "hours"), ("structuring", "period_hours")):
+            hours = self._longest_window(rules, rule_type, key)
+            if hours is not None:
+                window_starts.append(now - timedelta(hours=hours))
+        dormant_days = self._longest_window(rules, "dormancy", "dormant_days")
+        if dormant_days is not None:
+            window_starts.append(batch["transaction_date"].min().to_pydatetime() - timedelta(days=dormant_days))
+        
+        columns = ["id", "customer_key", "transaction_date", "amount"]
+        if not window_starts:
+            return pd.DataFrame(columns=columns), pd.Series(dtype="datetime64[ns]")
+        window_start = min(window_starts)
+        
+        customer_ids = [int(c) for c in batch.loc[batch["has_customer"], "customer_key"].unique()]
+        customer_filter = Transaction.customer_id.in_(customer_ids)
+        if not batch["has_customer"].all():
+            customer_filter = or_(customer_filter, Transaction.customer_id.is_(None))
+        
+        rows = self.db.query(
+            Transaction.id,
+            Transaction.customer_id,
+            Transaction.transaction_date,
+            Transaction.amount
+        ).filter(
+            customer_filter,
+            Transaction.transaction_date >= window_start
+        ).all()
         
-        rule_type = rule["type"]
-        params = rule["params"]
+        history = pd.DataFrame(rows, columns=columns)
+        history["customer_key"] = history["customer_key"].fillna(-1).astype(np.int64)
+        history["transaction_date"] = pd.to_datetime(history["transaction_date"])
+        history["amount"] = history["amount"].astype(float)
+        
+        last_before_window = pd.Series(dtype="datetime64[ns]")
+        if dormant_days is not None and customer_ids:
+            rows = self.db.query(
+                Transaction.customer_id,
+                func.max(Transaction.transaction_date)
+            ).filter(
+                Transaction.customer_id.in_(customer_ids),
+                Transaction.transaction_date < window_start
+            ).group_by(Transaction.customer_id).all()
+            if rows:
+                last_before_window = pd.Series(
+                    pd.to_datetime([row[1] for row in rows]),
+                    index=[int(row[0]) for row in rows]
+                )
+        
+        return history, last_before_window
+    
+    def _apply_rule_batch(
+        self,
+        batch: pd.DataFrame,
+        history: pd.DataFrame,
+        last_before_window: pd.Series,
+        rule: CompiledRule,
+        now: datetime
+    ) -> Dict[int, Dict[str, Any]]:
+        """Apply a monitoring rule to a batch; returns results keyed by row position"""
+        
+        rule_type = rule.rule_type
+        params = rule.params
         
         if rule_type == "amount_threshold":
-            return self._check_amount_threshold(transaction, params)
+            return self._check_amount_threshold_batch(batch, params)
         elif rule_type == "velocity":
-            return self._check_velocity(transaction, params)
+            return self._check_velocity_batch(batch, history, params, now)
         elif rule_type == "structuring":
-            return self._check_structuring(transaction, params)
+            return self._check_structuring_batch(batch, history, params, now)
         elif rule_type == "geographic":
-            return self._check_geographic(transaction, params)
+            return self._check_geographic_batch(batch, params)
         elif rule_type == "timing":
-            return self._check_timing(transaction, params)
+            return self._check_timing_batch(batch, params)
         elif rule_type == "round_amount":
-            return self._check_round_amount(transaction, params)
+            return self._check_round_amount_batch(batch, params)
         elif rule_type == "dormancy":
-            return self._check_dormancy(transaction, params)
+            return self._check_dormancy_batch(batch, history, last_before_window, params)
+        elif not rule.stateful:
+            return self._evaluate_rule_rows(batch, rule, now)
         else:
-            return {"triggered": False}
+            # No vectorized form and no preloaded history: ask the same history
+            # as monitor_transaction, one row at a time
+            logger.warning(f"Stateful rule {rule.rule_id} of type {rule_type} has no batch form; evaluating it row by row")
+            return self._evaluate_rule_rows(batch, rule, now, self.history)
     
-    def _check_amount_threshold(self, transaction: Transaction, params: Dict) -> Dict[str, Any]:
-        """Check if transaction exceeds amount threshold"""
-        
-        if transaction.transaction_type.value in params.get("types", []):
-            if transaction.amount >= params["amount"]:
-                return {
-                    "triggered": True,
-                    "description": f"Large {transaction.transaction_type.value} transaction of {transaction.amount} {transaction.currency}",
-                    "severity": AlertSeverity.HIGH if transaction.amount >= params["amount"] * 2 else AlertSeverity.MEDIUM,
-                    "score": min(100, (transaction.amount / params["amount"]) * 50),
-                    "details": {
-                        "amount": transaction.amount,
-                        "threshold": params["amount"],
-                        "type": transaction.transaction_type.value
-                    }
+    def _evaluate_rule_rows(
+        self,
+        batch: pd.DataFrame,
+        rule: CompiledRule,
+        now: datetime,
+        history: Optional[TransactionHistory] = None
+    ) -> Dict[int, Dict[str, Any]]:
+        """Evaluate a rule without a vectorized form row by row"""
+        
+        results = {}
+        columns = [column.key for column in BATCH_COLUMNS]
+        for position, row in enumerate(batch[columns].itertuples(index=False)):
+            facts = row._asdict()
+            facts["transaction_date"] = facts["transaction_date"].to_pydatetime()
+            if not batch["has_customer"].iat[position]:
+                facts["customer_id"] = None
+            result = rule.predicate(facts, history, now)
+            if result:
+                results[position] = result
+        return results
+    
+    def _check_amount_threshold_batch(self, batch: pd.DataFrame, params: Dict) -> Dict[int, Dict[str, Any]]:
+        """Vectorized amount threshold check"""
+        
+        threshold = params["amount"]
+        mask = batch["transaction_type"].isin(params.get("types", [])) & (batch["amount"] >= threshold)
+        
+        results = {}
+        for position in np.flatnonzero(mask.to_numpy()):
+            row = batch.iloc[position]
+            amount = row["amount"]
+            results[position] = {
+                "description": f"Large {row['transaction_type']} transaction of {amount} {row['currency']}",
+                "severity": AlertSeverity.HIGH if amount >= threshold * 2 else AlertSeverity.MEDIUM,
+                "score": min(100, (amount / threshold) * 50),
+                "details": {
+                    "amount": amount,
+                    "threshold": threshold,
+                    "type": row["transaction_type"]
                 }
-        
-        return {"triggered": False}
+            }
+        return results
     
-    def _check_velocity(self, transaction: Transaction, params: Dict) -> Dict[str, Any]:
-        """Check for rapid movement of funds"""
-        
-        if not transaction.customer_id:
-            return {"triggered": False}
-        
-        time_threshold = datetime.utcnow() - timedelta(hours=params["hours"])
-        
-        recent_transactions = self.db.query(Transaction).filter(
-            Transaction.customer_id == transaction.customer_id,
-            Transaction.transaction_date >= time_threshold,
-            Transaction.id != transaction.id
-        ).all()
-        
-        if len(recent_transactions) >= params["count"]:
-            total_amount = sum(t.amount for t in recent_transactions) + transaction.amount
-            if total_amount >= params["amount"]:
-                return {
-                    "triggered": True,
-                    "description": f"Rapid movement of funds: {len(recent_transactions)+1} transactions totaling {total_amount} in {params['hours']} hours",
-                    "severity": AlertSeverity.HIGH,
-                    "score": min(100, (len(recent_transactions) / params["count"]) * 60),
-                    "details": {
-                        "transaction_count": len(recent_transactions) + 1,
-                        "total_amount": total_amount,
-                        "period_hours": params["hours"]
-                    }
+    def _window_counts(
+        self,
+        batch: pd.DataFrame,
+        recent: pd.DataFrame,
+        window_start: datetime
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Per-row count and sum of other customer transactions in a window"""
+        
+        grouped = recent.groupby("customer_key")["amount"].agg(["count", "sum"])
+        counts = batch["customer_key"].map(grouped["count"]).fillna(0).to_numpy()
+        sums = batch["customer_key"].map(grouped["sum"]).fillna(0.0).to_numpy()
+        
+        # The transaction itself is part of its customer's history; exclude it
+        in_window = (batch["transaction_date"] >= window_start).to_numpy()
+        if "in_recent" in batch:
+            in_window = in_window & batch["in_recent"].to_numpy()
+        counts = counts - in_window
+        sums = sums - np.where(in_window, batch["amount"].to_numpy(), 0.0)
+        return counts.astype(np.int64), sums
+    
+    def _check_velocity_batch(
+        self,
+        batch: pd.DataFrame,
+        history: pd.DataFrame,
+        params: Dict,
+        now: datetime
+    ) -> Dict[int, Dict[str, Any]]:
+        """Vectorized rapid movement of funds check"""
+        
+        window_start = now - timedelta(hours=params["hours"])
+        recent = history[history["transaction_date"] >= window_start]
+        counts, sums = self._window_counts(batch, recent, window_start)
+        totals = sums + batch["amount"].to_numpy()
+        
+        mask = batch["has_customer"].to_numpy() & (counts >= params["count"]) & (totals >= params["amount"])
+        
+        results = {}
+        for position in np.flatnonzero(mask):
+            count = int(counts[position])
+            total_amount = float(totals[position])
+            results[position] = {
+                "description": f"Rapid movement of funds: {count+1} transactions totaling {total_amount} in {params['hours']} hours",
+                "severity": AlertSeverity.HIGH,
+                "score": min(100, (count / params["count"]) * 60),
+                "details": {
+                    "transaction_count": count + 1,
+                    "total_amount": total_amount,
+                    "period_hours": params["hours"]
                 }
-        
-        return {"triggered": False}
+            }
+        return results
     
-    def _check_structuring(self, transaction: Transaction, params: Dict) -> Dict[str, Any]:
-        """Check for potential structuring patterns"""
+    def _check_structuring_batch(
+        self,
+        batch: pd.DataFrame,
+        history: pd.DataFrame,
+        params: Dict,
+        now: datetime
+    ) -> Dict[int, Dict[str, Any]]:
+        """Vectorized structuring check"""
         
         threshold = params["threshold"]
         margin = params["margin"]
+        window_start = now - timedelta(hours=params["period_hours"])
         
-        # Check if amount is just below threshold
-        if threshold - margin <= transaction.amount < threshold:
-            # Look for similar transactions
-            time_threshold = datetime.utcnow() - timedelta(hours=params["period_hours"])
-            
-            similar_transactions = self.db.query(Transaction).filter(
-                Transaction.customer_id == transaction.customer_id,
-                Transaction.transaction_date >= time_threshold,
-                Transaction.amount >= threshold - margin,
-                Transaction.amount < threshold,
-                Transaction.id != transaction.id
-            ).count()
-            
-            if similar_transactions > 0:
-                return {
-                    "triggered": True,
-                    "description": f"Potential structuring: Multiple transactions just below {threshold} threshold",
-                    "severity": AlertSeverity.HIGH,
-                    "score": 80,
-                    "details": {
-                        "amount": transaction.amount,
-                        "threshold": threshold,
-                        "similar_count": similar_transactions
-                    }
-                }
+        near_threshold = (batch["amount"] >= threshold - margin) & (batch["amount"] < threshold)
+        recent = history[
+            (history["transaction_date"] >= window_start)
+            & (history["amount"] >= threshold - margin)
+            & (history["amount"] < threshold)
+        ]
+        counts, _ = self._window_counts(batch.assign(in_recent=near_threshold), recent, window_start)
+        
+        mask = near_threshold.to_numpy() & (counts > 0)
         
-        return {"triggered": False}
+        results = {}
+        for position in np.flatnonzero(mask):
+            results[position] = {
+                "description": f"Potential structuring: Multiple transactions just below {threshold} threshold",
+                "severity": AlertSeverity.HIGH,
+                "score": 80,
+                "details": {
+                    "amount": batch["amount"].iat[position],
+                    "threshold": threshold,
+                    "similar_count": int(counts[position])
+                }
+            }
+        return results
     
-    def _check_geographic(self, transaction: Transaction, params: Dict) -> Dict[str, Any]:
-        """Check for high-risk geographic locations"""
+    def _check_geographic_batch(self, batch: pd.DataFrame, params: Dict) -> Dict[int, Dict[str, Any]]:
+        """Vectorized high-risk geography check"""
         
         high_risk_countries = params["countries"]
-        
-        countries_to_check = [
-            transaction.originating_country,
-            transaction.destination_country,
-            transaction.counterparty_country
+        fields = [
+            ("originating", "originating_country"),
+            ("destination", "destination_country"),
+            ("counterparty", "counterparty_country")
         ]
         
-        for country in countries_to_check:
-            if country in high_risk_countries:
-                return {
-                    "triggered": True,
+        results = {}
+        for field, column in fields:
+            mask = batch[column].isin(high_risk_countries).to_numpy()
+            for position in np.flatnonzero(mask):
+                if position in results:
+                    continue
+                country = batch[column].iat[position]
+                # Report the first column holding this country, as the per-row check does
+                for first_field, first_column in fields:
+                    if batch[first_column].iat[position] == country:
+                        break
+                results[position] = {
                     "description": f"Transaction involves high-risk country: {country}",
                     "severity": AlertSeverity.HIGH,
                     "score": 90,
                     "details": {
                         "country": country,
-                        "field": "originating" if country == transaction.originating_country 
-                                else "destination" if country == transaction.destination_country 
-                                else "counterparty"
+                        "field": first_field
                     }
                 }
-        
-        return {"triggered": False}
+        return results
     
-    def _check_timing(self, transaction: Transaction, params: Dict) -> Dict[str, Any]:
-        """Check for unusual transaction timing"""
+    def _check_timing_batch(self, batch: pd.DataFrame, params: Dict) -> Dict[int, Dict[str, Any]]:
+        """Vectorized unusual timing check"""
         
-        hour = transaction.transaction_date.hour
+        hours = batch["transaction_date"].dt.hour
+        mask = hours.isin(params["hours"]).to_numpy()
         
-        if hour in params["hours"]:
-            return {
-                "triggered": True,
+        results = {}
+        for position in np.flatnonzero(mask):
+            hour = int(hours.iat[position])
+            results[position] = {
                 "description": f"Transaction at unusual hour: {hour:02d}:00",
                 "severity": AlertSeverity.MEDIUM,
                 "score": 60,
                 "details": {
                     "hour": hour,
-                    "timestamp": transaction.transaction_date.isoformat()
+                    "timestamp": batch["transaction_date"].iat[position].to_pydatetime().isoformat()
                 }
             }
-        
-        return {"triggered": False}
+        return results
     
-    def _check_round_amount(self, transaction: Transaction, params: Dict) -> Dict[str, Any]:
-        """Check for round amount patterns"""
-        
-        if transaction.amount >= params["min_amount"]:
-            if transaction.amount % params["divisor"] == 0:
-                return {
-                    "triggered": True,
-                    "description": f"Round amount transaction: {transaction.amount}",
-                    "severity": AlertSeverity.LOW,
-                    "score": 40,
-                    "details": {
-                        "amount": transaction.amount,
-                        "divisor": params["divisor"]
-                    }
+    def _check_round_amount_batch(self, batch: pd.DataFrame, params: Dict) -> Dict[int, Dict[str, Any]]:
+        """Vectorized round amount check"""
+        
+        amounts = batch["amount"]
+        mask = ((amounts >= params["min_amount"]) & (amounts % params["divisor"] == 0)).to_numpy()
+        
+        results = {}
+        for position in np.flatnonzero(mask):
+            amount = amounts.iat[position]
+            results[position] = {
+                "description": f"Round amount transaction: {amount}",
+                "severity": AlertSeverity.LOW,
+                "score": 40,
+                "details": {
+                    "amount": amount,
+                    "divisor": params["divisor"]
                 }
-        
-        return {"triggered": False}
+            }
+        return results
     
-    def _check_dormancy(self, transaction: Transaction, params: Dict) -> Dict[str, Any]:
-        """Check for sudden activity in dormant accounts"""
-        
-        if not transaction.customer_id:
-            return {"triggered": False}
-        
-        # Get last transaction before this one
-        last_transaction = self.db.query(Transaction).filter(
-            Transaction.customer_id == transaction.customer_id,
-            Transaction.id != transaction.id,
-            Transaction.transaction_date < transaction.transaction_date
-        ).order_by(Transaction.transaction_date.desc()).first()
-        
-        if last_transaction:
-            days_dormant = (transaction.transaction_date - last_transaction.transaction_date).days
-            
-            if days_dormant >= params["dormant_days"] and transaction.amount >= params["amount"]:
-                return {
-                    "triggered": True,
-                    "description": f"Sudden activity in dormant account: {days_dormant} days inactive",
-                    "severity": AlertSeverity.HIGH,
-                    "score": 75,
-                    "details": {
-                        "days_dormant": days_dormant,
-                        "amount": transaction.amount,
-                        "last_activity": last_transaction.transaction_date.isoformat()
-                    }
+    def _check_dormancy_batch(
+        self,
+        batch: pd.DataFrame,
+        history: pd.DataFrame,
+        last_before_window: pd.Series,
+        params: Dict
+    ) -> Dict[int, Dict[str, Any]]:
+        """Vectorized dormant account check"""
+        
+        # Last customer transaction strictly before each batch transaction
+        left = batch[["customer_key", "transaction_date"]].reset_index(drop=True)
+        left["position"] = np.arange(len(left))
+        right = history[["customer_key", "transaction_date"]].rename(
+            columns={"transaction_date": "last_activity"}
+        )
+        merged = pd.merge_asof(
+            left.sort_values("transaction_date"),
+            right.sort_values("last_activity"),
+            left_on="transaction_date",
+            right_on="last_activity",
+            by="customer_key",
+            allow_exact_matches=False
+        ).sort_values("position")
+        
+        last_activity = merged["last_activity"].reset_index(drop=True)
+        before_window = last_before_window.reindex(left["customer_key"].to_numpy())
+        last_activity = last_activity.combine_first(
+            pd.Series(pd.to_datetime(before_window.to_numpy()), index=left.index)
+        )
+        days_dormant = (left["transaction_date"] - last_activity).dt.days
+        
+        mask = (
+            batch["has_customer"].to_numpy()
+            & last_activity.notna().to_numpy()
+            & (days_dormant >= params["dormant_days"]).to_numpy()
+            & (batch["amount"] >= params["amount"]).to_numpy()
+        )
+        
+        results = {}
+        for position in np.flatnonzero(mask):
+            days = int(days_dormant.iat[position])
+            results[position] = {
+                "description": f"Sudden activity in dormant account: {days} days inactive",
+                "severity": AlertSeverity.HIGH,
+                "score": 75,
+                "details": {
+                    "days_dormant": days,
+                    "amount": batch["amount"].iat[position],
+                    "last_activity": last_activity.iat[position].to_pydatetime().isoformat()
                 }
-        
-        return {"triggered": False}
+            }
+        return results
     
     def _check_pattern_combinations(
         self,
@@ -1,33 +1,106 @@
 """
 Data pipeline service for syncing data between PostgreSQL and ClickHouse
+
+PostgreSQL triggers record every insert, update and delete of a synced row
+in the ``analytics_change_log`` outbox. A sync drains the outbox in large
+batches: it loads the current state of the changed rows, writes them to
+ClickHouse as one columnar insert per batch, and deletes the consumed
+outbox rows. Inserts carry a version, so ``ReplacingMergeTree`` keeps the
+latest state of each row without ``ALTER TABLE ... DELETE`` mutations;
+deletes are written as ``is_deleted`` tombstones.
+
+Writes to one stream are serialized with a PostgreSQL advisory lock, and
+each batch claims a version above the stream's last one, kept in
+``analytics_sync_state``. Versions therefore grow in write order, even when
+outbox ids commit out of order, and each write reads the current row state,
+so the last write of a row always carries its latest state. The backfill
+claims its version the same way. A batch that keeps failing is applied row
+by row and the rows that still fail are moved to ``analytics_change_failures``.
 """
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Callable, Optional, Tuple
+from sqlalchemy import func, text
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+import json
 import logging
-import asyncio
 from threading import Thread
 import time
 
+import pandas as pd
+
 from app.core.database import SessionLocal
 from app.core.clickhouse import get_clickhouse_client
 from app.models.aml import (
-    Transaction, CustomerProfile, TransactionAlert, 
-    CustomerRiskProfile, ComplianceCase
+    Transaction, CustomerProfile, TransactionAlert,
+    ComplianceCase, AnalyticsChange, AnalyticsChangeFailure, AnalyticsSyncState
 )
 
 logger = logging.getLogger(__name__)
 
+# Outbox stream -> (captured table, column holding the row id)
+CAPTURED_TABLES = {
+    "transactions": ("transactions", "id"),
+    "alerts": ("transaction_alerts", "id"),
+    "customer_risk": ("customer_profiles", "id"),
+}
+# Outbox rows applied per ClickHouse insert, and ids per IN (...) lookup
+CHANGE_BATCH_SIZE = 50000
+LOOKUP_CHUNK_SIZE = 5000
+# Advisory transaction lock (namespace, stream index) held by the one writer of a stream
+DRAIN_LOCK_NAMESPACE = 0x414E4C59
+# Failed applies of the same outbox batch before it is applied row by row
+MAX_APPLY_ATTEMPTS = 3
+# Creation date written for alerts without one, in live rows and tombstones alike
+MISSING_ALERT_DATE = datetime(1970, 1, 1)
+
+CAPTURE_FUNCTION_SQL = """
+    CREATE OR REPLACE FUNCTION analytics_capture_change() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            INSERT INTO analytics_change_log (stream, row_id, operation, old_row)
+            VALUES (TG_ARGV[0], (to_jsonb(OLD) ->> TG_ARGV[1])::integer, 'D', to_jsonb(OLD)::text);
+        ELSE
+            INSERT INTO analytics_change_log (stream, row_id, operation)
+            VALUES (TG_ARGV[0], (to_jsonb(NEW) ->> TG_ARGV[1])::integer, left(TG_OP, 1));
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+
+def _chunks(values: List[int], size: int):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _alert_created_date(value: Any) -> datetime:
+    """Sorting-key date of an alert row; live rows and tombstones must agree on it"""
+    if value is None:
+        return MISSING_ALERT_DATE
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.replace(tzinfo=None) if value.tzinfo is None else value.astimezone(timezone.utc).replace(tzinfo=None)
+
 
 class DataPipelineService:
     """Service for managing data pipeline between PostgreSQL and ClickHouse"""
     
     def __init__(self):
         self.clickhouse = get_clickhouse_client()
-        self.batch_size = 1000
-        self.sync_interval = 300  # 5 minutes
+        self.batch_size = CHANGE_BATCH_SIZE
+        self.sync_interval = 30  # between outbox drains; each drain runs until caught up
+        self.metrics_interval = 300
         self.running = False
-        self.last_sync = {}
+        self.lag: Dict[str, Dict[str, Any]] = {}
+        self._capture_installed = False
+        self._metrics_updated_at = 0.0
+        # stream -> (first outbox id of the failing batch, failed attempts)
+        self._apply_failures: Dict[str, Tuple[int, int]] = {}
     
     def start_pipeline(self):
         """Start the data pipeline in background"""
@@ -55,11 +128,36 @@ class DataPipelineService:
                 logger.error(f"Pipeline error: {e}")
                 time.sleep(60)  # Wait a minute before retry
     
+    def install_change_capture(self, db: Session):
+        """Create the outbox and the triggers that fill it (PostgreSQL only; idempotent)"""
+        if self._capture_installed:
+            return
+        if db.bind.dialect.name != "postgresql":
+            logger.warning("Change capture needs PostgreSQL triggers; nothing will be synced")
+            return
+        
+        AnalyticsChange.__table__.create(bind=db.bind, checkfirst=True)
+        AnalyticsChangeFailure.__table__.create(bind=db.bind, checkfirst=True)
+        AnalyticsSyncState.__table__.create(bind=db.bind, checkfirst=True)
+        db.execute(text(CAPTURE_FUNCTION_SQL))
+        for stream, (table, key_column) in CAPTURED_TABLES.items():
+            db.execute(text(f"DROP TRIGGER IF EXISTS analytics_capture_{stream} ON {table}"))
+            db.execute(text(
+                f"CREATE TRIGGER analytics_capture_{stream} "
+                f"AFTER INSERT OR UPDATE OR DELETE ON {table} "
+                f"FOR EACH ROW EXECUTE PROCEDURE analytics_capture_change('{stream}', '{key_column}')"
+            ))
+        db.commit()
+        self._capture_installed = True
+        logger.info("Change capture triggers installed")
+    
     def sync_all_data(self):
         """Sync all data types"""
-        logger.info("Starting full data sync")
+        logger.info("Starting data sync")
         
         with SessionLocal() as db:
+            self.install_change_capture(db)
+            
             # Sync transactions
             self.sync_transactions(db)
             
@@ -70,152 +168,364 @@ class DataPipelineService:
             self.sync_alerts(db)
             
             # Update metrics
-            self.update_risk_metrics(db)
+            if time.monotonic() - self._metrics_updated_at >= self.metrics_interval:
+                self.update_risk_metrics(db)
+                self._metrics_updated_at = time.monotonic()
         
         logger.info("Data sync completed")
     
-    def sync_transactions(self, db: Session):
-        """Sync transaction data to ClickHouse"""
-        logger.info("Syncing transactions")
-        
-        # Get last sync timestamp
-        last_sync = self.last_sync.get('transactions', datetime.min)
-        
-        # Query new/updated transactions
-        transactions = db.query(Transaction).filter(
-            Transaction.updated_at > last_sync
-        ).limit(self.batch_size).all()
-        
-        if not transactions:
-            return
-        
-        # Transform data for ClickHouse
-        ch_data = []
-        for txn in transactions:
-            ch_data.append({
-                'transaction_id': txn.transaction_id,
-                'customer_id': txn.customer_id or 0,
-                'account_number': txn.account_number or '',
-                'account_name': txn.account_name or '',
-                'transaction_date': txn.transaction_date,
-                'amount': float(txn.amount),
-                'currency': txn.currency,
-                'transaction_type': txn.transaction_type.value,
-                'risk_score': txn.risk_score or 0.0,
-                'is_high_risk': 1 if txn.is_high_risk else 0,
-                'is_flagged': 1 if txn.status and 'flagged' in txn.status.value else 0,
-                'country': txn.originating_country or '',
-                'counterparty_country': txn.counterparty_country or '',
-                'channel': txn.channel or '',
-                'created_at': datetime.utcnow()
+    def sync_transactions(self, db: Session) -> int:
+        """Sync transaction changes to ClickHouse"""
+        return self._drain(db, "transactions", self._write_transactions)
+    
+    def sync_customer_risk(self, db: Session) -> int:
+        """Sync customer risk snapshots of changed customers to ClickHouse"""
+        return self._drain(db, "customer_risk", self._write_customer_risk)
+    
+    def sync_alerts(self, db: Session) -> int:
+        """Sync alert changes to ClickHouse"""
+        return self._drain(db, "alerts", self._write_alerts)
+    
+    def _drain(
+        self,
+        db: Session,
+        stream: str,
+        write: Callable[[Session, List[int], Dict[int, Dict[str, Any]], int], int]
+    ) -> int:
+        """Apply a stream's outbox batch by batch until it is caught up"""
+        logger.info(f"Syncing {stream}")
+        started = time.monotonic()
+        synced = batches = 0
+        max_latency = 0.0
+        
+        while True:
+            if not self._lock_stream(db, stream):
+                logger.info(f"Another drain is applying {stream}; leaving it to that one")
+                db.rollback()
+                break
+            changes = db.query(
+                AnalyticsChange.id,
+                AnalyticsChange.row_id,
+                AnalyticsChange.operation,
+                AnalyticsChange.old_row,
+                AnalyticsChange.changed_at
+            ).filter(
+                AnalyticsChange.stream == stream
+            ).order_by(AnalyticsChange.id).limit(self.batch_size).all()
+            if not changes:
+                db.rollback()
+                break
+            
+            # Only the latest change of each row matters; its current state is what gets written
+            latest = {}
+            for change in changes:
+                latest[change.row_id] = change
+            deleted = {
+                row_id: json.loads(change.old_row)
+                for row_id, change in latest.items()
+                if change.operation == "D" and change.old_row
+            }
+            # Outbox ids can commit out of order, so a batch may hold an id
+            # below one already applied; the claim still goes above it
+            version = self._claim_version(db, stream, changes[-1].id)
+            try:
+                synced += write(db, list(latest), deleted, version)
+            except Exception as e:
+                db.rollback()
+                if self._count_apply_failure(stream, changes[0].id) < MAX_APPLY_ATTEMPTS:
+                    raise
+                logger.error(f"{stream} outbox batch from change {changes[0].id} keeps failing ({e}); applying it row by row")
+                synced += self._apply_row_by_row(db, stream, write, changes, latest, deleted, version)
+            
+            for chunk in _chunks([change.id for change in changes], LOOKUP_CHUNK_SIZE):
+                db.query(AnalyticsChange).filter(AnalyticsChange.id.in_(chunk)).delete(synchronize_session=False)
+            db.commit()
+            self._apply_failures.pop(stream, None)
+            
+            batches += 1
+            oldest = min(_as_utc(change.changed_at) for change in changes)
+            max_latency = max(max_latency, (datetime.now(timezone.utc) - oldest).total_seconds())
+            if len(changes) < self.batch_size:
+                break
+        
+        self._record_lag(db, stream, synced, batches, max_latency, time.monotonic() - started)
+        return synced
+    
+    def _lock_stream(self, db: Session, stream: str, wait: bool = False) -> bool:
+        """Take the stream's write lock for the current database transaction"""
+        if db.bind.dialect.name != "postgresql":
+            return True
+        lock = "pg_advisory_xact_lock" if wait else "pg_try_advisory_xact_lock"
+        result = db.execute(
+            text(f"SELECT {lock}(:namespace, :stream)"),
+            {"namespace": DRAIN_LOCK_NAMESPACE, "stream": list(CAPTURED_TABLES).index(stream)}
+        ).scalar()
+        return True if wait else bool(result)
+    
+    def _claim_version(self, db: Session, stream: str, floor: int = 0) -> int:
+        """Next version of a stream, above every version claimed before and at least ``floor``
+        
+        The caller holds the stream lock; the claim is kept when its transaction commits.
+        """
+        state = db.get(AnalyticsSyncState, stream)
+        if state is None:
+            state = AnalyticsSyncState(stream=stream, version=0)
+            db.add(state)
+        state.version = max(state.version + 1, floor)
+        db.flush()
+        return state.version
+    
+    def _count_apply_failure(self, stream: str, first_change_id: int) -> int:
+        batch, attempts = self._apply_failures.get(stream, (first_change_id, 0))
+        attempts = attempts + 1 if batch == first_change_id else 1
+        self._apply_failures[stream] = (first_change_id, attempts)
+        return attempts
+    
+    def _apply_row_by_row(
+        self,
+        db: Session,
+        stream: str,
+        write: Callable[[Session, List[int], Dict[int, Dict[str, Any]], int], int],
+        changes: List[Any],
+        latest: Dict[int, Any],
+        deleted: Dict[int, Dict[str, Any]],
+        version: int
+    ) -> int:
+        """Apply each row of a failing batch alone; rows that still fail are moved aside"""
+        if not self._lock_stream(db, stream):
+            raise RuntimeError(f"Lost the {stream} drain lock")
+        # The failed attempt's claim was rolled back with it
+        version = self._claim_version(db, stream, version)
+        synced = 0
+        failed: Dict[int, str] = {}
+        for row_id in latest:
+            try:
+                with db.begin_nested():
+                    synced += write(db, [row_id], {row_id: deleted[row_id]} if row_id in deleted else {}, version)
+            except Exception as e:
+                failed[row_id] = str(e)
+        
+        if failed and len(failed) == len(latest) and not self._clickhouse_available():
+            # Nothing applies because ClickHouse is down, not because of the rows
+            db.rollback()
+            raise RuntimeError(f"ClickHouse unavailable while applying {stream} changes")
+        
+        for change in changes:
+            if change.row_id in failed:
+                db.add(AnalyticsChangeFailure(
+                    id=change.id,
+                    stream=stream,
+                    row_id=change.row_id,
+                    operation=change.operation,
+                    old_row=change.old_row,
+                    changed_at=change.changed_at,
+                    error=failed[change.row_id]
+                ))
+        if failed:
+            logger.error(f"Moved {len(failed)} {stream} rows that could not be applied to analytics_change_failures")
+        return synced
+    
+    def _clickhouse_available(self) -> bool:
+        try:
+            self.clickhouse.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+    
+    def _record_lag(self, db: Session, stream: str, synced: int, batches: int, max_latency: float, duration: float):
+        backlog, oldest = db.query(
+            func.count(AnalyticsChange.id),
+            func.min(AnalyticsChange.changed_at)
+        ).filter(AnalyticsChange.stream == stream).one()
+        now = datetime.now(timezone.utc)
+        
+        self.lag[stream] = {
+            "rows_synced": synced,
+            "batches": batches,
+            "backlog": backlog,
+            # Age of the oldest change still waiting; 0 when caught up
+            "lag_seconds": (now - _as_utc(oldest)).total_seconds() if oldest else 0.0,
+            # Longest time a change applied in this run waited in the outbox
+            "max_change_latency_seconds": round(max_latency, 3),
+            "duration_seconds": round(duration, 3),
+            "synced_at": now.isoformat()
+        }
+        if synced:
+            logger.info(f"Synced {synced} {stream} rows in {batches} batches ({duration:.1f}s)")
+    
+    def _write_transactions(self, db: Session, row_ids: List[int], deleted: Dict[int, Dict[str, Any]], version: int) -> int:
+        rows = []
+        found = set()
+        for chunk in _chunks(row_ids, LOOKUP_CHUNK_SIZE):
+            for txn in db.query(
+                Transaction.id, Transaction.transaction_id, Transaction.customer_id,
+                Transaction.account_number, Transaction.account_name, Transaction.transaction_date,
+                Transaction.amount, Transaction.currency, Transaction.transaction_type,
+                Transaction.risk_score, Transaction.is_high_risk, Transaction.status,
+                Transaction.originating_country, Transaction.counterparty_country, Transaction.channel
+            ).filter(Transaction.id.in_(chunk)):
+                found.add(txn.id)
+                rows.append({
+                    'transaction_id': txn.transaction_id,
+                    'customer_id': txn.customer_id or 0,
+                    'account_number': txn.account_number or '',
+                    'account_name': txn.account_name or '',
+                    'transaction_date': txn.transaction_date,
+                    'amount': float(txn.amount),
+                    'currency': txn.currency,
+                    'transaction_type': txn.transaction_type.value,
+                    'risk_score': txn.risk_score or 0.0,
+                    'is_high_risk': 1 if txn.is_high_risk else 0,
+                    'is_flagged': 1 if txn.status and 'flagged' in txn.status.value else 0,
+                    'country': txn.originating_country or '',
+                    'counterparty_country': txn.counterparty_country or '',
+                    'channel': txn.channel or '',
+                    'created_at': datetime.utcnow(),
+                    'version': version,
+                    'is_deleted': 0
+                })
+        
+        # Tombstones need the sorting key of the row they replace
+        for row_id, old in deleted.items():
+            if row_id in found:
+                continue
+            rows.append({
+                'transaction_id': old['transaction_id'],
+                'customer_id': old.get('customer_id') or 0,
+                'account_number': '',
+                'account_name': '',
+                'transaction_date': datetime.fromisoformat(old['transaction_date']),
+                'amount': 0.0,
+                'currency': '',
+                'transaction_type': '',
+                'risk_score': 0.0,
+                'is_high_risk': 0,
+                'is_flagged': 0,
+                'country': '',
+                'counterparty_country': '',
+                'channel': '',
+                'created_at': datetime.utcnow(),
+                'version': version,
+                'is_deleted': 1
             })
         
-        # Insert into ClickHouse (using INSERT with ON DUPLICATE KEY semantics)
-        if ch_data:
-            self._upsert_transactions(ch_data)
-            self.last_sync['transactions'] = max(txn.updated_at for txn in transactions)
-            logger.info(f"Synced {len(ch_data)} transactions")
+        return self.clickhouse.insert_dataframe('transactions_analytics', pd.DataFrame(rows))
     
-    def sync_customer_risk(self, db: Session):
-        """Sync customer risk data to ClickHouse"""
-        logger.info("Syncing customer risk data")
-        
-        last_sync = self.last_sync.get('customer_risk', datetime.min)
-        
-        # Get updated customer profiles with risk data
-        query = db.query(CustomerProfile, CustomerRiskProfile).join(
-            CustomerRiskProfile, 
-            CustomerProfile.id == CustomerRiskProfile.customer_id,
-            isouter=True
-        ).filter(
-            CustomerProfile.updated_at > last_sync
-        )
-        
-        results = query.limit(self.batch_size).all()
-        
-        if not results:
-            return
+    def _write_alerts(self, db: Session, row_ids: List[int], deleted: Dict[int, Dict[str, Any]], version: int) -> int:
+        rows = []
+        found = set()
+        for chunk in _chunks(row_ids, LOOKUP_CHUNK_SIZE):
+            for alert in db.query(
+                TransactionAlert.id, TransactionAlert.alert_id, TransactionAlert.customer_id,
+                TransactionAlert.alert_type, TransactionAlert.severity, TransactionAlert.score,
+                TransactionAlert.rule_id, TransactionAlert.created_at, TransactionAlert.resolved_at,
+                TransactionAlert.status, TransactionAlert.resolution,
+                Transaction.transaction_id.label('transaction_reference')
+            ).outerjoin(
+                Transaction, Transaction.id == TransactionAlert.transaction_id
+            ).filter(TransactionAlert.id.in_(chunk)):
+                found.add(alert.id)
+                resolution_time = None
+                if alert.resolved_at and alert.created_at:
+                    resolution_time = (alert.resolved_at - alert.created_at).total_seconds() / 3600
+                
+                rows.append({
+                    'alert_id': alert.alert_id,
+                    'transaction_id': alert.transaction_reference or '',
+                    'customer_id': alert.customer_id or 0,
+                    'alert_type': alert.alert_type,
+                    'severity': alert.severity.value,
+                    'score': alert.score or 0.0,
+                    'rule_id': alert.rule_id or '',
+                    'created_date': _alert_created_date(alert.created_at),
+                    'resolved_date': alert.resolved_at,
+                    'resolution_time_hours': resolution_time,
+                    'status': alert.status.value,
+                    'false_positive': 1 if alert.resolution == 'false_positive' else 0,
+                    'version': version,
+                    'is_deleted': 0
+                })
+        
+        for row_id, old in deleted.items():
+            if row_id in found:
+                continue
+            rows.append({
+                'alert_id': old['alert_id'],
+                'transaction_id': '',
+                'customer_id': old.get('customer_id') or 0,
+                'alert_type': '',
+                'severity': '',
+                'score': 0.0,
+                'rule_id': '',
+                'created_date': _alert_created_date(old.get('created_at')),
+                'resolved_date': None,
+                'resolution_time_hours': None,
+                'status': '',
+                'false_positive': 0,
+                'version': version,
+                'is_deleted': 1
+            })
         
-        ch_data = []
-        for customer, risk_profile in results:
-            # Calculate transaction metrics for this customer
-            txn_metrics = db.query(
+        return self.clickhouse.insert_dataframe('alert_analytics', pd.DataFrame(rows))
+    
+    def _write_customer_risk(self, db: Session, row_ids: List[int], deleted: Dict[int, Dict[str, Any]], version: int) -> int:
+        """Today's snapshot of each changed customer; snapshots of deleted customers are kept"""
+        now = datetime.utcnow()
+        window_start = now - timedelta(days=90)
+        rows = []
+        for chunk in _chunks(row_ids, LOOKUP_CHUNK_SIZE):
+            # Transaction metrics, alerts and cases for the whole chunk, one grouped query each
+            txn_metrics = {
+                customer_id: (count, volume)
+                for customer_id, count, volume in db.query(
+                    Transaction.customer_id,
+                    func.count(Transaction.id),
+                    func.sum(Transaction.amount)
+                ).filter(
+                    Transaction.customer_id.in_(chunk),
+                    Transaction.transaction_date >= window_start
+                ).group_by(Transaction.customer_id)
+            }
+            alert_counts = dict(db.query(
                 Transaction.customer_id,
-                db.func.count(Transaction.id).label('txn_count'),
-                db.func.sum(Transaction.amount).label('total_volume'),
-                db.func.count(TransactionAlert.id).label('alert_count')
-            ).outerjoin(
+                func.count(TransactionAlert.id)
+            ).join(
                 TransactionAlert,
                 Transaction.id == TransactionAlert.transaction_id
             ).filter(
-                Transaction.customer_id == customer.id,
-                Transaction.transaction_date >= datetime.utcnow() - timedelta(days=90)
-            ).group_by(Transaction.customer_id).first()
-            
-            case_count = db.query(ComplianceCase).filter(
-                ComplianceCase.customer_id == customer.id
-            ).count()
+                Transaction.customer_id.in_(chunk),
+                Transaction.transaction_date >= window_start
+            ).group_by(Transaction.customer_id).all())
+            case_counts = dict(db.query(
+                ComplianceCase.customer_id,
+                func.count(ComplianceCase.id)
+            ).filter(ComplianceCase.customer_id.in_(chunk)).group_by(ComplianceCase.customer_id).all())
             
-            ch_data.append({
-                'customer_id': customer.id,
-                'snapshot_date': datetime.utcnow().date(),
-                'risk_score': customer.risk_score or 0.0,
-                'risk_level': customer.risk_level.value if customer.risk_level else 'low',
-                'transaction_count': txn_metrics.txn_count if txn_metrics else 0,
-                'total_volume': float(txn_metrics.total_volume) if txn_metrics and txn_metrics.total_volume else 0.0,
-                'alert_count': txn_metrics.alert_count if txn_metrics else 0,
-                'case_count': case_count,
-                'kyc_status': customer.kyc_status or 'pending',
-                'pep_status': 1 if customer.pep_status else 0,
-                'high_risk_country': 1 if customer.high_risk_country else 0,
-                'created_at': datetime.utcnow()
-            })
-        
-        if ch_data:
-            self.clickhouse.insert('customer_risk_analytics', ch_data)
-            self.last_sync['customer_risk'] = max(
-                customer.updated_at for customer, _ in results
-            )
-            logger.info(f"Synced {len(ch_data)} customer risk records")
+            for customer in db.query(
+                CustomerProfile.id, CustomerProfile.risk_score, CustomerProfile.risk_level,
+                CustomerProfile.kyc_status, CustomerProfile.pep_status, CustomerProfile.high_risk_country
+            ).filter(CustomerProfile.id.in_(chunk)):
+                txn_count, total_volume = txn_metrics.get(customer.id, (0, None))
+                rows.append({
+                    'customer_id': customer.id,
+                    'snapshot_date': pd.Timestamp(now.date()),
+                    'risk_score': customer.risk_score or 0.0,
+                    'risk_level': customer.risk_level.value if customer.risk_level else 'low',
+                    'transaction_count': txn_count,
+                    'total_volume': float(total_volume) if total_volume else 0.0,
+                    'alert_count': alert_counts.get(customer.id, 0),
+                    'case_count': case_counts.get(customer.id, 0),
+                    'kyc_status': customer.kyc_status or 'pending',
+                    'pep_status': 1 if customer.pep_status else 0,
+                    'high_risk_country': 1 if customer.high_risk_country else 0,
+                    'created_at': now
+                })
+        
+        return self.clickhouse.insert_dataframe('customer_risk_analytics', pd.DataFrame(rows))
     
-    def sync_alerts(self, db: Session):
-        """Sync alert data to ClickHouse"""
-        logger.info("Syncing alerts")
-        
-        last_sync = self.last_sync.get('alerts', datetime.min)
-        
-        alerts = db.query(TransactionAlert).filter(
-            TransactionAlert.updated_at > last_sync
-        ).limit(self.batch_size).all()
-        
-        if not alerts:
-            return
-        
-        ch_data = []
-        for alert in alerts:
-            resolution_time = None
-            if alert.resolved_at and alert.created_at:
-                resolution_time = (alert.resolved_at - alert.created_at).total_seconds() / 3600
-            
-            ch_data.append({
-                'alert_id': alert.alert_id,
-                'transaction_id': alert.transaction.transaction_id if alert.transaction else '',
-                'customer_id': alert.customer_id or 0,
-                'alert_type': alert.alert_type,
-                'severity': alert.severity.value,
-                'score': alert.score or 0.0,
-                'rule_id': alert.rule_id or '',
-                'created_date': alert.created_at,
-                'resolved_date': alert.resolved_at,
-                'resolution_time_hours': resolution_time,
-                'status': alert.status.value,
-                'false_positive': 1 if alert.resolution == 'false_positive' else 0
-            })
-        
-        if ch_data:
-            self._upsert_alerts(ch_data)
-            self.last_sync['alerts'] = max(alert.updated_at for alert in alerts)
-            logger.info(f"Synced {len(ch_data)} alerts")
+    def get_lag_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Per-stream result of the last sync: rows synced, outbox backlog and lag"""
+        return dict(self.lag)
     
     def update_risk_metrics(self, db: Session):
         """Update risk metrics time series in ClickHouse"""
@@ -227,7 +537,7 @@ class DataPipelineService:
         metrics = []
         
         # Transaction volume metrics
-        total_volume = db.query(db.func.sum(Transaction.amount)).filter(
+        total_volume = db.query(func.sum(Transaction.amount)).filter(
             Transaction.transaction_date >= now - timedelta(days=1)
         ).scalar() or 0
         
@@ -284,91 +594,57 @@ class DataPipelineService:
                 'dimensions.value': [risk_level]
             })
         
+        # Pipeline lag per stream
+        for stream, lag in self.lag.items():
+            for name in ('lag_seconds', 'backlog'):
+                metrics.append({
+                    'timestamp': now,
+                    'metric_type': 'pipeline',
+                    'metric_name': f'cdc_{name}',
+                    'value': float(lag[name]),
+                    'dimensions.key': ['stream'],
+                    'dimensions.value': [stream]
+                })
+        
         if metrics:
             self.clickhouse.insert('risk_metrics_timeseries', metrics)
             logger.info(f"Updated {len(metrics)} risk metrics")
     
-    def _upsert_transactions(self, data: List[Dict]):
-        """Upsert transactions with deduplication"""
-        if not data:
-            return
-        
-        # Delete existing records first (ClickHouse doesn't have native UPSERT)
-        transaction_ids = [f"'{d['transaction_id']}'" for d in data]
-        delete_query = f"ALTER TABLE transactions_analytics DELETE WHERE transaction_id IN ({','.join(transaction_ids)})"
-        
-        try:
-            self.clickhouse.execute(delete_query)
-        except Exception as e:
-            logger.warning(f"Delete operation failed (may be expected): {e}")
-        
-        # Insert new data
-        self.clickhouse.insert('transactions_analytics', data)
-    
-    def _upsert_alerts(self, data: List[Dict]):
-        """Upsert alerts with deduplication"""
-        if not data:
-            return
-        
-        alert_ids = [f"'{d['alert_id']}'" for d in data]
-        delete_query = f"ALTER TABLE alert_analytics DELETE WHERE alert_id IN ({','.join(alert_ids)})"
-        
-        try:
-            self.clickhouse.execute(delete_query)
-        except Exception as e:
-            logger.warning(f"Delete operation failed (may be expected): {e}")
-        
-        self.clickhouse.insert('alert_analytics', data)
-    
     def perform_initial_sync(self):
         """Perform initial data sync for historical data"""
         logger.info("Starting initial data sync")
         
         with SessionLocal() as db:
-            # Reset sync timestamps for full sync
-            self.last_sync = {}
+            # Capture first, so rows changed during the backfill are synced again afterwards
+            self.install_change_capture(db)
             
-            # Sync in batches to avoid memory issues
-            batch_count = 0
-            while True:
-                # Sync transactions in batches
-                transactions = db.query(Transaction).offset(
-                    batch_count * self.batch_size
-                ).limit(self.batch_size).all()
-                
-                if not transactions:
-                    break
-                
-                ch_data = []
-                for txn in transactions:
-                    ch_data.append({
-                        'transaction_id': txn.transaction_id,
-                        'customer_id': txn.customer_id or 0,
-                        'account_number': txn.account_number or '',
-                        'account_name': txn.account_name or '',
-                        'transaction_date': txn.transaction_date,
-                        'amount': float(txn.amount),
-                        'currency': txn.currency,
-                        'transaction_type': txn.transaction_type.value,
-                        'risk_score': txn.risk_score or 0.0,
-                        'is_high_risk': 1 if txn.is_high_risk else 0,
-                        'is_flagged': 1 if txn.status and 'flagged' in txn.status.value else 0,
-                        'country': txn.originating_country or '',
-                        'counterparty_country': txn.counterparty_country or '',
-                        'channel': txn.channel or '',
-                        'created_at': datetime.utcnow()
-                    })
-                
-                if ch_data:
-                    self.clickhouse.insert('transactions_analytics', ch_data)
+            backfills = (
+                ("transactions", Transaction, self._write_transactions),
+                ("customer_risk", CustomerProfile, self._write_customer_risk),
+                ("alerts", TransactionAlert, self._write_alerts),
+            )
+            for stream, model, write in backfills:
+                # Claimed like a drain's version: changes drained later go above it,
+                # and they re-read the current state of any row backfilled meanwhile
+                self._lock_stream(db, stream, wait=True)
+                version = self._claim_version(db, stream)
+                db.commit()
                 
-                batch_count += 1
-                logger.info(f"Synced batch {batch_count} ({len(ch_data)} transactions)")
-        
-        # Sync other data types
-        with SessionLocal() as db:
-            self.sync_customer_risk(db)
-            self.sync_alerts(db)
+                last_id = 0
+                batch_count = 0
+                while True:
+                    row_ids = [
+                        row_id for (row_id,) in db.query(model.id).filter(
+                            model.id > last_id
+                        ).order_by(model.id).limit(self.batch_size)
+                    ]
+                    if not row_ids:
+                        break
+                    
+                    written = write(db, row_ids, {}, version)
+                    last_id = row_ids[-1]
+                    batch_count += 1
+                    logger.info(f"Synced {stream} batch {batch_count} ({written} rows)")
         
         logger.info("Initial data sync completed")
 
@@ -382,4 +658,4 @@ def get_data_pipeline() -> DataPipelineService:
     global data_pipeline
     if data_pipeline is None:
         data_pipeline = DataPipelineService()
-    return data_pipeline
\ No newline at end of file
+    return data_pipeline
@@ -12,6 +12,9 @@ from .network_analyzer import (
     RelationshipType,
     get_network_analyzer
 )
+from .columnar_graph import ColumnarGraph
+from .centrality import CentralityService
+from .pattern_search import TemporalFlowSearch, maximal_cliques, benchmark_pattern_search
 
 __all__ = [
     "NetworkAnalyzer",
@@ -21,5 +24,10 @@ __all__ = [
     "CommunityDetectionResult",
     "NodeType",
     "RelationshipType",
-    "get_network_analyzer"
+    "get_network_analyzer",
+    "ColumnarGraph",
+    "CentralityService",
+    "TemporalFlowSearch",
+    "maximal_cliques",
+    "benchmark_pattern_search"
 ]
\ No newline at end of file
@@ -0,0 +1,337 @@
+"""
+Approximate, parallel centrality with results cached per graph version
+"""
+
+import hashlib
+import logging
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from app.services.graph import algorithms
+from app.services.graph.columnar_graph import ColumnarGraph
+
+logger = logging.getLogger(__name__)
+
+MEASURES = ("degree_centrality", "betweenness_centrality", "closeness_centrality", "eigenvector_centrality", "pagerank")
+# Small components are solved exactly, a group of at most this many nodes at a time
+EXACT_GROUP_NODES = 2048
+
+# Read-only adjacency held by each centrality worker process
+_worker_adjacency: Optional[sparse.csr_matrix] = None
+
+
+def _init_centrality_worker(adjacency: sparse.csr_matrix) -> None:
+    global _worker_adjacency
+    _worker_adjacency = adjacency
+
+
+def _betweenness_chunk(sources: np.ndarray, total_sources: int) -> np.ndarray:
+    # Rescale so summing chunk results gives the estimate over all sources
+    return algorithms.betweenness_centrality(_worker_adjacency, sources=sources) * (len(sources) / total_sources)
+
+
+def _pivot_chunk(pivots: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    return algorithms.pivot_distance_sums(_worker_adjacency, pivots)
+
+
+def sample_size(n: int, epsilon: float, delta: float) -> int:
+    """
+    Samples for every node's estimate to be within ``epsilon`` with
+    probability ``1 - delta`` (Hoeffding with a union bound over nodes)
+    """
+    if n <= 1:
+        return n
+    return min(n, math.ceil(math.log(2 * n / delta) / (2 * epsilon ** 2)))
+
+
+@dataclass
+class CentralityResult:
+    """Centrality arrays aligned with the graph's node indices"""
+    version: int
+    fingerprint: str
+    node_ids: List[str]
+    measures: Dict[str, np.ndarray]
+    betweenness_samples: int
+    closeness_pivots: int
+    epsilon: float
+    delta: float
+    computed_at: datetime = field(default_factory=datetime.now)
+    elapsed_seconds: float = 0.0
+
+    def scores(self, index: int) -> Dict[str, float]:
+        return {name: float(values[index]) for name, values in self.measures.items()}
+
+    def metadata(self) -> Dict[str, Any]:
+        n = len(self.node_ids)
+        return {
+            "graph_version": self.version,
+            "nodes": n,
+            "betweenness_samples": self.betweenness_samples,
+            "betweenness_exact": self.betweenness_samples >= n,
+            "closeness_pivots": self.closeness_pivots,
+            "epsilon": self.epsilon,
+            "delta": self.delta,
+            "computed_at": self.computed_at.isoformat(),
+            "elapsed_seconds": self.elapsed_seconds
+        }
+
+
+class CentralityService:
+    """
+    Centrality for a ColumnarGraph, recomputed only when the graph changes.
+
+    Betweenness is estimated from uniformly sampled sources and closeness
+    from sampled pivots (exact for components smaller than the pivot
+    count); sample sizes follow from ``epsilon`` and ``delta``, the additive
+    error and failure probability of the normalized scores. Sources and
+    pivots are split across a process pool for large graphs. Results are
+    kept in memory by graph version and, with ``cache_dir``, on disk by a
+    fingerprint of the graph's structure so they survive restarts.
+    """
+
+    def __init__(
+        self,
+        epsilon: float = 0.05,
+        delta: float = 0.1,
+        workers: Optional[int] = None,
+        parallel_min_nodes: int = 5000,
+        cache_dir: Optional[str] = None,
+        seed: Optional[int] = None
+    ):
+        self.epsilon = epsilon
+        self.delta = delta
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.parallel_min_nodes = parallel_min_nodes
+        self.cache_dir = cache_dir
+        self.seed = seed
+
+        self._result: Optional[CentralityResult] = None
+        self.computations = 0
+        self.cache_hits = 0
+        self.disk_hits = 0
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def cached(self, graph: ColumnarGraph) -> Optional[CentralityResult]:
+        """Result for the graph as it is now, without computing anything"""
+        if self._result is not None and self._result.version == graph.version:
+            return self._result
+        return None
+
+    def compute(self, graph: ColumnarGraph) -> CentralityResult:
+        result = self.cached(graph)
+        if result is not None:
+            self.cache_hits += 1
+            return result
+
+        fingerprint = self._fingerprint(graph)
+        result = self._load(fingerprint, graph)
+        if result is not None:
+            self.disk_hits += 1
+        else:
+            result = self._compute(graph, fingerprint)
+            self.computations += 1
+            self._save(result)
+
+        self._result = result
+        return result
+
+    def _compute(self, graph: ColumnarGraph, fingerprint: str) -> CentralityResult:
+        started = time.time()
+        n = graph.number_of_nodes()
+        rng = np.random.default_rng(self.seed)
+        undirected = graph.adjacency(undirected=True)
+
+        samples = sample_size(n, self.epsilon, self.delta)
+        sources = np.arange(n) if samples >= n else rng.choice(n, size=samples, replace=False)
+
+        component_count, labels = connected_components(undirected, directed=False)
+        sizes = np.bincount(labels, minlength=component_count)
+        pivot_target = sample_size(n, self.epsilon, self.delta)
+        large = sizes > pivot_target
+        pivots = np.concatenate([
+            rng.choice(np.flatnonzero(labels == component), size=pivot_target, replace=False)
+            for component in np.flatnonzero(large)
+        ]) if large.any() else np.zeros(0, dtype=np.int64)
+
+        executor = None
+        if self.workers > 1 and n >= self.parallel_min_nodes:
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_centrality_worker,
+                initargs=(undirected,)
+            )
+        try:
+            betweenness, (pivot_sums, pivot_counts) = self._run_sampled(executor, undirected, sources, pivots)
+        finally:
+            if executor:
+                executor.shutdown()
+
+        closeness = np.zeros(n)
+        in_large = large[labels]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            estimate = np.where(pivot_sums > 0, pivot_counts / pivot_sums, 0.0)
+        if n > 1:
+            closeness[in_large] = estimate[in_large] * (sizes[labels[in_large]] - 1) / (n - 1)
+        self._exact_small_components(undirected, labels, sizes, ~large, closeness)
+
+        eigenvector = algorithms.eigenvector_centrality(undirected)
+        pagerank = algorithms.pagerank(graph.adjacency(undirected=False, weighted=True))
+
+        return CentralityResult(
+            version=graph.version,
+            fingerprint=fingerprint,
+            node_ids=list(graph.node_ids),
+            measures={
+                "degree_centrality": algorithms.degree_centrality(graph.degrees()),
+                "betweenness_centrality": betweenness,
+                "closeness_centrality": closeness,
+                # Zero when power iteration does not converge
+                "eigenvector_centrality": eigenvector if eigenvector is not None else np.zeros(n),
+                "pagerank": pagerank if pagerank is not None else np.zeros(n)
+            },
+            betweenness_samples=len(sources),
+            closeness_pivots=pivot_target if large.any() else 0,
+            epsilon=self.epsilon,
+            delta=self.delta,
+            elapsed_seconds=time.time() - started
+        )
+
+    def _run_sampled(
+        self,
+        executor: Optional[ProcessPoolExecutor],
+        adjacency: sparse.csr_matrix,
+        sources: np.ndarray,
+        pivots: np.ndarray
+    ) -> Tuple[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+        n = adjacency.shape[0]
+        if executor is None:
+            betweenness = (
+                algorithms.betweenness_centrality(adjacency, sources=sources) if len(sources) else np.zeros(n)
+            )
+            return betweenness, algorithms.pivot_distance_sums(adjacency, pivots)
+
+        parts = self.workers * 4
+        source_futures = [
+            executor.submit(_betweenness_chunk, chunk, len(sources))
+            for chunk in np.array_split(sources, parts) if len(chunk)
+        ]
+        pivot_futures = [
+            executor.submit(_pivot_chunk, chunk)
+            for chunk in np.array_split(pivots, parts) if len(chunk)
+        ]
+
+        betweenness = np.zeros(n)
+        for future in source_futures:
+            betweenness += future.result()
+        sums, counts = np.zeros(n), np.zeros(n)
+        for future in pivot_futures:
+            chunk_sums, chunk_counts = future.result()
+            sums += chunk_sums
+            counts += chunk_counts
+        return betweenness, (sums, counts)
+
+    def _exact_small_components(
+        self,
+        adjacency: sparse.csr_matrix,
+        labels: np.ndarray,
+        sizes: np.ndarray,
+        small: np.ndarray,
+        closeness: np.ndarray
+    ) -> None:
+        """Exact closeness for components below the pivot count, in groups of whole components"""
+        n = adjacency.shape[0]
+        nodes = np.flatnonzero(small[labels])
+        nodes = nodes[np.argsort(labels[nodes], kind="stable")]
+        component_starts = np.flatnonzero(np.r_[True, labels[nodes][1:] != labels[nodes][:-1]])
+
+        def solve(start: int, end: int) -> None:
+            group = nodes[start:end]
+            sub = adjacency[group][:, group].tocsr()
+            scores = algorithms.closeness_centrality(sub)
+            if n > 1:
+                # closeness_centrality normalizes by the group size; rescale to the whole graph
+                scores *= (len(group) - 1) / (n - 1)
+            closeness[group] = scores
+
+        # Extend each group by whole components up to the size limit
+        bounds = component_starts.tolist() + [len(nodes)]
+        group_start = 0
+        for previous, bound in zip(bounds, bounds[1:]):
+            if bound - group_start > EXACT_GROUP_NODES and previous > group_start:
+                solve(group_start, previous)
+                group_start = previous
+        if group_start < len(nodes):
+            solve(group_start, len(nodes))
+
+    def _fingerprint(self, graph: ColumnarGraph) -> str:
+        edges = graph.live_edges()
+        digest = hashlib.sha1()
+        digest.update(f"{self.epsilon}:{self.delta}:{self.seed}\n".encode())
+        digest.update("\n".join(graph.node_ids).encode())
+        for column in (graph.src, graph.dst, graph.weight):
+            digest.update(np.ascontiguousarray(column[edges]).tobytes())
+        return digest.hexdigest()
+
+    def _cache_path(self, fingerprint: str) -> str:
+        return os.path.join(self.cache_dir, f"centrality_{fingerprint}.npz")
+
+    def _load(self, fingerprint: str, graph: ColumnarGraph) -> Optional[CentralityResult]:
+        if not self.cache_dir or not os.path.exists(self._cache_path(fingerprint)):
+            return None
+        try:
+            with np.load(self._cache_path(fingerprint), allow_pickle=False) as data:
+                return CentralityResult(
+                    version=graph.version,
+                    fingerprint=fingerprint,
+                    node_ids=list(graph.node_ids),
+                    measures={name: data[name] for name in MEASURES},
+                    betweenness_samples=int(data["betweenness_samples"]),
+                    closeness_pivots=int(data["closeness_pivots"]),
+                    epsilon=self.epsilon,
+                    delta=self.delta,
+                    computed_at=datetime.fromisoformat(str(data["computed_at"])),
+                    elapsed_seconds=float(data["elapsed_seconds"])
+                )
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable centrality cache {fingerprint}: {e}")
+            return None
+
+    def _save(self, result: CentralityResult) -> None:
+        if not self.cache_dir:
+            return
+        path = self._cache_path(result.fingerprint)
+        temporary = f"{path}.tmp.npz"
+        try:
+            np.savez(
+                temporary,
+                betweenness_samples=result.betweenness_samples,
+                closeness_pivots=result.closeness_pivots,
+                computed_at=result.computed_at.isoformat(),
+                elapsed_seconds=result.elapsed_seconds,
+                **result.measures
+            )
+            os.replace(temporary, path)
+        except OSError as e:
+            logger.warning(f"Could not persist centrality results: {e}")
+
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            "epsilon": self.epsilon,
+            "delta": self.delta,
+            "workers": self.workers,
+            "computations": self.computations,
+            "cache_hits": self.cache_hits,
+            "disk_hits": self.disk_hits,
+            "current": self._result.metadata() if self._result else None
+        }
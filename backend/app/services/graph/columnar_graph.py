@@ -0,0 +1,337 @@
+"""
+Columnar in-memory graph for network analysis
+Integer node ids, typed edge attribute columns and lazily built CSR adjacency
+"""
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+from scipy import sparse
+
+INITIAL_CAPACITY = 1024
+
+# compact() is worthwhile once this share of edge rows is tombstoned
+COMPACT_DEAD_FRACTION = 0.25
+
+
+class ColumnarGraph:
+    """
+    Directed multigraph stored as parallel numpy columns.
+
+    Nodes are dense integers mapped from external string ids. Each edge is a
+    row in typed columns (endpoints, relationship code, amount, count, weight,
+    confidence, last activity epoch and an interned label), unique per
+    (source, target, relationship). Removed edges and nodes are tombstoned and
+    dropped from the CSR views, which are rebuilt on first use after a change;
+    ``compact`` reclaims tombstoned rows, removed nodes and unused labels,
+    renumbering nodes and edges.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        self.node_ids: List[str] = []
+        self.node_index: Dict[str, int] = {}
+        self.node_type = np.zeros(INITIAL_CAPACITY, dtype=np.int8)
+        self.risk_score = np.zeros(INITIAL_CAPACITY, dtype=np.float64)
+        self.node_alive = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        self.num_removed_nodes = 0
+
+        self.src = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self.dst = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self.rel = np.zeros(INITIAL_CAPACITY, dtype=np.int8)
+        self.amount = np.zeros(INITIAL_CAPACITY, dtype=np.float64)
+        self.count = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self.weight = np.zeros(INITIAL_CAPACITY, dtype=np.float64)
+        self.confidence = np.zeros(INITIAL_CAPACITY, dtype=np.float32)
+        self.last_ts = np.zeros(INITIAL_CAPACITY, dtype=np.float64)
+        self.label = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self.alive = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        self.num_edge_rows = 0
+        self.num_live_edges = 0
+
+        # Packed (source, target, relationship) -> edge row
+        self._edge_keys: Dict[int, int] = {}
+        self.labels: List[str] = []
+        self._label_index: Dict[str, int] = {}
+
+        # Keeps counting across clears so a version never names two different graphs
+        self.version = getattr(self, "version", -1) + 1
+        # Changes only when node ids are reassigned (clear and compact)
+        self.layout_version = getattr(self, "layout_version", -1) + 1
+        self._csr_version = -1
+        self._out: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._in: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._adjacency: Dict[Tuple[bool, bool], sparse.csr_matrix] = {}
+
+    # Nodes
+
+    def number_of_nodes(self) -> int:
+        return len(self.node_ids)
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self.node_index
+
+    def index(self, node_id: str) -> int:
+        return self.node_index[node_id]
+
+    def add_node(self, node_id: str, node_type: int = 0, risk_score: float = 0.0) -> int:
+        """Add or update a node and return its integer id"""
+        idx = self.node_index.get(node_id)
+        if idx is None:
+            idx = len(self.node_ids)
+            if idx >= len(self.node_type):
+                self.node_type = _grow(self.node_type, idx + 1)
+                self.risk_score = _grow(self.risk_score, idx + 1)
+                self.node_alive = _grow(self.node_alive, idx + 1)
+            self.node_ids.append(node_id)
+            self.node_index[node_id] = idx
+            self.node_alive[idx] = True
+            self._touch()
+        self.node_type[idx] = node_type
+        self.risk_score[idx] = risk_score
+        return idx
+
+    def remove_node(self, node_id: str) -> None:
+        """Remove a node and its edges; its slot stays until ``compact``"""
+        idx = self.node_index.pop(node_id, None)
+        if idx is None:
+            return
+        for edge in np.concatenate([self.out_edges(idx), self.in_edges(idx)]).tolist():
+            self.remove_edge(edge)
+        self.node_alive[idx] = False
+        self.num_removed_nodes += 1
+        self._touch()
+
+    # Edges
+
+    def number_of_edges(self) -> int:
+        return self.num_live_edges
+
+    def intern_label(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        code = self._label_index.get(value)
+        if code is None:
+            code = self._label_index[value] = len(self.labels)
+            self.labels.append(value)
+        return code
+
+    def label_of(self, edge: int) -> Optional[str]:
+        code = self.label[edge]
+        return self.labels[code] if code >= 0 else None
+
+    def find_edge(self, source: int, target: int, rel: int) -> int:
+        return self._edge_keys.get(_edge_key(source, target, rel), -1)
+
+    def add_edge(
+        self,
+        source: int,
+        target: int,
+        rel: int,
+        amount: float = 0.0,
+        count: int = 0,
+        weight: float = 1.0,
+        confidence: float = 1.0,
+        last_ts: float = math.nan,
+        label: Optional[str] = None
+    ) -> int:
+        """Insert an edge, or overwrite the attributes of an existing one"""
+        key = _edge_key(source, target, rel)
+        edge = self._edge_keys.get(key)
+        if edge is None:
+            edge = self.num_edge_rows
+            if edge >= len(self.src):
+                self._grow_edges(edge + 1)
+            self.num_edge_rows += 1
+            self.num_live_edges += 1
+            self._edge_keys[key] = edge
+            self.src[edge] = source
+            self.dst[edge] = target
+            self.rel[edge] = rel
+            self.alive[edge] = True
+            self._touch()
+        elif self.weight[edge] != weight:
+            self._touch()
+
+        self.amount[edge] = amount
+        self.count[edge] = count
+        self.weight[edge] = weight
+        self.confidence[edge] = confidence
+        self.last_ts[edge] = last_ts
+        self.label[edge] = self.intern_label(label)
+        return edge
+
+    def remove_edge(self, edge: int) -> None:
+        if not self.alive[edge]:
+            return
+        self.alive[edge] = False
+        self.num_live_edges -= 1
+        del self._edge_keys[_edge_key(int(self.src[edge]), int(self.dst[edge]), int(self.rel[edge]))]
+        self._touch()
+
+    def live_edges(self) -> np.ndarray:
+        return np.flatnonzero(self.alive[:self.num_edge_rows])
+
+    def out_edges(self, node: int) -> np.ndarray:
+        indptr, edges = self._csr()[0]
+        return edges[indptr[node]:indptr[node + 1]]
+
+    def in_edges(self, node: int) -> np.ndarray:
+        indptr, edges = self._csr()[1]
+        return edges[indptr[node]:indptr[node + 1]]
+
+    def successors(self, node: int) -> np.ndarray:
+        """Distinct targets of a node's out-edges, in first-edge order"""
+        targets = self.dst[self.out_edges(node)]
+        _, first = np.unique(targets, return_index=True)
+        return targets[np.sort(first)]
+
+    def degree(self, node_id: str) -> int:
+        """In plus out edge count, parallel edges included"""
+        node = self.node_index[node_id]
+        return len(self.out_edges(node)) + len(self.in_edges(node))
+
+    def degrees(self) -> np.ndarray:
+        edges = self.live_edges()
+        n = self.number_of_nodes()
+        return (np.bincount(self.src[edges], minlength=n) + np.bincount(self.dst[edges], minlength=n))
+
+    # Matrix views
+
+    def adjacency(self, undirected: bool = True, weighted: bool = False) -> sparse.csr_matrix:
+        """n x n sparse adjacency; binary, or with parallel edge weights summed"""
+        self._csr()
+        key = (undirected, weighted)
+        matrix = self._adjacency.get(key)
+        if matrix is None:
+            n = self.number_of_nodes()
+            edges = self.live_edges()
+            rows, cols = self.src[edges], self.dst[edges]
+            data = self.weight[edges] if weighted else np.ones(len(edges))
+            if undirected:
+                rows, cols, data = np.concatenate([rows, cols]), np.concatenate([cols, rows]), np.concatenate([data, data])
+            matrix = sparse.csr_matrix((data, (rows, cols)), shape=(n, n))
+            matrix.sum_duplicates()
+            if not weighted:
+                matrix.data[:] = 1.0
+            self._adjacency[key] = matrix
+        return matrix
+
+    def to_networkx(self, undirected: bool = True) -> nx.Graph:
+        """Simple weighted networkx view for algorithms that need one"""
+        graph = nx.Graph() if undirected else nx.DiGraph()
+        graph.add_nodes_from(self.node_ids)
+        matrix = self.adjacency(undirected=undirected, weighted=True).tocoo()
+        ids = self.node_ids
+        graph.add_weighted_edges_from(
+            (ids[i], ids[j], w) for i, j, w in zip(matrix.row, matrix.col, matrix.data)
+            if not undirected or i <= j
+        )
+        return graph
+
+    def needs_compaction(self) -> bool:
+        dead_edges = self.num_edge_rows - self.num_live_edges
+        return (
+            self.num_removed_nodes > 0
+            or dead_edges > COMPACT_DEAD_FRACTION * max(self.num_edge_rows, INITIAL_CAPACITY)
+            or len(self.labels) > max(2 * self.num_live_edges, INITIAL_CAPACITY)
+        )
+
+    def compact(self) -> None:
+        """Rewrite live nodes, edges and labels densely
+
+        Node and edge ids change, so callers must not hold them across a call;
+        the version is bumped so every cached view is rebuilt.
+        """
+        n = self.number_of_nodes()
+        keep_nodes = np.flatnonzero(self.node_alive[:n])
+        remap = np.full(max(n, 1), -1, dtype=np.int32)
+        remap[keep_nodes] = np.arange(len(keep_nodes), dtype=np.int32)
+
+        self.node_ids = [self.node_ids[i] for i in keep_nodes.tolist()]
+        self.node_index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        for name in ("node_type", "risk_score", "node_alive"):
+            setattr(self, name, _compacted(getattr(self, name), keep_nodes))
+        self.num_removed_nodes = 0
+
+        edges = self.live_edges()
+        for name in ("src", "dst", "rel", "amount", "count", "weight", "confidence", "last_ts", "label", "alive"):
+            setattr(self, name, _compacted(getattr(self, name), edges))
+        m = len(edges)
+        self.src[:m] = remap[self.src[:m]]
+        self.dst[:m] = remap[self.dst[:m]]
+        self.num_edge_rows = self.num_live_edges = m
+
+        used = np.unique(self.label[:m][self.label[:m] >= 0])
+        label_remap = np.full(max(len(self.labels), 1), -1, dtype=np.int32)
+        label_remap[used] = np.arange(len(used), dtype=np.int32)
+        self.labels = [self.labels[code] for code in used.tolist()]
+        self._label_index = {value: code for code, value in enumerate(self.labels)}
+        labelled = self.label[:m] >= 0
+        self.label[:m][labelled] = label_remap[self.label[:m][labelled]]
+
+        self._edge_keys = {
+            _edge_key(source, target, rel): edge
+            for edge, (source, target, rel) in enumerate(zip(
+                self.src[:m].tolist(), self.dst[:m].tolist(), self.rel[:m].tolist()
+            ))
+        }
+        self.layout_version += 1
+        self._touch()
+
+    def memory_bytes(self) -> int:
+        columns = (
+            self.node_type, self.risk_score, self.node_alive, self.src, self.dst, self.rel, self.amount,
+            self.count, self.weight, self.confidence, self.last_ts, self.label, self.alive
+        )
+        total = sum(column.nbytes for column in columns)
+        if self._out is not None:
+            total += sum(array.nbytes for view in (self._out, self._in) for array in view)
+        for matrix in self._adjacency.values():
+            total += matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+        return total
+
+    def _touch(self) -> None:
+        self.version += 1
+
+    def _csr(self) -> Tuple[Tuple[np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray]]:
+        if self._csr_version != self.version:
+            n = self.number_of_nodes()
+            edges = self.live_edges()
+            self._out = _build_csr(self.src[edges], edges, n)
+            self._in = _build_csr(self.dst[edges], edges, n)
+            self._adjacency = {}
+            self._csr_version = self.version
+        return self._out, self._in
+
+    def _grow_edges(self, needed: int) -> None:
+        for name in ("src", "dst", "rel", "amount", "count", "weight", "confidence", "last_ts", "label", "alive"):
+            setattr(self, name, _grow(getattr(self, name), needed))
+
+
+def _edge_key(source: int, target: int, rel: int) -> int:
+    return (source << 40) | (target << 8) | rel
+
+
+def _grow(column: np.ndarray, needed: int) -> np.ndarray:
+    capacity = max(needed, len(column) * 2, INITIAL_CAPACITY)
+    grown = np.zeros(capacity, dtype=column.dtype)
+    grown[:len(column)] = column
+    return grown
+
+
+def _compacted(column: np.ndarray, keep: np.ndarray) -> np.ndarray:
+    compacted = np.zeros(max(len(keep), INITIAL_CAPACITY), dtype=column.dtype)
+    compacted[:len(keep)] = column[keep]
+    return compacted
+
+
+def _build_csr(keys: np.ndarray, edges: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    order = np.argsort(keys, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n), out=indptr[1:])
+    return indptr, edges[order]
@@ -0,0 +1,287 @@
+"""
+Ego-network index for subgraph queries
+Cached k-hop neighbourhoods of hub and high-risk nodes and pre-serialized payloads
+"""
+
+import json
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.graph.columnar_graph import ColumnarGraph
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Neighbourhood:
+    """Nodes within ``radius`` hops of a center, in breadth-first layer order"""
+    center: int
+    radius: int
+    members: np.ndarray
+    layer_offsets: np.ndarray  # members[layer_offsets[i]:layer_offsets[i + 1]] is hop i
+    truncated: bool
+
+
+@dataclass
+class SubgraphPage:
+    neighbourhood: Neighbourhood
+    page: int
+    page_size: int
+    nodes: np.ndarray
+    edges: np.ndarray
+    indexed: bool
+
+    @property
+    def total_pages(self) -> int:
+        return max(1, -(-len(self.neighbourhood.members) // self.page_size))
+
+
+class EgoNetworkIndex:
+    """
+    Neighbourhoods of the nodes investigators open most, kept per graph version.
+
+    Nodes with out-degree of at least ``hub_min_degree`` or a risk score of at
+    least ``risk_threshold`` (at most ``max_indexed_nodes``, highest degree
+    first) get their 1..``max_hops``-hop neighbourhoods precomputed when the
+    graph changes; other centers go through a small LRU. Neighbourhoods are
+    capped at ``max_nodes`` members. Node and edge payloads are built and
+    JSON-encoded once per version and reused by every page that includes them.
+
+    ``rebuild`` is meant to run at the end of a graph refresh. Until a rebuild
+    for the current version finishes, queries keep using the previous index
+    (as long as node ids were not reassigned) and a rebuild is started in the
+    background; requests never rebuild it themselves.
+    """
+
+    def __init__(
+        self,
+        max_hops: int = 2,
+        hub_min_degree: int = 25,
+        risk_threshold: float = 70.0,
+        max_indexed_nodes: int = 2000,
+        max_nodes: int = 5000,
+        lru_size: int = 256
+    ):
+        self.max_hops = max_hops
+        self.hub_min_degree = hub_min_degree
+        self.risk_threshold = risk_threshold
+        self.max_indexed_nodes = max_indexed_nodes
+        self.max_nodes = max_nodes
+        self.lru_size = lru_size
+
+        self._version = -1
+        self._layout_version = -1
+        self._indexed: Dict[Tuple[int, int], Neighbourhood] = {}
+        self._recent: "OrderedDict[Tuple[int, int, int, int], Neighbourhood]" = OrderedDict()
+        self._node_json: Dict[Tuple[int, bool], str] = {}
+        self._edge_json: Dict[int, str] = {}
+        self._payload_version = -1
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self._rebuild_lock = threading.Lock()
+        self._rebuild_thread: Optional[threading.Thread] = None
+
+    def invalidate(self) -> None:
+        """Drop cached payloads; payloads can change without a graph version change
+
+        Indexed neighbourhoods stay in service until ``rebuild`` replaces them.
+        """
+        self._recent = OrderedDict()
+        self._node_json = {}
+        self._edge_json = {}
+
+    def rebuild(self, graph: ColumnarGraph) -> None:
+        """Index the current graph version, then swap it in"""
+        with self._rebuild_lock:
+            version, layout_version = graph.version, graph.layout_version
+            if self._version == version:
+                return
+
+            indexed: Dict[Tuple[int, int], Neighbourhood] = {}
+            n = graph.number_of_nodes()
+            candidates = np.zeros(0, dtype=np.int64)
+            if n:
+                adjacency = graph.adjacency(undirected=False)
+                out_degree = np.diff(adjacency.indptr)
+                candidates = np.flatnonzero((out_degree >= self.hub_min_degree) | (graph.risk_score[:n] >= self.risk_threshold))
+                candidates = candidates[np.argsort(-out_degree[candidates], kind="stable")][:self.max_indexed_nodes]
+
+                for center in candidates.tolist():
+                    neighbourhood = self._expand(graph, center, self.max_hops, self.max_nodes)
+                    for radius in range(1, self.max_hops + 1):
+                        indexed[(center, radius)] = self._clip(neighbourhood, radius)
+
+            # Reference assignments; readers see either the old or the new index
+            self._indexed = indexed
+            self._layout_version = layout_version
+            self._version = version
+            self.rebuilds += 1
+        logger.info(f"Ego-network index built for {len(candidates)} nodes at graph version {version}")
+
+    def ensure_current(self, graph: ColumnarGraph) -> None:
+        """Start a background rebuild if the index is behind the graph"""
+        if self._payload_version != graph.version:
+            self._payload_version = graph.version
+            self._node_json = {}
+            self._edge_json = {}
+        if self._version == graph.version:
+            return
+        if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+            return
+        self._rebuild_thread = threading.Thread(
+            target=self._rebuild_quietly, args=(graph,), name="ego-index-rebuild", daemon=True
+        )
+        self._rebuild_thread.start()
+
+    def _rebuild_quietly(self, graph: ColumnarGraph) -> None:
+        try:
+            self.rebuild(graph)
+        except Exception as e:
+            logger.error(f"Ego-network index rebuild failed: {e}")
+
+    def neighbourhood(self, graph: ColumnarGraph, center: int, radius: int,
+                      max_nodes: Optional[int] = None) -> Tuple[Neighbourhood, bool]:
+        """Neighbourhood of ``center`` and whether it came from the index"""
+        self.ensure_current(graph)
+        cap = min(max_nodes or self.max_nodes, self.max_nodes)
+
+        # The previous version's neighbourhoods are served while a rebuild runs,
+        # but not once node ids have been reassigned
+        if self._layout_version == graph.layout_version:
+            cached = self._indexed.get((center, radius))
+            if cached is not None and (len(cached.members) <= cap):
+                self.hits += 1
+                return cached, True
+
+        key = (center, radius, cap, graph.version)
+        cached = self._recent.get(key)
+        if cached is not None:
+            self._recent.move_to_end(key)
+            self.hits += 1
+            return cached, True
+
+        self.misses += 1
+        neighbourhood = self._expand(graph, center, radius, cap)
+        self._recent[key] = neighbourhood
+        if len(self._recent) > self.lru_size:
+            self._recent.popitem(last=False)
+        return neighbourhood, False
+
+    def page(self, graph: ColumnarGraph, center: int, radius: int, page: int = 1,
+             page_size: int = 200, max_nodes: Optional[int] = None) -> SubgraphPage:
+        """
+        One page of members in layer order, plus the edges whose later endpoint
+        (by member position) falls on this page, so each edge is sent once
+        """
+        neighbourhood, indexed = self.neighbourhood(graph, center, radius, max_nodes)
+        members = neighbourhood.members
+        start = (page - 1) * page_size
+        end = min(start + page_size, len(members))
+        nodes = members[start:end]
+
+        position = np.full(graph.number_of_nodes(), -1, dtype=np.int64)
+        position[members] = np.arange(len(members))
+        if len(nodes):
+            candidates = np.unique(np.concatenate(
+                [graph.out_edges(node) for node in nodes] + [graph.in_edges(node) for node in nodes]
+            ))
+        else:
+            candidates = np.zeros(0, dtype=np.int64)
+        source_position = position[graph.src[candidates]]
+        target_position = position[graph.dst[candidates]]
+        later = np.maximum(source_position, target_position)
+        keep = (source_position >= 0) & (target_position >= 0) & (later >= start) & (later < end)
+
+        return SubgraphPage(
+            neighbourhood=neighbourhood,
+            page=page,
+            page_size=page_size,
+            nodes=nodes,
+            edges=candidates[keep],
+            indexed=indexed
+        )
+
+    def node_json(self, node: int, include_properties: bool, build: Callable[[int, bool], Optional[Dict[str, Any]]]) -> Optional[str]:
+        key = (node, include_properties)
+        fragment = self._node_json.get(key)
+        if fragment is None:
+            payload = build(node, include_properties)
+            if payload is None:
+                return None
+            fragment = self._node_json[key] = json.dumps(payload, default=str)
+        return fragment
+
+    def edge_json(self, edge: int, build: Callable[[int], Dict[str, Any]]) -> str:
+        fragment = self._edge_json.get(edge)
+        if fragment is None:
+            fragment = self._edge_json[edge] = json.dumps(build(edge), default=str)
+        return fragment
+
+    def _expand(self, graph: ColumnarGraph, center: int, radius: int, cap: int) -> Neighbourhood:
+        adjacency = graph.adjacency(undirected=False)
+        seen = np.zeros(graph.number_of_nodes(), dtype=bool)
+        seen[center] = True
+        layers = [np.array([center], dtype=np.int64)]
+        total = 1
+        truncated = False
+
+        for _ in range(radius):
+            frontier = layers[-1]
+            if not len(frontier) or truncated:
+                break
+            reached = np.concatenate([adjacency.indices[adjacency.indptr[node]:adjacency.indptr[node + 1]] for node in frontier])
+            reached = np.unique(reached)
+            reached = reached[~seen[reached]]
+            if total + len(reached) > cap:
+                # Keep the riskiest nodes of the last layer that fits
+                reached = reached[np.argsort(-graph.risk_score[reached], kind="stable")][:cap - total]
+                truncated = True
+            seen[reached] = True
+            total += len(reached)
+            layers.append(reached.astype(np.int64))
+
+        sizes = [len(layer) for layer in layers]
+        return Neighbourhood(
+            center=center,
+            radius=radius,
+            members=np.concatenate(layers),
+            layer_offsets=np.concatenate([[0], np.cumsum(sizes)]),
+            truncated=truncated
+        )
+
+    def _clip(self, neighbourhood: Neighbourhood, radius: int) -> Neighbourhood:
+        layers = min(radius + 1, len(neighbourhood.layer_offsets) - 1)
+        end = neighbourhood.layer_offsets[layers]
+        return Neighbourhood(
+            center=neighbourhood.center,
+            radius=radius,
+            members=neighbourhood.members[:end],
+            layer_offsets=neighbourhood.layer_offsets[:layers + 1],
+            truncated=neighbourhood.truncated and end == len(neighbourhood.members)
+        )
+
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            "graph_version": self._version,
+            "rebuilding": self._rebuild_thread is not None and self._rebuild_thread.is_alive(),
+            "rebuilds": self.rebuilds,
+            "indexed_nodes": len({center for center, _ in self._indexed}),
+            "recent_entries": len(self._recent),
+            "node_payloads": len(self._node_json),
+            "edge_payloads": len(self._edge_json),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+def render_page_json(header: Dict[str, Any], node_fragments: List[str], edge_fragments: List[str]) -> str:
+    """Assemble a subgraph response from pre-serialized node and edge payloads"""
+    head = json.dumps(header, default=str)[:-1]
+    separator = ", " if header else ""
+    return f'{head}{separator}"nodes": [{", ".join(node_fragments)}], "edges": [{", ".join(edge_fragments)}]}}'
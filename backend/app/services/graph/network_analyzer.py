@@ -3,7 +3,6 @@ Graph Database Network Analysis Service
 Provides network analysis capabilities using graph databases for relationship mapping
 """
 
-import networkx as nx
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
@@ -17,6 +16,14 @@ from sqlalchemy import text
 import community as community_louvain
 from collections import defaultdict, deque
 
+from app.core.config import settings
+from app.services.graph import algorithms
+from app.services.graph.centrality import CentralityService
+from app.services.graph.columnar_graph import ColumnarGraph
+from app.services.graph.ego_index import EgoNetworkIndex, render_page_json
+from app.services.graph.pattern_search import FlowPath, TemporalFlowSearch, maximal_cliques
+from app.services.graph.transaction_window import PairStore, TransactionWindow, iter_co_occurring_pairs, split_pair_key
+
 logger = logging.getLogger(__name__)
 
 class NodeType(Enum):
@@ -47,6 +54,25 @@ class RelationshipType(Enum):
     CONTROLS = "controls"
     BENEFITS_FROM = "benefits_from"
 
+# Integer codes stored in the graph's node_type / rel columns
+NODE_TYPE_CODES = {node_type: code for code, node_type in enumerate(NodeType)}
+NODE_TYPES = list(NodeType)
+RELATIONSHIP_CODES = {relationship: code for code, relationship in enumerate(RelationshipType)}
+RELATIONSHIP_TYPES = list(RelationshipType)
+TRANSACTS_WITH = RELATIONSHIP_CODES[RelationshipType.TRANSACTS_WITH]
+
+# Transactions fetched per round trip when streaming the analysis window
+TRANSACTION_FETCH_ROWS = 10000
+
+# Flow patterns are time-ordered by each customer pair's latest transfer, not per transfer
+FLOW_TIME_ORDERING = "approximate: ordered by each customer pair's last transfer, not by individual transfers"
+
+# Shared customer attributes -> column in the customers query
+SHARED_ATTRIBUTES = {"address": 6, "phone_number": 7}
+SHARED_RELATIONSHIPS = {"address": RelationshipType.SHARES_ADDRESS, "phone_number": RelationshipType.SHARES_PHONE}
+# (weight, confidence): shared phone is very significant, shared address significant
+SHARED_WEIGHTS = {RelationshipType.SHARES_ADDRESS: (2.0, 0.9), RelationshipType.SHARES_PHONE: (2.5, 0.95)}
+
 @dataclass
 class GraphNode:
     """Graph node representation"""
@@ -88,29 +114,65 @@ class CommunityDetectionResult:
     algorithm: str
 
 class NetworkAnalyzer:
-    """Main network analysis engine using NetworkX"""
+    """Main network analysis engine over a columnar graph"""
     
-    def __init__(self):
-        self.graph = nx.MultiDiGraph()
+    def __init__(self, centrality: Optional[CentralityService] = None):
+        self.graph = ColumnarGraph()
+        self.centrality = centrality or CentralityService()
+        self.ego_index = EgoNetworkIndex()
         self.node_cache: Dict[str, GraphNode] = {}
-        self.edge_cache: Dict[Tuple[str, str], List[GraphEdge]] = {}
         self.patterns_detected: List[NetworkPattern] = []
         self.last_analysis: Optional[datetime] = None
+        
+        # Pattern searches stop after this long; flows may span at most this long
+        self.pattern_search_budget_seconds: float = 2.0
+        self.pattern_search_max_span_seconds: Optional[float] = None
+        self._flow: Optional[TemporalFlowSearch] = None
+        self._flow_version = -1
+        
+        # State kept between builds for incremental refreshes
+        self.transaction_window = TransactionWindow()
+        self.pair_store = PairStore()
+        self.transactions_high_water_mark: Optional[datetime] = None
+        # (updated_at, id) keyset position of the newest customer row applied
+        self.customers_high_water_mark: Optional[Tuple[datetime, int]] = None
+        self.last_refresh: Optional[datetime] = None
+        self._build_params: Optional[Tuple[int, float]] = None
+        self._customer_attributes: Dict[int, tuple] = {}
+        self._shared_groups: Dict[str, Dict[str, Set[int]]] = {attribute: defaultdict(set) for attribute in SHARED_ATTRIBUTES}
     
     def build_graph_from_database(self, db: Session, 
                                  time_window_days: int = 90,
-                                 min_transaction_amount: float = 1000.0):
-        """Build network graph from database data"""
+                                 min_transaction_amount: float = 1000.0,
+                                 incremental: bool = False):
+        """Build network graph from database data
+        
+        With ``incremental`` and an existing graph built with the same
+        parameters, only transactions changed since the last build or refresh,
+        transactions leaving the window and changed customer attributes are
+        applied, as node and edge deltas.
+        """
         try:
+            if incremental and self._build_params == (time_window_days, min_transaction_amount):
+                self._refresh_graph(db, time_window_days, min_transaction_amount)
+                return
+            
             logger.info(f"Building graph from database with {time_window_days}-day window")
             
             # Clear existing graph
             self.graph.clear()
             self.node_cache.clear()
-            self.edge_cache.clear()
+            self.transaction_window = TransactionWindow()
+            self.pair_store = PairStore()
+            self._customer_attributes = {}
+            self._shared_groups = {attribute: defaultdict(set) for attribute in SHARED_ATTRIBUTES}
+            self.customers_high_water_mark = None
             
             cutoff_date = datetime.now() - timedelta(days=time_window_days)
             
+            # Load the transactions every relationship below is derived from
+            self._load_transaction_window(db, cutoff_date)
+            
             # Add customer nodes
             self._add_customer_nodes(db, cutoff_date)
             
@@ -123,40 +185,177 @@ class NetworkAnalyzer:
             # Add account relationships
             self._add_account_relationships(db)
             
+            self._build_params = (time_window_days, min_transaction_amount)
+            self._compact_graph()
+            self.last_refresh = datetime.now()
+            self.ego_index.invalidate()
+            self.ego_index.rebuild(self.graph)
             logger.info(f"Graph built with {self.graph.number_of_nodes()} nodes and {self.graph.number_of_edges()} edges")
             
         except Exception as e:
             logger.error(f"Error building graph from database: {e}")
+            # A failed build leaves no baseline to refresh from
+            self._build_params = None
             raise
     
-    def _add_customer_nodes(self, db: Session, cutoff_date: datetime):
-        """Add customer nodes to the graph"""
+    def _refresh_graph(self, db: Session, time_window_days: int, min_amount: float):
+        """Apply transaction and customer changes since the last build or refresh"""
+        window = self.transaction_window
+        cutoff_date = datetime.now() - timedelta(days=time_window_days)
+        cutoff_ts = cutoff_date.timestamp()
+        
         query = """
-        SELECT 
-            c.id,
-            c.first_name,
-            c.last_name,
-            c.date_of_birth,
-            c.risk_score,
-            c.kyc_status,
-            c.address,
-            c.phone_number,
-            c.email,
-            c.created_at,
-            COUNT(t.id) as transaction_count,
-            SUM(t.amount) as total_transaction_amount,
-            MAX(t.transaction_date) as last_transaction_date
-        FROM customers c
-        LEFT JOIN transactions t ON c.id = t.customer_id AND t.transaction_date >= :cutoff_date
-        GROUP BY c.id, c.first_name, c.last_name, c.date_of_birth, c.risk_score, 
-                 c.kyc_status, c.address, c.phone_number, c.email, c.created_at
+        SELECT id, customer_id, transaction_date, amount, country, updated_at
+        FROM transactions
+        WHERE updated_at >= :high_water_mark
         """
+        changed_rows = db.execute(text(query), {"high_water_mark": self.transactions_high_water_mark}).fetchall()
+        ids, customers, times, amounts, countries = self._window_columns(changed_rows)
+        
+        # Retract pairs involving transactions that left the window or changed
+        removed = (window.ts < cutoff_ts) | np.isin(window.ids, ids)
+        touched = set(window.customer[removed].tolist())
+        self.pair_store.apply_chunks(iter_co_occurring_pairs(window, removed, min_amount), sign=-1)
+        window.remove(removed)
+        
+        # Add pairs involving the new versions still inside the window
+        current = times >= cutoff_ts
+        inserted = window.insert(ids[current], customers[current], times[current], amounts[current], countries[current])
+        self.pair_store.apply_chunks(iter_co_occurring_pairs(window, inserted, min_amount))
+        touched.update(customers[current].tolist())
+        
+        self._advance_high_water_mark(changed_rows)
+        
+        # Customer attribute changes and deletions, then window aggregates of affected customers
+        touched.update(self._apply_customer_rows(self._fetch_customer_rows(db, changed_only=True), link_shared=True))
+        deleted = self._remove_deleted_customers(db)
+        touched.difference_update(deleted)
+        self._update_customer_aggregates(np.fromiter(touched, dtype=np.int64, count=len(touched)))
+        
+        self._materialize_transaction_edges(min_amount)
+        self._compact_graph()
+        self.last_refresh = datetime.now()
+        # Payloads go now; indexed neighbourhoods are replaced once rebuilt
+        self.ego_index.invalidate()
+        self.ego_index.rebuild(self.graph)
+        
+        logger.info(
+            f"Graph refreshed: {int(removed.sum())} transactions retracted, {int(current.sum())} applied, "
+            f"{len(touched)} customers updated, {len(deleted)} removed; {self.graph.number_of_nodes()} nodes, {self.graph.number_of_edges()} edges"
+        )
+    
+    def _load_transaction_window(self, db: Session, cutoff_date: datetime):
+        """Stream all transactions inside the analysis window in time order"""
+        query = """
+        SELECT id, customer_id, transaction_date, amount, country, updated_at
+        FROM transactions
+        WHERE transaction_date >= :cutoff_date
+        ORDER BY transaction_date
+        """
+        # Server-side cursor: rows arrive in batches instead of one large result set
+        result = db.execute(text(query).execution_options(stream_results=True), {"cutoff_date": cutoff_date})
+        self.transactions_high_water_mark = datetime.min
+        
+        batches = []
+        while True:
+            rows = result.fetchmany(TRANSACTION_FETCH_ROWS)
+            if not rows:
+                break
+            batches.append(self._window_columns(rows))
+            self._advance_high_water_mark(rows)
+        
+        if batches:
+            self.transaction_window.insert(*(np.concatenate(column) for column in zip(*batches)))
+    
+    def _window_columns(self, rows) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        rows = [row for row in rows if row[1] is not None and row[2] is not None]
+        return (
+            np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)),
+            np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows)),
+            np.fromiter((row[2].timestamp() for row in rows), dtype=np.float64, count=len(rows)),
+            np.fromiter((float(row[3] or 0) for row in rows), dtype=np.float64, count=len(rows)),
+            np.fromiter((self.transaction_window.country_code(row[4]) for row in rows), dtype=np.int32, count=len(rows))
+        )
+    
+    def _advance_high_water_mark(self, rows):
+        updated = [row[5] for row in rows if row[5] is not None]
+        if updated:
+            self.transactions_high_water_mark = max(self.transactions_high_water_mark, max(updated))
+    
+    def _fetch_customer_rows(self, db: Session, changed_only: bool = False):
+        """All customers, or those changed since the customer high-water mark"""
+        query = """
+        SELECT id, first_name, last_name, date_of_birth, risk_score,
+               kyc_status, address, phone_number, email, created_at, updated_at
+        FROM customers
+        """
+        params = {}
+        if changed_only and self.customers_high_water_mark is not None:
+            # Keyset on (updated_at, id) so rows sharing the boundary timestamp are neither lost nor repeated
+            query += "WHERE updated_at > :updated_at OR (updated_at = :updated_at AND id > :customer_id)"
+            params = {"updated_at": self.customers_high_water_mark[0], "customer_id": self.customers_high_water_mark[1]}
+        rows = db.execute(text(query), params).fetchall()
+        
+        for row in rows:
+            if row[10] is not None and (
+                self.customers_high_water_mark is None or (row[10], row[0]) > self.customers_high_water_mark
+            ):
+                self.customers_high_water_mark = (row[10], row[0])
+        return rows
+    
+    def _remove_deleted_customers(self, db: Session) -> Set[int]:
+        """Drop nodes, edges and shared-attribute links of customers deleted since the last pass"""
+        # Every known id was present at the last pass, so an unchanged count means no deletions
+        total = db.execute(text("SELECT COUNT(*) FROM customers")).scalar()
+        if total == len(self._customer_attributes):
+            return set()
+        
+        existing = {row[0] for row in db.execute(text("SELECT id FROM customers"))}
+        deleted = set(self._customer_attributes) - existing
+        for customer_id in deleted:
+            attributes = self._customer_attributes[customer_id]
+            for attribute, column in SHARED_ATTRIBUTES.items():
+                self._move_shared_attribute(attribute, customer_id, attributes[column], None)
+            node_id = f"customer_{customer_id}"
+            self.graph.remove_node(node_id)
+            self.node_cache.pop(node_id, None)
+            del self._customer_attributes[customer_id]
+        return deleted
+    
+    def _compact_graph(self):
+        """Reclaim tombstoned edges, removed nodes and unused labels once they add up"""
+        if self.graph.needs_compaction():
+            rows = self.graph.num_edge_rows
+            self.graph.compact()
+            logger.info(f"Compacted graph edge rows from {rows} to {self.graph.num_edge_rows}")
+    
+    def _add_customer_nodes(self, db: Session, cutoff_date: datetime):
+        """Add customer nodes to the graph"""
+        self._apply_customer_rows(self._fetch_customer_rows(db))
         
-        result = db.execute(text(query), {"cutoff_date": cutoff_date})
-        customers = result.fetchall()
+        # Transaction aggregates come from the window loaded for this build
+        self._update_customer_aggregates(np.fromiter(self._customer_attributes, dtype=np.int64))
+    
+    def _apply_customer_rows(self, customers, link_shared: bool = False) -> Set[int]:
+        """Add new customers and update changed ones; returns the ids that changed"""
+        changed = set()
         
         for customer in customers:
+            attributes = tuple(customer)
+            previous = self._customer_attributes.get(customer[0])
+            if previous == attributes:
+                continue
+            
             node_id = f"customer_{customer[0]}"
+            node = self.node_cache.get(node_id)
+            aggregates = {
+                key: node.properties[key]
+                for key in ("transaction_count", "total_transaction_amount", "last_transaction_date")
+            } if node else {
+                "transaction_count": 0,
+                "total_transaction_amount": 0.0,
+                "last_transaction_date": None
+            }
             
             properties = {
                 "customer_id": customer[0],
@@ -169,172 +368,227 @@ class NetworkAnalyzer:
                 "phone_number": customer[7],
                 "email": customer[8],
                 "created_at": customer[9].isoformat() if customer[9] else None,
-                "transaction_count": customer[10] or 0,
-                "total_transaction_amount": float(customer[11] or 0),
-                "last_transaction_date": customer[12].isoformat() if customer[12] else None
+                **aggregates
             }
             
             node = GraphNode(
                 node_id=node_id,
                 node_type=NodeType.CUSTOMER,
                 properties=properties,
-                risk_score=float(customer[4] or 0)
+                risk_score=float(customer[4] or 0),
+                centrality_scores=node.centrality_scores if node else None
             )
             
             self.node_cache[node_id] = node
-            self.graph.add_node(node_id, **asdict(node))
+            self.graph.add_node(node_id, NODE_TYPE_CODES[node.node_type], node.risk_score)
+            
+            if link_shared:
+                for attribute, column in SHARED_ATTRIBUTES.items():
+                    old_value = previous[column] if previous is not None else None
+                    if old_value != customer[column]:
+                        self._move_shared_attribute(attribute, customer[0], old_value, customer[column])
+            
+            self._customer_attributes[customer[0]] = attributes
+            changed.add(customer[0])
+        
+        return changed
+    
+    def _update_customer_aggregates(self, customer_ids: np.ndarray):
+        """Recompute window transaction count, total and last date for customers"""
+        window = self.transaction_window
+        rows = np.isin(window.customer, customer_ids)
+        customers, inverse = np.unique(window.customer[rows], return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(customers))
+        totals = np.bincount(inverse, weights=window.amount[rows], minlength=len(customers))
+        last = np.full(len(customers), -np.inf)
+        np.maximum.at(last, inverse, window.ts[rows])
+        found = {
+            int(customer): (int(count), float(total), float(latest))
+            for customer, count, total, latest in zip(customers, counts, totals, last)
+        }
+        
+        for customer_id in customer_ids.tolist():
+            node = self.node_cache.get(f"customer_{customer_id}")
+            if node is None:
+                continue
+            count, total, latest = found.get(customer_id, (0, 0.0, None))
+            node.properties["transaction_count"] = count
+            node.properties["total_transaction_amount"] = total
+            node.properties["last_transaction_date"] = datetime.fromtimestamp(latest).isoformat() if latest is not None else None
     
     def _add_transaction_relationships(self, db: Session, cutoff_date: datetime, min_amount: float):
         """Add transaction relationships between customers"""
-        # For this example, we'll create relationships based on transactions to/from the same accounts
-        # In a real system, you'd have more sophisticated relationship detection
+        # Customers are related when they transact within an hour of each other;
+        # a sweep over the time-sorted window replaces the transactions self-join
+        window = self.transaction_window
+        self.pair_store.apply_chunks(iter_co_occurring_pairs(window, np.ones(len(window), dtype=bool), min_amount))
         
-        query = """
-        WITH customer_transactions AS (
-            SELECT 
-                t1.customer_id as customer1_id,
-                t2.customer_id as customer2_id,
-                COUNT(*) as transaction_count,
-                SUM(t1.amount + t2.amount) as total_amount,
-                MAX(GREATEST(t1.transaction_date, t2.transaction_date)) as last_transaction_date,
-                STRING_AGG(DISTINCT t1.country, ', ') as countries
-            FROM transactions t1
-            JOIN transactions t2 ON t1.customer_id != t2.customer_id
-                AND ABS(EXTRACT(EPOCH FROM (t1.transaction_date - t2.transaction_date))) < 3600  -- Within 1 hour
-                AND t1.amount >= :min_amount
-                AND t2.amount >= :min_amount
-                AND t1.transaction_date >= :cutoff_date
-                AND t2.transaction_date >= :cutoff_date
-            GROUP BY t1.customer_id, t2.customer_id
-            HAVING COUNT(*) >= 2  -- At least 2 related transactions
-        )
-        SELECT * FROM customer_transactions
-        ORDER BY total_amount DESC
-        LIMIT 1000
-        """
+        self._materialize_transaction_edges(min_amount)
+    
+    def _materialize_transaction_edges(self, min_amount: float, min_count: int = 2, limit: int = 1000):
+        """Sync TRANSACTS_WITH edges to the top pairs by co-occurring amount"""
+        window = self.transaction_window
+        top = self.pair_store.top(min_count, limit)
+        keys = self.pair_store.keys[top]
+        
+        # Exact last date and countries for just the selected pairs
+        first_customers, _ = split_pair_key(keys)
+        pair_last = np.full(len(keys), -np.inf)
+        pair_countries = []
+        order = np.argsort(keys)
+        for first, _, pair_keys, _, latest in iter_co_occurring_pairs(
+            window, np.isin(window.customer, first_customers), min_amount
+        ):
+            selected = np.isin(pair_keys, keys)
+            rows = order[np.searchsorted(keys, pair_keys[selected], sorter=order)]
+            np.maximum.at(pair_last, rows, latest[selected])
+            pair_countries.append(rows * (len(window.countries) + 1) + window.country[first[selected]] + 1)
         
-        result = db.execute(text(query), {"cutoff_date": cutoff_date, "min_amount": min_amount})
-        relationships = result.fetchall()
+        last_by_key = {key: latest for key, latest in zip(keys.tolist(), pair_last.tolist()) if latest > -np.inf}
+        countries_by_key: Dict[int, Set[str]] = defaultdict(set)
+        if pair_countries:
+            for combined in np.unique(np.concatenate(pair_countries)).tolist():
+                row, country = divmod(combined, len(window.countries) + 1)
+                if country > 0:
+                    countries_by_key[int(keys[row])].add(window.countries[country - 1])
         
-        for rel in relationships:
-            source_id = f"customer_{rel[0]}"
-            target_id = f"customer_{rel[1]}"
+        wanted = set()
+        for row, key in zip(top.tolist(), keys.tolist()):
+            customer1, customer2 = key >> 32, key & 0xFFFFFFFF
+            source_id = f"customer_{customer1}"
+            target_id = f"customer_{customer2}"
             
             if source_id in self.node_cache and target_id in self.node_cache:
-                edge = GraphEdge(
-                    source_id=source_id,
-                    target_id=target_id,
-                    relationship_type=RelationshipType.TRANSACTS_WITH,
-                    properties={
-                        "transaction_count": rel[2],
-                        "total_amount": float(rel[3]),
-                        "last_transaction_date": rel[4].isoformat() if rel[4] else None,
-                        "countries": rel[5]
-                    },
-                    weight=float(rel[3]) / 10000,  # Normalize weight
-                    confidence=min(1.0, rel[2] / 10)  # More transactions = higher confidence
+                count = int(self.pair_store.count[row])
+                total_amount = float(self.pair_store.total[row])
+                countries = countries_by_key.get(key)
+                edge = self.graph.add_edge(
+                    self.graph.index(source_id),
+                    self.graph.index(target_id),
+                    TRANSACTS_WITH,
+                    amount=total_amount,
+                    count=count,
+                    weight=total_amount / 10000,  # Normalize weight
+                    confidence=min(1.0, count / 10),  # More transactions = higher confidence
+                    last_ts=last_by_key.get(key, float("nan")),
+                    label=", ".join(sorted(countries)) if countries else None
                 )
-                
-                self.graph.add_edge(source_id, target_id, **asdict(edge))
+                wanted.add(edge)
+        
+        # Pairs that dropped out of the top set or out of the window
+        live = self.graph.live_edges()
+        for edge in live[self.graph.rel[live] == TRANSACTS_WITH].tolist():
+            if edge not in wanted:
+                self.graph.remove_edge(edge)
     
     def _add_shared_attribute_relationships(self, db: Session):
         """Add relationships based on shared attributes"""
-        # Customers sharing the same address
-        query = """
-        SELECT c1.id, c2.id, c1.address
-        FROM customers c1
-        JOIN customers c2 ON c1.address = c2.address AND c1.id < c2.id
-        WHERE c1.address IS NOT NULL AND c1.address != ''
-        """
-        
-        result = db.execute(text(query))
-        shared_addresses = result.fetchall()
-        
-        for addr_rel in shared_addresses:
-            source_id = f"customer_{addr_rel[0]}"
-            target_id = f"customer_{addr_rel[1]}"
+        # Customers sharing the same address or phone number, linked from the lower id
+        for attribute, column in SHARED_ATTRIBUTES.items():
+            groups = self._shared_groups[attribute]
+            for customer_id, attributes in self._customer_attributes.items():
+                value = attributes[column]
+                if value:
+                    groups[value].add(customer_id)
             
-            if source_id in self.node_cache and target_id in self.node_cache:
-                edge = GraphEdge(
-                    source_id=source_id,
-                    target_id=target_id,
-                    relationship_type=RelationshipType.SHARES_ADDRESS,
-                    properties={"shared_address": addr_rel[2]},
-                    weight=2.0,  # Shared address is significant
-                    confidence=0.9
-                )
-                
-                self.graph.add_edge(source_id, target_id, **asdict(edge))
+            for value, members in groups.items():
+                ordered = sorted(members)
+                for i, first in enumerate(ordered):
+                    for second in ordered[i + 1:]:
+                        self._add_shared_edge(attribute, first, second, value)
+    
+    def _move_shared_attribute(self, attribute: str, customer_id: int, old_value: Optional[str], new_value: Optional[str]):
+        """Re-link a customer whose shared attribute value changed"""
+        groups = self._shared_groups[attribute]
+        relationship = SHARED_RELATIONSHIPS[attribute]
+        node = self.graph.index(f"customer_{customer_id}")
         
-        # Customers sharing the same phone number
-        query = """
-        SELECT c1.id, c2.id, c1.phone_number
-        FROM customers c1
-        JOIN customers c2 ON c1.phone_number = c2.phone_number AND c1.id < c2.id
-        WHERE c1.phone_number IS NOT NULL AND c1.phone_number != ''
-        """
+        if old_value and customer_id in groups.get(old_value, ()):
+            groups[old_value].discard(customer_id)
+            for other in groups[old_value]:
+                other_node = self.graph.index(f"customer_{other}")
+                source, target = (node, other_node) if customer_id < other else (other_node, node)
+                edge = self.graph.find_edge(source, target, RELATIONSHIP_CODES[relationship])
+                if edge >= 0:
+                    self.graph.remove_edge(edge)
+            if not groups[old_value]:
+                del groups[old_value]
         
-        result = db.execute(text(query))
-        shared_phones = result.fetchall()
+        if new_value:
+            for other in groups[new_value]:
+                self._add_shared_edge(attribute, min(customer_id, other), max(customer_id, other), new_value)
+            groups[new_value].add(customer_id)
+    
+    def _add_shared_edge(self, attribute: str, first: int, second: int, value: str):
+        source_id = f"customer_{first}"
+        target_id = f"customer_{second}"
         
-        for phone_rel in shared_phones:
-            source_id = f"customer_{phone_rel[0]}"
-            target_id = f"customer_{phone_rel[1]}"
-            
-            if source_id in self.node_cache and target_id in self.node_cache:
-                edge = GraphEdge(
-                    source_id=source_id,
-                    target_id=target_id,
-                    relationship_type=RelationshipType.SHARES_PHONE,
-                    properties={"shared_phone": phone_rel[2]},
-                    weight=2.5,  # Phone sharing is very significant
-                    confidence=0.95
-                )
-                
-                self.graph.add_edge(source_id, target_id, **asdict(edge))
+        if source_id in self.node_cache and target_id in self.node_cache:
+            relationship = SHARED_RELATIONSHIPS[attribute]
+            self.graph.add_edge(
+                self.graph.index(source_id),
+                self.graph.index(target_id),
+                RELATIONSHIP_CODES[relationship],
+                weight=SHARED_WEIGHTS[relationship][0],
+                confidence=SHARED_WEIGHTS[relationship][1],
+                label=value
+            )
     
     def _add_account_relationships(self, db: Session):
         """Add account ownership relationships (if account data available)"""
         # This is a placeholder - in a real system, you'd have account tables
         pass
     
+    def _edge_properties(self, edge: int) -> Dict[str, Any]:
+        """Rebuild an edge's property dict from the typed columns"""
+        relationship = RELATIONSHIP_TYPES[self.graph.rel[edge]]
+        if relationship == RelationshipType.TRANSACTS_WITH:
+            last_ts = self.graph.last_ts[edge]
+            return {
+                "transaction_count": int(self.graph.count[edge]),
+                "total_amount": float(self.graph.amount[edge]),
+                "last_transaction_date": None if np.isnan(last_ts) else datetime.fromtimestamp(last_ts).isoformat(),
+                "countries": self.graph.label_of(edge)
+            }
+        if relationship == RelationshipType.SHARES_ADDRESS:
+            return {"shared_address": self.graph.label_of(edge)}
+        if relationship == RelationshipType.SHARES_PHONE:
+            return {"shared_phone": self.graph.label_of(edge)}
+        return {}
+    
+    def _edge_payload(self, edge: int) -> Dict[str, Any]:
+        return {
+            "source": self.graph.node_ids[self.graph.src[edge]],
+            "target": self.graph.node_ids[self.graph.dst[edge]],
+            "relationship_type": RELATIONSHIP_TYPES[self.graph.rel[edge]].value,
+            "weight": float(self.graph.weight[edge]),
+            "properties": self._edge_properties(edge)
+        }
+    
+    def _transaction_edges_within(self, members: np.ndarray) -> np.ndarray:
+        """Live TRANSACTS_WITH edges with both endpoints in ``members``"""
+        inside = np.zeros(self.graph.number_of_nodes(), dtype=bool)
+        inside[members] = True
+        edges = np.concatenate([self.graph.out_edges(node) for node in members]) if len(members) else np.zeros(0, dtype=np.int64)
+        return edges[(self.graph.rel[edges] == TRANSACTS_WITH) & inside[self.graph.dst[edges]]]
+    
     def calculate_centrality_measures(self) -> Dict[str, Dict[str, float]]:
         """Calculate various centrality measures for all nodes"""
         try:
             logger.info("Calculating centrality measures")
             
             centrality_results = {}
+            n = self.graph.number_of_nodes()
+            if n == 0:
+                return centrality_results
             
-            # Convert to undirected for some centrality measures
-            undirected_graph = self.graph.to_undirected()
-            
-            # Degree centrality
-            degree_centrality = nx.degree_centrality(self.graph)
-            
-            # Betweenness centrality
-            betweenness_centrality = nx.betweenness_centrality(undirected_graph, k=min(100, len(undirected_graph)))
-            
-            # Closeness centrality
-            closeness_centrality = nx.closeness_centrality(undirected_graph)
-            
-            # Eigenvector centrality (if graph is connected)
-            try:
-                eigenvector_centrality = nx.eigenvector_centrality(undirected_graph, max_iter=1000)
-            except nx.NetworkXException:
-                eigenvector_centrality = {node: 0.0 for node in self.graph.nodes()}
-            
-            # PageRank
-            pagerank = nx.pagerank(self.graph, max_iter=1000)
+            # Approximate within the service's error bounds; cached until the graph changes
+            result = self.centrality.compute(self.graph)
+            measures = result.measures
             
             # Combine all centrality measures
-            for node in self.graph.nodes():
-                centrality_results[node] = {
-                    "degree_centrality": degree_centrality.get(node, 0.0),
-                    "betweenness_centrality": betweenness_centrality.get(node, 0.0),
-                    "closeness_centrality": closeness_centrality.get(node, 0.0),
-                    "eigenvector_centrality": eigenvector_centrality.get(node, 0.0),
-                    "pagerank": pagerank.get(node, 0.0)
-                }
+            for index, node in enumerate(self.graph.node_ids):
+                centrality_results[node] = {name: float(values[index]) for name, values in measures.items()}
                 
                 # Update node cache
                 if node in self.node_cache:
@@ -353,8 +607,8 @@ class NetworkAnalyzer:
             logger.info(f"Detecting communities using {algorithm} algorithm")
             
             if algorithm == "louvain":
-                # Convert to undirected for community detection
-                undirected_graph = self.graph.to_undirected()
+                # Undirected view with parallel edge weights summed
+                undirected_graph = self.graph.to_networkx(undirected=True)
                 
                 # Apply Louvain community detection
                 partition = community_louvain.best_partition(undirected_graph, weight='weight')
@@ -423,24 +677,26 @@ class NetworkAnalyzer:
         patterns = []
         
         try:
-            # Find cliques of size 4 or larger
-            cliques = list(nx.find_cliques(self.graph.to_undirected()))
-            large_cliques = [clique for clique in cliques if len(clique) >= 4]
-            
-            for i, clique in enumerate(large_cliques[:10]):  # Limit to top 10
-                # Calculate total transaction volume in clique
-                total_volume = 0.0
-                edges = []
-                
-                for node1 in clique:
-                    for node2 in clique:
-                        if node1 != node2 and self.graph.has_edge(node1, node2):
-                            edge_data = self.graph.get_edge_data(node1, node2)
-                            if edge_data:
-                                for edge in edge_data.values():
-                                    if edge.get('relationship_type') == RelationshipType.TRANSACTS_WITH.value:
-                                        total_volume += edge.get('properties', {}).get('total_amount', 0)
-                                        edges.append((node1, node2))
+            # Find cliques of size 4 or larger, within the search budget
+            cliques, complete = maximal_cliques(
+                self.graph.adjacency(undirected=True), min_size=4, budget_seconds=self.pattern_search_budget_seconds
+            )
+            if not complete:
+                logger.info(f"Clique search stopped at budget with {len(cliques)} cliques found")
+            
+            # Calculate total transaction volume in each clique and keep the top 10
+            scored = []
+            for clique in cliques:
+                clique_edges = self._transaction_edges_within(np.array(clique))
+                scored.append((float(self.graph.amount[clique_edges].sum()), clique, clique_edges))
+            scored.sort(key=lambda item: -item[0])
+            
+            for i, (total_volume, clique, clique_edges) in enumerate(scored[:10]):
+                members = [self.graph.node_ids[node] for node in clique]
+                edges = [
+                    (self.graph.node_ids[self.graph.src[edge]], self.graph.node_ids[self.graph.dst[edge]])
+                    for edge in clique_edges
+                ]
                 
                 if total_volume > 100000:  # Significant volume threshold
                     pattern = NetworkPattern(
@@ -449,7 +705,7 @@ class NetworkAnalyzer:
                         description=f"Dense subgraph of {len(clique)} customers with high transaction volume",
                         confidence=min(0.9, total_volume / 1000000),
                         risk_level="HIGH" if total_volume > 500000 else "MEDIUM",
-                        involved_nodes=list(clique),
+                        involved_nodes=members,
                         involved_edges=edges,
                         properties={
                             "clique_size": len(clique),
@@ -471,49 +727,41 @@ class NetworkAnalyzer:
         
         try:
             # Find nodes with high degree centrality
-            centrality = nx.degree_centrality(self.graph)
-            high_degree_nodes = [(node, centrality[node]) for node in centrality 
-                               if centrality[node] > 0.1]  # Top 10% by degree
+            centrality = algorithms.degree_centrality(self.graph.degrees())
+            high_degree_nodes = np.flatnonzero(centrality > 0.1)  # Top 10% by degree
+            directed = self.graph.adjacency(undirected=False)
             
-            for node, degree_centrality in high_degree_nodes[:5]:  # Top 5 candidates
-                neighbors = list(self.graph.neighbors(node))
+            for node in high_degree_nodes[:5]:  # Top 5 candidates
+                neighbors = self.graph.successors(node)
                 
                 if len(neighbors) >= 5:  # At least 5 connections
                     # Check if it's actually a star (neighbors not connected to each other)
-                    neighbor_edges = 0
-                    for n1 in neighbors:
-                        for n2 in neighbors:
-                            if n1 != n2 and self.graph.has_edge(n1, n2):
-                                neighbor_edges += 1
+                    among_neighbors = directed[neighbors][:, neighbors]
+                    neighbor_edges = among_neighbors.nnz - among_neighbors.diagonal().astype(bool).sum()
                     
                     neighbor_connectivity = neighbor_edges / (len(neighbors) * (len(neighbors) - 1))
                     
                     if neighbor_connectivity < 0.2:  # Low connectivity among neighbors = star pattern
                         # Calculate total transaction volume
-                        total_volume = 0.0
-                        edges = []
-                        
-                        for neighbor in neighbors:
-                            if self.graph.has_edge(node, neighbor):
-                                edge_data = self.graph.get_edge_data(node, neighbor)
-                                if edge_data:
-                                    for edge in edge_data.values():
-                                        if edge.get('relationship_type') == RelationshipType.TRANSACTS_WITH.value:
-                                            total_volume += edge.get('properties', {}).get('total_amount', 0)
-                                            edges.append((node, neighbor))
+                        spokes = self.graph.out_edges(node)
+                        spokes = spokes[self.graph.rel[spokes] == TRANSACTS_WITH]
+                        total_volume = float(self.graph.amount[spokes].sum())
+                        node_id = self.graph.node_ids[node]
+                        edges = [(node_id, self.graph.node_ids[target]) for target in self.graph.dst[spokes]]
+                        neighbor_ids = [self.graph.node_ids[neighbor] for neighbor in neighbors]
                         
                         pattern = NetworkPattern(
-                            pattern_id=f"star_pattern_{node}",
+                            pattern_id=f"star_pattern_{node_id}",
                             pattern_type="star_pattern",
                             description=f"Star pattern with {len(neighbors)} connections (potential smurfing)",
                             confidence=min(0.9, (1 - neighbor_connectivity) * len(neighbors) / 10),
                             risk_level="HIGH" if len(neighbors) > 10 else "MEDIUM",
-                            involved_nodes=[node] + neighbors,
+                            involved_nodes=[node_id] + neighbor_ids,
                             involved_edges=edges,
                             properties={
-                                "center_node": node,
+                                "center_node": node_id,
                                 "spoke_count": len(neighbors),
-                                "neighbor_connectivity": neighbor_connectivity,
+                                "neighbor_connectivity": float(neighbor_connectivity),
                                 "total_volume": total_volume
                             },
                             detected_at=datetime.now()
@@ -529,172 +777,150 @@ class NetworkAnalyzer:
         """Detect chain patterns (potential layering)"""
         patterns = []
         
+        def decreasing_ratio(amounts: List[float]) -> Optional[float]:
+            # Check for decreasing pattern (layering indicator)
+            decreasing = sum(1 for i in range(len(amounts) - 1) if amounts[i] > amounts[i + 1])
+            ratio = decreasing / (len(amounts) - 1)
+            return ratio if ratio > 0.6 else None  # Mostly decreasing
+        
         try:
-            # Look for long paths with decreasing amounts (typical layering pattern)
-            for start_node in list(self.graph.nodes())[:50]:  # Sample nodes
-                try:
-                    # Find paths of length 3-6 from this node
-                    for target_node in self.graph.nodes():
-                        if start_node != target_node:
-                            try:
-                                paths = list(nx.all_simple_paths(self.graph, start_node, target_node, cutoff=6))
-                                
-                                for path in paths:
-                                    if len(path) >= 4:  # At least 4 nodes in chain
-                                        # Analyze transaction amounts along the path
-                                        amounts = []
-                                        edges = []
-                                        
-                                        for i in range(len(path) - 1):
-                                            if self.graph.has_edge(path[i], path[i + 1]):
-                                                edge_data = self.graph.get_edge_data(path[i], path[i + 1])
-                                                if edge_data:
-                                                    for edge in edge_data.values():
-                                                        if edge.get('relationship_type') == RelationshipType.TRANSACTS_WITH.value:
-                                                            amount = edge.get('properties', {}).get('total_amount', 0)
-                                                            amounts.append(amount)
-                                                            edges.append((path[i], path[i + 1]))
-                                                            break
-                                        
-                                        # Check for decreasing pattern (layering indicator)
-                                        if len(amounts) >= 3 and amounts[0] > 50000:
-                                            decreasing = sum(1 for i in range(len(amounts) - 1) 
-                                                           if amounts[i] > amounts[i + 1])
-                                            decreasing_ratio = decreasing / (len(amounts) - 1)
-                                            
-                                            if decreasing_ratio > 0.6:  # Mostly decreasing
-                                                pattern = NetworkPattern(
-                                                    pattern_id=f"chain_pattern_{start_node}_{target_node}",
-                                                    pattern_type="chain_pattern",
-                                                    description=f"Chain of {len(path)} nodes with decreasing amounts (potential layering)",
-                                                    confidence=decreasing_ratio,
-                                                    risk_level="HIGH" if decreasing_ratio > 0.8 else "MEDIUM",
-                                                    involved_nodes=path,
-                                                    involved_edges=edges,
-                                                    properties={
-                                                        "chain_length": len(path),
-                                                        "decreasing_ratio": decreasing_ratio,
-                                                        "start_amount": amounts[0] if amounts else 0,
-                                                        "end_amount": amounts[-1] if amounts else 0
-                                                    },
-                                                    detected_at=datetime.now()
-                                                )
-                                                patterns.append(pattern)
-                                                
-                                                if len(patterns) >= 10:  # Limit results
-                                                    break
-                                
-                                if len(patterns) >= 10:
-                                    break
-                            except nx.NetworkXNoPath:
-                                continue
-                        
-                        if len(patterns) >= 10:
-                            break
-                    
-                    if len(patterns) >= 10:
-                        break
-                        
-                except Exception:
-                    continue
+            # Look for time-ordered paths of 4-7 customers with decreasing amounts (typical layering)
+            result = self._flow_search().chains(
+                min_length=3,
+                max_length=6,
+                top_k=5,
+                min_start_amount=50000,
+                accept=decreasing_ratio,
+                budget_seconds=self.pattern_search_budget_seconds
+            )
+            if not result.complete:
+                logger.info(f"Chain search stopped at budget after {result.expansions} expansions")
+            
+            for path in result.paths:
+                path_ids = [self.graph.node_ids[member] for member in path.nodes]
+                amounts = [float(self._flow.amount[edge]) for edge in path.edges]
+                pattern = NetworkPattern(
+                    pattern_id=f"chain_pattern_{path_ids[0]}_{path_ids[-1]}",
+                    pattern_type="chain_pattern",
+                    description=f"Chain of {len(path_ids)} nodes with decreasing amounts (potential layering)",
+                    confidence=path.score,
+                    risk_level="HIGH" if path.score > 0.8 else "MEDIUM",
+                    involved_nodes=path_ids,
+                    involved_edges=list(zip(path_ids, path_ids[1:])),
+                    properties={
+                        "chain_length": len(path_ids),
+                        "decreasing_ratio": path.score,
+                        "start_amount": amounts[0],
+                        "end_amount": amounts[-1],
+                        "total_volume": path.volume,
+                        **self._flow_time_span(path)
+                    },
+                    detected_at=datetime.now()
+                )
+                patterns.append(pattern)
         
         except Exception as e:
             logger.error(f"Error detecting chain patterns: {e}")
         
-        return patterns[:5]  # Return top 5
+        return patterns
     
     def _detect_circular_patterns(self) -> List[NetworkPattern]:
         """Detect circular transaction patterns"""
         patterns = []
         
         try:
-            # Find simple cycles in the graph
-            try:
-                cycles = list(nx.simple_cycles(self.graph))
-                cycles = [cycle for cycle in cycles if len(cycle) >= 3 and len(cycle) <= 8]  # Reasonable cycle sizes
+            # Money returning to its origin through 3-8 customers, each hop later than the last
+            result = self._flow_search().cycles(
+                min_length=3,
+                max_length=8,
+                top_k=10,
+                min_volume=25000,  # Significant circular flow
+                budget_seconds=self.pattern_search_budget_seconds
+            )
+            if not result.complete:
+                logger.info(f"Cycle search stopped at budget after {result.expansions} expansions")
+            
+            for i, path in enumerate(result.paths):
+                cycle = [self.graph.node_ids[member] for member in path.nodes]
+                edges = list(zip(cycle, cycle[1:] + cycle[:1]))
+                total_volume = path.volume
                 
-                for i, cycle in enumerate(cycles[:10]):  # Limit to 10 cycles
-                    # Calculate total volume in cycle
-                    total_volume = 0.0
-                    edges = []
-                    
-                    for j in range(len(cycle)):
-                        current = cycle[j]
-                        next_node = cycle[(j + 1) % len(cycle)]
-                        
-                        if self.graph.has_edge(current, next_node):
-                            edge_data = self.graph.get_edge_data(current, next_node)
-                            if edge_data:
-                                for edge in edge_data.values():
-                                    if edge.get('relationship_type') == RelationshipType.TRANSACTS_WITH.value:
-                                        total_volume += edge.get('properties', {}).get('total_amount', 0)
-                                        edges.append((current, next_node))
-                                        break
-                    
-                    if total_volume > 25000:  # Significant circular flow
-                        pattern = NetworkPattern(
-                            pattern_id=f"circular_pattern_{i}",
-                            pattern_type="circular_pattern",
-                            description=f"Circular transaction pattern of {len(cycle)} customers",
-                            confidence=min(0.9, total_volume / 100000),
-                            risk_level="HIGH" if total_volume > 100000 else "MEDIUM",
-                            involved_nodes=cycle,
-                            involved_edges=edges,
-                            properties={
-                                "cycle_length": len(cycle),
-                                "total_volume": total_volume,
-                                "average_amount": total_volume / len(edges) if edges else 0
-                            },
-                            detected_at=datetime.now()
-                        )
-                        patterns.append(pattern)
-                        
-            except nx.NetworkXError:
-                # Graph might be too large for cycle detection
-                pass
+                pattern = NetworkPattern(
+                    pattern_id=f"circular_pattern_{i}",
+                    pattern_type="circular_pattern",
+                    description=f"Circular transaction pattern of {len(cycle)} customers",
+                    confidence=min(0.9, total_volume / 100000),
+                    risk_level="HIGH" if total_volume > 100000 else "MEDIUM",
+                    involved_nodes=cycle,
+                    involved_edges=edges,
+                    properties={
+                        "cycle_length": len(cycle),
+                        "total_volume": total_volume,
+                        "average_amount": total_volume / len(edges),
+                        **self._flow_time_span(path)
+                    },
+                    detected_at=datetime.now()
+                )
+                patterns.append(pattern)
         
         except Exception as e:
             logger.error(f"Error detecting circular patterns: {e}")
         
         return patterns
     
+    def _flow_search(self) -> TemporalFlowSearch:
+        """Time-ordered TRANSACTS_WITH index, rebuilt when the graph changes"""
+        if self._flow is None or self._flow_version != self.graph.version:
+            self._flow = TemporalFlowSearch(self.graph, TRANSACTS_WITH, self.pattern_search_max_span_seconds)
+            self._flow_version = self.graph.version
+        return self._flow
+    
+    def _flow_time_span(self, path: FlowPath) -> Dict[str, Any]:
+        first, last = self._flow.ts[path.edges[0]], self._flow.ts[path.edges[-1]]
+        return {
+            "first_transaction_date": datetime.fromtimestamp(first).isoformat(),
+            "last_transaction_date": datetime.fromtimestamp(last).isoformat(),
+            "time_span_hours": float(last - first) / 3600,
+            "time_ordering": FLOW_TIME_ORDERING
+        }
+    
     def _detect_bridge_patterns(self) -> List[NetworkPattern]:
         """Detect bridge nodes that connect different communities"""
         patterns = []
         
         try:
-            # Calculate betweenness centrality to find bridge nodes
-            betweenness = nx.betweenness_centrality(self.graph.to_undirected(), k=100)
-            high_betweenness = [(node, score) for node, score in betweenness.items() 
-                              if score > 0.1]  # High betweenness centrality
+            # Calculate betweenness centrality to find bridge nodes (reusing current centrality results)
+            cached = self.centrality.cached(self.graph)
+            if cached is not None:
+                betweenness = cached.measures["betweenness_centrality"]
+            else:
+                betweenness = algorithms.betweenness_centrality(
+                    self.graph.adjacency(undirected=True), k=min(100, self.graph.number_of_nodes())
+                )
+            high_betweenness = np.flatnonzero(betweenness > 0.1)  # High betweenness centrality
             
-            for node, betweenness_score in high_betweenness[:5]:  # Top 5 bridge candidates
-                neighbors = list(self.graph.neighbors(node))
+            for node in high_betweenness[:5]:  # Top 5 bridge candidates
+                neighbors = self.graph.successors(node)
                 
                 if len(neighbors) >= 3:  # Must connect multiple nodes
                     # Calculate transaction volume through this bridge
-                    total_volume = 0.0
-                    edges = []
-                    
-                    for neighbor in neighbors:
-                        if self.graph.has_edge(node, neighbor):
-                            edge_data = self.graph.get_edge_data(node, neighbor)
-                            if edge_data:
-                                for edge in edge_data.values():
-                                    if edge.get('relationship_type') == RelationshipType.TRANSACTS_WITH.value:
-                                        total_volume += edge.get('properties', {}).get('total_amount', 0)
-                                        edges.append((node, neighbor))
+                    flows = self.graph.out_edges(node)
+                    flows = flows[self.graph.rel[flows] == TRANSACTS_WITH]
+                    total_volume = float(self.graph.amount[flows].sum())
+                    node_id = self.graph.node_ids[node]
+                    edges = [(node_id, self.graph.node_ids[target]) for target in self.graph.dst[flows]]
+                    betweenness_score = float(betweenness[node])
                     
                     pattern = NetworkPattern(
-                        pattern_id=f"bridge_pattern_{node}",
+                        pattern_id=f"bridge_pattern_{node_id}",
                         pattern_type="bridge_pattern",
                         description=f"Bridge node connecting {len(neighbors)} different network segments",
                         confidence=min(0.9, betweenness_score * 2),
                         risk_level="MEDIUM",
-                        involved_nodes=[node] + neighbors,
+                        involved_nodes=[node_id] + [self.graph.node_ids[neighbor] for neighbor in neighbors],
                         involved_edges=edges,
                         properties={
-                            "bridge_node": node,
+                            "bridge_node": node_id,
                             "betweenness_centrality": betweenness_score,
                             "connected_nodes": len(neighbors),
                             "flow_volume": total_volume
@@ -714,99 +940,118 @@ class NetworkAnalyzer:
             return None
         
         node = self.node_cache[node_id]
+        index = self.graph.index(node_id)
         
         # Get neighbors
-        neighbors = list(self.graph.neighbors(node_id))
+        neighbors = [self.graph.node_ids[neighbor] for neighbor in self.graph.successors(index)]
         
         # Get edge details
         edges = []
-        for neighbor in neighbors:
-            edge_data = self.graph.get_edge_data(node_id, neighbor)
-            if edge_data:
-                for edge in edge_data.values():
-                    edges.append({
-                        "target": neighbor,
-                        "relationship_type": edge.get('relationship_type'),
-                        "weight": edge.get('weight'),
-                        "properties": edge.get('properties', {})
-                    })
+        for edge in self.graph.out_edges(index):
+            payload = self._edge_payload(edge)
+            edges.append({
+                "target": payload["target"],
+                "relationship_type": payload["relationship_type"],
+                "weight": payload["weight"],
+                "properties": payload["properties"]
+            })
         
         return {
             "node_id": node_id,
             "node_type": node.node_type.value,
             "properties": node.properties,
             "risk_score": node.risk_score,
-            "centrality_scores": node.centrality_scores or {},
+            "centrality_scores": self._node_centrality(node, index),
             "neighbor_count": len(neighbors),
             "neighbors": neighbors,
             "edges": edges
         }
     
-    def get_subgraph(self, center_node: str, radius: int = 2) -> Dict[str, Any]:
+    def _node_centrality(self, node: GraphNode, index: int) -> Dict[str, float]:
+        """Scores for the current graph when computed, else the last ones stored on the node"""
+        cached = self.centrality.cached(self.graph)
+        if cached is not None:
+            return cached.scores(index)
+        return node.centrality_scores or {}
+    
+    def get_subgraph(self, center_node: str, radius: int = 2, page: int = 1, page_size: int = 200,
+                     max_nodes: Optional[int] = None, include_properties: bool = False) -> Dict[str, Any]:
         """Get subgraph around a specific node"""
-        if center_node not in self.graph.nodes():
+        payload = self.get_subgraph_json(center_node, radius, page, page_size, max_nodes, include_properties)
+        if payload is None:
             return {"nodes": [], "edges": []}
+        return json.loads(payload)
+    
+    def get_subgraph_json(self, center_node: str, radius: int = 2, page: int = 1, page_size: int = 200,
+                          max_nodes: Optional[int] = None, include_properties: bool = False) -> Optional[str]:
+        """
+        One page of the subgraph around a node as a JSON document, assembled
+        from cached node and edge payloads; None when the node is unknown
+        """
+        if center_node not in self.graph:
+            return None
         
-        # Get nodes within radius
-        subgraph_nodes = set([center_node])
-        current_layer = {center_node}
-        
-        for _ in range(radius):
-            next_layer = set()
-            for node in current_layer:
-                neighbors = set(self.graph.neighbors(node))
-                next_layer.update(neighbors)
-            current_layer = next_layer - subgraph_nodes
-            subgraph_nodes.update(current_layer)
-        
-        # Extract subgraph
-        subgraph = self.graph.subgraph(subgraph_nodes)
+        # Get nodes within radius (precomputed for hubs and high-risk nodes)
+        result = self.ego_index.page(
+            self.graph, self.graph.index(center_node), radius, max(page, 1), max(page_size, 1), max_nodes
+        )
         
         # Format for visualization
-        nodes = []
-        for node in subgraph.nodes():
-            node_data = self.node_cache.get(node, None)
-            if node_data:
-                nodes.append({
-                    "id": node,
-                    "type": node_data.node_type.value,
-                    "label": node_data.properties.get("name", node),
-                    "risk_score": node_data.risk_score,
-                    "properties": node_data.properties
-                })
+        nodes = [
+            fragment for fragment in (
+                self.ego_index.node_json(member, include_properties, self._node_payload)
+                for member in result.nodes.tolist()
+            ) if fragment is not None
+        ]
+        edges = [self.ego_index.edge_json(edge, self._edge_payload) for edge in result.edges.tolist()]
         
-        edges = []
-        for source, target in subgraph.edges():
-            edge_data = self.graph.get_edge_data(source, target)
-            if edge_data:
-                for edge in edge_data.values():
-                    edges.append({
-                        "source": source,
-                        "target": target,
-                        "relationship_type": edge.get('relationship_type'),
-                        "weight": edge.get('weight', 1.0),
-                        "properties": edge.get('properties', {})
-                    })
-        
-        return {
+        header = {
             "center_node": center_node,
             "radius": radius,
-            "nodes": nodes,
-            "edges": edges,
             "node_count": len(nodes),
-            "edge_count": len(edges)
+            "edge_count": len(edges),
+            "total_nodes": len(result.neighbourhood.members),
+            "page": result.page,
+            "page_size": result.page_size,
+            "total_pages": result.total_pages,
+            "truncated": result.neighbourhood.truncated,
+            "indexed": result.indexed
+        }
+        return render_page_json(header, nodes, edges)
+    
+    def _node_payload(self, index: int, include_properties: bool) -> Optional[Dict[str, Any]]:
+        node = self.graph.node_ids[index]
+        node_data = self.node_cache.get(node)
+        if node_data is None:
+            return None
+        payload = {
+            "id": node,
+            "type": node_data.node_type.value,
+            "label": node_data.properties.get("name", node),
+            "risk_score": node_data.risk_score
         }
+        if include_properties:
+            payload["properties"] = node_data.properties
+        return payload
     
     def get_graph_statistics(self) -> Dict[str, Any]:
         """Get overall graph statistics"""
         try:
+            node_count = self.graph.number_of_nodes()
+            edge_count = self.graph.number_of_edges()
             stats = {
-                "node_count": self.graph.number_of_nodes(),
-                "edge_count": self.graph.number_of_edges(),
-                "density": nx.density(self.graph),
-                "is_connected": nx.is_weakly_connected(self.graph),
+                "node_count": node_count,
+                "edge_count": edge_count,
+                "density": edge_count / (node_count * (node_count - 1)) if node_count > 1 else 0.0,
+                "is_connected": algorithms.is_weakly_connected(self.graph.adjacency(undirected=False)),
                 "patterns_detected": len(self.patterns_detected),
-                "last_analysis": self.last_analysis.isoformat() if self.last_analysis else None
+                "last_analysis": self.last_analysis.isoformat() if self.last_analysis else None,
+                "graph_memory_bytes": self.graph.memory_bytes(),
+                "last_refresh": self.last_refresh.isoformat() if self.last_refresh else None,
+                "window_transactions": len(self.transaction_window),
+                "co_occurring_pairs": len(self.pair_store),
+                "centrality": self.centrality.get_statistics(),
+                "ego_index": self.ego_index.get_statistics()
             }
             
             # Node type distribution
@@ -818,12 +1063,11 @@ class NetworkAnalyzer:
             stats["node_type_distribution"] = node_type_dist
             
             # Relationship type distribution
-            relationship_type_dist = {}
-            for _, _, edge_data in self.graph.edges(data=True):
-                rel_type = edge_data.get('relationship_type', 'unknown')
-                relationship_type_dist[rel_type] = relationship_type_dist.get(rel_type, 0) + 1
-            
-            stats["relationship_type_distribution"] = relationship_type_dist
+            relationship_codes = np.bincount(self.graph.rel[self.graph.live_edges()], minlength=len(RELATIONSHIP_TYPES))
+            stats["relationship_type_distribution"] = {
+                RELATIONSHIP_TYPES[code].value: int(count)
+                for code, count in enumerate(relationship_codes) if count
+            }
             
             return stats
             
@@ -838,5 +1082,7 @@ def get_network_analyzer() -> NetworkAnalyzer:
     """Get the global network analyzer instance"""
     global network_analyzer
     if network_analyzer is None:
-        network_analyzer = NetworkAnalyzer()
+        network_analyzer = NetworkAnalyzer(
+            centrality=CentralityService(cache_dir=settings.GRAPH_CENTRALITY_CACHE_DIR)
+        )
     return network_analyzer
\ No newline at end of file
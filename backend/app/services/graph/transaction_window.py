@@ -0,0 +1,172 @@
+"""
+In-memory transaction window and customer-pair co-occurrence aggregates
+Used to maintain TRANSACTS_WITH edges incrementally between graph refreshes
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Two transactions co-occur when they are strictly less than this far apart
+CO_OCCURRENCE_SECONDS = 3600.0
+# Candidate pairs expanded per chunk when sweeping the window
+PAIR_CHUNK_PAIRS = 1 << 21
+
+
+def pair_key(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    return (first.astype(np.int64) << 32) | second.astype(np.int64)
+
+
+def split_pair_key(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    return keys >> 32, keys & 0xFFFFFFFF
+
+
+class TransactionWindow:
+    """Transactions inside the analysis window as columns sorted by time"""
+
+    def __init__(self):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.customer = np.zeros(0, dtype=np.int64)
+        self.ts = np.zeros(0, dtype=np.float64)
+        self.amount = np.zeros(0, dtype=np.float64)
+        self.country = np.zeros(0, dtype=np.int32)
+        self.countries: List[str] = []
+        self._country_index: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def country_code(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        code = self._country_index.get(value)
+        if code is None:
+            code = self._country_index[value] = len(self.countries)
+            self.countries.append(value)
+        return code
+
+    def insert(self, ids: np.ndarray, customer: np.ndarray, ts: np.ndarray,
+               amount: np.ndarray, country: np.ndarray) -> np.ndarray:
+        """Add rows and return a mask of the inserted rows in the new order"""
+        inserted = np.concatenate([np.zeros(len(self.ids), dtype=bool), np.ones(len(ids), dtype=bool)])
+        self.ids = np.concatenate([self.ids, ids])
+        self.customer = np.concatenate([self.customer, customer])
+        self.ts = np.concatenate([self.ts, ts])
+        self.amount = np.concatenate([self.amount, amount])
+        self.country = np.concatenate([self.country, country])
+
+        order = np.argsort(self.ts, kind="stable")
+        self._take(order)
+        return inserted[order]
+
+    def remove(self, mask: np.ndarray) -> None:
+        self._take(np.flatnonzero(~mask))
+
+    def _take(self, rows: np.ndarray) -> None:
+        self.ids = self.ids[rows]
+        self.customer = self.customer[rows]
+        self.ts = self.ts[rows]
+        self.amount = self.amount[rows]
+        self.country = self.country[rows]
+
+    def memory_bytes(self) -> int:
+        return sum(column.nbytes for column in (self.ids, self.customer, self.ts, self.amount, self.country))
+
+
+def iter_co_occurring_pairs(
+    window: TransactionWindow,
+    mask: np.ndarray,
+    min_amount: float
+) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Ordered transaction pairs (a, b) from different customers, both at or above
+    ``min_amount``, strictly less than an hour apart, with ``a`` or ``b`` in
+    ``mask``. Each such pair is yielded exactly once, in chunks of row arrays
+    ``(a, b)`` plus their pair keys, summed amounts and later timestamp.
+
+    The window is sorted by time, so each source row's neighbours are one
+    contiguous slice found by binary search; sources are swept in time order
+    and cut into chunks of at most ``PAIR_CHUNK_PAIRS`` candidate pairs.
+    """
+    eligible = window.amount >= min_amount
+    sources = np.flatnonzero(mask & eligible)
+    times = window.ts[sources]
+    low = np.searchsorted(window.ts, times - CO_OCCURRENCE_SECONDS, side="right")
+    high = np.searchsorted(window.ts, times + CO_OCCURRENCE_SECONDS, side="left")
+    lengths = high - low
+
+    boundaries = np.searchsorted(np.cumsum(lengths), np.arange(PAIR_CHUNK_PAIRS, lengths.sum(), PAIR_CHUNK_PAIRS))
+    for chunk in np.split(np.arange(len(sources)), np.unique(boundaries)):
+        if not len(chunk):
+            continue
+        chunk_lengths = lengths[chunk]
+        source = np.repeat(sources[chunk], chunk_lengths)
+        offsets = np.repeat(np.cumsum(chunk_lengths) - chunk_lengths, chunk_lengths)
+        neighbour = np.repeat(low[chunk], chunk_lengths) + (np.arange(chunk_lengths.sum()) - offsets)
+
+        keep = eligible[neighbour] & (window.customer[neighbour] != window.customer[source])
+        source, neighbour = source[keep], neighbour[keep]
+
+        # (s, n) always; (n, s) only when n is not itself a source, so it is not emitted twice
+        reverse = ~mask[neighbour]
+        first = np.concatenate([source, neighbour[reverse]])
+        second = np.concatenate([neighbour, source[reverse]])
+
+        keys = pair_key(window.customer[first], window.customer[second])
+        totals = window.amount[first] + window.amount[second]
+        latest = np.maximum(window.ts[first], window.ts[second])
+        yield first, second, keys, totals, latest
+
+
+class PairStore:
+    """Co-occurrence count and summed amount per ordered customer pair"""
+
+    def __init__(self):
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.count = np.zeros(0, dtype=np.int64)
+        self.total = np.zeros(0, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def apply_chunks(self, chunks: Iterable[Tuple[np.ndarray, ...]], sign: int = 1) -> None:
+        """
+        Add (sign=1) or subtract (sign=-1) ``iter_co_occurring_pairs`` output.
+        Each chunk is reduced to its distinct pairs and the store merged once.
+        """
+        reduced_keys, reduced_counts, reduced_sums = [], [], []
+        for _, _, keys, totals, _ in chunks:
+            unique, inverse = np.unique(keys, return_inverse=True)
+            reduced_keys.append(unique)
+            reduced_counts.append(np.bincount(inverse, minlength=len(unique)))
+            reduced_sums.append(np.bincount(inverse, weights=totals, minlength=len(unique)))
+        if not reduced_keys:
+            return
+
+        unique, inverse = np.unique(np.concatenate(reduced_keys), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate(reduced_counts), minlength=len(unique))
+        sums = np.bincount(inverse, weights=np.concatenate(reduced_sums), minlength=len(unique))
+        self._merge(unique, np.rint(counts).astype(np.int64) * sign, sums * sign)
+
+    def _merge(self, unique: np.ndarray, counts: np.ndarray, sums: np.ndarray) -> None:
+        merged = np.union1d(self.keys, unique)
+        count = np.zeros(len(merged), dtype=np.int64)
+        total = np.zeros(len(merged), dtype=np.float64)
+        existing = np.searchsorted(merged, self.keys)
+        count[existing] = self.count
+        total[existing] = self.total
+        delta = np.searchsorted(merged, unique)
+        count[delta] += counts
+        total[delta] += sums
+
+        keep = count > 0
+        self.keys, self.count, self.total = merged[keep], count[keep], total[keep]
+
+    def top(self, min_count: int, limit: int) -> np.ndarray:
+        """Row indices of the pairs with the largest totals among those with enough co-occurrences"""
+        candidates = np.flatnonzero(self.count >= min_count)
+        order = np.argsort(-self.total[candidates], kind="stable")
+        return candidates[order[:limit]]
+
+    def memory_bytes(self) -> int:
+        return self.keys.nbytes + self.count.nbytes + self.total.nbytes
@@ -13,6 +13,7 @@ from .stream_processor import (
     publish_ml_prediction_event,
     publish_alert_event
 )
+from .event_log import EventLog
 
 __all__ = [
     "StreamingService",
@@ -23,5 +24,6 @@ __all__ = [
     "get_streaming_service",
     "publish_transaction_event",
     "publish_ml_prediction_event", 
-    "publish_alert_event"
+    "publish_alert_event",
+    "EventLog"
 ]
\ No newline at end of file
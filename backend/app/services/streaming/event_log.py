@@ -0,0 +1,264 @@
+"""
+Durable, replayable event log for the streaming pipeline
+Append-only segment files written through mmap, with compact binary records
+and committed consumer offsets
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Record header: body length, crc32 of body, offset, event timestamp (epoch seconds)
+RECORD_HEADER = struct.Struct("<IIQd")
+# String fields are length-prefixed; this length marks None
+NULL_STRING = 0xFFFF
+STRING_LENGTH = struct.Struct("<H")
+
+SEGMENT_SUFFIX = ".log"
+OFFSETS_FILE = "offsets.json"
+
+
+@dataclass
+class LogRecord:
+    """A record read back from the event log"""
+    offset: int
+    timestamp: float
+    fields: Tuple[Optional[str], ...]
+    data: Dict[str, Any]
+
+
+def encode_body(fields: Tuple[Optional[str], ...], data: Dict[str, Any]) -> bytes:
+    parts = [struct.pack("<B", len(fields))]
+    for value in fields:
+        if value is None:
+            parts.append(STRING_LENGTH.pack(NULL_STRING))
+        else:
+            encoded = value.encode()[:NULL_STRING - 1]
+            parts.append(STRING_LENGTH.pack(len(encoded)))
+            parts.append(encoded)
+    parts.append(json.dumps(data, separators=(",", ":"), default=str).encode())
+    return b"".join(parts)
+
+
+def decode_body(body: bytes) -> Tuple[Tuple[Optional[str], ...], Dict[str, Any]]:
+    count = body[0]
+    position = 1
+    fields = []
+    for _ in range(count):
+        (length,) = STRING_LENGTH.unpack_from(body, position)
+        position += STRING_LENGTH.size
+        if length == NULL_STRING:
+            fields.append(None)
+        else:
+            fields.append(body[position:position + length].decode())
+            position += length
+    return tuple(fields), json.loads(body[position:])
+
+
+class LogSegment:
+    """A preallocated segment file mapped into memory"""
+
+    def __init__(self, path: str, base_offset: int, size: int):
+        self.path = path
+        self.base_offset = base_offset
+        self.size = size
+        self.next_offset = base_offset
+        self.position = 0
+        self.first_timestamp: Optional[float] = None
+
+        exists = os.path.exists(path)
+        self._file = open(path, "r+b" if exists else "w+b")
+        if not exists or os.path.getsize(path) < size:
+            self._file.truncate(size)
+        self.size = os.path.getsize(path)
+        self._map = mmap.mmap(self._file.fileno(), self.size)
+
+        if exists:
+            self._recover()
+
+    def _recover(self) -> None:
+        """Find the end of valid data; a torn or zeroed record ends the segment"""
+        for record, end in self._scan(0):
+            if self.first_timestamp is None:
+                self.first_timestamp = record.timestamp
+            self.next_offset = record.offset + 1
+            self.position = end
+
+    def _scan(self, position: int) -> Iterator[Tuple[LogRecord, int]]:
+        while position + RECORD_HEADER.size <= self.size:
+            length, checksum, offset, timestamp = RECORD_HEADER.unpack_from(self._map, position)
+            if length == 0:
+                return
+            start = position + RECORD_HEADER.size
+            end = start + length
+            if end > self.size:
+                return
+            body = self._map[start:end]
+            if zlib.crc32(body) != checksum:
+                logger.warning(f"Corrupt record at {self.path}:{position}; ignoring the rest of the segment")
+                return
+            fields, data = decode_body(body)
+            yield LogRecord(offset, timestamp, fields, data), end
+            position = end
+
+    def has_room(self, length: int) -> bool:
+        return self.position + RECORD_HEADER.size + length <= self.size
+
+    def append(self, timestamp: float, body: bytes) -> int:
+        offset = self.next_offset
+        header = RECORD_HEADER.pack(len(body), zlib.crc32(body), offset, timestamp)
+        end = self.position + len(header) + len(body)
+        self._map[self.position:end] = header + body
+        self.position = end
+        self.next_offset += 1
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp
+        return offset
+
+    def read(self, from_offset: int) -> Iterator[LogRecord]:
+        for record, _ in self._scan(0):
+            if record.offset >= from_offset:
+                yield record
+
+    def flush(self) -> None:
+        self._map.flush()
+
+    def close(self) -> None:
+        self._map.flush()
+        self._map.close()
+        self._file.close()
+
+
+class EventLog:
+    """
+    Append-only log of segment files named by their first offset.
+
+    Offsets are record sequence numbers. Appends are durable once flushed
+    (every ``flush_every`` records and on ``flush``/``close``); consumers commit
+    the highest offset they have fully processed and resume after it.
+    """
+
+    def __init__(self, directory: str, segment_size: int = 64 * 1024 * 1024, flush_every: int = 100):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.flush_every = flush_every
+        self._unflushed = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self.segments: List[LogSegment] = [
+            LogSegment(os.path.join(directory, name), int(name[:-len(SEGMENT_SUFFIX)]), segment_size)
+            for name in sorted(os.listdir(directory))
+            if name.endswith(SEGMENT_SUFFIX)
+        ]
+        if not self.segments:
+            self.segments.append(self._new_segment(0))
+
+        self._offsets = self._load_offsets()
+
+    @property
+    def next_offset(self) -> int:
+        return self.segments[-1].next_offset
+
+    def append(self, timestamp: float, fields: Tuple[Optional[str], ...], data: Dict[str, Any]) -> int:
+        """Append a record and return its offset"""
+        body = encode_body(fields, data)
+        with self._lock:
+            segment = self.segments[-1]
+            if not segment.has_room(len(body)):
+                if segment.next_offset == segment.base_offset:
+                    raise ValueError(f"Record of {len(body)} bytes does not fit in a segment")
+                segment.flush()
+                segment = self._new_segment(segment.next_offset)
+                self.segments.append(segment)
+
+            offset = segment.append(timestamp, body)
+            self._unflushed += 1
+            if self._unflushed >= self.flush_every:
+                segment.flush()
+                self._unflushed = 0
+            return offset
+
+    def read(self, from_offset: int = 0, to_offset: Optional[int] = None) -> Iterator[LogRecord]:
+        """Records with ``from_offset <= offset < to_offset`` in offset order"""
+        for i, segment in enumerate(list(self.segments)):
+            following = self.segments[i + 1].base_offset if i + 1 < len(self.segments) else None
+            if following is not None and following <= from_offset:
+                continue
+            for record in segment.read(from_offset):
+                if to_offset is not None and record.offset >= to_offset:
+                    return
+                yield record
+
+    def offset_for_time(self, timestamp: float) -> int:
+        """First offset of the last segment that starts at or before ``timestamp``"""
+        offset = self.segments[0].base_offset
+        for segment in self.segments:
+            if segment.first_timestamp is not None and segment.first_timestamp <= timestamp:
+                offset = segment.base_offset
+        return offset
+
+    def commit(self, consumer: str, offset: int) -> None:
+        """Record that ``consumer`` has processed everything up to and including ``offset``"""
+        with self._lock:
+            self.flush()
+            self._offsets[consumer] = offset
+            path = os.path.join(self.directory, OFFSETS_FILE)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._offsets, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+
+    def committed(self, consumer: str) -> int:
+        """Last committed offset of a consumer, or -1"""
+        return self._offsets.get(consumer, -1)
+
+    def truncate_before(self, offset: int) -> int:
+        """Delete whole segments that only hold records before ``offset``"""
+        removed = 0
+        with self._lock:
+            while len(self.segments) > 1 and self.segments[1].base_offset <= offset:
+                segment = self.segments.pop(0)
+                segment.close()
+                os.remove(segment.path)
+                removed += 1
+        return removed
+
+    def flush(self) -> None:
+        self.segments[-1].flush()
+        self._unflushed = 0
+
+    def close(self) -> None:
+        with self._lock:
+            for segment in self.segments:
+                segment.close()
+
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "segments": len(self.segments),
+            "first_offset": self.segments[0].base_offset,
+            "next_offset": self.next_offset,
+            "committed": dict(self._offsets)
+        }
+
+    def _new_segment(self, base_offset: int) -> LogSegment:
+        path = os.path.join(self.directory, f"{base_offset:020d}{SEGMENT_SUFFIX}")
+        return LogSegment(path, base_offset, self.segment_size)
+
+    def _load_offsets(self) -> Dict[str, int]:
+        path = os.path.join(self.directory, OFFSETS_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
@@ -0,0 +1,207 @@
+"""
+Non-blocking subscriber fan-out for the streaming service
+Each subscriber gets a bounded buffer drained by its own task, so a slow
+callback delays only its own deliveries. A subscriber never holds more than
+one executor thread, and one that keeps failing or timing out is closed.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from app.services.streaming.metrics import StreamingMetrics
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop_oldest"
+COALESCE = "coalesce"
+
+
+def default_coalesce_key(data: Any) -> Hashable:
+    """Alerts coalesce by alert id, events by the entity they describe"""
+    if isinstance(data, dict):
+        alert = data.get("alert")
+        if isinstance(alert, dict) and "alert_id" in alert:
+            return alert["alert_id"]
+        return id(data)
+    entity_id = getattr(data, "entity_id", None)
+    if entity_id is None:
+        return id(data)
+    return (getattr(data, "entity_type", None), entity_id)
+
+
+class SubscriberChannel:
+    """
+    Bounded buffer and delivery task for one subscriber callback.
+
+    A sync callback that overruns ``timeout`` keeps running on its executor
+    thread (threads cannot be interrupted), so the next delivery waits for it
+    instead of taking a second thread. After ``max_failures`` consecutive
+    errors or timeouts the channel closes, drops its buffer and calls
+    ``on_close`` so the owner can forget it.
+    """
+
+    def __init__(
+        self,
+        event_type: str,
+        callback: Callable,
+        executor: Executor,
+        metrics: Optional[StreamingMetrics] = None,
+        buffer_size: int = 1000,
+        policy: str = DROP_OLDEST,
+        timeout: Optional[float] = 5.0,
+        coalesce_key: Callable[[Any], Hashable] = default_coalesce_key,
+        max_failures: int = 3,
+        on_close: Optional[Callable[["SubscriberChannel"], None]] = None
+    ):
+        if policy not in (DROP_OLDEST, COALESCE):
+            raise ValueError(f"Unknown subscriber buffer policy: {policy}")
+
+        self.event_type = event_type
+        self.callback = callback
+        self.name = f"{event_type}:{getattr(callback, '__qualname__', type(callback).__name__)}"
+        self.executor = executor
+        self.metrics = metrics
+        self.buffer_size = max(1, buffer_size)
+        self.policy = policy
+        self.timeout = timeout
+        self.coalesce_key = coalesce_key
+        self.is_async = asyncio.iscoroutinefunction(callback)
+        self.max_failures = max(1, max_failures)
+        self.on_close = on_close
+        self.closed = False
+
+        self._buffer: Any = OrderedDict() if policy == COALESCE else deque()
+        self._ready: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # Executor call of a sync callback that may still be running
+        self._running_call: Optional[asyncio.Future] = None
+        self._consecutive_failures = 0
+
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def offer(self, data: Any) -> None:
+        """Buffer an item without waiting; the oldest pending item is dropped when full"""
+        if self.closed:
+            self.dropped += 1
+            return
+
+        if self.policy == COALESCE:
+            key = self.coalesce_key(data)
+            if key in self._buffer:
+                # Keep the slot (and its place in line), deliver the newest value
+                self._buffer[key] = data
+                self.coalesced += 1
+            else:
+                if len(self._buffer) >= self.buffer_size:
+                    self._buffer.popitem(last=False)
+                    self.dropped += 1
+                self._buffer[key] = data
+        else:
+            if len(self._buffer) >= self.buffer_size:
+                self._buffer.popleft()
+                self.dropped += 1
+            self._buffer.append(data)
+
+        if self._task is None or self._task.done():
+            self._ready = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        self._ready.set()
+
+    def _pop(self) -> Any:
+        if self.policy == COALESCE:
+            return self._buffer.popitem(last=False)[1]
+        return self._buffer.popleft()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while not self.closed:
+            if self._running_call is not None and not self._running_call.done():
+                # An overrun sync callback still holds its thread; wait for it
+                # rather than occupying another one
+                try:
+                    await asyncio.wait_for(asyncio.shield(self._running_call), timeout=self.timeout)
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    self._record_failure(f"still running after {self.timeout}s")
+                    continue
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    pass
+
+            if not self._buffer:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+
+            data = self._pop()
+            started = time.perf_counter()
+            try:
+                if self.is_async:
+                    delivery = self.callback(data)
+                else:
+                    self._running_call = loop.run_in_executor(self.executor, self.callback, data)
+                    delivery = asyncio.shield(self._running_call)
+                await asyncio.wait_for(delivery, timeout=self.timeout)
+                self.delivered += 1
+                self._consecutive_failures = 0
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                self._record_failure(f"timed out after {self.timeout}s")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                self._record_failure(f"raised {e}")
+            finally:
+                if self.metrics is not None:
+                    self.metrics.record_subscriber(self.name, time.perf_counter() - started)
+
+    def _record_failure(self, reason: str) -> None:
+        self._consecutive_failures += 1
+        logger.warning(f"Subscriber {self.name} {reason}")
+        if self._consecutive_failures >= self.max_failures:
+            logger.warning(f"Dropping subscriber {self.name} after {self._consecutive_failures} consecutive failures")
+            self.close()
+
+    def close(self) -> None:
+        """Stop delivering, discard pending items and notify the owner"""
+        if self.closed:
+            return
+        self.closed = True
+        self.dropped += len(self._buffer)
+        self._buffer.clear()
+        if self._ready is not None:
+            self._ready.set()
+        if self.on_close is not None:
+            self.on_close(self)
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            "subscriber": self.name,
+            "policy": self.policy,
+            "pending": len(self._buffer),
+            "buffer_size": self.buffer_size,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "closed": self.closed
+        }
@@ -0,0 +1,210 @@
+"""
+Latency and throughput instrumentation for the streaming pipeline
+HDR-style log-linear histograms, per-second rate meters and queue depth samples
+"""
+
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+# 2**SUB_BUCKET_BITS linear sub-buckets per power of two: ~3% relative error
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+# Covers 1 microsecond up to ~2**40 microseconds (about 12 days)
+MAX_EXPONENT = 40
+PERCENTILES = (50.0, 95.0, 99.0, 99.9)
+
+
+def _bucket_index(micros: int) -> int:
+    if micros < 2 * SUB_BUCKETS:
+        return micros
+    shift = micros.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKETS + (micros >> shift) - SUB_BUCKETS
+
+
+def _bucket_upper_bound(index: int) -> int:
+    if index < 2 * SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    sub_bucket = index % SUB_BUCKETS + SUB_BUCKETS
+    return ((sub_bucket + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """Fixed-size log-linear latency histogram recorded in microseconds"""
+
+    def __init__(self):
+        self._counts = [0] * ((MAX_EXPONENT + 1) * SUB_BUCKETS)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_seconds = 0.0
+        self.min_seconds: Optional[float] = None
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float, count: int = 1) -> None:
+        """Record ``count`` observations of ``seconds``"""
+        seconds = max(seconds, 0.0)
+        index = min(_bucket_index(int(seconds * 1_000_000)), len(self._counts) - 1)
+        with self._lock:
+            self._counts[index] += count
+            self.count += count
+            self.total_seconds += seconds * count
+            self.max_seconds = max(self.max_seconds, seconds)
+            if self.min_seconds is None or seconds < self.min_seconds:
+                self.min_seconds = seconds
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.total_seconds / self.count if self.count else 0.0
+
+    def percentiles(self, percentiles: Tuple[float, ...] = PERCENTILES) -> Dict[float, float]:
+        """Upper bound of the bucket holding each percentile, in seconds"""
+        with self._lock:
+            counts = list(self._counts)
+            total = self.count
+            maximum = self.max_seconds
+
+        result = {}
+        if not total:
+            return {p: 0.0 for p in percentiles}
+
+        targets = sorted((max(1, int(-(-p * total // 100))), p) for p in percentiles)
+        seen = 0
+        position = 0
+        for index, bucket_count in enumerate(counts):
+            if not bucket_count:
+                continue
+            seen += bucket_count
+            while position < len(targets) and seen >= targets[position][0]:
+                # Never report beyond the exact maximum
+                result[targets[position][1]] = min(_bucket_upper_bound(index) / 1_000_000, maximum)
+                position += 1
+            if position == len(targets):
+                break
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        percentiles = self.percentiles()
+        return {
+            "count": self.count,
+            "mean_ms": self.mean_seconds * 1000,
+            "min_ms": (self.min_seconds or 0.0) * 1000,
+            "p50_ms": percentiles[50.0] * 1000,
+            "p95_ms": percentiles[95.0] * 1000,
+            "p99_ms": percentiles[99.0] * 1000,
+            "p999_ms": percentiles[99.9] * 1000,
+            "max_ms": self.max_seconds * 1000
+        }
+
+
+class RateMeter:
+    """Events per second over a sliding window of one-second slots"""
+
+    def __init__(self, window_seconds: int = 60):
+        self.window_seconds = window_seconds
+        self._slots = [0] * window_seconds
+        self._slot_seconds = [0] * window_seconds
+        self.total = 0
+
+    def mark(self, count: int = 1, now: Optional[float] = None) -> None:
+        second = int(now if now is not None else time.time())
+        slot = second % self.window_seconds
+        if self._slot_seconds[slot] != second:
+            self._slot_seconds[slot] = second
+            self._slots[slot] = 0
+        self._slots[slot] += count
+        self.total += count
+
+    def rate(self, now: Optional[float] = None) -> float:
+        second = int(now if now is not None else time.time())
+        recent = sum(
+            count for count, slot_second in zip(self._slots, self._slot_seconds)
+            if second - self.window_seconds < slot_second <= second
+        )
+        return recent / self.window_seconds
+
+
+class StreamingMetrics:
+    """Histograms and gauges collected by StreamingService"""
+
+    def __init__(self, depth_samples: int = 360):
+        self.processor_latency: Dict[str, LatencyHistogram] = {}
+        self.subscriber_latency: Dict[str, LatencyHistogram] = {}
+        self.processing_latency = LatencyHistogram()  # share of batch processing time, per event
+        self.end_to_end_latency = LatencyHistogram()  # event timestamp -> alert emitted
+        self.events_rate = RateMeter()
+        self.alerts_rate = RateMeter()
+        self.queue_depth: deque = deque(maxlen=depth_samples)
+
+    def _histogram(self, histograms: Dict[str, LatencyHistogram], name: str) -> LatencyHistogram:
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms.setdefault(name, LatencyHistogram())
+        return histogram
+
+    def record_processor(self, name: str, seconds: float, events: int = 1) -> None:
+        """Per-event processor latency; batch time is spread over its events"""
+        events = max(events, 1)
+        self._histogram(self.processor_latency, name).record(seconds / events, events)
+
+    def record_subscriber(self, name: str, seconds: float) -> None:
+        self._histogram(self.subscriber_latency, name).record(seconds)
+
+    def sample_queue_depth(self, depths: List[int], now: Optional[float] = None) -> None:
+        self.queue_depth.append((now if now is not None else time.time(), sum(depths), max(depths, default=0)))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "processing_latency": self.processing_latency.snapshot(),
+            "end_to_end_alert_latency": self.end_to_end_latency.snapshot(),
+            "processor_latency": {name: h.snapshot() for name, h in list(self.processor_latency.items())},
+            "subscriber_latency": {name: h.snapshot() for name, h in list(self.subscriber_latency.items())},
+            "events_per_second": self.events_rate.rate(),
+            "alerts_per_second": self.alerts_rate.rate(),
+            "queue_depth": [
+                {"timestamp": timestamp, "total": total, "max_partition": largest}
+                for timestamp, total, largest in list(self.queue_depth)
+            ]
+        }
+
+    def to_prometheus(self, prefix: str = "streaming") -> str:
+        """Text exposition format (summaries with quantile labels)"""
+        lines = []
+
+        def summary(name: str, histogram: LatencyHistogram, labels: Dict[str, str]) -> None:
+            label_text = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+            percentiles = histogram.percentiles()
+            for percentile, value in percentiles.items():
+                quantile_labels = ",".join(filter(None, [label_text, f'quantile="{percentile / 100:g}"']))
+                lines.append(f"{name}{{{quantile_labels}}} {value:.6f}")
+            suffix = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{name}_sum{suffix} {histogram.total_seconds:.6f}")
+            lines.append(f"{name}_count{suffix} {histogram.count}")
+
+        for metric, histograms, label in (
+            (f"{prefix}_processor_latency_seconds", self.processor_latency, "processor"),
+            (f"{prefix}_subscriber_latency_seconds", self.subscriber_latency, "subscriber")
+        ):
+            lines.append(f"# TYPE {metric} summary")
+            for name, histogram in list(histograms.items()):
+                summary(metric, histogram, {label: name})
+
+        lines.append(f"# TYPE {prefix}_processing_latency_seconds summary")
+        summary(f"{prefix}_processing_latency_seconds", self.processing_latency, {})
+        lines.append(f"# TYPE {prefix}_alert_end_to_end_latency_seconds summary")
+        summary(f"{prefix}_alert_end_to_end_latency_seconds", self.end_to_end_latency, {})
+
+        lines.append(f"# TYPE {prefix}_events_per_second gauge")
+        lines.append(f"{prefix}_events_per_second {self.events_rate.rate():.6f}")
+        lines.append(f"# TYPE {prefix}_alerts_per_second gauge")
+        lines.append(f"{prefix}_alerts_per_second {self.alerts_rate.rate():.6f}")
+        if self.queue_depth:
+            lines.append(f"# TYPE {prefix}_queue_depth gauge")
+            lines.append(f"{prefix}_queue_depth {self.queue_depth[-1][1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return re.sub(r'(["\\])', r"\\\1", value).replace("\n", "\\n")
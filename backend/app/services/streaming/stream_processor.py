@@ -7,13 +7,25 @@ import asyncio
 import json
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Callable, Set
+from typing import Dict, List, Any, Optional, Callable, Set, Union
 from dataclasses import dataclass, asdict
 from enum import Enum
 from collections import defaultdict, deque
 import threading
 import time
+import zlib
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.aml.rule_engine import CompiledRule, RuleEngine, TransactionHistory, get_rule_engine
+from app.services.aml.customer_state import CustomerStateStore, StateStoreHistory, get_customer_state_store, to_utc
+from app.services.aml.ml_prediction_engine import MLPredictionEngine, get_ml_engine
+from app.services.streaming.event_log import EventLog, LogRecord
+from app.services.streaming.fanout import DROP_OLDEST, SubscriberChannel
+from app.services.streaming.metrics import StreamingMetrics
+from app.services.streaming.window_state import WindowedState
 
 logger = logging.getLogger(__name__)
 
@@ -51,6 +63,30 @@ class StreamEvent:
     correlation_id: Optional[str] = None
     user_id: Optional[str] = None
     session_id: Optional[str] = None
+    offset: Optional[int] = None  # Position in the durable event log, once appended
+    
+    def to_log_fields(self) -> tuple:
+        return (
+            self.event_id, self.event_type.value, self.source, self.entity_type,
+            self.entity_id, self.correlation_id, self.user_id, self.session_id
+        )
+    
+    @classmethod
+    def from_log_record(cls, record: LogRecord) -> "StreamEvent":
+        event_id, event_type, source, entity_type, entity_id, correlation_id, user_id, session_id = record.fields
+        return cls(
+            event_id=event_id,
+            event_type=EventType(event_type),
+            timestamp=datetime.fromtimestamp(record.timestamp),
+            source=source,
+            entity_type=entity_type,
+            entity_id=entity_id,
+            data=record.data,
+            correlation_id=correlation_id,
+            user_id=user_id,
+            session_id=session_id,
+            offset=record.offset
+        )
 
 @dataclass
 class ProcessingRule:
@@ -80,185 +116,277 @@ class Alert:
 class EventProcessor(ABC):
     """Abstract base class for event processors"""
     
+    # How far back events must be replayed to rebuild in-memory window state
+    state_window_seconds: int = 0
+    # Events that raised in process_batch
+    failed_events: int = 0
+    
+    @property
+    def stateful(self) -> bool:
+        """Whether processing an event changes state, so no event may be processed twice"""
+        return self.state_window_seconds > 0
+    
     @abstractmethod
-    async def process(self, event: StreamEvent) -> Optional[Alert]:
+    async def process(self, event: StreamEvent) -> Union[Optional[Alert], List[Alert]]:
         pass
+    
+    async def process_batch(self, events: List[StreamEvent]) -> List[Union[Optional[Alert], List[Alert]]]:
+        """Process events in order; returns one result per event
+        
+        Every event is processed exactly once: an event that raises is logged
+        and yields None, and the rest of the batch carries on. Overrides must
+        either keep that contract or raise before changing any state.
+        """
+        results = []
+        for event in events:
+            try:
+                results.append(await self.process(event))
+            except Exception as e:
+                self.failed_events += 1
+                logger.error(f"Processor {type(self).__name__} failed on event {event.event_id}: {e}")
+                results.append(None)
+        return results
+    
+    def get_state_statistics(self) -> Optional[Dict[str, Any]]:
+        """Footprint of in-memory state, for processors that keep any"""
+        return None
 
-class TransactionVelocityProcessor(EventProcessor):
-    """Process transaction velocity events"""
+def _rule_alert(rule: CompiledRule, result: Dict[str, Any], event: StreamEvent, subject_id: Any) -> Alert:
+    """Build a stream alert from a compiled rule's result"""
+    alert_key = result.get("alert_key", rule.rule_id.lower())
+    return Alert(
+        alert_id=f"{alert_key}_{subject_id}_{event.timestamp.timestamp()}",
+        title=result.get("title", rule.name),
+        description=result["description"],
+        severity=AlertSeverity(result["severity"].value),
+        event_data={**result.get("details", {}), "rule_id": rule.rule_id, "rule_version": rule.version},
+        triggered_by=[event.event_id],
+        timestamp=event.timestamp
+    )
+
+class WindowRuleProcessor(EventProcessor):
+    """
+    Keeps a per-customer sliding window for one windowed rule from the rule
+    engine. Thresholds and the window length come from the current rule set,
+    so they change on rule reload like every other rule.
+    """
     
-    def __init__(self, velocity_threshold: int = 10, time_window: int = 300):
-        self.velocity_threshold = velocity_threshold
-        self.time_window = time_window  # seconds
-        self.customer_transactions = defaultdict(deque)
+    track_values = False
     
-    async def process(self, event: StreamEvent) -> Optional[Alert]:
-        if event.event_type != EventType.TRANSACTION_CREATED:
+    def __init__(self, rule_id: str, rule_engine: Optional[RuleEngine] = None, max_state_bytes: int = 64 * 1024 * 1024):
+        self.rule_id = rule_id
+        self.rule_engine = rule_engine or get_rule_engine()
+        self.window_seconds = 0.0
+        self.state = WindowedState(ttl_seconds=0, max_bytes=max_state_bytes, track_values=self.track_values)
+        self._current_rule()
+    
+    @property
+    def state_window_seconds(self) -> int:
+        return int(self.window_seconds)
+    
+    def get_state_statistics(self) -> Dict[str, Any]:
+        return self.state.get_statistics()
+    
+    def _current_rule(self) -> Optional[CompiledRule]:
+        rule = self.rule_engine.rule(self.rule_id)
+        if rule is not None:
+            window_seconds = float(rule.params["window_seconds"])
+            if window_seconds != self.window_seconds:
+                self.window_seconds = window_seconds
+                self.state.ttl_seconds = window_seconds
+        return rule
+    
+    def _evaluate(self, rule: CompiledRule, event: StreamEvent, customer_id: Any, facts: Dict[str, Any]) -> Optional[Alert]:
+        try:
+            result = rule.predicate({**event.data, "customer_id": customer_id, **facts}, None, to_utc(event.timestamp))
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Rule {rule.rule_id} failed on event {event.event_id}: {e}")
             return None
-        
-        customer_id = event.entity_id
-        current_time = event.timestamp
-        
-        # Clean old transactions outside time window
-        cutoff_time = current_time - timedelta(seconds=self.time_window)
-        while (self.customer_transactions[customer_id] and 
-               self.customer_transactions[customer_id][0] < cutoff_time):
-            self.customer_transactions[customer_id].popleft()
-        
-        # Add current transaction
-        self.customer_transactions[customer_id].append(current_time)
-        
-        # Check if velocity threshold exceeded
-        transaction_count = len(self.customer_transactions[customer_id])
-        if transaction_count > self.velocity_threshold:
-            return Alert(
-                alert_id=f"velocity_{customer_id}_{current_time.timestamp()}",
-                title="High Transaction Velocity Detected",
-                description=f"Customer {customer_id} has {transaction_count} transactions in {self.time_window} seconds",
-                severity=AlertSeverity.HIGH,
-                event_data={
-                    "customer_id": customer_id,
-                    "transaction_count": transaction_count,
-                    "time_window": self.time_window,
-                    "threshold": self.velocity_threshold
-                },
-                triggered_by=[event.event_id],
-                timestamp=current_time
-            )
-        
-        return None
+        return _rule_alert(rule, result, event, customer_id) if result else None
 
-class LargeAmountProcessor(EventProcessor):
-    """Process large amount transactions"""
+class TransactionVelocityProcessor(WindowRuleProcessor):
+    """Process transaction velocity events"""
     
-    def __init__(self, amount_threshold: float = 50000.0):
-        self.amount_threshold = amount_threshold
+    def __init__(self, rule_engine: Optional[RuleEngine] = None, rule_id: str = "S003", max_state_bytes: int = 64 * 1024 * 1024):
+        super().__init__(rule_id, rule_engine, max_state_bytes)
     
     async def process(self, event: StreamEvent) -> Optional[Alert]:
         if event.event_type != EventType.TRANSACTION_CREATED:
             return None
+        rule = self._current_rule()
+        if rule is None:
+            return None
         
-        amount = event.data.get('amount', 0)
-        if amount > self.amount_threshold:
-            return Alert(
-                alert_id=f"large_amount_{event.entity_id}_{event.timestamp.timestamp()}",
-                title="Large Amount Transaction",
-                description=f"Transaction amount ${amount:,.2f} exceeds threshold ${self.amount_threshold:,.2f}",
-                severity=AlertSeverity.MEDIUM,
-                event_data={
-                    "transaction_id": event.entity_id,
-                    "amount": amount,
-                    "threshold": self.amount_threshold,
-                    "customer_id": event.data.get('customer_id')
-                },
-                triggered_by=[event.event_id],
-                timestamp=event.timestamp
-            )
+        customer_id = event.entity_id
+        timestamp = event.timestamp.timestamp()
         
-        return None
+        # Clean old transactions outside time window, then add this one
+        self.state.trim(customer_id, timestamp - self.window_seconds)
+        self.state.add(customer_id, timestamp)
+        
+        return self._evaluate(rule, event, customer_id, {"window_count": self.state.count(customer_id)})
 
-class StructuringDetectionProcessor(EventProcessor):
+class StructuringDetectionProcessor(WindowRuleProcessor):
     """Detect structuring patterns in real-time"""
     
-    def __init__(self, threshold: float = 10000.0, pattern_window: int = 86400):  # 24 hours
-        self.threshold = threshold
-        self.pattern_window = pattern_window
-        self.customer_amounts = defaultdict(list)
+    track_values = True
+    
+    def __init__(self, rule_engine: Optional[RuleEngine] = None, rule_id: str = "S004", max_state_bytes: int = 64 * 1024 * 1024):
+        super().__init__(rule_id, rule_engine, max_state_bytes)
     
     async def process(self, event: StreamEvent) -> Optional[Alert]:
         if event.event_type != EventType.TRANSACTION_CREATED:
             return None
+        rule = self._current_rule()
+        if rule is None:
+            return None
         
         amount = event.data.get('amount', 0)
         customer_id = event.data.get('customer_id')
         
-        if not customer_id or amount >= self.threshold:
+        if not customer_id or amount >= rule.params["threshold"]:
             return None
         
-        current_time = event.timestamp
+        timestamp = event.timestamp.timestamp()
         
-        # Clean old transactions
-        cutoff_time = current_time - timedelta(seconds=self.pattern_window)
-        self.customer_amounts[customer_id] = [
-            (amt, ts) for amt, ts in self.customer_amounts[customer_id]
-            if ts > cutoff_time
-        ]
+        # Clean old transactions, then add this one
+        self.state.trim(customer_id, timestamp - self.window_seconds, inclusive=True)
+        self.state.add(customer_id, timestamp, amount)
         
-        # Add current transaction
-        self.customer_amounts[customer_id].append((amount, current_time))
+        return self._evaluate(rule, event, customer_id, {"window_amounts": self.state.values(customer_id)})
+
+class CompiledRuleProcessor(EventProcessor):
+    """Evaluate the shared compiled AML rules subscribed to each event type"""
+    
+    def __init__(
+        self,
+        rule_engine: Optional[RuleEngine] = None,
+        history: Optional[TransactionHistory] = None,
+        state_store: Optional[CustomerStateStore] = None
+    ):
+        self.rule_engine = rule_engine or get_rule_engine()
+        self.state_store = state_store
+        if history is None and state_store is not None:
+            history = StateStoreHistory(state_store)
+        self.history = history
+    
+    @property
+    def stateful(self) -> bool:
+        return self.state_store is not None
+    
+    async def process(self, event: StreamEvent) -> List[Alert]:
+        rules = self.rule_engine.rules_for_event(event.event_type.value)
+        if not rules:
+            return []
+        
+        facts = {
+            **event.data,
+            "entity_type": event.entity_type,
+            "entity_id": event.entity_id,
+            "event_type": event.event_type.value
+        }
+        # Event timestamps are local wall-clock time; the state store and the
+        # rule windows measured back from ``now`` work in UTC
+        now = to_utc(event.timestamp)
+        if not isinstance(facts.get("transaction_date"), datetime):
+            facts["transaction_date"] = now
         
-        # Check for structuring pattern
-        transactions = self.customer_amounts[customer_id]
-        if len(transactions) >= 3:  # Need at least 3 transactions
-            total_amount = sum(amt for amt, _ in transactions)
-            near_threshold_count = sum(1 for amt, _ in transactions if amt > self.threshold * 0.8)
+        alerts = []
+        for rule in rules:
+            if rule.stateful and self.history is None:
+                continue
+            try:
+                result = rule.predicate(facts, self.history, now)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.error(f"Rule {rule.rule_id} failed on event {event.event_id}: {e}")
+                continue
+            if not result:
+                continue
             
-            if (total_amount > self.threshold * 1.5 and 
-                near_threshold_count >= len(transactions) * 0.6):  # 60% near threshold
-                
-                return Alert(
-                    alert_id=f"structuring_{customer_id}_{current_time.timestamp()}",
-                    title="Potential Structuring Pattern",
-                    description=f"Customer {customer_id} has {len(transactions)} transactions totaling ${total_amount:,.2f} in pattern suggesting structuring",
-                    severity=AlertSeverity.HIGH,
-                    event_data={
-                        "customer_id": customer_id,
-                        "transaction_count": len(transactions),
-                        "total_amount": total_amount,
-                        "threshold": self.threshold,
-                        "pattern_window_hours": self.pattern_window / 3600
-                    },
-                    triggered_by=[event.event_id],
-                    timestamp=current_time
-                )
+            alerts.append(_rule_alert(rule, result, event, event.entity_id))
         
-        return None
+        # Fold the transaction into the window state after it has been evaluated
+        if self.state_store is not None and event.event_type == EventType.TRANSACTION_CREATED and "amount" in facts:
+            try:
+                self.state_store.ingest(facts)
+            except (TypeError, ValueError) as e:
+                logger.debug(f"Could not update customer state for event {event.event_id}: {e}")
+        
+        return alerts
 
-class RiskScoreProcessor(EventProcessor):
-    """Process ML risk score predictions"""
+class FeatureStoreProcessor(EventProcessor):
+    """Fold streamed transactions into the ML engine's online feature store"""
     
-    def __init__(self, high_risk_threshold: float = 0.8):
-        self.high_risk_threshold = high_risk_threshold
+    def __init__(self, ml_engine: Optional[MLPredictionEngine] = None):
+        self.ml_engine = ml_engine or get_ml_engine()
     
-    async def process(self, event: StreamEvent) -> Optional[Alert]:
-        if event.event_type != EventType.ML_MODEL_PREDICTION:
-            return None
-        
-        risk_score = event.data.get('risk_score', 0)
-        if risk_score > self.high_risk_threshold:
-            return Alert(
-                alert_id=f"high_risk_{event.entity_id}_{event.timestamp.timestamp()}",
-                title="High Risk Score Detected",
-                description=f"ML model predicted high risk score ({risk_score:.2%}) for {event.entity_type} {event.entity_id}",
-                severity=AlertSeverity.HIGH if risk_score > 0.9 else AlertSeverity.MEDIUM,
-                event_data={
-                    "entity_type": event.entity_type,
-                    "entity_id": event.entity_id,
-                    "risk_score": risk_score,
-                    "threshold": self.high_risk_threshold,
-                    "model_confidence": event.data.get('confidence', 0)
-                },
-                triggered_by=[event.event_id],
-                timestamp=event.timestamp
-            )
-        
+    @property
+    def stateful(self) -> bool:
+        return True
+    
+    async def process(self, event: StreamEvent) -> None:
+        if event.event_type == EventType.TRANSACTION_CREATED and "amount" in event.data:
+            self.ml_engine.record_transaction(event.data)
         return None
 
 class StreamingService:
     """Main streaming service for real-time event processing"""
     
-    def __init__(self):
-        self.event_queue = asyncio.Queue()
+    def __init__(
+        self,
+        num_partitions: int = 1,
+        queue_maxsize: int = 10000,
+        batch_size: int = 100,
+        publish_timeout: Optional[float] = None,
+        event_log: Optional[EventLog] = None,
+        consumer_name: str = "streaming_service",
+        checkpoint_interval: float = 5.0,
+        log_retention_seconds: int = 7 * 86400,
+        metrics_interval: float = 10.0,
+        subscriber_workers: int = 8
+    ):
+        # Events are hashed by customer onto bounded partition queues, each drained
+        # by its own worker, so per-customer order is kept and publishers block
+        # (or time out) instead of growing the queue without limit
+        self.num_partitions = max(1, num_partitions)
+        self.batch_size = batch_size
+        self.publish_timeout = publish_timeout
+        self.partition_queues: List[asyncio.Queue] = [
+            asyncio.Queue(maxsize=queue_maxsize) for _ in range(self.num_partitions)
+        ]
+        # Published events are appended to the log before they are acknowledged;
+        # the committed offset trails the oldest event still in flight, so a
+        # restart reprocesses anything unfinished (at-least-once)
+        self.event_log = event_log
+        self.consumer_name = consumer_name
+        self.checkpoint_interval = checkpoint_interval
+        self.log_retention_seconds = log_retention_seconds
+        self._inflight_offsets: Set[int] = set()
+        
         self.processors: List[EventProcessor] = []
         self.active_alerts: Dict[str, Alert] = {}
         self.event_history = deque(maxlen=10000)  # Keep last 10k events
-        self.subscribers: Dict[str, List[Callable]] = defaultdict(list)
+        # Subscribers are fed through their own bounded buffers; sync callbacks
+        # run on this pool so they never block the event loop
+        self.subscribers: Dict[str, List[SubscriberChannel]] = defaultdict(list)
+        self.subscriber_executor = ThreadPoolExecutor(
+            max_workers=subscriber_workers, thread_name_prefix="stream-subscriber"
+        )
+        self.rule_engine = get_rule_engine()
+        self.state_store = get_customer_state_store()
         self.is_running = False
+        self.metrics = StreamingMetrics()
+        self.metrics_interval = metrics_interval
         self.processing_stats = {
             'events_processed': 0,
             'alerts_generated': 0,
             'processing_time_avg': 0.0,
-            'last_event_time': None
+            'last_event_time': None,
+            'events_rejected': 0,
+            'processor_errors': 0,
+            'events_replayed': 0,
+            'events_restored': 0,
+            'subscribers_dropped': 0
         }
         
         # Initialize default processors
@@ -266,11 +394,13 @@ class StreamingService:
     
     def _initialize_processors(self):
         """Initialize default event processors"""
+        # Every threshold comes from the shared rule store; the velocity and
+        # structuring processors only own the sliding windows their rules read
         self.processors = [
-            TransactionVelocityProcessor(velocity_threshold=15, time_window=300),
-            LargeAmountProcessor(amount_threshold=50000.0),
-            StructuringDetectionProcessor(threshold=10000.0, pattern_window=86400),
-            RiskScoreProcessor(high_risk_threshold=0.7)
+            TransactionVelocityProcessor(self.rule_engine),
+            StructuringDetectionProcessor(self.rule_engine),
+            CompiledRuleProcessor(self.rule_engine, state_store=self.state_store),
+            FeatureStoreProcessor()
         ]
     
     async def start(self):
@@ -278,87 +408,219 @@ class StreamingService:
         self.is_running = True
         logger.info("Starting streaming service...")
         
+        # Load customer window state before evaluating stateful rules
+        if not self.state_store.is_warm:
+            try:
+                await asyncio.to_thread(self._warm_state_store)
+            except Exception as e:
+                logger.error(f"Failed to warm customer state store: {e}")
+        
+        # Rebuild processor window state from the log before new events arrive
+        if self.event_log is not None:
+            try:
+                await self._restore_processor_state()
+            except Exception as e:
+                logger.error(f"Failed to restore processor state from event log: {e}")
+        
         # Start processing loop
         processing_task = asyncio.create_task(self._processing_loop())
         
         # Start cleanup task
         cleanup_task = asyncio.create_task(self._cleanup_loop())
         
-        await asyncio.gather(processing_task, cleanup_task)
+        # Start rule reload task
+        rule_reload_task = asyncio.create_task(self._rule_reload_loop())
+        
+        # Start queue depth sampling
+        metrics_task = asyncio.create_task(self._metrics_loop())
+        
+        # Pick up transactions other workers and bulk loads wrote
+        state_refresh_task = asyncio.create_task(self._state_refresh_loop())
+        
+        tasks = [processing_task, cleanup_task, rule_reload_task, metrics_task, state_refresh_task]
+        if self.event_log is not None:
+            # Re-deliver events that were logged but not committed before the last stop
+            await self._replay_uncommitted()
+            tasks.append(asyncio.create_task(self._checkpoint_loop()))
+        
+        await asyncio.gather(*tasks)
     
     async def stop(self):
         """Stop the streaming service"""
         self.is_running = False
+        if self.event_log is not None:
+            self._commit_offsets()
+            self.event_log.flush()
+        for channels in self.subscribers.values():
+            for channel in channels:
+                channel.stop()
         logger.info("Stopping streaming service...")
     
-    async def publish_event(self, event: StreamEvent):
-        """Publish an event to the stream"""
+    def _partition_for(self, event: StreamEvent) -> int:
+        """Stable partition of an event; transaction events are keyed by customer"""
+        key = event.data.get('customer_id') if event.entity_type == "transaction" else None
+        if key is None:
+            key = event.entity_id
+        return zlib.crc32(str(key).encode()) % self.num_partitions
+    
+    async def publish_event(self, event: StreamEvent) -> bool:
+        """Publish an event to the stream, waiting while its partition is full"""
+        queue = self.partition_queues[self._partition_for(event)]
         try:
-            await self.event_queue.put(event)
+            if self.publish_timeout is None:
+                await queue.put(event)
+            else:
+                await asyncio.wait_for(queue.put(event), timeout=self.publish_timeout)
+            # No await between enqueue and append, so the worker sees the offset
+            if self.event_log is not None and event.offset is None:
+                event.offset = self.event_log.append(event.timestamp.timestamp(), event.to_log_fields(), event.data)
+                self._inflight_offsets.add(event.offset)
             logger.debug(f"Published event: {event.event_type.value} for {event.entity_type}:{event.entity_id}")
+            return True
+        except asyncio.TimeoutError:
+            self.processing_stats['events_rejected'] += 1
+            logger.warning(f"Rejected event {event.event_id}: partition queue full for {self.publish_timeout}s")
+            return False
         except Exception as e:
             logger.error(f"Failed to publish event: {e}")
+            return False
     
-    def subscribe(self, event_type: str, callback: Callable[[StreamEvent], None]):
-        """Subscribe to specific event types"""
-        self.subscribers[event_type].append(callback)
+    def subscribe(
+        self,
+        event_type: str,
+        callback: Callable[[StreamEvent], None],
+        buffer_size: int = 1000,
+        policy: str = DROP_OLDEST,
+        timeout: Optional[float] = 5.0,
+        max_failures: int = 3
+    ):
+        """Subscribe to specific event types
+        
+        ``policy`` is ``drop_oldest`` or ``coalesce`` (keep only the newest
+        pending item per alert/entity) once ``buffer_size`` items are waiting.
+        A subscriber whose callback fails or times out ``max_failures`` times
+        in a row is removed.
+        """
+        self.subscribers[event_type].append(SubscriberChannel(
+            event_type,
+            callback,
+            self.subscriber_executor,
+            metrics=self.metrics,
+            buffer_size=buffer_size,
+            policy=policy,
+            timeout=timeout,
+            max_failures=max_failures,
+            on_close=self._drop_subscriber
+        ))
         logger.info(f"Added subscriber for event type: {event_type}")
     
+    def _drop_subscriber(self, channel: SubscriberChannel) -> None:
+        channels = self.subscribers.get(channel.event_type, [])
+        if channel in channels:
+            channels.remove(channel)
+            self.processing_stats['subscribers_dropped'] += 1
+    
+    def unsubscribe(self, event_type: str, callback: Callable) -> bool:
+        """Remove a subscriber and stop its delivery task"""
+        for channel in list(self.subscribers.get(event_type, [])):
+            if channel.callback == callback:
+                channel.stop()
+                self.subscribers[event_type].remove(channel)
+                return True
+        return False
+    
     def add_processor(self, processor: EventProcessor):
         """Add a custom event processor"""
         self.processors.append(processor)
         logger.info(f"Added custom processor: {type(processor).__name__}")
     
     async def _processing_loop(self):
-        """Main event processing loop"""
-        logger.info("Event processing loop started")
+        """Run one worker per partition"""
+        logger.info(f"Event processing started with {self.num_partitions} partitions")
+        
+        await asyncio.gather(*(
+            self._partition_worker(partition) for partition in range(self.num_partitions)
+        ))
+    
+    async def _partition_worker(self, partition: int):
+        """Drain a partition queue in batches of up to ``batch_size`` events"""
+        queue = self.partition_queues[partition]
         
         while self.is_running:
             try:
-                # Get event from queue with timeout
-                try:
-                    event = await asyncio.wait_for(self.event_queue.get(), timeout=1.0)
-                except asyncio.TimeoutError:
-                    continue
-                
-                start_time = time.time()
-                
-                # Store event in history
-                self.event_history.append(event)
-                
-                # Process event through all processors
-                alerts = []
-                for processor in self.processors:
-                    try:
-                        alert = await processor.process(event)
-                        if alert:
-                            alerts.append(alert)
-                    except Exception as e:
-                        logger.error(f"Processor error: {e}")
-                
-                # Handle generated alerts
-                for alert in alerts:
-                    self.active_alerts[alert.alert_id] = alert
-                    await self._notify_subscribers("alert_generated", {
-                        "alert": asdict(alert),
-                        "triggering_event": asdict(event)
-                    })
-                
-                # Notify event subscribers
-                await self._notify_subscribers(event.event_type.value, event)
-                
-                # Update statistics
-                processing_time = time.time() - start_time
-                self.processing_stats['events_processed'] += 1
-                self.processing_stats['alerts_generated'] += len(alerts)
-                self.processing_stats['processing_time_avg'] = (
-                    (self.processing_stats['processing_time_avg'] * (self.processing_stats['events_processed'] - 1) + processing_time) /
-                    self.processing_stats['events_processed']
-                )
-                self.processing_stats['last_event_time'] = event.timestamp.isoformat()
-                
+                event = await asyncio.wait_for(queue.get(), timeout=1.0)
+            except asyncio.TimeoutError:
+                continue
+            
+            batch = [event]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            
+            try:
+                await self._process_batch(batch)
             except Exception as e:
-                logger.error(f"Error in processing loop: {e}")
+                logger.exception(f"Partition {partition} failed on a batch of {len(batch)} events: {e}")
+            finally:
+                for event in batch:
+                    self._inflight_offsets.discard(event.offset)
+                    queue.task_done()
+    
+    async def _process_batch(self, batch: List[StreamEvent]):
+        """Run a batch through every processor, then publish alerts per event"""
+        start_time = time.time()
+        
+        # Store events in history
+        self.event_history.extend(batch)
+        
+        # Process the batch through all processors
+        alerts_by_event: List[List[Alert]] = [[] for _ in batch]
+        for processor in self.processors:
+            processor_start = time.perf_counter()
+            failed_before = processor.failed_events
+            try:
+                results = await processor.process_batch(batch)
+            except Exception as e:
+                # Failures inside the batch are isolated per event by process_batch;
+                # an exception here comes from a batch override. Re-running events
+                # through a stateful processor would count them twice, so only
+                # stateless processors get a second, per-event pass.
+                logger.error(f"Processor {type(processor).__name__} failed on batch: {e}")
+                if processor.stateful:
+                    processor.failed_events += len(batch)
+                    results = [None] * len(batch)
+                else:
+                    results = await EventProcessor.process_batch(processor, batch)
+            self.processing_stats['processor_errors'] += processor.failed_events - failed_before
+            self.metrics.record_processor(type(processor).__name__, time.perf_counter() - processor_start, len(batch))
+            
+            for event_alerts, result in zip(alerts_by_event, results):
+                if isinstance(result, list):
+                    event_alerts.extend(result)
+                elif result:
+                    event_alerts.append(result)
+        
+        for event, alerts in zip(batch, alerts_by_event):
+            # Handle generated alerts
+            for alert in alerts:
+                self.metrics.end_to_end_latency.record(time.time() - event.timestamp.timestamp())
+                self.active_alerts[alert.alert_id] = alert
+                self._notify_subscribers("alert_generated", {
+                    "alert": asdict(alert),
+                    "triggering_event": asdict(event)
+                })
+            
+            # Notify event subscribers
+            self._notify_subscribers(event.event_type.value, event)
+            self.processing_stats['alerts_generated'] += len(alerts)
+            self.metrics.alerts_rate.mark(len(alerts))
+        
+        # Update statistics
+        processing_time = (time.time() - start_time) / len(batch)
+        self.metrics.processing_latency.record(processing_time, len(batch))
+        self.metrics.events_rate.mark(len(batch))
+        self.processing_stats['events_processed'] += len(batch)
+        self.processing_stats['processing_time_avg'] = self.metrics.processing_latency.mean_seconds
+        self.processing_stats['last_event_time'] = batch[-1].timestamp.isoformat()
     
     async def _cleanup_loop(self):
         """Cleanup old alerts and events"""
@@ -377,23 +639,182 @@ class StreamingService:
                 if old_alerts:
                     logger.info(f"Cleaned up {len(old_alerts)} old alerts")
                 
+                # Drop log segments that are committed and outside every window
+                if self.event_log is not None:
+                    retention = max(self.log_retention_seconds, self._state_window_seconds())
+                    keep_from = min(
+                        self.event_log.committed(self.consumer_name) + 1,
+                        self.event_log.offset_for_time(time.time() - retention)
+                    )
+                    removed = self.event_log.truncate_before(keep_from)
+                    if removed:
+                        logger.info(f"Removed {removed} event log segments")
+                
                 # Sleep for 5 minutes before next cleanup
                 await asyncio.sleep(300)
                 
             except Exception as e:
                 logger.error(f"Error in cleanup loop: {e}")
     
-    async def _notify_subscribers(self, event_type: str, data: Any):
-        """Notify subscribers of events"""
+    async def _rule_reload_loop(self):
+        """Pick up rule store changes without restarting the service"""
+        while self.is_running:
+            try:
+                await asyncio.to_thread(self._reload_rules)
+            except Exception as e:
+                logger.error(f"Error reloading AML rules: {e}")
+            
+            await asyncio.sleep(self.rule_engine.reload_interval_seconds)
+    
+    async def _state_refresh_loop(self):
+        """Keep the process-local customer state in step with the transactions table"""
+        while self.is_running:
+            try:
+                await asyncio.to_thread(self._refresh_state_store)
+            except Exception as e:
+                logger.error(f"Error refreshing customer state store: {e}")
+            
+            await asyncio.sleep(self.state_store.refresh_interval_seconds)
+    
+    async def _metrics_loop(self):
+        """Sample partition queue depths"""
+        while self.is_running:
+            self.metrics.sample_queue_depth([queue.qsize() for queue in self.partition_queues])
+            await asyncio.sleep(self.metrics_interval)
+    
+    async def _checkpoint_loop(self):
+        """Periodically commit the offset below the oldest in-flight event"""
+        while self.is_running:
+            await asyncio.sleep(self.checkpoint_interval)
+            try:
+                # The watermark is read on the event loop, where a publish logs an
+                # event and marks it in flight without yielding; only the fsync
+                # of the commit runs in a thread
+                watermark = self._offset_watermark()
+                if watermark > self.event_log.committed(self.consumer_name):
+                    await asyncio.to_thread(self.event_log.commit, self.consumer_name, watermark)
+            except Exception as e:
+                logger.error(f"Error committing event log offset: {e}")
+    
+    def _offset_watermark(self) -> int:
+        """Offset below the oldest in-flight event; call on the event loop"""
+        if self._inflight_offsets:
+            return min(self._inflight_offsets) - 1
+        return self.event_log.next_offset - 1
+    
+    def _commit_offsets(self) -> None:
+        watermark = self._offset_watermark()
+        if watermark > self.event_log.committed(self.consumer_name):
+            self.event_log.commit(self.consumer_name, watermark)
+    
+    def _state_window_seconds(self) -> int:
+        return max((processor.state_window_seconds for processor in self.processors), default=0)
+    
+    async def _restore_processor_state(self) -> int:
+        """Replay committed events inside the processors' windows, discarding alerts"""
+        stateful = [p for p in self.processors if p.state_window_seconds > 0]
+        committed = self.event_log.committed(self.consumer_name)
+        if not stateful or committed < 0:
+            return 0
+        
+        start = self.event_log.offset_for_time(time.time() - self._state_window_seconds())
+        restored = 0
+        batch: List[StreamEvent] = []
+        for record in self.event_log.read(start, committed + 1):
+            batch.append(StreamEvent.from_log_record(record))
+            if len(batch) >= self.batch_size:
+                restored += await self._restore_batch(stateful, batch)
+                batch = []
+        if batch:
+            restored += await self._restore_batch(stateful, batch)
+        
+        self.processing_stats['events_restored'] += restored
+        logger.info(f"Restored processor state from {restored} logged events")
+        return restored
+    
+    async def _restore_batch(self, processors: List[EventProcessor], batch: List[StreamEvent]) -> int:
+        for processor in processors:
+            try:
+                await processor.process_batch(batch)
+            except Exception as e:
+                logger.error(f"Processor {type(processor).__name__} failed restoring state: {e}")
+        return len(batch)
+    
+    async def _replay_uncommitted(self) -> int:
+        """Re-enqueue logged events after the committed offset"""
+        replayed = 0
+        for record in self.event_log.read(self.event_log.committed(self.consumer_name) + 1):
+            event = StreamEvent.from_log_record(record)
+            self._inflight_offsets.add(event.offset)
+            await self.partition_queues[self._partition_for(event)].put(event)
+            replayed += 1
+        
+        if replayed:
+            self.processing_stats['events_replayed'] += replayed
+            logger.info(f"Replayed {replayed} uncommitted events from the event log")
+        return replayed
+    
+    async def benchmark_replay(self, from_offset: int = 0, to_offset: Optional[int] = None) -> Dict[str, Any]:
+        """Run recorded traffic through the processors and report throughput
+        
+        Alerts are counted but not stored or published.
+        """
+        started = time.time()
+        events = 0
+        alerts = 0
+        batch: List[StreamEvent] = []
+        
+        async def run(batch: List[StreamEvent]) -> int:
+            count = 0
+            for processor in self.processors:
+                for result in await processor.process_batch(batch):
+                    count += len(result) if isinstance(result, list) else int(bool(result))
+            return count
+        
+        for record in self.event_log.read(from_offset, to_offset):
+            batch.append(StreamEvent.from_log_record(record))
+            if len(batch) >= self.batch_size:
+                alerts += await run(batch)
+                events += len(batch)
+                batch = []
+        if batch:
+            alerts += await run(batch)
+            events += len(batch)
+        
+        elapsed = time.time() - started
+        return {
+            "events": events,
+            "alerts": alerts,
+            "elapsed_seconds": elapsed,
+            "events_per_second": events / elapsed if elapsed > 0 else 0.0
+        }
+    
+    def _warm_state_store(self) -> int:
+        db = SessionLocal()
+        try:
+            return self.state_store.warm(db)
+        finally:
+            db.close()
+    
+    def _refresh_state_store(self) -> int:
+        db = SessionLocal()
+        try:
+            return self.state_store.ensure_current(db)
+        finally:
+            db.close()
+    
+    def _reload_rules(self) -> bool:
+        db = SessionLocal()
+        try:
+            return self.rule_engine.reload(db)
+        finally:
+            db.close()
+    
+    def _notify_subscribers(self, event_type: str, data: Any):
+        """Hand an item to each subscriber's buffer without waiting for delivery"""
         try:
-            for callback in self.subscribers.get(event_type, []):
-                try:
-                    if asyncio.iscoroutinefunction(callback):
-                        await callback(data)
-                    else:
-                        callback(data)
-                except Exception as e:
-                    logger.error(f"Subscriber callback error: {e}")
+            for channel in self.subscribers.get(event_type, []):
+                channel.offer(data)
         except Exception as e:
             logger.error(f"Error notifying subscribers: {e}")
     
@@ -428,9 +849,25 @@ class StreamingService:
             **self.processing_stats,
             'active_alerts': len([a for a in self.active_alerts.values() if not a.resolved]),
             'total_alerts': len(self.active_alerts),
-            'event_queue_size': self.event_queue.qsize(),
+            'event_queue_size': sum(queue.qsize() for queue in self.partition_queues),
+            'partition_queue_sizes': [queue.qsize() for queue in self.partition_queues],
+            'num_partitions': self.num_partitions,
             'processors_count': len(self.processors),
-            'subscribers_count': sum(len(subs) for subs in self.subscribers.values())
+            'rule_set_version': self.rule_engine.rule_set.version,
+            'customer_state': self.state_store.get_statistics(),
+            'processor_state': {
+                type(processor).__name__: processor.get_state_statistics()
+                for processor in self.processors
+                if processor.get_state_statistics() is not None
+            },
+            'event_log': self.event_log.get_statistics() if self.event_log is not None else None,
+            'subscribers_count': sum(len(subs) for subs in self.subscribers.values()),
+            'subscribers': [
+                channel.get_statistics()
+                for channels in self.subscribers.values()
+                for channel in channels
+            ],
+            'metrics': self.metrics.snapshot()
         }
     
     def get_event_history(self, limit: int = 100) -> List[StreamEvent]:
@@ -445,10 +882,11 @@ def get_streaming_service() -> StreamingService:
     """Get the global streaming service instance"""
     global streaming_service
     if streaming_service is None:
-        streaming_service = StreamingService()
+        event_log = EventLog(settings.STREAMING_EVENT_LOG_DIR) if settings.STREAMING_EVENT_LOG_DIR else None
+        streaming_service = StreamingService(num_partitions=4, event_log=event_log)
     return streaming_service
 
-async def publish_transaction_event(transaction_data: Dict[str, Any], event_type: str = "created"):
+async def publish_transaction_event(transaction_data: Dict[str, Any], event_type: str = "created") -> bool:
     """Convenience function to publish transaction events"""
     service = get_streaming_service()
     
@@ -463,9 +901,9 @@ async def publish_transaction_event(transaction_data: Dict[str, Any], event_type
         user_id=transaction_data.get('user_id')
     )
     
-    await service.publish_event(event)
+    return await service.publish_event(event)
 
-async def publish_ml_prediction_event(entity_type: str, entity_id: str, prediction_data: Dict[str, Any]):
+async def publish_ml_prediction_event(entity_type: str, entity_id: str, prediction_data: Dict[str, Any]) -> bool:
     """Convenience function to publish ML prediction events"""
     service = get_streaming_service()
     
@@ -479,9 +917,9 @@ async def publish_ml_prediction_event(entity_type: str, entity_id: str, predicti
         data=prediction_data
     )
     
-    await service.publish_event(event)
+    return await service.publish_event(event)
 
-async def publish_alert_event(alert_data: Dict[str, Any]):
+async def publish_alert_event(alert_data: Dict[str, Any]) -> bool:
     """Convenience function to publish alert events"""
     service = get_streaming_service()
     
@@ -495,4 +933,4 @@ async def publish_alert_event(alert_data: Dict[str, Any]):
         data=alert_data
     )
     
-    await service.publish_event(event)
\ No newline at end of file
+    return await service.publish_event(event)
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""
+Memory-bounded sliding-window state for stream processors
+Per-key epoch timestamps (and optional values) in compact arrays, with
+TTL eviction of idle keys and a cap on the estimated footprint
+"""
+
+import bisect
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+# Rough per-key cost of the dict slot, window object, arrays and key itself
+KEY_OVERHEAD_BYTES = 256
+
+
+class _KeyWindow:
+    __slots__ = ("times", "values", "start")
+
+    def __init__(self, track_values: bool):
+        self.times = array("d")
+        self.values = array("d") if track_values else None
+        self.start = 0
+
+    def __len__(self) -> int:
+        return len(self.times) - self.start
+
+    def compact(self) -> None:
+        if self.start > 32 and self.start * 2 > len(self.times):
+            del self.times[:self.start]
+            if self.values is not None:
+                del self.values[:self.start]
+            self.start = 0
+
+
+class WindowedState:
+    """
+    Sliding windows of epoch timestamps keyed by customer.
+
+    Keys are kept in least-recently-updated order. A key whose newest entry is
+    older than ``ttl_seconds`` before the newest timestamp seen is dropped, and
+    the least recently updated keys are dropped while the estimated footprint
+    exceeds ``max_bytes``. Time is event time, so replays behave like live traffic.
+    """
+
+    def __init__(self, ttl_seconds: float, max_bytes: int = 64 * 1024 * 1024, track_values: bool = False):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.track_values = track_values
+        self._windows: "OrderedDict[Hashable, _KeyWindow]" = OrderedDict()
+        self._entries = 0
+        self._latest = float("-inf")
+        self.evicted_expired = 0
+        self.evicted_for_capacity = 0
+
+    @property
+    def entry_bytes(self) -> int:
+        return 16 if self.track_values else 8
+
+    @property
+    def estimated_bytes(self) -> int:
+        return len(self._windows) * KEY_OVERHEAD_BYTES + self._entries * self.entry_bytes
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._windows
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def trim(self, key: Hashable, cutoff: float, inclusive: bool = False) -> None:
+        """Drop entries older than ``cutoff`` (and equal to it when ``inclusive``)"""
+        window = self._windows.get(key)
+        if window is None:
+            return
+
+        find = bisect.bisect_right if inclusive else bisect.bisect_left
+        position = find(window.times, cutoff, window.start)
+        self._entries -= position - window.start
+        window.start = position
+        window.compact()
+
+    def add(self, key: Hashable, timestamp: float, value: float = 0.0) -> None:
+        """Insert an entry, keeping each window sorted by time"""
+        self._latest = max(self._latest, timestamp)
+        self._evict(key)
+
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = _KeyWindow(self.track_values)
+        else:
+            self._windows.move_to_end(key)
+
+        times = window.times
+        if not times or window.start == len(times) or times[-1] <= timestamp:
+            times.append(timestamp)
+            if window.values is not None:
+                window.values.append(value)
+        else:
+            # Late event: insert in place
+            position = bisect.bisect_right(times, timestamp, window.start)
+            times.insert(position, timestamp)
+            if window.values is not None:
+                window.values.insert(position, value)
+        self._entries += 1
+
+    def count(self, key: Hashable) -> int:
+        window = self._windows.get(key)
+        return len(window) if window is not None else 0
+
+    def values(self, key: Hashable) -> List[float]:
+        window = self._windows.get(key)
+        if window is None or window.values is None:
+            return []
+        return window.values[window.start:].tolist()
+
+    def _evict(self, protected: Hashable) -> None:
+        cutoff = self._latest - self.ttl_seconds
+        while self._windows:
+            key, window = next(iter(self._windows.items()))
+            if key == protected:
+                break
+            if len(window) and window.times[-1] >= cutoff:
+                break
+            self._drop(key)
+            self.evicted_expired += 1
+
+        while self._windows and self.estimated_bytes > self.max_bytes:
+            key = next(iter(self._windows))
+            if key == protected:
+                break
+            self._drop(key)
+            self.evicted_for_capacity += 1
+
+    def _drop(self, key: Hashable) -> None:
+        window = self._windows.pop(key)
+        self._entries -= len(window)
+
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            "keys": len(self._windows),
+            "entries": self._entries,
+            "estimated_bytes": self.estimated_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "evicted_expired": self.evicted_expired,
+            "evicted_for_capacity": self.evicted_for_capacity
+        }
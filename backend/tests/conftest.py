@@ -0,0 +1,68 @@
+"""
+Shared fixtures: an in-memory SQLite database standing in for PostgreSQL
+"""
+
+import numpy as np
+import pytest
+from sqlalchemy import BigInteger, create_engine, event
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+import app.models  # noqa: F401  (registers every table on Base.metadata)
+from app.core.database import Base
+
+
+@compiles(UUID, "sqlite")
+def _uuid_on_sqlite(type_, compiler, **kw):
+    return "CHAR(36)"
+
+
+@compiles(JSONB, "sqlite")
+def _jsonb_on_sqlite(type_, compiler, **kw):
+    return "TEXT"
+
+
+@compiles(BigInteger, "sqlite")
+def _bigint_on_sqlite(type_, compiler, **kw):
+    # SQLite only autoincrements INTEGER PRIMARY KEY columns
+    return "INTEGER"
+
+
+class _StddevPop:
+    def __init__(self):
+        self.values = []
+
+    def step(self, value):
+        if value is not None:
+            self.values.append(value)
+
+    def finalize(self):
+        return float(np.std(self.values)) if self.values else None
+
+
+def sqlite_engine(url: str = "sqlite://", tables=None):
+    """SQLite engine with the PostgreSQL functions the services use, and the given tables"""
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def _register_functions(connection, _):
+        connection.create_aggregate("stddev_pop", 1, _StddevPop)
+
+    Base.metadata.create_all(engine, tables=tables)
+    return engine
+
+
+@pytest.fixture
+def session_factory():
+    """Build sessionmakers over SQLite engines holding only the given tables"""
+    engines = []
+
+    def make(tables, url: str = "sqlite://"):
+        engine = sqlite_engine(url, tables)
+        engines.append(engine)
+        return sessionmaker(bind=engine)
+
+    yield make
+    for engine in engines:
+        engine.dispose()
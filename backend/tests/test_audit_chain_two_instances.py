@@ -0,0 +1,109 @@
+"""
+Two audit service instances sharing one database, as in two worker
+processes, must extend each entity's state chain without forking it
+"""
+
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from app.services.blockchain_audit import (
+    AuditEvent,
+    BlockchainAuditService,
+    BlockchainStateHead,
+    BlockchainTransaction
+)
+
+
+def make_service(url: str) -> BlockchainAuditService:
+    # Nothing seals in the background; the test seals explicitly
+    return BlockchainAuditService(url, block_size=10000, seal_interval=3600)
+
+
+@pytest.fixture
+def services(tmp_path):
+    url = f"sqlite:///{tmp_path / 'audit.db'}"
+    first = make_service(url)
+    second = make_service(url)
+    yield first, second
+    for service in (first, second):
+        service.stop()
+
+
+def event(entity_id: str, sequence: int) -> AuditEvent:
+    return AuditEvent(
+        event_type="customer_update",
+        entity_type="customer",
+        entity_id=entity_id,
+        user_id="tester",
+        timestamp=datetime.now(timezone.utc),
+        data={"sequence": sequence}
+    )
+
+
+def entity_chain(service: BlockchainAuditService, entity_id: str):
+    db = service.SessionLocal()
+    try:
+        rows = db.query(BlockchainTransaction).filter(
+            BlockchainTransaction.entity_type == "customer",
+            BlockchainTransaction.entity_id == entity_id
+        ).all()
+        head = db.get(BlockchainStateHead, ("customer", entity_id))
+        return [(row.previous_state_hash, row.new_state_hash) for row in rows], head.state_hash
+    finally:
+        db.close()
+
+
+def assert_linear(links, head):
+    """Every state follows exactly one other, starting from nothing and ending at the head"""
+    following = {}
+    for previous, new in links:
+        assert previous not in following, "two events chained onto the same state"
+        following[previous] = new
+    state, length = None, 0
+    while state in following:
+        state = following[state]
+        length += 1
+    assert length == len(links)
+    assert state == head
+
+
+def test_alternating_instances_extend_one_chain(services):
+    first, second = services
+    for sequence in range(10):
+        # Each instance's cached head is stale whenever the other one recorded last
+        (first if sequence % 2 == 0 else second).record_audit_event(event("C1", sequence))
+    first.force_block_creation()
+    second.force_block_creation()
+
+    links, head = entity_chain(first, "C1")
+    assert len(links) == 10
+    assert_linear(links, head)
+    assert first.state_head_conflicts + second.state_head_conflicts > 0
+
+
+def test_concurrent_instances_extend_one_chain(services):
+    first, second = services
+    barrier = threading.Barrier(4)
+
+    def record(service: BlockchainAuditService, offset: int):
+        barrier.wait()
+        for sequence in range(offset, offset + 15):
+            service.record_audit_event(event("C2", sequence))
+
+    threads = [
+        threading.Thread(target=record, args=(service, offset))
+        for offset, service in enumerate([first, second, first, second])
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    first.force_block_creation()
+    second.force_block_creation()
+
+    links, head = entity_chain(second, "C2")
+    assert len(links) == 60
+    assert_linear(links, head)
+    assert first.verify_blockchain_integrity(full=True)["is_valid"]
@@ -0,0 +1,78 @@
+"""
+Batch monitoring must raise the same alerts as per-transaction monitoring,
+whatever rules of one type are configured alongside each other
+"""
+
+from dataclasses import replace
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.aml import CustomerProfile, Transaction, TransactionAlert
+from app.models.aml.transaction import TransactionType
+from app.models.system_config import SystemConfiguration
+from app.services.aml.customer_state import CustomerStateStore
+from app.services.aml.rule_engine import SCOPE_BATCH, RuleEngine
+from app.services.aml.transaction_monitoring import TransactionMonitoringService
+
+TABLES = [
+    CustomerProfile.__table__,
+    Transaction.__table__,
+    TransactionAlert.__table__,
+    SystemConfiguration.__table__
+]
+
+# A short-window velocity rule listed before a long-window one
+VELOCITY_RULES = [
+    {"id": "V1", "type": "velocity", "params": {"hours": 1, "count": 100, "amount": 1}},
+    {"id": "V2", "type": "velocity", "params": {"hours": 72, "count": 3, "amount": 1000}}
+]
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory(TABLES)()
+    now = datetime.utcnow()
+    session.add(CustomerProfile(id=1, customer_id="C1", account_name="Customer 1"))
+    for i in range(1, 6):
+        session.add(Transaction(
+            id=i,
+            transaction_id=f"T{i}",
+            customer_id=1,
+            transaction_type=TransactionType.DEPOSIT,
+            transaction_date=now - timedelta(hours=12 * (5 - i)),
+            amount=500.0,
+            currency="ZMW"
+        ))
+    session.commit()
+    yield session
+    session.close()
+
+
+def make_service(db, rule_engine):
+    return TransactionMonitoringService(db, rule_engine=rule_engine, state_store=CustomerStateStore())
+
+
+def triggered_rules(result):
+    return sorted(alert["rule_id"] for alert in result["alerts"])
+
+
+def test_longest_window_of_each_type_sizes_batch_history(db):
+    service = make_service(db, RuleEngine(VELOCITY_RULES))
+
+    batch = service.monitor_batch(transaction_ids=[5])
+    assert triggered_rules(batch[0]) == ["V2"]
+    assert triggered_rules(batch[0]) == triggered_rules(service.monitor_transaction(5))
+
+
+def test_stateful_rule_without_batch_form_is_evaluated(db):
+    rule_engine = RuleEngine(VELOCITY_RULES[1:])
+    rule_set = rule_engine.rule_set
+    # A stateful rule type the batch path has no vectorized check for
+    custom = replace(rule_set.rules[0], rule_id="X1", rule_type="custom_velocity")
+    rule_engine._rule_set = replace(rule_set, rules=(custom,), by_scope={SCOPE_BATCH: (custom,)})
+    service = make_service(db, rule_engine)
+
+    batch = service.monitor_batch(transaction_ids=[5])
+    assert triggered_rules(batch[0]) == ["X1"]
+    assert triggered_rules(batch[0]) == triggered_rules(service.monitor_transaction(5))
@@ -0,0 +1,79 @@
+"""
+A bulk screening run interrupted between a chunk's commit and its checkpoint
+must resume and finish without duplicating that chunk's results
+"""
+
+import pytest
+
+from app.models.aml import (
+    CustomerProfile,
+    SanctionsList,
+    ScreeningResult,
+    Transaction,
+    WatchlistEntry
+)
+from app.models.aml.sanctions import ListType
+from app.services.aml.screening import ScreeningService
+from app.services.aml.screening_index import WatchlistScreeningIndex
+
+CUSTOMERS = 9
+TABLES = [
+    CustomerProfile.__table__,
+    Transaction.__table__,
+    SanctionsList.__table__,
+    WatchlistEntry.__table__,
+    ScreeningResult.__table__
+]
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory(TABLES)()
+    session.add(SanctionsList(id=1, list_code="OFAC", list_name="OFAC SDN", list_type=ListType.SANCTIONS))
+    session.add(WatchlistEntry(id=1, entry_id="W1", list_id=1, full_name="Ivan Petrov"))
+    for i in range(1, CUSTOMERS + 1):
+        session.add(CustomerProfile(
+            id=i,
+            customer_id=f"C{i}",
+            account_name="Ivan Petrov",
+            first_name="Ivan",
+            last_name="Petrov"
+        ))
+    session.commit()
+    yield session
+    session.close()
+
+
+class Interrupted(Exception):
+    pass
+
+
+def test_resume_after_commit_before_checkpoint(db, tmp_path, monkeypatch):
+    checkpoint_path = str(tmp_path / "screening.json")
+    service = ScreeningService(db, index=WatchlistScreeningIndex())
+    save_checkpoint = service._save_bulk_checkpoint
+    saved = []
+
+    def crash_on_second_checkpoint(path, checkpoint):
+        if saved:
+            raise Interrupted()
+        saved.append(checkpoint)
+        save_checkpoint(path, checkpoint)
+
+    monkeypatch.setattr(service, "_save_bulk_checkpoint", crash_on_second_checkpoint)
+    with pytest.raises(Interrupted):
+        service.screen_customers_bulk(chunk_size=3, workers=1, checkpoint_path=checkpoint_path)
+    # The second chunk is committed but not checkpointed
+    assert {row.customer_id for row in db.query(ScreeningResult)} == set(range(1, 7))
+
+    monkeypatch.undo()
+    # A different chunk size on resume must not matter
+    result = service.screen_customers_bulk(chunk_size=2, workers=1, checkpoint_path=checkpoint_path)
+
+    assert result["run_id"] == saved[0]["run_id"]
+    assert result["customers_screened"] == CUSTOMERS - 3
+    per_customer = {}
+    for row in db.query(ScreeningResult):
+        per_customer[row.customer_id] = per_customer.get(row.customer_id, 0) + 1
+    assert set(per_customer) == set(range(1, CUSTOMERS + 1))
+    assert len(set(per_customer.values())) == 1
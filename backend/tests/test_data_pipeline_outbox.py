@@ -0,0 +1,221 @@
+"""
+Outbox drains and the backfill must write versions that grow in write order,
+write deletes as tombstones and move rows that keep failing aside instead
+of blocking the stream
+"""
+
+import json
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from app.models.aml import (
+    AnalyticsChange,
+    AnalyticsChangeFailure,
+    AnalyticsSyncState,
+    ComplianceCase,
+    CustomerProfile,
+    Transaction,
+    TransactionAlert
+)
+from app.models.aml.transaction import AlertSeverity, TransactionType
+from app.services import data_pipeline
+from app.services.data_pipeline import MAX_APPLY_ATTEMPTS, MISSING_ALERT_DATE, DataPipelineService
+
+TABLES = [
+    CustomerProfile.__table__,
+    Transaction.__table__,
+    TransactionAlert.__table__,
+    ComplianceCase.__table__,
+    AnalyticsChange.__table__,
+    AnalyticsChangeFailure.__table__,
+    AnalyticsSyncState.__table__
+]
+
+
+class FakeClickHouse:
+    """Records inserted frames; inserts containing a poisoned transaction fail"""
+
+    def __init__(self):
+        self.frames = []
+        self.poisoned = set()
+
+    def insert_dataframe(self, table, frame):
+        if 'transaction_id' in frame and self.poisoned.intersection(frame['transaction_id']):
+            raise ValueError("cannot convert row")
+        self.frames.append((table, frame))
+        return len(frame)
+
+    def execute(self, query, params=None):
+        return [(1,)]
+
+    def rows(self, table):
+        return pd.concat([frame for name, frame in self.frames if name == table], ignore_index=True)
+
+
+@pytest.fixture
+def clickhouse(monkeypatch):
+    fake = FakeClickHouse()
+    monkeypatch.setattr(data_pipeline, "get_clickhouse_client", lambda: fake)
+    return fake
+
+
+@pytest.fixture
+def sessions(session_factory):
+    return session_factory(TABLES)
+
+
+@pytest.fixture
+def db(sessions):
+    session = sessions()
+    now = datetime.utcnow()
+    session.add(CustomerProfile(id=1, customer_id="C1", account_name="Customer 1"))
+    for i in range(1, 21):
+        session.add(Transaction(
+            id=i,
+            transaction_id=f"T{i}",
+            customer_id=1,
+            transaction_type=TransactionType.DEPOSIT,
+            transaction_date=now - timedelta(days=i),
+            amount=100.0 * i,
+            currency="ZMW"
+        ))
+    session.commit()
+    yield session
+    session.close()
+
+
+def capture(db, stream, row_id, operation, old_row=None, change_id=None):
+    db.add(AnalyticsChange(
+        id=change_id,
+        stream=stream,
+        row_id=row_id,
+        operation=operation,
+        old_row=json.dumps(old_row) if old_row else None,
+        changed_at=datetime.utcnow()
+    ))
+    db.commit()
+
+
+def delete_transaction(db, row_id):
+    transaction = db.get(Transaction, row_id)
+    old_row = {
+        "id": row_id,
+        "transaction_id": transaction.transaction_id,
+        "customer_id": transaction.customer_id,
+        "transaction_date": transaction.transaction_date.isoformat()
+    }
+    db.delete(transaction)
+    db.commit()
+    capture(db, "transactions", row_id, "D", old_row)
+
+
+def latest_rows(clickhouse, table, key):
+    """What FINAL keeps: the highest version of each row"""
+    rows = clickhouse.rows(table)
+    return rows.sort_values('version', kind='stable').groupby(key).last()
+
+
+def test_versions_follow_outbox_ids_and_deletes_are_tombstones(db, clickhouse):
+    for i in range(1, 21):
+        capture(db, "transactions", i, "I")
+    pipeline = DataPipelineService()
+    pipeline.batch_size = 8
+
+    assert pipeline.sync_transactions(db) == 20
+    versions = [frame['version'].iloc[0] for _, frame in clickhouse.frames]
+    assert versions == [8, 16, 20]
+
+    # A later drain always writes a higher version than the rows it replaces
+    capture(db, "transactions", 3, "U")
+    delete_transaction(db, 4)
+    assert pipeline.sync_transactions(db) == 2
+    rows = clickhouse.rows('transactions_analytics')
+    latest = latest_rows(clickhouse, 'transactions_analytics', 'transaction_id')
+    assert latest.loc['T3', 'version'] > 20
+    assert latest.loc['T4', 'is_deleted'] == 1
+    assert latest.loc['T4', 'transaction_date'] == rows[rows.transaction_id == 'T4']['transaction_date'].iloc[0]
+    assert latest.drop(index='T4')['is_deleted'].eq(0).all()
+    assert db.query(AnalyticsChange).count() == 0
+
+
+def test_alert_tombstone_without_creation_date(db, clickhouse):
+    db.add(TransactionAlert(
+        id=1,
+        alert_id="A1",
+        transaction_id=1,
+        customer_id=1,
+        alert_type="structuring",
+        title="Structuring",
+        severity=AlertSeverity.HIGH
+    ))
+    db.commit()
+    db.query(TransactionAlert).update({TransactionAlert.created_at: None})
+    db.commit()
+    capture(db, "alerts", 1, "I")
+    capture(db, "alerts", 2, "D", {"id": 2, "alert_id": "A2", "customer_id": 1, "created_at": None})
+
+    assert DataPipelineService().sync_alerts(db) == 2
+    rows = clickhouse.rows('alert_analytics').set_index('alert_id')
+    assert rows.loc['A1', 'created_date'] == MISSING_ALERT_DATE
+    assert rows.loc['A2', 'created_date'] == MISSING_ALERT_DATE
+    assert rows.loc['A2', 'is_deleted'] == 1
+
+
+def test_poison_rows_are_moved_aside_after_repeated_failures(db, clickhouse):
+    for i in range(1, 21):
+        capture(db, "transactions", i, "I")
+    capture(db, "transactions", 5, "U")
+    clickhouse.poisoned.add("T5")
+    pipeline = DataPipelineService()
+
+    for _ in range(MAX_APPLY_ATTEMPTS - 1):
+        with pytest.raises(ValueError):
+            pipeline.sync_transactions(db)
+        assert db.query(AnalyticsChange).count() == 21
+        assert not clickhouse.frames
+
+    assert pipeline.sync_transactions(db) == 19
+    synced = set(clickhouse.rows('transactions_analytics')['transaction_id'])
+    assert synced == {f"T{i}" for i in range(1, 21)} - {"T5"}
+    assert db.query(AnalyticsChange).count() == 0
+    failures = db.query(AnalyticsChangeFailure).order_by(AnalyticsChangeFailure.id).all()
+    assert [(failure.row_id, failure.operation) for failure in failures] == [(5, "I"), (5, "U")]
+    assert "cannot convert row" in failures[0].error
+
+
+def test_change_committed_out_of_order_still_wins(db, clickhouse):
+    pipeline = DataPipelineService()
+    # Outbox id 3 was handed out but is not committed when ids 2 and 4 are drained
+    capture(db, "transactions", 1, "U", change_id=2)
+    capture(db, "transactions", 2, "U", change_id=4)
+    assert pipeline.sync_transactions(db) == 2
+
+    db.get(Transaction, 1).amount = 12345.0
+    db.commit()
+    capture(db, "transactions", 1, "U", change_id=3)
+    assert pipeline.sync_transactions(db) == 1
+
+    latest = latest_rows(clickhouse, 'transactions_analytics', 'transaction_id')
+    assert latest.loc['T1', 'amount'] == 12345.0
+    assert latest.loc['T1', 'version'] > latest.loc['T2', 'version']
+
+
+def test_backfilled_rows_are_replaced_by_later_changes(db, sessions, clickhouse, monkeypatch):
+    monkeypatch.setattr(data_pipeline, "SessionLocal", sessions)
+    pipeline = DataPipelineService()
+    pipeline.perform_initial_sync()
+    backfilled = latest_rows(clickhouse, 'transactions_analytics', 'transaction_id')
+    assert len(backfilled) == 20
+
+    db.get(Transaction, 3).amount = 777.0
+    db.commit()
+    capture(db, "transactions", 3, "U")
+    delete_transaction(db, 4)
+    assert pipeline.sync_transactions(db) == 2
+
+    latest = latest_rows(clickhouse, 'transactions_analytics', 'transaction_id')
+    assert latest.loc['T3', 'amount'] == 777.0
+    assert latest.loc['T3', 'version'] > backfilled.loc['T3', 'version']
+    assert latest.loc['T4', 'is_deleted'] == 1
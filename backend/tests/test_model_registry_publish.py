@@ -0,0 +1,73 @@
+"""
+Concurrent publishers must each get their own version number, and a publish
+that fails for any other reason must raise instead of retrying forever
+"""
+
+import errno
+import os
+import threading
+
+import pytest
+from sklearn.preprocessing import StandardScaler
+
+from app.services.aml import model_registry
+from app.services.aml.model_registry import ModelRegistry
+
+SCHEMA = ("amount",)
+
+
+def test_concurrent_publishes_get_distinct_versions(tmp_path):
+    # One registry per publisher, as in separate worker processes
+    registries = [ModelRegistry(str(tmp_path)) for _ in range(8)]
+    barrier = threading.Barrier(len(registries))
+    published = []
+
+    def publish(registry: ModelRegistry, index: int):
+        barrier.wait()
+        published.append(registry.publish("model", {"index": index}, SCHEMA))
+
+    threads = [threading.Thread(target=publish, args=(registry, i)) for i, registry in enumerate(registries)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(published) == list(range(1, len(registries) + 1))
+    assert registries[0].versions("model") == sorted(published)
+    assert registries[0].current_version("model") in published
+    assert not [entry for entry in os.listdir(tmp_path / "model") if entry.startswith(".staging")]
+
+    indexes = {registries[0]._load("model", version).model["index"] for version in published}
+    assert indexes == set(range(len(registries)))
+
+
+def test_publish_reraises_other_errors(tmp_path, monkeypatch):
+    registry = ModelRegistry(str(tmp_path))
+    attempts = []
+
+    def rename(source, target):
+        attempts.append(target)
+        raise PermissionError(errno.EACCES, "denied")
+
+    monkeypatch.setattr(model_registry.os, "rename", rename)
+    with pytest.raises(PermissionError):
+        registry.publish("model", StandardScaler(), SCHEMA)
+
+    assert len(attempts) == 1
+    assert registry.versions("model") == []
+    assert not [entry for entry in os.listdir(tmp_path / "model") if entry.startswith(".staging")]
+
+
+def test_publish_gives_up_after_bounded_attempts(tmp_path, monkeypatch):
+    registry = ModelRegistry(str(tmp_path))
+    attempts = []
+
+    def rename(source, target):
+        attempts.append(target)
+        raise OSError(errno.ENOTEMPTY, "taken")
+
+    monkeypatch.setattr(model_registry.os, "rename", rename)
+    with pytest.raises(RuntimeError):
+        registry.publish("model", StandardScaler(), SCHEMA)
+
+    assert len(attempts) == model_registry.MAX_PUBLISH_ATTEMPTS
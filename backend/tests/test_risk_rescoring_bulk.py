@@ -0,0 +1,93 @@
+"""
+Bulk re-scoring must agree with the single-customer path and must not make
+rescored customers look changed to the next incremental run
+"""
+
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.aml import CustomerProfile, CustomerRiskProfile, Transaction
+from app.models.aml.transaction import TransactionType
+from app.services.aml.risk_scoring import RiskScoringService
+
+CUSTOMERS = 120
+TABLES = [CustomerProfile.__table__, CustomerRiskProfile.__table__, Transaction.__table__]
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory(TABLES)()
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    transaction_id = 0
+    for i in range(1, CUSTOMERS + 1):
+        session.add(CustomerProfile(
+            id=i,
+            customer_id=f"C{i}",
+            account_name=f"Customer {i}",
+            country=rng.choice(["IR", "US", None, "ZM"]),
+            pep_status=rng.random() < 0.2,
+            customer_type=rng.choice(["individual", "corporate"]),
+            occupation=rng.choice(["gambling", "teacher", None]),
+            kyc_status=rng.choice(["completed", "pending"])
+        ))
+        for _ in range(rng.randint(0, 6)):
+            transaction_id += 1
+            session.add(Transaction(
+                id=transaction_id,
+                transaction_id=f"T{transaction_id}",
+                customer_id=i,
+                transaction_type=TransactionType.DEPOSIT,
+                transaction_date=now - timedelta(days=rng.randint(0, 120)),
+                amount=rng.choice([100.0, 5000.0, 20000.0, 9000.5]),
+                is_cash=rng.random() < 0.5,
+                currency="ZMW"
+            ))
+    # Some customers already have a profile, so both the update and insert paths run
+    for i in range(1, CUSTOMERS // 4):
+        session.add(CustomerRiskProfile(customer_id=i))
+    session.commit()
+    yield session
+    session.close()
+
+
+def customer_state(db, customer_id):
+    customer = db.get(CustomerProfile, customer_id)
+    return customer.risk_score, customer.risk_level, customer.high_risk_country, customer.high_risk_business
+
+
+def test_bulk_matches_single_customer_scoring(db):
+    service = RiskScoringService(db)
+    summary = service.rescore_customers_bulk(chunk_size=32)
+    assert summary["customers_scored"] == CUSTOMERS
+
+    bulk = {
+        profile.customer_id: (
+            profile.geographic_risk, profile.customer_type_risk,
+            profile.transaction_risk, profile.composite_risk_score
+        )
+        for profile in db.query(CustomerRiskProfile)
+    }
+    bulk_customers = {i: customer_state(db, i) for i in range(1, CUSTOMERS + 1)}
+
+    for i in range(1, CUSTOMERS + 1):
+        single = service.calculate_customer_risk_score(i)
+        factors = single["factors"]
+        expected = (factors["geographic"], factors["customer_type"], factors["transaction"], single["composite_score"])
+        assert bulk[i] == pytest.approx(expected)
+        assert bulk_customers[i] == customer_state(db, i)
+    assert db.query(CustomerRiskProfile).count() == CUSTOMERS
+
+
+def test_bulk_rescore_keeps_customer_updated_at(db):
+    before = dict(db.query(CustomerProfile.id, CustomerProfile.updated_at).all())
+
+    service = RiskScoringService(db)
+    summary = service.rescore_customers_bulk(chunk_size=32)
+    db.expire_all()
+
+    assert summary["customers_changed"] > 0
+    assert dict(db.query(CustomerProfile.id, CustomerProfile.updated_at).all()) == before
+    assert service.rescore_customers_bulk(since=summary["completed_at"])["customers_scored"] == 0
@@ -0,0 +1,52 @@
+"""
+Stream rules must measure their windows in UTC, like the customer state they
+read, when the host clock is not on UTC
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.aml.customer_state import CustomerStateStore
+from app.services.aml.rule_engine import SCOPE_STREAM, RuleEngine
+from app.services.streaming.stream_processor import CompiledRuleProcessor, EventType, StreamEvent
+
+VELOCITY_RULE = {
+    "id": "V1",
+    "type": "velocity",
+    "scopes": [SCOPE_STREAM],
+    "params": {"hours": 1, "count": 3, "amount": 1000}
+}
+
+
+@pytest.fixture
+def local_utc_plus_two(monkeypatch):
+    monkeypatch.setenv("TZ", "Africa/Lusaka")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_velocity_window_ends_at_event_time_in_utc(local_utc_plus_two):
+    store = CustomerStateStore(bucket_seconds=60, window_seconds=86400)
+    utc_now = datetime.utcnow()
+    for i in range(3):
+        store.ingest({"id": i, "customer_id": 1, "transaction_date": utc_now - timedelta(minutes=10), "amount": 500.0})
+    processor = CompiledRuleProcessor(rule_engine=RuleEngine([VELOCITY_RULE]), state_store=store)
+
+    event = StreamEvent(
+        event_id="e1",
+        event_type=EventType.TRANSACTION_CREATED,
+        timestamp=datetime.now(),  # local wall-clock time, two hours ahead of UTC
+        source="test",
+        entity_type="transaction",
+        entity_id="3",
+        data={"id": 3, "customer_id": 1, "amount": 500.0}
+    )
+    alerts = asyncio.run(processor.process(event))
+
+    assert [alert.title for alert in alerts] == ["V1"]
+    assert alerts[0].description.startswith("Rapid movement of funds: 4 transactions")
@@ -0,0 +1,125 @@
+"""
+A failing event or processor must not cost the rest of the batch, and must
+not make stateful processors see any event twice
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from app.services.streaming.stream_processor import (
+    Alert,
+    AlertSeverity,
+    EventProcessor,
+    EventType,
+    StreamEvent,
+    StreamingService
+)
+
+
+def make_events(count: int) -> List[StreamEvent]:
+    start = datetime(2026, 1, 1)
+    return [
+        StreamEvent(
+            event_id=f"e{i}",
+            event_type=EventType.TRANSACTION_CREATED,
+            timestamp=start + timedelta(seconds=i),
+            source="test",
+            entity_type="transaction",
+            entity_id=str(i),
+            data={"amount": 100.0, "customer_id": 1, "poison": i == 2}
+        )
+        for i in range(count)
+    ]
+
+
+def alert_for(event: StreamEvent) -> Alert:
+    return Alert(
+        alert_id=f"seen_{event.event_id}",
+        title="Seen",
+        description="Seen",
+        severity=AlertSeverity.LOW,
+        event_data={},
+        triggered_by=[event.event_id],
+        timestamp=event.timestamp
+    )
+
+
+class CountingProcessor(EventProcessor):
+    """Counts every event it sees; raises on poison events"""
+
+    state_window_seconds = 60
+
+    def __init__(self):
+        self.seen: List[str] = []
+
+    async def process(self, event: StreamEvent) -> Optional[Alert]:
+        if event.data["poison"]:
+            raise ValueError("poison event")
+        self.seen.append(event.event_id)
+        return alert_for(event)
+
+
+class PartialBatchProcessor(CountingProcessor):
+    """A batch override that fails after applying part of the batch"""
+
+    async def process_batch(self, events: List[StreamEvent]):
+        for event in events:
+            if event.data["poison"]:
+                raise ValueError("poison event")
+            self.seen.append(event.event_id)
+        return [alert_for(event) for event in events]
+
+
+class StatelessPartialBatchProcessor(PartialBatchProcessor):
+    state_window_seconds = 0
+
+
+def run_batch(processor: EventProcessor, events: List[StreamEvent]) -> StreamingService:
+    service = StreamingService()
+    service.processors = [processor]
+    asyncio.run(service._process_batch(events))
+    return service
+
+
+def test_failing_event_is_isolated_and_others_run_once():
+    processor = CountingProcessor()
+    events = make_events(5)
+
+    service = run_batch(processor, events)
+
+    assert processor.seen == ["e0", "e1", "e3", "e4"]
+    assert service.processing_stats["processor_errors"] == 1
+    assert sorted(service.active_alerts) == ["seen_e0", "seen_e1", "seen_e3", "seen_e4"]
+
+
+def test_stateful_batch_override_is_not_replayed():
+    processor = PartialBatchProcessor()
+    events = make_events(5)
+
+    service = run_batch(processor, events)
+
+    # The events applied before the failure are not applied a second time
+    assert processor.seen == ["e0", "e1"]
+    assert service.processing_stats["processor_errors"] == len(events)
+    assert service.active_alerts == {}
+
+
+def test_stateless_batch_override_falls_back_per_event():
+    processor = StatelessPartialBatchProcessor()
+    events = make_events(5)
+
+    service = run_batch(processor, events)
+
+    assert processor.seen == ["e0", "e1", "e0", "e1", "e3", "e4"]
+    assert service.processing_stats["processor_errors"] == 1
+    assert len(service.active_alerts) == 4
+
+
+def test_publish_reports_full_queue():
+    async def publish():
+        service = StreamingService(queue_maxsize=1, publish_timeout=0.01)
+        first, second = make_events(2)
+        return await service.publish_event(first), await service.publish_event(second)
+
+    assert asyncio.run(publish()) == (True, False)